@@ -0,0 +1,65 @@
+import tempfile
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+from larkedit.core.audio import AudioMixer
+from larkedit.core.project import Clip, MediaAsset, MediaType, Project, Timeline, Track
+
+# --- AudioMixer ベンチマーク ---
+# 44.1 kHz のステレオ WAV を 32 本の音声トラックに並べ、48 kHz へ変換しながら混ぜる時間を測る
+# (デコード・リサンプル込み。CPU 時間は全スレッドの合計)
+
+TRACKS = 32
+SECONDS = 30
+SOURCE_RATE = 44_100
+
+
+def write_wav(path: Path, seconds: int, freq: float) -> None:
+    t = np.arange(seconds * SOURCE_RATE) / SOURCE_RATE
+    tone = (np.sin(2 * np.pi * freq * t) * 0.2 * 32767).astype(np.int16)
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(SOURCE_RATE)
+        w.writeframes(np.repeat(tone, 2).tobytes())
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    tracks = [Track(0, "video")]
+    for i in range(TRACKS):
+        path = Path(tmp) / f"tone_{i}.wav"
+        write_wav(path, SECONDS, 220 + 20 * i)
+        asset = MediaAsset(path, MediaType.AUDIO, SECONDS * 1000)
+        track = Track(i + 1, f"A{i + 1}", kind=MediaType.AUDIO)
+        start = i * 10  # 少しずつずらしてブロック境界をまたがせる
+        track.add_clip(
+            Clip(
+                asset,
+                0,
+                SECONDS * 1000 - 1000,
+                start,
+                gain=0.5,
+                fade_in_ms=500,
+                fade_out_ms=500,
+            )
+        )
+        tracks.append(track)
+    project = Project(name="audio-bench", timeline=Timeline(tracks))
+
+    mixer = AudioMixer(project.timeline)
+    wall0, cpu0 = time.perf_counter(), time.process_time()
+    samples = 0
+    peak = 0.0
+    for _, block in mixer.blocks():
+        samples += len(block)
+        peak = max(peak, float(np.abs(block).max()))
+    wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+
+    seconds = samples / mixer.sample_rate
+    print(f"--- {TRACKS} stereo tracks / {seconds:.1f} s @ {mixer.sample_rate} Hz ---")
+    print(f"wall   : {wall * 1000:8.1f} ms ({seconds / wall:.0f}x realtime)")
+    print(f"cpu    : {cpu * 1000:8.1f} ms ({cpu / seconds * 100:.2f}% of one core)")
+    print(f"peak   : {peak:.3f}")
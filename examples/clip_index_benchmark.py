@@ -0,0 +1,70 @@
+import random
+import time
+
+from larkedit.core.project import Clip, MediaAsset, Track
+
+# --- ClipIndex ベンチマーク ---
+# 旧実装 (append + sort / 線形探索) と Track (ClipIndex) の
+# 挿入・点問い合わせ・範囲問い合わせの時間を比較
+
+SIZES = (10_000, 100_000)
+QUERIES = 10_000
+CLIP_MS = (500, 5_000)  # クリップ長の範囲
+LINEAR_QUERIES = 200  # 旧実装の点問い合わせは遅いので回数を減らす
+
+
+def make_clips(n: int, rng: random.Random) -> list[Clip]:
+    """タイムライン上に重なり合いながら並ぶクリップ (挿入順はランダム)"""
+    asset = MediaAsset("bench.mp4", "video", 10_000)
+    span = n * 1_000
+    clips = [
+        Clip(asset, 0, rng.randint(*CLIP_MS), rng.randrange(span)) for _ in range(n)
+    ]
+    clips.append(Clip(asset, 0, span // 2, span // 2))  # 後半全体にかかる長いクリップ
+    return clips
+
+
+def linear_find(clips: list[Clip], t: int) -> Clip | None:
+    for c in clips:
+        if c.start_ms <= t < c.end_ms:
+            return c
+    return None
+
+
+def timed(fn) -> float:  # type: ignore[no-untyped-def]
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+rng = random.Random(0)
+for n in SIZES:
+    clips = make_clips(n, rng)
+    span = n * 1_000
+    points = [rng.randrange(span) for _ in range(QUERIES)]
+    ranges = [(t, t + 1_000) for t in points]
+
+    # 旧実装: 1 件ごとに append + sort (大きいと遅すぎるので 1/10 で測って外挿)
+    old: list[Clip] = []
+    part = clips[: len(clips) // 10]
+    old_insert = (
+        timed(
+            lambda: [(old.append(c), old.sort(key=lambda x: x.start_ms)) for c in part]
+        )
+        * 10
+    )
+    old = sorted(clips, key=lambda c: c.start_ms)
+
+    track = Track(0, "bench")
+    new_insert = timed(lambda: [track.add_clip(c) for c in clips])
+
+    old_point = timed(
+        lambda: [linear_find(old, t) for t in points[:LINEAR_QUERIES]]
+    ) * (QUERIES / LINEAR_QUERIES)
+    new_point = timed(lambda: [track.find_clip_at(t) for t in points])
+    new_range = timed(lambda: [track.clips_in_range(a, b) for a, b in ranges])
+
+    print(f"--- {n:,} clips ---")
+    print(f"insert all    : sort {old_insert:9.1f} ms / index {new_insert:7.1f} ms")
+    print(f"{QUERIES:,} points : scan {old_point:9.1f} ms / index {new_point:7.1f} ms")
+    print(f"{QUERIES:,} ranges : index {new_range:7.1f} ms")
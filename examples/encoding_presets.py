@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+
+from larkedit.core.compositor import RenderEngine, RenderSettings
+from larkedit.core.project import MediaAsset, MediaType, Project
+from larkedit.encoding.presets import PRESETS, auto_tune
+from larkedit.utils.media import probe
+
+# --- エンコードプリセット / 自動調整 example ---
+# 使い方: python examples/encoding_presets.py a.mp4 [目標の実時間倍率 (既定 1.0)]
+# "web" プリセットの preset を振って、このマシンで目標の倍速を保てる最も画質の良いものを選び、
+# それで書き出す (2 回目以降はキャッシュした結果を使う)
+
+OUT_DIR = Path("example_output")
+OUT_DIR.mkdir(exist_ok=True)
+
+path = Path(sys.argv[1])
+target = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+info = probe(path)
+project = Project(width=1280, height=720, fps=30)
+project.add_clip(0, MediaAsset(path, MediaType.VIDEO, info["duration_ms"]), 0)
+
+print("presets:", ", ".join(f"{p.name} ({p.label})" for p in PRESETS.values()))
+result = auto_tune(project, "web", target_realtime=target)
+for m in result.measurements:
+    speed = f"{m.realtime:6.2f}x" if m.error is None else f"unusable: {m.error}"
+    print(f"  {m.preset:16} threads={m.threads:2} {m.thread_type:12} {speed}")
+print(
+    f"chosen: {result.preset.name} "
+    f"threads={result.preset.threads} {result.preset.thread_type} "
+    f"{result.realtime:.2f}x{' (cached)' if result.cached else ''}"
+    f"{'' if result.met_target else ' -- target not reached, using the fastest'}"
+)
+
+settings = result.preset.apply(RenderSettings(OUT_DIR / "tuned.mp4"))
+stats = RenderEngine(project, settings).run()
+print(f"{stats.frames} frames, {stats.realtime:.2f}x realtime")
@@ -29,6 +29,9 @@ enc = ffm.MediaEncoder(
     fps=FPS,
     sample_rate=SAMPLE_RATE,
     channels=CHANNELS,
+    threads=0,  # コーデックのスレッド数 (0 = 自動)
+    thread_type="frame+slice",
+    convert_threads=0,  # RGBA→YUV 変換の帯分割数 (0 = 自動)
 )
 enc.start()
 print("Encoder started")
@@ -36,25 +39,19 @@ print("Encoder started")
 comp = ffm.Compositor(WIDTH, HEIGHT)
 
 
-def np_to_vframe(arr: np.ndarray, pts_ms: int) -> ffm.VideoFrame:  # type: ignore
-    """numpy → VideoFrame 変換ヘルパ"""
-    return ffm.VideoFrame(WIDTH, HEIGHT, pts_ms, arr.tobytes())
-
-
 def audio_producer() -> None:
     """440 Hz 正弦波を 2048 サンプルずつ送信"""
     total_samples = SAMPLE_RATE * DURATION_SEC
     t = 0
     freq = 440.0
-    # 時間計測で PTS を算出
+    # PTS は先頭からのサンプル数
     while t < total_samples:
         length = min(AUDIO_CHUNK, total_samples - t)
         ts = np.arange(length, dtype=np.float32) + t
         chunk = np.sin(2 * np.pi * freq * ts / SAMPLE_RATE).astype(np.float32)
         if CHANNELS == 2:
             chunk = np.repeat(chunk[:, None], 2, axis=1).flatten()
-        pts_ms = int(t * 1000 / SAMPLE_RATE)
-        enc.submit_audio(chunk, pts_ms)
+        enc.submit_audio(chunk, t)
         t += length
     print("Audio thread finished")
 
@@ -74,19 +71,17 @@ for i in range(FRAME_COUNT):
     rect_w, rect_h = 80, 60
     x = int((WIDTH - rect_w) * i / (FRAME_COUNT - 1))
     y = (HEIGHT - rect_h) // 2
-    ov[y: y + rect_h, x: x + rect_w, 0] = 255  # R
-    ov[y: y + rect_h, x: x + rect_w, 3] = 255  # A
+    ov[y : y + rect_h, x : x + rect_w, 0] = 255  # R
+    ov[y : y + rect_h, x : x + rect_w, 3] = 255  # A
 
-    # Compositor でレイヤブレンド
-    vf_bg = np_to_vframe(bg, pts_ms)
-    vf_ov = np_to_vframe(ov, pts_ms)
-    composed = comp.compose([vf_bg, vf_ov])
+    # Compositor でレイヤブレンド (ndarray をそのまま渡せる・コピーなし)
+    # 出力先はエンコーダのプールから借りるので、定常状態では確保が発生しない
+    composed = enc.acquire_frame(pts_ms)
+    comp.compose_into([bg, ov], composed)
+    composed.pts = pts_ms
 
-    # Encoder へ送信
-    rgba = np.frombuffer(bytes(composed.rgba), dtype=np.uint8).reshape(
-        (HEIGHT, WIDTH, 4)
-    )
-    enc.submit_video(rgba, pts_ms)
+    # Encoder へ送信 (VideoFrame の画素を参照で積む)
+    enc.submit_video(composed)
 
     # 擬似リアルタイム送信 (早すぎるとキュー飽和を検証しにくいので 10 ms sleep)
     time.sleep(0.01)
@@ -97,6 +92,7 @@ audio_thread.join()
 print("Audio thread joined")
 enc.finish()
 print("done :", VIDEO_FILE)
+print("encoder stats:", enc.stats())
 
 
 # --- probe example ---
@@ -0,0 +1,55 @@
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from larkedit.core.project import Clip, MediaAsset, Project, Timeline, Track
+
+# --- プロジェクトファイル ベンチマーク ---
+# 大きなプロジェクトの保存・読み込み・1 クリップ変更後の追記保存の時間を測る
+
+CLIPS = 50_000
+TRACKS = 4
+ASSETS = 500
+
+rng = random.Random(0)
+assets = [
+    MediaAsset(Path(f"/media/shot_{i:04d}.mp4"), "video", 60_000) for i in range(ASSETS)
+]
+project = Project(
+    name="bench", timeline=Timeline([Track(i, f"V{i + 1}") for i in range(TRACKS)])
+)
+for k in range(CLIPS):
+    track = project.timeline.track(k % TRACKS)
+    track.add_clip(
+        Clip(
+            rng.choice(assets), 0, rng.randint(500, 5_000), rng.randrange(CLIPS * 1_000)
+        )
+    )
+
+
+def timed(fn) -> float:  # type: ignore[no-untyped-def]
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    path = Path(tmp) / "bench.lkproj"
+    full = timed(lambda: project.save(path))
+    size = path.stat().st_size
+
+    loaded: list[Project] = []
+    open_ms = timed(lambda: loaded.append(Project.load(path)))
+    reopened = loaded[0]
+    expand = timed(lambda: [len(list(t.clips)) for t in reopened.timeline.tracks])
+
+    reopened.timeline.track(0).add_clip(Clip(assets[0], 0, 1_000, 0))
+    append = timed(reopened.save)
+
+    print(f"--- {CLIPS:,} clips / {TRACKS} tracks / {ASSETS} assets ---")
+    print(f"full save     : {full:7.1f} ms ({size / 1024:,.0f} KiB)")
+    print(f"open (lazy)   : {open_ms:7.1f} ms")
+    print(f"expand tracks : {expand:7.1f} ms")
+    grown = (path.stat().st_size - size) / 1024
+    print(f"append save   : {append:7.1f} ms (+{grown:,.0f} KiB)")
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+from larkedit.core.compositor import RenderEngine, RenderSettings
+from larkedit.core.project import MediaAsset, MediaType, Project, Track
+from larkedit.utils.media import probe
+
+# --- RenderEngine example ---
+# 使い方: python examples/render_project.py a.mp4 [b.mp4 ...]
+# 1 本目をトラック 0 に並べ、2 本目以降はトラック 2 に半分ずつずらして重ねる
+# 音声はどれも既定の音声トラック (1) に同じ位置で置いて混ぜる
+
+OUT_DIR = Path("example_output")
+OUT_DIR.mkdir(exist_ok=True)
+
+project = Project(width=1280, height=720, fps=30)
+project.add_track(Track(index=2, name="overlay"))
+
+pos = 0
+for i, arg in enumerate(sys.argv[1:]):
+    path = Path(arg)
+    info = probe(path)
+    asset = MediaAsset(path, MediaType.VIDEO, info["duration_ms"])
+    start = 0 if i == 0 else pos
+    project.add_clip(0 if i == 0 else 2, asset, start)
+    if info.get("audio"):
+        project.add_clip(
+            1, MediaAsset(path, MediaType.AUDIO, info["duration_ms"]), start
+        )
+    pos += asset.duration_ms // 2
+
+
+def on_progress(done: int, total: int) -> None:
+    if done % 30 == 0 or done == total:
+        print(f"\r{done}/{total}", end="", flush=True)
+
+
+engine = RenderEngine(project, RenderSettings(OUT_DIR / "project.mp4"), on_progress)
+stats = engine.run()
+print()
+print(f"{stats.frames} frames, {stats.fps:.1f} fps ({stats.realtime:.2f}x realtime)")
+print(
+    f"decode {stats.decode_s:.2f}s / wait {stats.wait_s:.2f}s / "
+    f"composite {stats.composite_s:.2f}s / submit {stats.submit_s:.2f}s / "
+    f"finish {stats.finish_s:.2f}s / audio {stats.audio_s:.2f}s"
+)
+print(stats.encoder)
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import threading
+from typing import Iterator
+
+import numpy as np
+
+from ..encoding.ffmpeg_binding import probe as _probe  # type: ignore
+from .project import Clip, Timeline
+
+__all__ = ["AudioMixer"]
+
+
+class _ClipSource:
+    """
+    1 clip ぶんの音声。デコーダから chunk サンプルずつまとめて読み、
+    take(n) で連続した n サンプルのビューを返す (終端を過ぎた分は無音)
+    """
+
+    def __init__(
+        self, clip: Clip, first: int, last: int, rate: int, channels: int, chunk: int
+    ) -> None:
+        self.clip = clip
+        self.first = first  # タイムライン上の開始 / 終了サンプル
+        self.last = last
+        self.decoder: _probe.AudioDecoder | None = None
+        self._rate = rate
+        self._buf = np.zeros((chunk, channels), np.float32)
+        self._pos = 0
+        self._end = 0
+        self._eof = False
+        length = last - first
+        self._fade_in = min(length, clip.fade_in_ms * rate // 1000)
+        self._fade_out = min(length, clip.fade_out_ms * rate // 1000)
+
+    def open(self, decoder: _probe.AudioDecoder, at: int) -> None:
+        """タイムライン上のサンプル at から読めるように decoder を合わせる"""
+        self.decoder = decoder
+        offset = at - self.first
+        skip_ms = offset * 1000 // self._rate
+        decoder.seek(self.clip.in_point_ms + skip_ms)
+        self._pos = self._end = 0
+        self._eof = False
+        self.take(offset - skip_ms * self._rate // 1000)  # ms に丸めた端数
+
+    def take(self, n: int) -> np.ndarray:
+        if self._end - self._pos < n:
+            # 残りを先頭へ寄せて、後ろを 1 回の read でまとめて埋める
+            rest = self._end - self._pos
+            self._buf[:rest] = self._buf[self._pos : self._end]
+            self._pos, self._end = 0, rest
+            if not self._eof:
+                assert self.decoder is not None
+                got = self.decoder.read_into(self._buf[rest:])
+                self._eof = got < len(self._buf) - rest
+                self._end += got
+            if self._end < n:
+                self._buf[self._end : n] = 0.0
+                self._end = n
+        view = self._buf[self._pos : self._pos + n]
+        self._pos += n
+        return view
+
+    def envelope(self, a: int, b: int) -> np.ndarray | float:
+        """タイムライン上 [a, b) の音量 (フェードに掛からなければスカラー)"""
+        gain = self.clip.gain
+        fi, fo = self._fade_in, self._fade_out
+        i0, i1 = a - self.first, b - self.first
+        length = self.last - self.first
+        if i0 >= fi and i1 <= length - fo:
+            return gain
+        i = np.arange(i0, i1, dtype=np.float32)
+        env = np.ones(len(i), np.float32)
+        if fi:
+            np.minimum(env, (i + 1) / fi, out=env)
+        if fo:
+            np.minimum(env, (length - i) / fo, out=env)
+        env *= gain
+        return env[:, None]
+
+
+class AudioMixer:
+    """
+    音声トラック (Track.kind == MediaType.AUDIO) の clip を混ぜて、
+    block_size サンプルずつの float32 (block_size x channels, interleaved) にする。
+    clip ごとに gain とフェード (直線) を掛ける。ソースはネイティブの AudioDecoder が
+    sample_rate / channels へ変換して chunk_s 秒ぶんずつまとめて読む
+    (音声ストリームの無いファイルの clip は無音として扱う)。
+    ブロックの時刻はサンプル数で返すので丸めは起きない。エンコーダは frame_size に満たない
+    端数を次のブロックへ持ち越すが、frame_size (AAC は 1024) の倍数にしておくと持ち越しが無い
+    """
+
+    def __init__(
+        self,
+        timeline: Timeline,
+        *,
+        sample_rate: int = 48000,
+        channels: int = 2,
+        block_size: int = 3072,
+        chunk_s: float = 2.0,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.block_size = block_size
+        self._chunk = max(block_size, int(chunk_s * sample_rate))
+        # 開始サンプル順の (first, last, clip)
+        spans = []
+        for track in timeline.tracks:
+            if not track.is_audio:
+                continue
+            for c in track.clips:
+                first, last = self._sample(c.start_ms), self._sample(c.end_ms)
+                if last > first:
+                    spans.append((first, last, c))
+        spans.sort(key=lambda s: (s[0], s[1]))
+        self._spans = spans
+
+    @property
+    def has_clips(self) -> bool:
+        return bool(self._spans)
+
+    def _sample(self, ms: int) -> int:
+        return ms * self.sample_rate // 1000
+
+    # --- 公開 API ---
+    def blocks(
+        self,
+        start_ms: int = 0,
+        end_ms: int | None = None,
+        stop: threading.Event | None = None,
+    ) -> Iterator[tuple[int, np.ndarray]]:
+        """
+        [start_ms, end_ms) を混ぜたブロックを (start_ms からのサンプル数, 配列) で順に返す。
+        最後のブロックだけ短いことがある。配列は使い回すので次を取る前に使い終えること。
+        stop がセットされたらそこで終わる
+        """
+        rate, size = self.sample_rate, self.block_size
+        first = self._sample(start_ms)
+        last = (
+            self._sample(end_ms)
+            if end_ms is not None
+            else max((s[1] for s in self._spans), default=0)
+        )
+        out = np.zeros((size, self.channels), np.float32)
+        scratch = np.empty_like(out)
+        spans = self._spans
+        nxt = 0
+        active: list[_ClipSource] = []
+        # 終わった clip のデコーダ (同じファイルで使い回す)
+        idle: dict[str, list[_probe.AudioDecoder]] = {}
+        silent: set[str] = set()  # 音声ストリームの無いファイル (無音として飛ばす)
+
+        def acquire(path: str) -> _probe.AudioDecoder | None:
+            if pool := idle.get(path):
+                return pool.pop()
+            if path in silent:
+                return None
+            try:
+                return _probe.AudioDecoder(path, rate, self.channels)
+            except RuntimeError:
+                # 映像だけのファイルが音声トラックに置かれた。開けない理由が他なら送出する
+                if "audio" in (_probe.probe(path) or {}):
+                    raise
+                silent.add(path)
+                return None
+
+        def release(src: _ClipSource) -> None:
+            assert src.decoder is not None
+            idle.setdefault(str(src.clip.asset.path), []).append(src.decoder)
+
+        try:
+            for pos in range(first, last, size):
+                if stop is not None and stop.is_set():
+                    return
+                end = min(pos + size, last)
+                n = end - pos
+
+                # このブロックで始まる clip を開く (開始前に終わっているものは飛ばす)
+                while nxt < len(spans) and spans[nxt][0] < end:
+                    a, b, clip = spans[nxt]
+                    nxt += 1
+                    if b <= pos:
+                        continue
+                    dec = acquire(str(clip.asset.path))
+                    if dec is None:
+                        continue
+                    src = _ClipSource(clip, a, b, rate, self.channels, self._chunk)
+                    src.open(dec, max(a, pos))
+                    active.append(src)
+
+                block = out[:n]
+                block.fill(0.0)
+                for src in active:
+                    a, b = max(src.first, pos), min(src.last, end)
+                    if a >= b:
+                        continue
+                    data = src.take(b - a)
+                    gain = src.envelope(a, b)
+                    dst = block[a - pos : b - pos]
+                    if not isinstance(gain, np.ndarray) and gain == 1.0:
+                        dst += data
+                    else:
+                        tmp = scratch[: b - a]
+                        np.multiply(data, gain, out=tmp)
+                        dst += tmp
+
+                for src in [s for s in active if s.last <= end]:
+                    active.remove(src)
+                    release(src)
+                np.clip(block, -1.0, 1.0, out=block)
+                yield pos - first, block
+        finally:
+            active.clear()
+            idle.clear()
+
+    def mix(self, start_ms: int = 0, end_ms: int | None = None) -> np.ndarray:
+        """[start_ms, end_ms) をまとめて混ぜる (N x channels)"""
+        parts = [block.copy() for _, block in self.blocks(start_ms, end_ms)]
+        if not parts:
+            return np.zeros((0, self.channels), np.float32)
+        return np.concatenate(parts)
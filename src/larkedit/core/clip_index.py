@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, overload
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .project import Clip
+
+__all__ = ["ClipIndex"]
+
+# この段数以下の部分木は総当たりする (分岐より速い)
+_LEAF_LEVEL = 3
+
+
+class ClipIndex:
+    """
+    開始時刻順に並べた Clip の区間インデックス。
+
+    配列を暗黙の二分木とみなし、各ノードに部分木内の最大終了時刻を持たせる
+    (cgranges と同じ方式)。点・範囲の問い合わせは O(log n + k)。
+    挿入・削除は bisect で位置を求めて list に差し込み、最大終了時刻は
+    次の問い合わせ時にまとめて numpy で作り直す。
+    Clip の start_ms / duration_ms を変えるときは update() を通すこと。
+    lazy() で作ったものは最初に中身へ触れたときに loader を呼んで読み込む。
+    """
+
+    __slots__ = (
+        "_clips",
+        "_starts",
+        "_ends",
+        "_max",
+        "_root",
+        "_dirty",
+        "_version",
+        "_loader",
+        "_lazy_len",
+        "_lazy_end",
+    )
+
+    def __init__(self, clips: Any = ()) -> None:
+        items = sorted(clips, key=lambda c: c.start_ms)
+        self._clips: list[Clip] = items
+        self._starts: list[int] = [c.start_ms for c in items]
+        self._ends: list[int] = [c.end_ms for c in items]
+        self._max: list[int] = []
+        self._root = -1  # 根の段数
+        self._dirty = True
+        self._version = 0
+        self._loader: Callable[[], list[Clip]] | None = None
+        self._lazy_len = 0
+        self._lazy_end = 0
+
+    @classmethod
+    def lazy(
+        cls, loader: Callable[[], list[Clip]], count: int, end_ms: int
+    ) -> ClipIndex:
+        """
+        中身を後で読み込むインデックス。loader は開始時刻順の clip の列を返すこと。
+        件数と終端だけは読み込まずに答える
+        """
+        index = cls()
+        index._loader = loader
+        index._lazy_len = count
+        index._lazy_end = end_ms
+        return index
+
+    @property
+    def loaded(self) -> bool:
+        return self._loader is None
+
+    def _load(self) -> None:
+        loader, self._loader = self._loader, None
+        if loader is not None:
+            clips = loader()
+            self._clips = clips
+            self._starts = [c.start_ms for c in clips]
+            self._ends = [c.end_ms for c in clips]
+            self._dirty = True
+
+    # --- 変更 ---
+    def add(self, clip: Clip) -> None:
+        """同じ開始時刻のものの後ろに挿入する"""
+        if self._loader is not None:
+            self._load()
+        i = bisect.bisect_right(self._starts, clip.start_ms)
+        self._clips.insert(i, clip)
+        self._starts.insert(i, clip.start_ms)
+        self._ends.insert(i, clip.end_ms)
+        self._touch()
+
+    def add_many(self, clips: Iterable[Clip]) -> None:
+        """まとめて挿入する (1 件ずつ add するより速い。同じ開始時刻なら既存・渡した順の後ろ)"""
+        if self._loader is not None:
+            self._load()
+        new = sorted(clips, key=lambda c: c.start_ms)
+        if not new:
+            return
+        # 既存と新規はどちらも整列済みなので 2 本を併合する (同じ開始時刻なら既存が先)
+        self._clips = list(heapq.merge(self._clips, new, key=lambda c: c.start_ms))
+        self._starts = [c.start_ms for c in self._clips]
+        self._ends = [c.end_ms for c in self._clips]
+        self._touch()
+
+    def remove_many(self, clips: Iterable[Clip]) -> None:
+        """まとめて削除する (1 つでも含まれていなければ何も消さずに ValueError)"""
+        if self._loader is not None:
+            self._load()
+        drop = {id(c) for c in clips}
+        if not drop:
+            return
+        keep = [i for i, c in enumerate(self._clips) if id(c) not in drop]
+        if len(self._clips) - len(keep) != len(drop):
+            raise ValueError("clip is not in this index")
+        self._clips = [self._clips[i] for i in keep]
+        self._starts = [self._starts[i] for i in keep]
+        self._ends = [self._ends[i] for i in keep]
+        self._touch()
+
+    def remove(self, clip: Clip) -> None:
+        i = self._position(clip)
+        if i < 0:
+            raise ValueError("clip is not in this index")
+        del self._clips[i], self._starts[i], self._ends[i]
+        self._touch()
+
+    def update(self, clip: Clip, **changes: float) -> None:
+        """clip のフィールド (時刻・音量) を書き換え、並び順とインデックスを直す"""
+        self.remove(clip)
+        try:
+            for name, value in changes.items():
+                setattr(clip, name, value)
+        finally:
+            self.add(clip)
+
+    def clear(self) -> None:
+        self._loader = None
+        self._clips.clear()
+        self._starts.clear()
+        self._ends.clear()
+        self._touch()
+
+    # --- 問い合わせ ---
+    def at(self, position_ms: int) -> list[Clip]:
+        """position_ms を含む clip (開始時刻順)"""
+        return self.overlapping(position_ms, position_ms + 1)
+
+    def first_at(self, position_ms: int) -> Clip | None:
+        """position_ms を含む clip のうち最も早く始まるもの"""
+        for i in self._query(position_ms, position_ms + 1):
+            return self._clips[i]
+        return None
+
+    def overlapping(self, start_ms: int, end_ms: int) -> list[Clip]:
+        """[start_ms, end_ms) と重なる clip (開始時刻順)"""
+        if self._loader is not None:
+            self._load()
+        clips = self._clips
+        return [clips[i] for i in self._query(start_ms, end_ms)]
+
+    def __contains__(self, clip: object) -> bool:
+        return self._position(clip) >= 0  # type: ignore[arg-type]
+
+    @property
+    def end_ms(self) -> int:
+        """最後に終わる clip の終端 (空なら 0)"""
+        if self._loader is not None:
+            return self._lazy_end
+        return max(self._ends, default=0)
+
+    @property
+    def version(self) -> int:
+        """変更のたびに増える (キャッシュの無効化用)"""
+        return self._version
+
+    # --- list 互換 ---
+    def __len__(self) -> int:
+        if self._loader is not None:
+            return self._lazy_len
+        return len(self._clips)
+
+    def __iter__(self) -> Iterator[Clip]:
+        if self._loader is not None:
+            self._load()
+        return iter(self._clips)
+
+    @overload
+    def __getitem__(self, i: int) -> Clip: ...
+    @overload
+    def __getitem__(self, i: slice) -> list[Clip]: ...
+    def __getitem__(self, i):
+        if self._loader is not None:
+            self._load()
+        return self._clips[i]
+
+    def __repr__(self) -> str:
+        if self._loader is not None:
+            return f"ClipIndex(<{self._lazy_len} clips, not loaded>)"
+        return f"ClipIndex({self._clips!r})"
+
+    # pickle では clip の列だけ持つ
+    def __getstate__(self) -> list[Clip]:
+        if self._loader is not None:
+            self._load()
+        return list(self._clips)
+
+    def __setstate__(self, clips: list[Clip]) -> None:
+        self.__init__(clips)  # type: ignore[misc]
+
+    # --- 内部 ---
+    def _touch(self) -> None:
+        self._dirty = True
+        self._version += 1
+
+    def _position(self, clip: Clip) -> int:
+        """clip (同一オブジェクト) の位置。無ければ -1"""
+        if self._loader is not None:
+            self._load()
+        lo = bisect.bisect_left(self._starts, clip.start_ms)
+        hi = bisect.bisect_right(self._starts, clip.start_ms, lo)
+        for i in range(lo, hi):
+            if self._clips[i] is clip:
+                return i
+        return -1
+
+    def _build(self) -> None:
+        """各ノードの部分木内最大終了時刻を作り直す"""
+        if not self._dirty:
+            return
+        n = len(self._ends)
+        self._dirty = False
+        if n == 0:
+            self._max, self._root = [], -1
+            return
+        ends = np.asarray(self._ends, dtype=np.int64)
+        mx = ends.copy()
+        last_i = (n - 1) & ~1  # 最後の葉 (偶数番目)
+        last = int(mx[last_i])
+        k = 1
+        while (1 << k) <= n:
+            x = 1 << (k - 1)
+            idx = np.arange((x << 1) - 1, n, x << 2)
+            if idx.size:
+                right = idx + x
+                er = np.where(right < n, mx[np.minimum(right, n - 1)], last)
+                mx[idx] = np.maximum(np.maximum(ends[idx], mx[idx - x]), er)
+            last_i = last_i - x if (last_i >> k) & 1 else last_i + x
+            if last_i < n and mx[last_i] > last:
+                last = int(mx[last_i])
+            k += 1
+        self._max = mx.tolist()
+        self._root = k - 1
+
+    def _query(self, st: int, en: int) -> Iterator[int]:
+        """[st, en) と重なる要素の位置を昇順に返す"""
+        if self._loader is not None:
+            self._load()
+        n = len(self._clips)
+        if n == 0:
+            return
+        self._build()
+        starts, ends, mx = self._starts, self._ends, self._max
+        stack = [(self._root, (1 << self._root) - 1, False)]
+        while stack:
+            k, x, left_done = stack.pop()
+            if k <= _LEAF_LEVEL:
+                # 小さい部分木は開始時刻順に総当たり
+                i0 = x >> k << k
+                for i in range(i0, min(i0 + (1 << (k + 1)) - 1, n)):
+                    if starts[i] >= en:
+                        break
+                    if st < ends[i]:
+                        yield i
+            elif not left_done:
+                stack.append((k, x, True))
+                y = x - (1 << (k - 1))  # 左の子 (範囲外のこともある)
+                if y >= n or mx[y] > st:
+                    stack.append((k - 1, y, False))
+            elif x < n and starts[x] < en:
+                if st < ends[x]:
+                    yield x
+                stack.append((k - 1, x + (1 << (k - 1)), False))
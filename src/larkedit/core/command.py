@@ -1,10 +1,38 @@
 from __future__ import annotations
 
 import abc
+import json
+import os
+import struct
+import sys
+import uuid
+import zlib
 from collections import deque
-from typing import Deque, List, Optional
+from contextlib import nullcontext
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Callable,
+    ClassVar,
+    ContextManager,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    TypeVar,
+)
 
-__all__ = ["Command", "MacroCommand", "UndoStack"]
+from ..utils.paths import cache_dir
+
+if TYPE_CHECKING:
+    from .project import MediaAsset, Project
+
+_T = TypeVar("_T")
+
+__all__ = ["Command", "DeltaCodec", "DeltaCommand", "MacroCommand", "UndoStack"]
 
 
 class Command(abc.ABC):
@@ -21,6 +49,11 @@ class Command(abc.ABC):
     def __init__(self, *, merge_id: Optional[str] = None) -> None:
         self._merge_id = merge_id  # 連続入力 (文字入力など) マージ用
 
+    @property
+    def project(self) -> Project | None:
+        """変更する Project。返すと UndoStack が実行・取り消しを 1 つの transaction で包む"""
+        return None
+
     # --- Template Methods ---
     def execute(self) -> bool:
         """コマンドを実行してプロジェクトを変更する"""
@@ -58,15 +91,65 @@ class Command(abc.ABC):
         """other を self に取り込んだら True を返す（未使用なら False）"""
         return False  # デフォルトはマージしない
 
+    # --- 差分表現 (UndoStack が履歴を小さく持つのに使う) ---
+    def to_delta(self, codec: DeltaCodec) -> Any | None:
+        """
+        オブジェクト参照を含まない JSON にできる値で自分を表す (実行済みの状態で呼ばれる)。
+        None を返すと UndoStack はコマンドを生のまま持ち、ジャーナルにも書けない。
+        差分にできるコマンドは DeltaCommand を継承する
+        """
+        return None
+
+
+class DeltaCommand(Command):
+    """
+    差分にできるコマンド。to_delta() と from_delta() の両方を実装する。
+    クラス名で引けるように登録しておく (ジャーナルにはクラス名を書く)
+    """
 
-class MacroCommand(Command):
-    """複数コマンドをまとめて 1 つに見せる"""
+    #: 名前 -> クラス (差分から作り直すときに引く)
+    _types: ClassVar[Dict[str, type[DeltaCommand]]] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        DeltaCommand._types[cls.__name__] = cls
+
+    @abc.abstractmethod
+    def to_delta(self, codec: DeltaCodec) -> Any | None: ...  # noqa: E704
+
+    @classmethod
+    @abc.abstractmethod
+    def from_delta(cls, codec: DeltaCodec, delta: Any) -> Command:
+        """to_delta() の値から作り直す。Clip などは undo / redo の時点で codec.project から探すこと"""
+
+
+class MacroCommand(DeltaCommand):
+    """
+    複数コマンドをまとめて 1 つに見せる。
+    project の transaction 内で実行するので、observer への通知は全体で 1 回になる
+    """
 
     description = "Macro Command"
 
-    def __init__(self, commands: List[Command]) -> None:
+    def __init__(
+        self,
+        commands: List[Command],
+        *,
+        project: Project | None = None,
+        description: str | None = None,
+    ) -> None:
         super().__init__()
         self._commands = commands
+        # 省略時は最初に project を持つ子コマンドのもの
+        self._project = project or next(
+            (c.project for c in commands if c.project is not None), None
+        )
+        if description is not None:
+            self.description = description
+
+    @property
+    def project(self) -> Project | None:
+        return self._project
 
     def _execute(self) -> bool:
         for cmd in self._commands:
@@ -82,18 +165,256 @@ class MacroCommand(Command):
         for cmd in self._commands:
             cmd.redo()
 
+    def to_delta(self, codec: DeltaCodec) -> Any | None:
+        children = [codec.encode(c) for c in self._commands]
+        if any(c is None for c in children):
+            return None
+        return {"description": self.description, "commands": children}
+
+    @classmethod
+    def from_delta(cls, codec: DeltaCodec, delta: Any) -> Command:
+        return cls(
+            [codec.decode(c) for c in delta["commands"]],
+            project=codec.project,
+            description=delta["description"],
+        )
+
+
+class DeltaCodec:
+    """
+    Command と差分 (JSON にできる値) の相互変換。
+    MediaAsset は (path, media_type, duration_ms) で表し、作り直すときは同じ組のものを共有する
+    """
+
+    def __init__(self, project: Project | None = None) -> None:
+        self.project = project
+        self._assets: Dict[tuple[str, str, int], MediaAsset] = {}
+
+    def encode(self, command: Command) -> list[Any] | None:
+        """[クラス名, 差分] (差分にできなければ None)"""
+        delta = command.to_delta(self)
+        return None if delta is None else [type(command).__name__, delta]
+
+    def decode(self, data: list[Any]) -> Command:
+        name, delta = data
+        try:
+            cls = DeltaCommand._types[name]
+        except KeyError:
+            raise ValueError(f"unknown command type {name!r}") from None
+        return cls.from_delta(self, delta)
+
+    def asset_ref(self, asset: MediaAsset) -> list[Any]:
+        key = (str(asset.path), asset.media_type, asset.duration_ms)
+        self._assets.setdefault(key, asset)
+        return list(key)
+
+    def asset(self, ref: list[Any]) -> MediaAsset:
+        from .project import MediaAsset
+
+        key = (str(ref[0]), str(ref[1]), int(ref[2]))
+        asset = self._assets.get(key)
+        if asset is None:
+            asset = self._assets[key] = MediaAsset(Path(key[0]), key[1], key[2])
+        return asset
+
+
+# --- 履歴のジャーナル ---
+# Undo 履歴をディスクに追記していくファイル。メモリから追い出した差分をここから読み直し、
+# アプリが落ちたときは最後の保存 (CHECKPOINT) 以降の操作をここから再適用する。
+#
+#   ヘッダ    : magic "LKUJ", version u16
+#   レコード  : [tag u8][len u32][crc32 u32][payload]  (crc は tag + payload)
+#   PUSH      : zlib(JSON [description, [クラス名, 差分]])  コマンドを実行して積んだ
+#   MERGE     : PUSH と同じ形。直前のコマンドにマージした結果 (古い方を置き換える)
+#   UNDO/REDO : 空
+#   OPAQUE    : description (utf-8)  差分にできないコマンドを積んだ (ここから先は再適用できない)
+#   CHECKPOINT: プロジェクトファイルのパス (utf-8)  その時点で保存した
+#
+# 既定のジャーナルは cache_dir("undo")/<pid>-<uuid>.lkundo。pid のプロセスが居なければ
+# 落ちたセッションの残りなので、起動時に UndoStack.orphaned_journals() で探して復旧するか消す。
+
+_JOURNAL_SUFFIX = ".lkundo"
+_JOURNAL_HEADER = struct.Struct("<4sH")
+_JOURNAL_MAGIC = b"LKUJ"
+_JOURNAL_VERSION = 1
+_JOURNAL_RECORD = struct.Struct("<BII")
+
+_PUSH, _MERGE, _UNDO, _REDO, _OPAQUE, _CHECKPOINT = range(1, 7)
+
+_COMPRESS_LEVEL = 1  # 速さ優先
+_REPLAYABLE = (_PUSH, _MERGE, _UNDO, _REDO)
+# 生の Command 1 つのメモリ量の目安 (参照している Clip などを含む)
+_LIVE_COST = 2048
+
+
+def _journal_name() -> str:
+    return f"{os.getpid()}-{uuid.uuid4().hex}{_JOURNAL_SUFFIX}"
+
+
+def _journal_pid(path: Path) -> int | None:
+    """既定の名前のジャーナルを書いたプロセスの pid"""
+    pid = path.name.split("-", 1)[0]
+    return int(pid) if pid.isdigit() else None
+
+
+def _pid_alive(pid: int) -> bool:
+    if sys.platform == "win32":
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            ok = kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+            return bool(ok) and code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # 他のユーザーのプロセス
+    return True
+
+
+@dataclass(slots=True)
+class _Record:
+    tag: int
+    start: int  # レコード先頭の位置
+    offset: int  # payload の位置
+    size: int
+
+
+class _Journal:
+    """ジャーナルファイル 1 つ (追記と、位置を指定した読み直し)"""
+
+    def __init__(self, path: Path, *, resume_at: int | None = None) -> None:
+        self.path = path
+        if resume_at is None:
+            self._f: BinaryIO = open(path, "w+b")
+            self._f.write(_JOURNAL_HEADER.pack(_JOURNAL_MAGIC, _JOURNAL_VERSION))
+        else:
+            self._f = open(path, "r+b")
+            # 途中で切れたレコードや再適用できなかった分を捨てる
+            self._f.truncate(resume_at)
+        self._f.flush()
+
+    def append(self, tag: int, payload: bytes = b"") -> int:
+        """レコードを 1 つ書いて payload の位置を返す (落ちても残るよう毎回 flush する)"""
+        f = self._f
+        at = f.seek(0, os.SEEK_END)
+        crc = zlib.crc32(payload, zlib.crc32(bytes([tag])))
+        f.write(_JOURNAL_RECORD.pack(tag, len(payload), crc) + payload)
+        f.flush()
+        return at + _JOURNAL_RECORD.size
+
+    def read(self, offset: int, size: int) -> bytes:
+        self._f.seek(offset)
+        return self._f.read(size)
+
+    def reset(self) -> None:
+        self._f.truncate(_JOURNAL_HEADER.size)
+        self._f.flush()
+
+    @property
+    def empty(self) -> bool:
+        return self._f.seek(0, os.SEEK_END) <= _JOURNAL_HEADER.size
+
+    def close(self, *, remove: bool) -> None:
+        self._f.close()
+        if remove:
+            self.path.unlink(missing_ok=True)
+
+    @staticmethod
+    def scan(data: bytes) -> list[_Record]:
+        """読めるところまでのレコード (末尾が壊れていればその手前まで)"""
+        if len(data) < _JOURNAL_HEADER.size:
+            raise ValueError("not an undo journal")
+        magic, version = _JOURNAL_HEADER.unpack_from(data)
+        if magic != _JOURNAL_MAGIC or version > _JOURNAL_VERSION:
+            raise ValueError("not an undo journal")
+        records = []
+        pos = _JOURNAL_HEADER.size
+        view = memoryview(data)
+        while pos + _JOURNAL_RECORD.size <= len(data):
+            tag, n, crc = _JOURNAL_RECORD.unpack_from(data, pos)
+            at = pos + _JOURNAL_RECORD.size
+            if (
+                at + n > len(data)
+                or zlib.crc32(view[at : at + n], zlib.crc32(bytes([tag]))) != crc
+            ):
+                break
+            records.append(_Record(tag, pos, at, n))
+            pos = at + n
+        return records
+
+
+@dataclass(slots=True, eq=False)
+class _Entry:
+    """
+    履歴 1 段。command (生) / delta (メモリ上の差分) / offset (ジャーナル上の差分) のどれかで持つ。
+    どれも無いものは差分にできなかったコマンドの跡 (復旧時のみ)
+    """
+
+    description: str
+    command: Command | None = None
+    delta: bytes | None = None
+    offset: int = -1
+    size: int = 0
+    undone: bool = False
+    alive: bool = True
+    seq: int = 0  # 最後にメモリへ載せた順番 (UndoStack._resident の古い記録を見分ける)
+
+    @property
+    def cost(self) -> int:
+        return (len(self.delta) if self.delta is not None else 0) + (
+            _LIVE_COST if self.command is not None else 0
+        )
+
 
 class UndoStack:
     """
-    履歴の実装はシンプルなデック。
+    Undo / Redo 履歴。件数 (max_depth) とメモリ量 (memory_budget バイト) で上限を決める。
 
     - _history      … 実行済みコマンド
     - _undone       … Undo 済みで Redo 可能なコマンド
+
+    積んだコマンドはすぐ to_delta() で圧縮した差分にし、生のオブジェクトは各スタックの先頭
+    (次に undo / redo / マージするもの) だけに残す。差分はジャーナルファイルにも追記しておき、
+    予算を超えたら古いものからメモリを空ける (undo で必要になったらジャーナルから読み直す)。
+    差分にできないコマンドはジャーナルに置けないので、予算を超えたらそれより古い履歴ごと捨てる。
+    spill=False ならジャーナルを作らない (予算を超えた分は捨てる)。
+
+    ジャーナルはクラッシュ復旧にも使う。Project.save() が checkpoint() を書くので、
+    落ちたあとは recover() で最後の保存以降の編集をやり直せる
+    (落ちたセッションのジャーナルは orphaned_journals() で探す)。
+    正常に閉じるときは close() でジャーナルを消すこと。
     """
 
-    def __init__(self, max_depth: int | None = 1000) -> None:
-        self._history: Deque[Command] = deque(maxlen=max_depth)
-        self._undone: Deque[Command] = deque()
+    def __init__(
+        self,
+        max_depth: int | None = 1000,
+        *,
+        memory_budget: int = 32 * 1024 * 1024,
+        journal: str | Path | None = None,
+        spill: bool = True,
+    ) -> None:
+        self._max_depth = max_depth
+        self._budget = memory_budget
+        self._journal_path = Path(journal) if journal is not None else None
+        self._spill = spill
+        self._journal: _Journal | None = None
+        self._codec = DeltaCodec()
+        self._history: Deque[_Entry] = deque()
+        self._undone: Deque[_Entry] = deque()
+        # メモリを使っている段 (古い順)
+        self._resident: Deque[tuple[int, _Entry]] = deque()
+        self._bytes = 0
+        self._seq = 0
 
     # --- API ---
     def push(self, command: Command) -> bool:
@@ -101,30 +422,188 @@ class UndoStack:
         コマンドを実行し、成功したら履歴に積む。
         必要ならマージ処理も行う。
         """
-        if self._history and command.can_merge_with(self._history[-1]):
-            merged = self._history[-1]
-            if merged.merge_with(command):
+        if self._codec.project is None:
+            self._codec.project = command.project
+        top = self._history[-1] if self._history else None
+        if (
+            top is not None
+            and top.command is not None
+            and command.can_merge_with(top.command)
+        ):
+            if top.command.merge_with(command):
+                self._store(top, _MERGE)
+                self._trim()
                 return True  # マージ完了 (新規エントリは不要)
 
-        if command.execute():
-            self._history.append(command)
-            self._undone.clear()
+        if self._in_transaction(command, command.execute):
+            self._discard(self._undone)
+            entry = _Entry(command.description)
+            self._put(self._history, entry)
+            self._load(entry, command)
+            self._store(entry, _PUSH)
+            if self._max_depth is not None:
+                while len(self._history) > self._max_depth:
+                    self._drop(self._history.popleft())
+            self._trim()
             return True
         return False
 
     def undo(self) -> None:
-        if not self._history:
-            return
-        cmd = self._history.pop()
-        cmd.undo()
-        self._undone.append(cmd)
+        """先頭のコマンドを取り消す (例外で失敗したら履歴は動かさない)"""
+        self._step(self._history, self._undone, _UNDO, "undo")
 
     def redo(self) -> None:
-        if not self._undone:
-            return
-        cmd = self._undone.pop()
-        cmd.redo()
-        self._history.append(cmd)
+        self._step(self._undone, self._history, _REDO, "redo")
+
+    def checkpoint(self, project_path: str | Path) -> None:
+        """プロジェクトを保存したことを記録する (復旧はここから後の操作だけやり直す)"""
+        if self._journal is not None:
+            self._journal.append(_CHECKPOINT, str(project_path).encode())
+
+    def close(self) -> None:
+        """履歴を捨ててジャーナルを消す (正常終了時)"""
+        self.clear()
+        if self._journal is not None:
+            self._journal.close(remove=True)
+            self._journal = None
+
+    @staticmethod
+    def _in_transaction(command: Command, fn: Callable[[], _T]) -> _T:
+        """command.project があればその transaction 内で fn を呼ぶ (通知をまとめる)"""
+        project = command.project
+        ctx: ContextManager[object] = (
+            project.transaction(command.description)
+            if project is not None
+            else nullcontext()
+        )
+        with ctx:
+            return fn()
+
+    # --- クラッシュ復旧 ---
+    @staticmethod
+    def journal_project(journal: str | Path) -> Path | None:
+        """ジャーナルに記録された最後の保存先 (一度も保存していなければ None)"""
+        data = Path(journal).read_bytes()
+        checkpoints = [r for r in _Journal.scan(data) if r.tag == _CHECKPOINT]
+        if not checkpoints:
+            return None
+        r = checkpoints[-1]
+        return Path(data[r.offset : r.offset + r.size].decode())
+
+    @staticmethod
+    def journal_has_edits(journal: str | Path) -> bool:
+        """最後の checkpoint より後にやり直す操作があるか"""
+        records = _Journal.scan(Path(journal).read_bytes())
+        for r in reversed(records):
+            if r.tag == _CHECKPOINT:
+                return False
+            if r.tag in _REPLAYABLE:
+                return True
+        return False
+
+    @staticmethod
+    def orphaned_journals() -> list[Path]:
+        """落ちたセッションが残した既定の場所のジャーナル (新しい順。動いているプロセスのものは除く)"""
+        found = []
+        for path in cache_dir("undo").glob(f"*{_JOURNAL_SUFFIX}"):
+            pid = _journal_pid(path)
+            if pid is not None and _pid_alive(pid):
+                continue
+            try:
+                found.append((path.stat().st_mtime, path))
+            except OSError:
+                continue  # 他のプロセスが先に消した
+        return [path for _, path in sorted(found, reverse=True)]
+
+    @classmethod
+    def recover(
+        cls,
+        project: Project,
+        journal: str | Path,
+        *,
+        max_depth: int | None = 1000,
+        memory_budget: int = 32 * 1024 * 1024,
+    ) -> UndoStack:
+        """
+        落ちたセッションのジャーナルから編集をやり直す。
+        project は最後の checkpoint で保存したファイル (checkpoint が無ければセッション開始時の状態)。
+        履歴も引き継ぐので復旧後もそのまま undo できる。
+        差分にできないコマンドに当たったらその手前で止め、ジャーナルの残りは捨てる。
+        既定の場所のジャーナルはこのプロセスの名前に付け替えて、そのまま使い続ける
+        """
+        path = Path(journal)
+        if path.parent == cache_dir("undo") and _journal_pid(path) != os.getpid():
+            path = path.rename(path.with_name(_journal_name()))
+        data = path.read_bytes()
+        records = _Journal.scan(data)
+        last_checkpoint = max(
+            (i for i, r in enumerate(records) if r.tag == _CHECKPOINT), default=-1
+        )
+        end = records[-1].offset + records[-1].size if records else _JOURNAL_HEADER.size
+
+        stack = cls(max_depth, memory_budget=memory_budget, journal=path)
+        stack._codec.project = project
+        history: List[_Entry | None] = []
+        undone: List[_Entry | None] = []
+
+        def replay(entry: _Entry | None, payload: bytes | None, action: str) -> bool:
+            if entry is None:
+                return False
+            cmd = stack._decode(
+                payload
+                if payload is not None
+                else data[entry.offset : entry.offset + entry.size]
+            )
+            stack._in_transaction(cmd, getattr(cmd, action))
+            return True
+
+        for i, r in enumerate(records):
+            apply = i > last_checkpoint
+            ok = True
+            if r.tag in (_PUSH, _MERGE):
+                payload = data[r.offset : r.offset + r.size]
+                description = json.loads(zlib.decompress(payload))[0]
+                if r.tag == _MERGE:
+                    old = history.pop() if history else None
+                    ok = not apply or replay(old, None, "undo")
+                else:
+                    undone.clear()
+                if ok and apply:
+                    replay(_Entry(description), payload, "execute")
+                if ok:
+                    history.append(_Entry(description, offset=r.offset, size=r.size))
+            elif r.tag == _OPAQUE:
+                ok = not apply
+                if ok:
+                    history.append(None)
+                    undone.clear()
+            elif r.tag in (_UNDO, _REDO):
+                src, dst = (history, undone) if r.tag == _UNDO else (undone, history)
+                entry = src.pop() if src else None
+                ok = not apply or replay(
+                    entry, None, "undo" if r.tag == _UNDO else "redo"
+                )
+                if ok:
+                    dst.append(entry)
+            if not ok:
+                end = r.start
+                break
+
+        # 差分の無い段より先へは undo / redo できない
+        for replayed, entries, undone_flag in (
+            (history, stack._history, False),
+            (undone, stack._undone, True),
+        ):
+            cut = max((i for i, e in enumerate(replayed) if e is None), default=-1)
+            for e in replayed[cut + 1 :]:
+                assert e is not None
+                e.undone = undone_flag
+                entries.append(e)
+        if max_depth is not None:
+            while len(stack._history) > max_depth:
+                stack._drop(stack._history.popleft())
+        stack._journal = _Journal(path, resume_at=end)
+        return stack
 
     # --- クエリ系 ---
     @property
@@ -143,7 +622,139 @@ class UndoStack:
     def redo_description(self) -> str | None:
         return self._undone[-1].description if self._undone else None
 
+    @property
+    def memory_bytes(self) -> int:
+        """履歴がメモリ上で使っている量 (目安)"""
+        return self._bytes
+
+    @property
+    def journal_path(self) -> Path | None:
+        return self._journal.path if self._journal is not None else self._journal_path
+
     def clear(self) -> None:
         """履歴リセット (プロジェクト再読込時など)"""
-        self._history.clear()
-        self._undone.clear()
+        self._discard(self._history)
+        self._discard(self._undone)
+        self._resident.clear()
+        self._bytes = 0
+        self._codec = DeltaCodec()
+        if self._journal is not None:
+            self._journal.reset()
+
+    # --- 内部 ---
+    def _step(
+        self, src: Deque[_Entry], dst: Deque[_Entry], tag: int, action: str
+    ) -> None:
+        """src の先頭を取り消し / やり直しして dst に移す (成功してから移す)"""
+        if not src:
+            return
+        entry = src[-1]
+        cmd = self._command(entry)
+        self._in_transaction(cmd, getattr(cmd, action))
+        src.pop()
+        self._write(tag)
+        self._put(dst, entry)
+        self._trim()
+
+    def _write(self, tag: int, payload: bytes = b"") -> int:
+        """ジャーナルに書いて payload の位置を返す (ジャーナルを使わないなら -1)"""
+        if not self._spill:
+            return -1
+        if self._journal is None:
+            path = self._journal_path or cache_dir("undo") / _journal_name()
+            self._journal = _Journal(path)
+        if self._journal.empty:
+            # 開いたファイルから編集を始めたなら、復旧はそのファイルから始める
+            project = self._codec.project
+            if project is not None and project.file_path is not None:
+                self._journal.append(_CHECKPOINT, str(project.file_path).encode())
+        return self._journal.append(tag, payload)
+
+    def _store(self, entry: _Entry, tag: int) -> None:
+        """entry.command を差分にしてメモリとジャーナルに置く"""
+        assert entry.command is not None
+        encoded = self._codec.encode(entry.command)
+        old = entry.cost
+        entry.description = entry.command.description
+        if encoded is None:
+            entry.delta, entry.offset, entry.size = None, -1, 0
+            self._write(_OPAQUE, entry.description.encode())
+        else:
+            raw = json.dumps(
+                [entry.description, encoded], ensure_ascii=False, separators=(",", ":")
+            ).encode()
+            entry.delta = zlib.compress(raw, _COMPRESS_LEVEL)
+            entry.offset, entry.size = self._write(tag, entry.delta), len(entry.delta)
+        self._bytes += entry.cost - old
+
+    def _decode(self, payload: bytes) -> Command:
+        return self._codec.decode(json.loads(zlib.decompress(payload))[1])
+
+    def _command(self, entry: _Entry) -> Command:
+        """生の Command (差分しか無ければメモリかジャーナルから作り直す)"""
+        if entry.command is None:
+            if entry.delta is not None:
+                payload = entry.delta
+            elif entry.offset >= 0 and self._journal is not None:
+                payload = self._journal.read(entry.offset, entry.size)
+            else:
+                raise RuntimeError(
+                    f"history entry {entry.description!r} is not available"
+                )
+            self._load(entry, self._decode(payload))
+        assert entry.command is not None
+        return entry.command
+
+    def _load(self, entry: _Entry, command: Command) -> None:
+        old = entry.cost
+        entry.command = command
+        self._bytes += entry.cost - old
+        self._seq += 1
+        entry.seq = self._seq
+        self._resident.append((self._seq, entry))
+
+    def _put(self, stack: Deque[_Entry], entry: _Entry) -> None:
+        """stack に積む。それまでの先頭は差分があれば生のオブジェクトを手放す"""
+        if stack:
+            top = stack[-1]
+            if top.command is not None and (top.delta is not None or top.offset >= 0):
+                old = top.cost
+                top.command = None
+                self._bytes += top.cost - old
+        entry.undone = stack is self._undone
+        stack.append(entry)
+
+    def _drop(self, entry: _Entry) -> None:
+        self._bytes -= entry.cost
+        entry.alive = False
+        entry.command = entry.delta = None
+
+    def _discard(self, stack: Deque[_Entry]) -> None:
+        for entry in stack:
+            self._drop(entry)
+        stack.clear()
+
+    def _trim(self) -> None:
+        """予算を超えていたら古い段からメモリを空ける (各スタックの先頭は残す)"""
+        tops: list[tuple[int, _Entry]] = []
+        while self._bytes > self._budget and self._resident:
+            seq, entry = self._resident.popleft()
+            if not entry.alive or entry.seq != seq or entry.cost == 0:
+                continue
+            stack = self._undone if entry.undone else self._history
+            if stack and stack[-1] is entry:
+                # 次の undo / redo / マージに生のまま使う (先頭でなくなったら空ける)
+                tops.append((seq, entry))
+                continue
+            if entry.offset >= 0:
+                # ジャーナルにあるので読み直せる
+                self._bytes -= entry.cost
+                entry.command = entry.delta = None
+                continue
+            # ジャーナルに無い: それより古い段ごと捨てる
+            while stack:
+                dropped = stack.popleft()
+                self._drop(dropped)
+                if dropped is entry:
+                    break
+        self._resident.extendleft(reversed(tops))
@@ -0,0 +1,503 @@
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Literal
+
+import numpy as np
+
+from ..encoding.ffmpeg_binding import encoder as ffm  # type: ignore
+from ..encoding.ffmpeg_binding import probe as _probe  # type: ignore
+from .audio import AudioMixer
+from .project import Clip, Project
+from .render_plan import RenderPlan, frame_of
+
+__all__ = [
+    "RenderCancelled",
+    "RenderEngine",
+    "RenderSettings",
+    "RenderStats",
+    "ThreadType",
+]
+
+# 先読みしたフレームがこれ以上先の時刻なら順に読まずに seek する
+_SEEK_AHEAD_MS = 250
+
+# エンコーダのスレッドの分け方 (AVCodecContext.thread_type)
+ThreadType = Literal["frame", "slice", "frame+slice"]
+
+
+class RenderCancelled(Exception):
+    """RenderEngine.cancel() で中断された"""
+
+
+@dataclass(slots=True)
+class RenderSettings:
+    """書き出し設定 (0 / None はプロジェクトの値を使う)"""
+
+    output: str | Path
+    width: int = 0
+    height: int = 0
+    fps: int = 0
+    video_codec: str = "libx264"
+    audio_codec: str = "aac"  # 音声トラックに clip が無ければ音声ストリームは作らない
+    sample_rate: int = 48000
+    channels: int = 2
+    start_ms: int = 0
+    end_ms: int | None = None  # None ならタイムライン末尾まで
+    threads: int = 0  # デコーダ / Compositor / エンコーダのスレッド数 (0 = 自動)
+    lookahead: int = 8  # トラックごとに先読みするフレーム数
+    gop_size: int = 0  # キーフレーム間隔 (0 = コーデック任せ)
+    pix_fmt: str = "yuv420p"
+    bit_rate: int = 4_000_000  # 0 = コーデック任せ (crf などで決める)
+    # avcodec_open2 に渡す (preset / crf など)
+    codec_options: dict[str, str] = field(default_factory=dict)
+    codec_threads: int = 0  # エンコーダのスレッド数 (0 = threads と同じ)
+    thread_type: ThreadType = "frame+slice"
+    # encoding.presets.EncodingPreset.apply() でまとめて設定できる
+
+
+@dataclass(slots=True)
+class RenderStats:
+    """段ごとの所要時間 (秒)。decode_s は各トラックの合計なので wall_s を超えうる"""
+
+    frames: int = 0
+    duration_ms: int = 0
+    decode_s: float = 0.0
+    wait_s: float = 0.0  # メインループがデコード待ちで止まっていた時間
+    composite_s: float = 0.0
+    submit_s: float = 0.0  # エンコーダのキュー待ちを含む
+    finish_s: float = 0.0
+    audio_s: float = 0.0  # 音声のデコード + ミックス (別スレッドで映像と並行)
+    wall_s: float = 0.0
+    encoder: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def fps(self) -> float:
+        return self.frames / self.wall_s if self.wall_s else 0.0
+
+    @property
+    def realtime(self) -> float:
+        """実時間の何倍速で書き出せたか"""
+        return self.duration_ms / 1000 / self.wall_s if self.wall_s else 0.0
+
+
+class _SlotRing:
+    """デコード先のバッファ群。参照カウントが 0 になったものを再利用する"""
+
+    def __init__(self, count: int, height: int, width: int) -> None:
+        self.frames = [np.zeros((height, width, 4), np.uint8) for _ in range(count)]
+        self._refs = [0] * count
+        self._free: queue.SimpleQueue[int] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        for i in range(count):
+            self._free.put(i)
+
+    def acquire(self, stop: threading.Event) -> int:
+        while True:
+            try:
+                slot = self._free.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    raise RenderCancelled from None
+                continue
+            self._refs[slot] = 1
+            return slot
+
+    def retain(self, slot: int) -> None:
+        with self._lock:
+            self._refs[slot] += 1
+
+    def release(self, slot: int) -> None:
+        with self._lock:
+            self._refs[slot] -= 1
+            if self._refs[slot]:
+                return
+        self._free.put(slot)
+
+
+class _TrackReader(threading.Thread):
+    """
+    1 トラックぶんのデコードを先読みするスレッド。
+    RenderPlan から引いたフレームごとの (clip, ソース時刻) に従って
+    出力フレーム番号ごとに (index, slot | None) を queue に積む。
+    デコーダはアセットごとに持ち続け、連続するクリップでは開き直さない。
+    use_proxy なら asset.proxy_path があればそちらを読む (プレビュー用)。
+    """
+
+    _END = None
+
+    def __init__(
+        self,
+        track_index: int,
+        clips: tuple[Clip, ...],
+        clip_of_frame: list[int],  # -1 は clip 無し
+        src_of_frame: list[int],
+        width: int,
+        height: int,
+        lookahead: int,
+        threads: int,
+        stop: threading.Event,
+        *,
+        use_proxy: bool = False,
+    ) -> None:
+        super().__init__(name=f"render-track-{track_index}", daemon=True)
+        self.queue: queue.Queue[tuple[int, int | None] | None] = queue.Queue(lookahead)
+        # 出力待ち lookahead + 現在/次のフレーム + メインループが使用中のもの
+        self.slots = _SlotRing(lookahead + 4, height, width)
+        self.error: BaseException | None = None
+        self.decode_s = 0.0
+        self._clips = clips
+        self._clip_of_frame = clip_of_frame
+        self._src_of_frame = src_of_frame
+        self._size = (width, height)
+        self._threads = threads
+        self._use_proxy = use_proxy
+        self._cancel = stop
+        self._decoders: dict[str, _probe.MediaDecoder] = {}
+
+    def run(self) -> None:
+        try:
+            self._run()
+        except RenderCancelled:
+            pass
+        except BaseException as e:  # noqa: BLE001
+            self.error = e
+        finally:
+            self._decoders.clear()
+            self._put(self._END)
+
+    # --- 内部 ---
+    def _put(self, item: tuple[int, int | None] | None) -> None:
+        while True:
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._cancel.is_set() and item is not self._END:
+                    raise RenderCancelled from None
+                if self._cancel.is_set():
+                    return
+
+    def _decoder(self, clip: Clip) -> _probe.MediaDecoder:
+        asset = clip.asset
+        key = str(
+            asset.proxy_path if self._use_proxy and asset.proxy_path else asset.path
+        )
+        dec = self._decoders.get(key)
+        if dec is None:
+            w, h = self._size
+            dec = _probe.MediaDecoder(key, w, h, True, self._threads)
+            self._decoders[key] = dec
+        return dec
+
+    def _read(self, dec: _probe.MediaDecoder) -> tuple[int, int] | None:
+        slot = self.slots.acquire(self._cancel)
+        t0 = time.perf_counter()
+        got = dec.read_frame(self.slots.frames[slot])
+        self.decode_s += time.perf_counter() - t0
+        if got is None:
+            self.slots.release(slot)
+            return None
+        return got[0], slot
+
+    def _run(self) -> None:
+        clip: Clip | None = None
+        dec: _probe.MediaDecoder | None = None
+        cur: tuple[int, int] | None = None  # (pts_ms, slot) 現在表示中
+        nxt: tuple[int, int] | None = None  # 1 つ先に読んだもの
+        eof = False
+
+        def drop() -> None:
+            nonlocal cur, nxt
+            for f in (cur, nxt):
+                if f is not None:
+                    self.slots.release(f[1])
+            cur = nxt = None
+
+        for i, (ci, src_ms) in enumerate(zip(self._clip_of_frame, self._src_of_frame)):
+            if self._cancel.is_set():
+                raise RenderCancelled
+            if ci < 0:
+                if clip is not None:
+                    drop()
+                    clip = None
+                self._put((i, None))
+                continue
+
+            active = self._clips[ci]
+            if active is not clip:
+                clip, dec = active, self._decoder(active)
+                drop()
+            assert dec is not None
+
+            # 後戻り、または大きく先へ飛ぶ場合は seek
+            jump = (
+                not eof
+                and cur is not None
+                and src_ms - (nxt or cur)[0] > _SEEK_AHEAD_MS
+            )
+            if cur is None or src_ms < cur[0] or jump:
+                drop()
+                t0 = time.perf_counter()
+                dec.seek(src_ms)
+                self.decode_s += time.perf_counter() - t0
+                eof = False
+                cur = self._read(dec)
+                if cur is None:
+                    eof = True
+                    self._put((i, None))
+                    continue
+
+            # src_ms を越えない最後のフレームまで進める (EOF なら最後のフレームを保持)
+            while not eof:
+                if self._cancel.is_set():
+                    raise RenderCancelled
+                if nxt is None:
+                    nxt = self._read(dec)
+                    if nxt is None:
+                        eof = True
+                        break
+                if nxt[0] > src_ms:
+                    break
+                self.slots.release(cur[1])
+                cur, nxt = nxt, None
+
+            self.slots.retain(cur[1])
+            self._put((i, cur[1]))
+
+        drop()
+
+
+def _open_readers(
+    plan: RenderPlan,
+    first: int,
+    last: int,
+    width: int,
+    height: int,
+    *,
+    lookahead: int,
+    threads: int,
+    stop: threading.Event,
+    use_proxy: bool = False,
+) -> list[_TrackReader]:
+    """
+    [first, last) を width x height で読む _TrackReader を下のレイヤーから (clip の無いトラックは除く)。
+    書き出しとプレビューで共用し、解像度だけ変える (デコーダのスケーラが直接その大きさで出す)
+    """
+    readers = []
+    for index in plan.track_indices:
+        clips, clip_of_frame, src_of_frame = plan.track_frames(index, first, last)
+        if not (clip_of_frame >= 0).any():
+            continue
+        readers.append(
+            _TrackReader(
+                index,
+                clips,
+                clip_of_frame.tolist(),
+                src_of_frame.tolist(),
+                width,
+                height,
+                max(1, lookahead),
+                threads,
+                stop,
+                use_proxy=use_proxy,
+            )
+        )
+    return readers
+
+
+def _next_layers(readers: list[_TrackReader]) -> list[tuple[_TrackReader, int]]:
+    """
+    各 reader から次のフレームを受け取り、映っているものを (reader, slot) で返す。
+    使い終わったら reader.slots.release(slot) すること
+    """
+    held: list[tuple[_TrackReader, int]] = []
+    for r in readers:
+        item = r.queue.get()
+        if item is None:
+            for h, slot in held:
+                h.slots.release(slot)
+            raise r.error or RenderCancelled()
+        if item[1] is not None:
+            held.append((r, item[1]))
+    return held
+
+
+class _AudioFeeder(threading.Thread):
+    """AudioMixer のブロックを MediaEncoder.submit_audio へ流すスレッド (映像とは待ち合わせない)"""
+
+    def __init__(
+        self,
+        mixer: AudioMixer,
+        enc: Any,
+        start_ms: int,
+        end_ms: int,
+        stop: threading.Event,
+    ) -> None:
+        super().__init__(name="render-audio", daemon=True)
+        self.error: BaseException | None = None
+        self.mix_s = 0.0
+        self._mixer = mixer
+        self._enc = enc
+        self._range = (start_ms, end_ms)
+        self._cancel = stop
+
+    def run(self) -> None:
+        try:
+            blocks = self._mixer.blocks(*self._range, stop=self._cancel)
+            while True:
+                t0 = time.perf_counter()
+                item = next(blocks, None)
+                self.mix_s += time.perf_counter() - t0
+                if item is None:
+                    return
+                # 中身はコピーされるので使い回してよい
+                self._enc.submit_audio(item[1], item[0])
+        except BaseException as e:  # noqa: BLE001
+            self.error = e
+
+
+class RenderEngine:
+    """
+    Project.timeline を Compositor → MediaEncoder へ流して書き出す。
+    デコードはトラックごとのスレッドで先読みし、合成・エンコードと重ねて走らせる。
+    音声トラックは AudioMixer で混ぜ、別スレッドから submit_audio する。
+    ネイティブ側は GIL を手放すので各段は実際に並列に動く。
+    """
+
+    def __init__(
+        self,
+        project: Project,
+        settings: RenderSettings,
+        progress: Callable[[int, int], None] | None = None,
+    ) -> None:
+        self._project = project
+        self._settings = settings
+        self._progress = progress
+        self._stop = threading.Event()
+
+    def cancel(self) -> None:
+        self._stop.set()
+
+    def frame_range(self) -> tuple[int, int]:
+        """
+        書き出すフレーム番号の範囲 [first, last)。
+        0 からのフレーム格子に乗せるので、区間ごとに書き出しても映像は全体と同じ時刻になる。
+        音声は区間ごとにエンコードするとプライミングのぶん境界でずれるので、
+        SegmentedExporter は区間を映像だけにして音声を別に一度で書き出す
+        """
+        s = self._settings
+        fps = s.fps or self._project.fps
+        end = self._project.timeline.duration_ms if s.end_ms is None else s.end_ms
+        return frame_of(s.start_ms, fps), frame_of(end, fps)
+
+    def frame_times(self) -> list[int]:
+        """書き出す各フレームのタイムライン時刻 (ms)"""
+        fps = self._settings.fps or self._project.fps
+        first, last = self.frame_range()
+        return [k * 1000 // fps for k in range(first, last)]
+
+    def run(self) -> RenderStats:
+        s = self._settings
+        width = s.width or self._project.width
+        height = s.height or self._project.height
+        fps = s.fps or self._project.fps
+        first, last = self.frame_range()
+        times = self.frame_times()
+        stats = RenderStats(duration_ms=len(times) * 1000 // fps)
+        threads = s.threads or os.cpu_count() or 1
+
+        wall0 = time.perf_counter()
+        plan = self._project.timeline.render_plan(fps)
+        readers = _open_readers(
+            plan,
+            first,
+            last,
+            width,
+            height,
+            lookahead=s.lookahead,
+            threads=s.threads,
+            stop=self._stop,
+        )
+        comp = ffm.Compositor(width, height, threads)
+        mixer = AudioMixer(
+            self._project.timeline, sample_rate=s.sample_rate, channels=s.channels
+        )
+        # 範囲ではなくタイムライン全体で決める (範囲内に clip が無くても無音のストリームを持たせる)
+        with_audio = bool(s.audio_codec) and mixer.has_clips
+        enc = ffm.MediaEncoder(
+            str(s.output),
+            width,
+            height,
+            fps,
+            sample_rate=s.sample_rate,
+            channels=s.channels,
+            video_codec=s.video_codec,
+            audio_codec=s.audio_codec if with_audio else "",
+            threads=s.codec_threads or s.threads,
+            thread_type=s.thread_type,
+            convert_threads=s.threads,
+            gop_size=s.gop_size,
+            pix_fmt=s.pix_fmt,
+            bit_rate=s.bit_rate,
+            codec_options=s.codec_options,
+        )
+        enc.start()
+        for r in readers:
+            r.start()
+        feeder = None
+        if with_audio and times:
+            feeder = _AudioFeeder(mixer, enc, times[0], last * 1000 // fps, self._stop)
+            feeder.start()
+
+        try:
+            for i, t in enumerate(times):
+                if self._stop.is_set():
+                    raise RenderCancelled
+
+                t0 = time.perf_counter()
+                held = _next_layers(readers)
+                t1 = time.perf_counter()
+
+                pts = t - times[0]
+                out = enc.acquire_frame(pts)
+                comp.compose_into([r.slots.frames[slot] for r, slot in held], out)
+                out.pts = pts
+                for r, slot in held:
+                    r.slots.release(slot)
+                t2 = time.perf_counter()
+
+                enc.submit_video(out)
+                t3 = time.perf_counter()
+
+                stats.wait_s += t1 - t0
+                stats.composite_s += t2 - t1
+                stats.submit_s += t3 - t2
+                stats.frames += 1
+                if self._progress is not None:
+                    self._progress(i + 1, len(times))
+
+            if feeder is not None:
+                feeder.join()
+                if feeder.error is not None:
+                    raise feeder.error
+                stats.audio_s = feeder.mix_s
+
+            t0 = time.perf_counter()
+            enc.finish()
+            stats.finish_s = time.perf_counter() - t0
+        finally:
+            self._stop.set()
+            for r in readers:
+                r.join()
+            if feeder is not None:
+                feeder.join()
+        stats.decode_s = sum(r.decode_s for r in readers)
+        stats.encoder = dict(enc.stats())
+        stats.wall_s = time.perf_counter() - wall0
+        return stats
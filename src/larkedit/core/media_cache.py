@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from ..utils.media import MediaInfo
+from ..utils.paths import cache_dir
+
+__all__ = ["CachedMedia", "MediaCache"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    key       TEXT PRIMARY KEY,   -- ファイル同一性 (path, size, mtime[, 部分ハッシュ]) のハッシュ
+    path      TEXT NOT NULL,
+    info      TEXT,               -- MediaInfo (JSON)
+    thumb     BLOB,               -- zlib 圧縮した RGBA
+    thumb_w   INTEGER,
+    thumb_h   INTEGER,
+    thumb_req INTEGER,            -- 生成時に要求したサイズ
+    nbytes    INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_path ON media(path);
+CREATE INDEX IF NOT EXISTS media_lru ON media(last_used);
+"""
+
+_PARTIAL_HASH_BYTES = 64 * 1024  # 先頭と末尾をこれだけ読む
+# get() ごとに last_used を書かず、溜めてからまとめて書く
+_TOUCH_INTERVAL_S = 30.0
+_TOUCH_MAX_PENDING = 256
+
+_default: MediaCache | None = None
+_default_lock = threading.Lock()
+
+
+@dataclass(slots=True)
+class CachedMedia:
+    info: MediaInfo | None
+    thumbnail: np.ndarray | None  # (H, W, 4) RGBA
+
+
+class MediaCache:
+    """
+    probe 結果とサムネイルのディスクキャッシュ (SQLite)。
+    キーはファイルのパス・サイズ・更新時刻 (と任意で先頭/末尾の部分ハッシュ) なので、
+    ファイルが変わればヒットしなくなり、古い行は次の put で消える。
+    合計サイズが max_bytes を超えたら最後に使われた時刻が古いものから捨てる
+    (合計は put のたびに DB から数え直すので、同じ DB を開いた他のプロセスの分も入る)。
+    最後に使われた時刻は get のたびには書かず、put / close か一定間隔でまとめて書く。
+    スレッドセーフ (MediaImportService のワーカーから呼ばれる)。
+    """
+
+    def __init__(
+        self,
+        db_path: str | Path | None = None,
+        *,
+        max_bytes: int = 256 * 1024 * 1024,
+        partial_hash: bool = False,
+    ) -> None:
+        self._path = Path(db_path) if db_path else cache_dir("media") / "media.sqlite3"
+        self._max_bytes = max_bytes
+        self._partial_hash = partial_hash
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self._path, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._total = self._sum_locked()
+        self._touched: dict[str, float] = {}  # まだ書いていない last_used
+        self._touch_flushed = time.monotonic()
+        self._closed = False
+
+    @property
+    def total_bytes(self) -> int:
+        """最後に数えたときの合計バイト数"""
+        return self._total
+
+    # --- 公開 API ---
+    def key_for(self, path: str | Path) -> str | None:
+        """ファイル同一性のキー (stat できなければ None)"""
+        path = Path(path).resolve()
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}".encode())
+        if self._partial_hash:
+            try:
+                with path.open("rb") as f:
+                    h.update(f.read(_PARTIAL_HASH_BYTES))
+                    if st.st_size > _PARTIAL_HASH_BYTES:
+                        f.seek(
+                            max(st.st_size - _PARTIAL_HASH_BYTES, _PARTIAL_HASH_BYTES)
+                        )
+                        h.update(f.read(_PARTIAL_HASH_BYTES))
+            except OSError:
+                return None
+        return h.hexdigest()
+
+    def get(
+        self, path: str | Path, thumb_size: int | None = None
+    ) -> CachedMedia | None:
+        """
+        キャッシュ済みの結果。thumb_size が生成時と違えばサムネイルは None。
+        ファイルが変わっていれば None
+        """
+        key = self.key_for(path)
+        if key is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT info, thumb, thumb_w, thumb_h, thumb_req"
+                " FROM media WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+            if (
+                len(self._touched) >= _TOUCH_MAX_PENDING
+                or time.monotonic() - self._touch_flushed >= _TOUCH_INTERVAL_S
+            ):
+                self._flush_touches_locked()
+        info_json, blob, w, h, req = row
+        thumb = None
+        if blob is not None and (thumb_size is None or thumb_size == req):
+            thumb = np.frombuffer(zlib.decompress(blob), dtype=np.uint8).reshape(
+                (h, w, 4)
+            )
+        info = json.loads(info_json) if info_json is not None else None
+        return CachedMedia(info, thumb)
+
+    def put(
+        self,
+        path: str | Path,
+        info: MediaInfo | None,
+        thumbnail: np.ndarray | None = None,
+        thumb_size: int | None = None,
+    ) -> None:
+        key = self.key_for(path)
+        if key is None:
+            return
+        info_json = json.dumps(info) if info is not None else None
+        blob, w, h = None, None, None
+        if thumbnail is not None:
+            h, w = thumbnail.shape[:2]
+            blob = zlib.compress(
+                np.ascontiguousarray(thumbnail, dtype=np.uint8).tobytes(), 6
+            )
+        nbytes = len(blob or b"") + len(info_json or "")
+        resolved = str(Path(path).resolve())
+
+        with self._lock:
+            self._flush_touches_locked()  # LRU を正しくしてから追い出す
+            # 同じパスの古い版 (ファイル変更前のもの) は置き換える
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute("DELETE FROM media WHERE path = ?", (resolved,))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        key,
+                        resolved,
+                        info_json,
+                        blob,
+                        w,
+                        h,
+                        thumb_size,
+                        nbytes,
+                        time.time(),
+                    ),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._total = self._sum_locked()
+            self._evict_locked()
+
+    def invalidate(self, path: str | Path) -> None:
+        resolved = str(Path(path).resolve())
+        with self._lock:
+            self._db.execute("DELETE FROM media WHERE path = ?", (resolved,))
+            self._total = self._sum_locked()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM media")
+            self._touched.clear()
+            self._total = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            try:
+                self._flush_touches_locked()
+            finally:
+                self._db.close()
+
+    # --- 内部 ---
+    def _sum_locked(self) -> int:
+        return int(
+            self._db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM media").fetchone()[0]
+        )
+
+    def _flush_touches_locked(self) -> None:
+        """溜めた last_used をまとめて書く (ロック保持中に呼ぶ)"""
+        if self._touched:
+            self._db.executemany(
+                "UPDATE media SET last_used = ? WHERE key = ?",
+                [(t, key) for key, t in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touch_flushed = time.monotonic()
+
+    def _evict_locked(self) -> None:
+        """LRU で max_bytes 以下まで削る (ロック保持中に呼ぶ)"""
+        while self._total > self._max_bytes:
+            rows = self._db.execute(
+                "SELECT key, nbytes FROM media ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._total = 0
+                return
+            victims = []
+            for key, nbytes in rows:
+                victims.append((key,))
+                self._total -= nbytes
+                if self._total <= self._max_bytes:
+                    break
+            self._db.executemany("DELETE FROM media WHERE key = ?", victims)
+
+    @staticmethod
+    def default() -> MediaCache | None:
+        """既定の場所のキャッシュ (プロセスで 1 つを共有する。閉じないこと。開けなければ None)"""
+        global _default
+        with _default_lock:
+            if _default is None:
+                try:
+                    _default = MediaCache()
+                except (OSError, sqlite3.Error):
+                    return None
+                atexit.register(_default.close)
+            return _default
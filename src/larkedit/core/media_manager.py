@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from ..utils.media import IMAGE_SUFFIXES, MediaInfo, probe, thumbnail_rgba
+from .media_cache import MediaCache
+from .project import MediaType
+
+__all__ = ["ImportResult", "MediaImportService", "detect_media_type"]
+
+DEFAULT_DURATION_MS = 10_000  # probe 失敗時の長さ
+
+
+def detect_media_type(path: Path) -> str:
+    """拡張子からメディアタイプを判定"""
+    return MediaType.IMAGE if path.suffix.lower() in IMAGE_SUFFIXES else MediaType.VIDEO
+
+
+@dataclass(slots=True)
+class ImportResult:
+    """1 ファイル分の probe + サムネイル結果"""
+
+    path: Path
+    media_type: str
+    duration_ms: int
+    info: MediaInfo | None = None
+    thumbnail: np.ndarray | None = None  # (H, W, 4) RGBA
+    error: str | None = None
+    cached: bool = False  # MediaCache から返したか
+
+
+class MediaImportService:
+    """
+    probe とサムネイル生成をスレッドプールで並列に行う。
+    ネイティブ側は GIL を手放すので、ワーカー数ぶん実際に並列で動く。
+    callback はワーカースレッドから呼ばれる (GUI へはシグナル等で渡すこと)。
+    失敗しても例外にはせず、error を埋めた ImportResult を渡す (取り消したものは呼ばない)。
+    cache を渡さなければ既定の MediaCache を使う (use_cache=False で無効)。
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        thumb_size: int = 96,
+        *,
+        cache: MediaCache | None = None,
+        use_cache: bool = True,
+    ) -> None:
+        # 各デコーダも内部でスレッドを使うので、コア数いっぱいまでは使わない
+        workers = max_workers or max(1, min(4, (os.cpu_count() or 2) // 2))
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="media-import")
+        self._thumb_size = thumb_size
+        self._lock = threading.Lock()
+        self._futures: set[Future[ImportResult]] = set()
+        self._cache = (cache or MediaCache.default()) if use_cache else None
+
+    @property
+    def thumb_size(self) -> int:
+        return self._thumb_size
+
+    def submit(
+        self, path: str | Path, callback: Callable[[ImportResult], None] | None = None
+    ) -> Future[ImportResult]:
+        """path の取り込みを予約する"""
+        fut = self._pool.submit(self._run, Path(path))
+        with self._lock:
+            self._futures.add(fut)
+        fut.add_done_callback(self._discard)
+        if callback is not None:
+
+            def deliver(f: Future[ImportResult]) -> None:
+                if f.cancelled():
+                    return
+                if (e := f.exception()) is not None:  # _run の外で落ちた
+                    result = ImportResult(
+                        Path(path), detect_media_type(Path(path)), DEFAULT_DURATION_MS
+                    )
+                    result.error = f"{type(e).__name__}: {e}"
+                    callback(result)
+                else:
+                    callback(f.result())
+
+            fut.add_done_callback(deliver)
+        return fut
+
+    def cancel_pending(self) -> None:
+        """まだ始まっていない取り込みを取り消す"""
+        with self._lock:
+            futures = list(self._futures)
+        for fut in futures:
+            fut.cancel()
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    # --- 内部 ---
+    def _discard(self, fut: Future[ImportResult]) -> None:
+        with self._lock:
+            self._futures.discard(fut)
+
+    def _run(self, path: Path) -> ImportResult:
+        result = ImportResult(path, detect_media_type(path), DEFAULT_DURATION_MS)
+        try:
+            self._import(path, result)
+        except Exception as e:  # noqa: BLE001
+            result.error = f"{type(e).__name__}: {e}"
+        return result
+
+    def _import(self, path: Path, result: ImportResult) -> None:
+        if self._cache is not None:
+            try:
+                hit = self._cache.get(path, self._thumb_size)
+            except (sqlite3.Error, OSError):  # キャッシュが使えなくても取り込みは続ける
+                hit = None
+            if hit is not None and hit.info is not None and hit.thumbnail is not None:
+                result.info = hit.info
+                result.duration_ms = hit.info.get("duration_ms", 0)
+                result.thumbnail = hit.thumbnail
+                result.cached = True
+                return
+
+        errors = []
+        try:
+            result.info = probe(path)
+            result.duration_ms = result.info.get("duration_ms", 0)
+        except Exception as e:  # noqa: BLE001
+            errors.append(f"probe: {e}")
+        try:
+            result.thumbnail = thumbnail_rgba(path, 0, self._thumb_size)
+        except Exception as e:  # noqa: BLE001
+            errors.append(f"thumbnail: {e}")
+        result.error = "; ".join(errors) or None
+        if self._cache is not None and result.error is None:
+            try:
+                self._cache.put(path, result.info, result.thumbnail, self._thumb_size)
+            except (sqlite3.Error, OSError):
+                pass  # 次回また probe するだけ
@@ -0,0 +1,459 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+
+from ..encoding.ffmpeg_binding import encoder as ffm  # type: ignore
+from .compositor import RenderCancelled, _next_layers, _open_readers
+from .project import Project, ProjectChange
+from .render_plan import RenderPlan, frame_of
+
+__all__ = [
+    "DropPolicy",
+    "FrameCache",
+    "PlaybackEngine",
+    "PlaybackStats",
+    "PreviewQuality",
+    "preview_size",
+]
+
+# 先読みが再生位置からこのフレーム数より遅れたら、順に読むのをやめて先へ seek し直す
+_MAX_LAG_FRAMES = 2
+# seek し直すときに再生位置からどれだけ先を狙うか (秒)。デコードが再生より遅いときは
+# ここから追いつかれるまでの間だけ表示され、残りは落ちる
+_RESEEK_LEAD_S = 0.5
+_WAIT_S = 0.05
+
+
+class DropPolicy:
+    """表示に間に合わなかったときの扱い"""
+
+    DROP = "drop"  # 時計は進め続け、間に合わなかったフレームは飛ばす
+    WAIT = "wait"  # フレームが揃うまで時計を止める
+
+
+class PreviewQuality:
+    """プレビューの解像度 (プロジェクト解像度を何分の 1 にするか)"""
+
+    FULL = 1
+    HALF = 2
+    QUARTER = 4
+    ALL = (FULL, HALF, QUARTER)
+
+
+def preview_size(width: int, height: int, quality: int) -> tuple[int, int]:
+    """quality で縮めた大きさ (偶数に揃える)"""
+    w = max(2, width // quality)
+    h = max(2, height // quality)
+    return w - (w & 1), h - (h & 1)
+
+
+@dataclass(slots=True)
+class PlaybackStats:
+    shown: int = 0
+    dropped: int = 0  # 表示時刻に間に合わなかったフレーム
+    skipped: int = 0  # 先読み側が遅れて合成しなかったフレーム
+    stalls: int = 0  # WAIT で時計を止めていたティック数
+    rendered: int = 0
+    render_s: float = 0.0
+
+
+class FrameCache:
+    """
+    合成済みフレームの LRU キャッシュ (フレーム番号 → HxWx4 配列)。
+    合計バイト数が max_bytes を超えたら最後に使われたのが古いものから捨てる。
+    スレッドセーフ (先読みスレッドが put し、GUI スレッドが get する)
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self._max_bytes = max_bytes
+        self._frames: OrderedDict[int, np.ndarray] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __contains__(self, frame: int) -> bool:
+        return frame in self._frames
+
+    def get(self, frame: int) -> np.ndarray | None:
+        with self._lock:
+            image = self._frames.get(frame)
+            if image is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(frame)
+            self.hits += 1
+            return image
+
+    def put(
+        self, frame: int, image: np.ndarray, keep: tuple[int, int] = (0, 0)
+    ) -> None:
+        """
+        frame を入れる。溢れた分は古いものから捨てるが、[keep[0], keep[1]) のフレームは残す
+        (先読みしてまだ表示していないフレームを捨てないため)
+        """
+        lo, hi = keep
+        with self._lock:
+            old = self._frames.pop(frame, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._frames[frame] = image
+            self._bytes += image.nbytes
+            if self._bytes <= self._max_bytes:
+                return
+            for f in [f for f in self._frames if not lo <= f < hi and f != frame]:
+                self._bytes -= self._frames.pop(f).nbytes
+                if self._bytes <= self._max_bytes:
+                    break
+
+    def invalidate(self, ranges: Iterable[tuple[int, int]]) -> None:
+        """[start, end) の範囲のフレームを捨てる"""
+        ranges = list(ranges)
+        if not ranges:
+            return
+        with self._lock:
+            for frame in [
+                f for f in self._frames if any(a <= f < b for a, b in ranges)
+            ]:
+                self._bytes -= self._frames.pop(frame).nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+
+
+class PlaybackEngine:
+    """
+    プレビュー再生。Project.fps の時計と、再生位置より先を合成してキャッシュに積む
+    先読みスレッドからなる。GUI 側はタイマーで current_frame() を呼んで表示する。
+    先読みは RenderEngine と同じトラックごとのデコードスレッドを使う。
+    use_proxies なら asset にプロキシがあればそちらを読む。
+    quality (PreviewQuality.*) で縮めた解像度でデコード・合成する (書き出しは常に等倍)。
+    タイムラインを変えたら invalidate() を呼ぶこと (変わったフレームだけ捨てる)。
+    ProjectChange を渡せばその区間だけ捨てる (プラン全体を比べなくて済む)
+    """
+
+    def __init__(
+        self,
+        project: Project,
+        *,
+        cache_bytes: int = 512 * 1024 * 1024,
+        ahead_s: float = 1.0,
+        drop_policy: str = DropPolicy.DROP,
+        threads: int = 0,
+        lookahead: int = 4,
+        use_proxies: bool = True,
+        quality: int = PreviewQuality.FULL,
+    ) -> None:
+        self._project = project
+        self._fps = project.fps
+        self._quality = quality
+        self._size = preview_size(project.width, project.height, quality)
+        self.cache = FrameCache(cache_bytes)
+        self.stats = PlaybackStats()
+        self.drop_policy = drop_policy
+        self._ahead_s = ahead_s
+        self._threads = threads or os.cpu_count() or 1
+        self._lookahead = lookahead
+        self._use_proxies = use_proxies
+        self._plan: RenderPlan = project.timeline.render_plan(self._fps)
+
+        # 時計: 再生中は anchor_frame + (now - anchor_t) * fps
+        self._playing = False
+        self._anchor_frame = 0
+        self._anchor_t = 0.0
+        self._last_shown = -1
+        self._last_dropped = -1
+        self._resume_at = 0
+        self.error: BaseException | None = (
+            None  # 先読みで起きた例外 (次の seek / 変更で再試行)
+        )
+
+        self._cond = threading.Condition()
+        self._generation = 0  # seek / invalidate のたびに増やし、先読みをやり直させる
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="playback", daemon=True)
+        self._thread.start()
+
+    # --- 時計 ---
+    @property
+    def fps(self) -> int:
+        return self._fps
+
+    @property
+    def frame_count(self) -> int:
+        return self._plan.frame_count
+
+    @property
+    def quality(self) -> int:
+        return self._quality
+
+    @property
+    def frame_size(self) -> tuple[int, int]:
+        """合成するフレームの (幅, 高さ)"""
+        return self._size
+
+    def set_quality(self, quality: int) -> None:
+        """解像度を変える。キャッシュは作り直しになる"""
+        if quality == self._quality:
+            return
+        with self._cond:
+            self._quality = quality
+            self._size = preview_size(
+                self._project.width, self._project.height, quality
+            )
+            self.cache.clear()
+            self._restart()
+
+    @property
+    def playing(self) -> bool:
+        return self._playing
+
+    @property
+    def position(self) -> int:
+        """再生位置 (フレーム番号)"""
+        if not self._playing:
+            return self._anchor_frame
+        frame = self._anchor_frame + int(
+            (time.perf_counter() - self._anchor_t) * self._fps
+        )
+        return min(frame, max(0, self.frame_count - 1))
+
+    @property
+    def position_ms(self) -> int:
+        return self._plan.frame_time(self.position)
+
+    def play(self) -> None:
+        if self._playing:
+            return
+        if self._anchor_frame >= self.frame_count - 1:
+            self._anchor_frame = 0  # 末尾からは頭出し
+        self._anchor_t = time.perf_counter()
+        self._playing = True
+        self._wake()
+
+    def pause(self) -> None:
+        if self._playing:
+            self._anchor_frame = self.position
+            self._playing = False
+            self._wake()
+
+    def seek(self, frame: int) -> None:
+        self._anchor_frame = max(0, min(frame, max(0, self.frame_count - 1)))
+        self._anchor_t = time.perf_counter()
+        self._restart()
+
+    def seek_ms(self, ms: int) -> None:
+        self.seek(ms * self._fps // 1000)
+
+    # --- 表示 ---
+    def current_frame(self) -> tuple[int, np.ndarray | None]:
+        """
+        今表示すべき (フレーム番号, 画像)。画像が None なら前回のものを表示し続ける。
+        返した配列はキャッシュと共有なので書き換えないこと
+        """
+        frame = self.position
+        if self._playing and frame >= self.frame_count - 1:
+            self.pause()
+        image = self.cache.get(frame)
+        if image is None:
+            if frame != self._last_shown and self._playing:
+                if self.drop_policy == DropPolicy.WAIT and self._last_shown >= 0:
+                    # 間に合うまで時計を最後に出したフレームの次で止めておく
+                    self._anchor_frame = min(self._last_shown + 1, frame)
+                    self._anchor_t = time.perf_counter()
+                    self.stats.stalls += 1
+                elif frame != self._last_dropped:
+                    self.stats.dropped += 1
+                    self._last_dropped = frame
+            self._wake()
+            return frame, None
+        if frame != self._last_shown:
+            self.stats.shown += 1
+            self._last_shown = frame
+        return frame, image
+
+    # --- 編集への追従 ---
+    def invalidate(self, change: ProjectChange | None = None) -> None:
+        """
+        タイムラインが変わったあとに呼ぶ。見た目が変わるフレームだけキャッシュから捨てる。
+        change が無ければ前のプランと比べて変わったフレームを探す
+        """
+        if change is not None and change.structural and self._settings_changed():
+            self._reset()
+            return
+        old = self._plan
+        plan = self._project.timeline.render_plan(self._fps)
+        if change is None or change.structural:
+            changed = plan.changed_frames(old)
+        elif not change.tracks.intersection(plan.track_indices):
+            changed = []  # 音声トラックだけの変更は絵に効かない
+        else:
+            fps = self._fps
+            changed = [(frame_of(a, fps), frame_of(b, fps)) for a, b in change.ranges]
+            changed = [(a, b) for a, b in changed if a < b]
+        with self._cond:
+            self._plan = plan
+            if changed:
+                # 先読みスレッドは世代を確かめてから put するので、古いプランのフレームは残らない
+                self.cache.invalidate(changed)
+                self._restart()
+
+    def _settings_changed(self) -> bool:
+        p = self._project
+        size = preview_size(p.width, p.height, self._quality)
+        return p.fps != self._fps or size != self._size
+
+    def _reset(self) -> None:
+        """fps / 解像度が変わったのでプランとキャッシュを作り直す (再生位置は時刻で保つ)"""
+        p = self._project
+        with self._cond:
+            position_ms = self.position_ms
+            self._fps = p.fps
+            self._size = preview_size(p.width, p.height, self._quality)
+            self._plan = p.timeline.render_plan(self._fps)
+            self._anchor_frame = min(
+                frame_of(position_ms, self._fps), max(0, self.frame_count - 1)
+            )
+            self._anchor_t = time.perf_counter()
+            self.cache.clear()
+            self._restart()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._generation += 1
+            self._cond.notify_all()
+        self._thread.join()
+        self.cache.clear()
+
+    # --- 先読みスレッド ---
+    def _wake(self) -> None:
+        with self._cond:
+            self._cond.notify_all()
+
+    def _restart(self) -> None:
+        with self._cond:
+            self.error = None
+            self._resume_at = 0
+            self._generation += 1
+            self._last_shown = -1
+            self._cond.notify_all()
+
+    def _ahead_frames(self) -> int:
+        """再生位置から先読みするフレーム数 (キャッシュに収まる範囲)"""
+        w, h = self._size
+        fit = max(1, self.cache.max_bytes // (w * h * 4) - 1)
+        return max(1, min(int(self._ahead_s * self._fps), fit))
+
+    def _next_missing(self) -> int | None:
+        """再生位置 (遅れて読み直すときはその少し先) から先読み範囲内で最初に欠けているフレーム"""
+        position = self.position
+        end = min(self.frame_count, position + self._ahead_frames())
+        start = min(max(position, self._resume_at), end)
+        return next((f for f in range(start, end) if f not in self.cache), None)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                first = self._next_missing()
+                while not self._closed and first is None:
+                    self._cond.wait(_WAIT_S)
+                    first = self._next_missing()
+                if self._closed or first is None:
+                    return
+                generation = self._generation
+                plan = self._plan
+            try:
+                self._render_from(plan, first, generation)
+            except RenderCancelled:
+                pass
+            except Exception as e:  # noqa: BLE001
+                self.error = e
+                with self._cond:
+                    while not self._closed and self._generation == generation:
+                        self._cond.wait()
+
+    def _render_from(self, plan: RenderPlan, first: int, generation: int) -> None:
+        """first から順に合成してキャッシュに積む。seek / 変更 / 大きな遅れで戻る"""
+        w, h = self._size
+        last = plan.frame_count
+        stop = threading.Event()
+        readers = _open_readers(
+            plan,
+            first,
+            last,
+            w,
+            h,
+            lookahead=self._lookahead,
+            threads=self._threads,
+            stop=stop,
+            use_proxy=self._use_proxies,
+        )
+        comp = ffm.Compositor(w, h, self._threads)
+        lead = max(1, int(_RESEEK_LEAD_S * self._fps))
+        for r in readers:
+            r.start()
+        try:
+            for frame in range(first, last):
+                # 再生位置より先に行き過ぎたら待つ
+                while True:
+                    if self._generation != generation:
+                        return
+                    ahead = frame - self.position
+                    if ahead < self._ahead_frames():
+                        break
+                    with self._cond:
+                        self._cond.wait(_WAIT_S)
+                if ahead < -_MAX_LAG_FRAMES:
+                    # 遅れすぎ: 読み直す間も時計は進むので、再生位置より先から始める
+                    self._resume_at = self.position + lead
+                    return
+
+                held = _next_layers(readers)
+                try:
+                    if ahead < 0:
+                        self.stats.skipped += 1  # 表示時刻を過ぎたものは合成しない
+                    elif frame not in self.cache:
+                        t0 = time.perf_counter()
+                        image = np.empty((h, w, 4), np.uint8)
+                        comp.compose_into(
+                            [r.slots.frames[slot] for r, slot in held], image
+                        )
+                        with self._cond:
+                            if self._generation != generation:
+                                return
+                            position = self.position
+                            self.cache.put(
+                                frame,
+                                image,
+                                (position, position + self._ahead_frames()),
+                            )
+                        self.stats.rendered += 1
+                        self.stats.render_s += time.perf_counter() - t0
+                finally:
+                    for r, slot in held:
+                        r.slots.release(slot)
+        finally:
+            stop.set()
+            for r in readers:
+                r.join()
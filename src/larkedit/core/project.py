@@ -1,10 +1,24 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Protocol, Union, runtime_checkable
-
-__all__ = ["Project", "MediaAsset", "Clip", "Track", "Timeline"]
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Protocol,
+    Union,
+    runtime_checkable,
+)
+
+from .clip_index import ClipIndex
+from .project_file import ProjectFile
+from .render_plan import RenderPlan
+
+__all__ = ["Project", "ProjectChange", "MediaAsset", "Clip", "Track", "Timeline"]
 
 # --- 基本データ型 ---
 
@@ -22,6 +36,7 @@ class MediaAsset:
     path: Path
     media_type: str  # see MediaType.*
     duration_ms: int
+    proxy_path: Path | None = None  # プレビュー用の低解像度版 (ProxyManager が設定する)
 
 
 @dataclass(slots=True)
@@ -32,6 +47,9 @@ class Clip:
     in_point_ms: int  # asset 先頭からのオフセット
     duration_ms: int
     start_ms: int  # タイムライン上の開始位置
+    gain: float = 1.0  # 音量 (倍率, 音声トラックのみ)
+    fade_in_ms: int = 0
+    fade_out_ms: int = 0
 
     @property
     def end_ms(self) -> int:
@@ -44,23 +62,44 @@ class Track:
 
     index: int
     name: str
-    clips: List[Clip] = field(default_factory=list)
+    clips: ClipIndex = field(default_factory=ClipIndex)
+    # MediaType.VIDEO / AUDIO (音声トラックは合成せず AudioMixer が混ぜる)
+    kind: str = MediaType.VIDEO
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.clips, ClipIndex):
+            self.clips = ClipIndex(self.clips)
+
+    @property
+    def is_audio(self) -> bool:
+        return self.kind == MediaType.AUDIO
 
     # --- インターフェース ---
     def add_clip(self, clip: Clip) -> None:
-        """clip をタイムライン位置順に挿入 (単純 O(n) で十分)"""
-        self.clips.append(clip)
-        self.clips.sort(key=lambda c: c.start_ms)
+        """clip をタイムライン位置順に挿入 (O(log n) で位置を探す)"""
+        self.clips.add(clip)
 
     def remove_clip(self, clip: Clip) -> None:
         self.clips.remove(clip)
 
+    def add_clips(self, clips: Iterable[Clip]) -> None:
+        """まとめて挿入 (並べ直しは 1 回だけ)"""
+        self.clips.add_many(clips)
+
+    def remove_clips(self, clips: Iterable[Clip]) -> None:
+        self.clips.remove_many(clips)
+
+    def update_clip(self, clip: Clip, **changes: float) -> None:
+        """start_ms / in_point_ms / duration_ms / gain / fade_* を書き換える (インデックスも直す)"""
+        self.clips.update(clip, **changes)
+
     def find_clip_at(self, position_ms: int) -> Clip | None:
         """position_ms が含まれる clip を返す (無ければ None)"""
-        for c in self.clips:
-            if c.start_ms <= position_ms < c.end_ms:
-                return c
-        return None
+        return self.clips.first_at(position_ms)
+
+    def clips_in_range(self, start_ms: int, end_ms: int) -> List[Clip]:
+        """[start_ms, end_ms) と重なる clip (開始時刻順)"""
+        return self.clips.overlapping(start_ms, end_ms)
 
 
 @dataclass(slots=True)
@@ -68,16 +107,131 @@ class Timeline:
     """複数 Track を束ねるコンテナ"""
 
     tracks: List[Track] = field(default_factory=list)
+    _by_index: Dict[int, Track] = field(default_factory=dict, init=False, repr=False)
+    _plan: RenderPlan | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        self.tracks.sort(key=lambda t: t.index)
+        self._by_index = {t.index: t for t in self.tracks}
+
+    # pickle にはトラックだけ含める (索引とプランは作り直す)
+    def __getstate__(self) -> List[Track]:
+        return self.tracks
+
+    def __setstate__(self, tracks: List[Track]) -> None:
+        self.tracks = tracks
+        self._plan = None
+        self.__post_init__()
 
     def add_track(self, track: Track) -> None:
+        if track.index in self._by_index:
+            raise ValueError(f"Track index {track.index} already exists")
         self.tracks.append(track)
         self.tracks.sort(key=lambda t: t.index)
+        self._by_index[track.index] = track
 
     def remove_track(self, track: Track) -> None:
         self.tracks.remove(track)
+        del self._by_index[track.index]
 
     def track(self, index: int) -> Track:
-        return next(t for t in self.tracks if t.index == index)
+        """index のトラック (無ければ KeyError)"""
+        return self._by_index[index]
+
+    def track_of(self, clip: Clip) -> Track | None:
+        """clip を含むトラック"""
+        return next((t for t in self.tracks if clip in t.clips), None)
+
+    def clips_at(self, position_ms: int) -> Iterable[tuple[Track, Clip]]:
+        """position_ms で有効な (track, clip) を下のトラックから順に"""
+        for t in self.tracks:
+            for c in t.clips.at(position_ms):
+                yield t, c
+
+    @property
+    def duration_ms(self) -> int:
+        """最後のクリップの終端 (クリップが無ければ 0)"""
+        return max((t.clips.end_ms for t in self.tracks), default=0)
+
+    def render_plan(self, fps: int) -> RenderPlan:
+        """フレーム単位の区間表。前回から変わったトラックだけ作り直す"""
+        self._plan = RenderPlan.build(self, fps, self._plan)
+        return self._plan
+
+
+# --- 変更通知 ---
+
+
+def _merge_ranges(ranges: Iterable[tuple[int, int]]) -> tuple[tuple[int, int], ...]:
+    """区間 [start, end) の列を整列し、重なり・接するものをまとめる (空の区間は捨てる)"""
+    out: List[tuple[int, int]] = []
+    for a, b in sorted(r for r in ranges if r[0] < r[1]):
+        if out and a <= out[-1][1]:
+            if b > out[-1][1]:
+                out[-1] = (out[-1][0], b)
+        else:
+            out.append((a, b))
+    return tuple(out)
+
+
+@dataclass(frozen=True, slots=True)
+class ProjectChange:
+    """
+    Project の変更内容。observer はこれを見て変わった部分だけ作り直す。
+    tracks は変わったトラックの index、clips は追加・削除・変更された Clip (同一性で比べること)、
+    ranges はタイムライン上で見た目が変わりうる区間 [start_ms, end_ms) (整列済み・重なり無し)。
+    structural ならトラック構成や設定が変わったので全体を作り直すこと
+    """
+
+    description: str
+    tracks: frozenset[int] = frozenset()
+    clips: tuple[Clip, ...] = ()
+    ranges: tuple[tuple[int, int], ...] = ()
+    structural: bool = False
+
+    @classmethod
+    def for_clips(
+        cls,
+        description: str,
+        track_index: int,
+        clips: Iterable[Clip],
+        ranges: Iterable[tuple[int, int]] = (),
+    ) -> ProjectChange:
+        """track_index の clips が変わった (ranges は clip の今の位置以外に変わった区間。移動前など)"""
+        clips = tuple(clips)
+        spans = [(c.start_ms, c.end_ms) for c in clips]
+        return cls(
+            description,
+            frozenset((track_index,)),
+            clips,
+            _merge_ranges([*spans, *ranges]),
+        )
+
+    @classmethod
+    def merge(cls, changes: Iterable[ProjectChange], description: str) -> ProjectChange:
+        """transaction で溜まった変更を 1 つにまとめる"""
+        changes = list(changes)
+        clips: Dict[int, Clip] = {}
+        for ch in changes:
+            for c in ch.clips:
+                clips.setdefault(id(c), c)
+        return cls(
+            description,
+            frozenset().union(*(ch.tracks for ch in changes)),
+            tuple(clips.values()),
+            _merge_ranges(r for ch in changes for r in ch.ranges),
+            any(ch.structural for ch in changes),
+        )
+
+    @property
+    def span(self) -> tuple[int, int] | None:
+        """ranges 全体を覆う区間 (無ければ None)"""
+        return (self.ranges[0][0], self.ranges[-1][1]) if self.ranges else None
+
+    def affects(self, track_index: int) -> bool:
+        return self.structural or track_index in self.tracks
 
 
 # --- プロジェクト本体 ---
@@ -87,7 +241,13 @@ class Timeline:
 class ProjectObserver(Protocol):
     """GUI などが実装して Project 変化を受け取る"""
 
-    def project_changed(self, *, description: str) -> None: ...  # noqa: E704
+    def project_changed(
+        self, *, description: str, change: ProjectChange
+    ) -> None: ...  # noqa: E704
+
+
+# Project.update_settings() で変えられるもの
+_SETTING_FIELDS = frozenset(("name", "fps", "width", "height"))
 
 
 @dataclass
@@ -102,15 +262,56 @@ class Project:
     undo_stack: Union["UndoStack", None] = None  # lazy import
 
     _observers: List[ProjectObserver] = field(default_factory=list, init=False)
+    _file: ProjectFile | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _tx_depth: int = field(default=0, init=False, repr=False, compare=False)
+    _tx_pending: List[ProjectChange] = field(
+        default_factory=list, init=False, repr=False, compare=False
+    )
 
     def __post_init__(self) -> None:
         """初期化後に実行される。デフォルトのトラックを作成する"""
-        # デフォルトでビデオトラックを追加
+        # デフォルトでビデオトラックと音声トラックを追加
         if not self.timeline.tracks:
             video_track = Track(index=0, name="video")
-            # audio_track = Track(index=1, name="audio")
+            audio_track = Track(index=1, name="audio", kind=MediaType.AUDIO)
             self.timeline.add_track(video_track)
-            # self.timeline.add_track(audio_track)
+            self.timeline.add_track(audio_track)
+
+    def __getstate__(self) -> dict:
+        """pickle 用。GUI の observer と Undo 履歴は含めない"""
+        state = self.__dict__.copy()
+        state["_observers"] = []
+        state["undo_stack"] = None
+        state["_file"] = None
+        state["_tx_depth"] = 0
+        state["_tx_pending"] = []
+        return state
+
+    # --- 保存 / 読み込み ---
+    @property
+    def file_path(self) -> Path | None:
+        """最後に保存 / 読み込みしたファイル"""
+        return self._file.path if self._file is not None else None
+
+    def save(self, path: Path | str | None = None) -> None:
+        """
+        path (省略時は前回のファイル) に保存する。
+        同じファイルへの 2 回目以降は変わったトラックだけ追記するので autosave にも使える
+        """
+        if self._file is None:
+            if path is None:
+                raise ValueError("path is required for the first save")
+            self._file = ProjectFile(Path(path))
+        self._file.save(self, path)
+        if self.undo_stack is not None:
+            self.undo_stack.checkpoint(self._file.path)
+
+    @classmethod
+    def load(cls, path: Path | str) -> "Project":
+        """保存したプロジェクトを開く (トラックの中身は最初に触れたときに読む)"""
+        return ProjectFile.load(path)
 
     # --- 公開 API ---
     def attach_observer(self, obs: ProjectObserver) -> None:
@@ -120,6 +321,64 @@ class Project:
     def detach_observer(self, obs: ProjectObserver) -> None:
         self._observers.remove(obs)
 
+    @contextmanager
+    def transaction(self, description: str | None = None) -> Iterator[None]:
+        """
+        区間内の変更通知を溜めておき、抜けるときに 1 回だけ observer に送る。
+        入れ子にできる (一番外側を抜けたときに送る)。例外で抜けてもそこまでの変更は通知する。
+        description を省略すると溜まった説明からまとめる
+        """
+        self._tx_depth += 1
+        try:
+            yield
+        finally:
+            self._tx_depth -= 1
+            if self._tx_depth == 0 and self._tx_pending:
+                pending, self._tx_pending = self._tx_pending, []
+                if description is None:
+                    first = pending[0].description
+                    description = (
+                        first if len(pending) == 1 else f"{first} (+{len(pending) - 1})"
+                    )
+                self._notify(ProjectChange.merge(pending, description))
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._tx_depth > 0
+
+    # --- トラック構成 / 設定 (structural として通知する) ---
+    def add_track(self, track: Track) -> Track:
+        self.timeline.add_track(track)
+        self._notify(
+            ProjectChange(
+                f"Add track {track.index}",
+                frozenset((track.index,)),
+                structural=True,
+            )
+        )
+        return track
+
+    def remove_track(self, track_index: int) -> Track:
+        track = self.timeline.track(track_index)
+        self.timeline.remove_track(track)
+        self._notify(
+            ProjectChange(
+                f"Remove track {track_index}",
+                frozenset((track_index,)),
+                structural=True,
+            )
+        )
+        return track
+
+    def update_settings(self, **changes: Any) -> None:
+        """name / fps / width / height を書き換える"""
+        unknown = changes.keys() - _SETTING_FIELDS
+        if unknown:
+            raise TypeError(f"Unknown project settings: {', '.join(sorted(unknown))}")
+        for name, value in changes.items():
+            setattr(self, name, value)
+        self._notify(ProjectChange(f"Change {', '.join(changes)}", structural=True))
+
     # --- タイムライン操作をユーティリティとしてラップ ---
     def add_clip(
         self,
@@ -128,7 +387,7 @@ class Project:
         start_ms: int,
         in_point_ms: int = 0,
         duration_ms: int | None = None,
-    ) -> None:
+    ) -> Clip:
         """
         UndoStack を通さずに内部呼び出し可能 (コマンド側から呼ばれる想定)。
         GUI から直接呼ぶ場合は必ず Command を介して push すること。
@@ -142,27 +401,132 @@ class Project:
         )
         track.add_clip(clip)
 
-        self._notify(f"Add clip to track {track_index}")
+        self._notify(
+            ProjectChange.for_clips(
+                f"Add clip to track {track_index}", track_index, [clip]
+            )
+        )
+        return clip
 
     def remove_clip(self, track_index: int, clip: Clip) -> None:
         track = self.timeline.track(track_index)
         track.remove_clip(clip)
-        self._notify(f"Remove clip from track {track_index}")
+        self._notify(
+            ProjectChange.for_clips(
+                f"Remove clip from track {track_index}", track_index, [clip]
+            )
+        )
+
+    def add_clips(self, track_index: int, clips: Iterable[Clip]) -> List[Clip]:
+        """作成済みの clip をまとめて追加する (貼り付けなど)。通知は 1 回"""
+        clips = list(clips)
+        self.timeline.track(track_index).add_clips(clips)
+        self._notify(
+            ProjectChange.for_clips(
+                f"Add {len(clips)} clips to track {track_index}", track_index, clips
+            )
+        )
+        return clips
+
+    def remove_clips(self, track_index: int, clips: Iterable[Clip]) -> None:
+        clips = list(clips)
+        self.timeline.track(track_index).remove_clips(clips)
+        self._notify(
+            ProjectChange.for_clips(
+                f"Remove {len(clips)} clips from track {track_index}",
+                track_index,
+                clips,
+            )
+        )
+
+    def update_clip(self, clip: Clip, **changes: float) -> None:
+        """clip の時刻 / 音量フィールドを書き換える (直接代入するとインデックスがずれる)"""
+        track = self.timeline.track_of(clip)
+        if track is None:
+            raise ValueError("clip is not on the timeline")
+        before = (clip.start_ms, clip.end_ms)
+        track.update_clip(clip, **changes)
+        self._notify(
+            ProjectChange.for_clips(
+                f"Update clip on track {track.index}", track.index, [clip], [before]
+            )
+        )
 
     # --- 内部 util ---
-    def _notify(self, description: str) -> None:
+    def _notify(self, change: ProjectChange) -> None:
+        if self._tx_depth:
+            self._tx_pending.append(change)
+            return
         for obs in self._observers:
-            obs.project_changed(description=description)
+            obs.project_changed(description=change.description, change=change)
 
 
 # --- Ex: 基本コマンド ---
 
 # 遅延インポート (循環回避)
 from .command import Command  # noqa: E402
+from .command import DeltaCodec  # noqa: E402
+from .command import DeltaCommand  # noqa: E402
 from .command import UndoStack  # noqa: E402
 
-
-class AddClipCommand(Command):
+# _clip_row() の 2 列目以降に並ぶフィールド
+_ROW_FIELDS = (
+    "in_point_ms",
+    "duration_ms",
+    "start_ms",
+    "gain",
+    "fade_in_ms",
+    "fade_out_ms",
+)
+
+
+def _clip_row(codec: DeltaCodec, clip: Clip) -> List[Any]:
+    """Clip の差分表現 (Clip オブジェクトは持たない)"""
+    return [codec.asset_ref(clip.asset), *(getattr(clip, f) for f in _ROW_FIELDS)]
+
+
+def _with_fields(row: List[Any], values: Dict[str, float]) -> List[Any]:
+    """row の values のフィールドを書き換えたもの"""
+    row = list(row)
+    for name, value in values.items():
+        row[1 + _ROW_FIELDS.index(name)] = value
+    return row
+
+
+def _clips_from_rows(
+    project: Project,
+    codec: DeltaCodec,
+    track_index: int,
+    rows: List[List[Any]],
+    *,
+    on_timeline: bool,
+) -> List[Clip]:
+    """
+    rows の Clip を返す。on_timeline ならトラック上にある同じ値のものを探し
+    (同じ値が複数あれば後から入ったもの)、そうでなければ作る
+    """
+    if not on_timeline:
+        return [Clip(codec.asset(r[0]), *r[1:]) for r in rows]
+    track = project.timeline.track(track_index)
+    taken: set[int] = set()
+    found = []
+    for row in rows:
+        start = row[3]
+        for c in reversed(track.clips_in_range(start, start + 1)):
+            if (
+                c.start_ms == start
+                and id(c) not in taken
+                and _clip_row(codec, c) == row
+            ):
+                taken.add(id(c))
+                found.append(c)
+                break
+        else:
+            raise ValueError(f"clip at {start} ms is not on track {track_index}")
+    return found
+
+
+class AddClipCommand(DeltaCommand):
     """Project に Clip を1つ追加する"""
 
     description = "Add Clip"
@@ -185,22 +549,232 @@ class AddClipCommand(Command):
         self._in_point_ms = in_point_ms
         self._duration_ms = duration_ms
         self._clip: Clip | None = None
+        self._codec: DeltaCodec | None = (
+            None  # 差分から作ったときだけ (undo で clip を探す)
+        )
+
+    @property
+    def project(self) -> Project:
+        return self._project
 
     # --- Command impl ---
     def _execute(self) -> bool:
-        self._project.add_clip(
+        self._clip = self._project.add_clip(
             self._track_index,
             self._asset,
             self._start_ms,
             self._in_point_ms,
             self._duration_ms,
         )
-        # 直近に追加された Clip を記憶 (簡便策)
-        track = self._project.timeline.track(self._track_index)
-        self._clip = track.clips[-1]
         return True
 
     def _undo(self) -> None:
+        if self._clip is None and self._codec is not None:
+            self._clip = _clips_from_rows(
+                self._project,
+                self._codec,
+                self._track_index,
+                [self._row(self._codec)],
+                on_timeline=True,
+            )[0]
         if self._clip:
             self._project.remove_clip(self._track_index, self._clip)
             self._clip = None
+
+    # --- 差分 ---
+    def _row(self, codec: DeltaCodec) -> List[Any]:
+        """add_clip() が作る Clip の値"""
+        duration = self._duration_ms or self._asset.duration_ms
+        return [
+            codec.asset_ref(self._asset),
+            self._in_point_ms,
+            duration,
+            self._start_ms,
+            1.0,
+            0,
+            0,
+        ]
+
+    def to_delta(self, codec: DeltaCodec) -> Any:
+        return {"track": self._track_index, "clip": self._row(codec)}
+
+    @classmethod
+    def from_delta(cls, codec: DeltaCodec, delta: Any) -> Command:
+        asset_ref, in_point, duration, start = delta["clip"][:4]
+        cmd = cls(
+            codec.project,  # type: ignore[arg-type]
+            track_index=delta["track"],
+            asset=codec.asset(asset_ref),
+            start_ms=start,
+            in_point_ms=in_point,
+            duration_ms=duration,
+        )
+        cmd._codec = codec
+        return cmd
+
+
+class _TrackClipsCommand(DeltaCommand):
+    """1 つのトラックへの Clip の一括操作 (AddClipsCommand / RemoveClipsCommand の共通部分)"""
+
+    def __init__(
+        self, project: Project, *, track_index: int, clips: Iterable[Clip]
+    ) -> None:
+        super().__init__()
+        self._project = project
+        self._track_index = track_index
+        self._clips = list(clips)
+        self._pending: tuple[DeltaCodec, List[List[Any]]] | None = (
+            None  # 差分から作ったときの行
+        )
+
+    @property
+    def project(self) -> Project:
+        return self._project
+
+    def _clips_for(self, *, on_timeline: bool) -> List[Clip]:
+        """差分から作ったものは最初の undo / redo でタイムラインの Clip と結び付ける"""
+        if self._pending is not None:
+            codec, rows = self._pending
+            self._clips = _clips_from_rows(
+                self._project, codec, self._track_index, rows, on_timeline=on_timeline
+            )
+            self._pending = None
+        return self._clips
+
+    def to_delta(self, codec: DeltaCodec) -> Any:
+        rows = (
+            self._pending[1]
+            if self._pending is not None
+            else [_clip_row(codec, c) for c in self._clips]
+        )
+        return {"track": self._track_index, "clips": rows}
+
+    @classmethod
+    def from_delta(cls, codec: DeltaCodec, delta: Any) -> Command:
+        cmd = cls(
+            codec.project,  # type: ignore[arg-type]
+            track_index=delta["track"],
+            clips=(),
+        )
+        cmd._pending = (codec, delta["clips"])
+        return cmd
+
+
+class AddClipsCommand(_TrackClipsCommand):
+    """作成済みの Clip をまとめて 1 つのトラックに追加する (貼り付けなど)"""
+
+    description = "Add Clips"
+
+    def _execute(self) -> bool:
+        self._project.add_clips(self._track_index, self._clips_for(on_timeline=False))
+        return True
+
+    def _undo(self) -> None:
+        self._project.remove_clips(self._track_index, self._clips_for(on_timeline=True))
+
+
+class RemoveClipsCommand(_TrackClipsCommand):
+    """1 つのトラックから Clip をまとめて取り除く"""
+
+    description = "Remove Clips"
+
+    def _execute(self) -> bool:
+        self._project.remove_clips(self._track_index, self._clips_for(on_timeline=True))
+        return True
+
+    def _undo(self) -> None:
+        self._project.add_clips(self._track_index, self._clips_for(on_timeline=False))
+
+
+class UpdateClipCommand(DeltaCommand):
+    """
+    Clip の時刻 / 音量フィールドを書き換える (プロパティ編集など)。
+    同じ merge_id で続けて積むと 1 段にまとまる (スピンボックスの連続入力など)
+    """
+
+    description = "Update Clip"
+
+    def __init__(
+        self,
+        project: Project,
+        clip: Clip | None,
+        *,
+        merge_id: str | None = None,
+        **changes: float,
+    ) -> None:
+        super().__init__(merge_id=merge_id)
+        self._project = project
+        self._clip = clip
+        self._changes = dict(changes)
+        self._before: Dict[str, float] = {}
+        self._track_index = -1
+        self._pending: tuple[DeltaCodec, List[Any]] | None = (
+            None  # 差分から作ったときの変更前の行
+        )
+        if clip is not None:
+            track = project.timeline.track_of(clip)
+            if track is None:
+                raise ValueError("clip is not on the timeline")
+            self._track_index = track.index
+            self._before = {name: getattr(clip, name) for name in changes}
+
+    @property
+    def project(self) -> Project:
+        return self._project
+
+    def _target(self, *, updated: bool) -> Clip:
+        """書き換える Clip (差分から作ったものはタイムラインから変更前 / 後の値で探す)"""
+        if self._clip is None:
+            assert self._pending is not None
+            codec, row = self._pending
+            if updated:
+                row = _with_fields(row, self._changes)
+            self._clip = _clips_from_rows(
+                self._project, codec, self._track_index, [row], on_timeline=True
+            )[0]
+            self._pending = None
+        return self._clip
+
+    def _execute(self) -> bool:
+        self._project.update_clip(self._target(updated=False), **self._changes)
+        return True
+
+    def _undo(self) -> None:
+        self._project.update_clip(self._target(updated=True), **self._before)
+
+    def can_merge_with(self, other: Command) -> bool:
+        return (
+            super().can_merge_with(other)
+            and isinstance(other, UpdateClipCommand)
+            and other._clip is not None
+            and other._clip is self._clip
+        )
+
+    def merge_with(self, other: Command) -> bool:
+        """other の変更を実行して取り込む (変更前の値は古い方を残す)"""
+        if not isinstance(other, UpdateClipCommand) or other._clip is not self._clip:
+            return False
+        other.execute()
+        self._changes.update(other._changes)
+        for name, value in other._before.items():
+            self._before.setdefault(name, value)
+        return True
+
+    # --- 差分 ---
+    def to_delta(self, codec: DeltaCodec) -> Any:
+        if self._pending is not None:
+            row = self._pending[1]
+        else:
+            assert self._clip is not None
+            row = _with_fields(_clip_row(codec, self._clip), self._before)
+        return {"track": self._track_index, "clip": row, "changes": self._changes}
+
+    @classmethod
+    def from_delta(cls, codec: DeltaCodec, delta: Any) -> Command:
+        cmd = cls(codec.project, None, **delta["changes"])  # type: ignore[arg-type]
+        cmd._track_index = delta["track"]
+        cmd._before = {
+            name: delta["clip"][1 + _ROW_FIELDS.index(name)] for name in cmd._changes
+        }
+        cmd._pending = (codec, delta["clip"])
+        return cmd
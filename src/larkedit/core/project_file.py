@@ -0,0 +1,480 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Callable
+
+import numpy as np
+
+from .clip_index import ClipIndex
+
+if TYPE_CHECKING:
+    from .project import Clip, MediaAsset, Project, Track
+
+__all__ = ["PROJECT_SUFFIX", "ProjectFile", "ProjectFileError"]
+
+# --- ファイル形式 ---
+# ヘッダ (16 byte) の後にレコードを追記していく。保存のたびに変わった部分と
+# COMMIT / TRAILER を足すだけなので、既存のバイトは書き換えない。
+#
+#   レコード: [tag u8][len u32][payload][crc32 u32]  (crc は tag + payload)
+#   META    : JSON {name, fps, width, height}
+#   ASSETS  : first_id u32, count u32, (type u8, duration i64, path_len u16, path utf-8) * count
+#             (proxy_path は持たない。開いたあと ProxyManager.attach_all() で付け直す)
+#   TRACK   : index i32, count u32, name_len u16, name, kind u8,
+#             zlib(列: asset u32 / in i64 / dur i64 / start の差分 i64 / fade_in i64 / fade_out i64 / gain f32)
+#             (version 1 は kind と fade / gain の列が無い)
+#   COMMIT  : その時点で有効なレコードの位置表 (_COMMIT_* を参照)
+#   TRAILER : 直前の COMMIT の位置 u64 (ファイル末尾に必ず来る)
+#
+# 末尾の TRAILER が壊れていたら (書き込み途中で落ちた等) 先頭から走査して
+# 最後に読めた COMMIT を使う。
+
+PROJECT_SUFFIX = ".lkproj"
+
+_MAGIC = b"LKPJ"
+_VERSION = 2
+_HEADER = struct.Struct("<4sHH8x")
+_RECORD_HEAD = struct.Struct("<BI")
+_CRC = struct.Struct("<I")
+
+_META, _ASSETS, _TRACK, _COMMIT, _TRAILER = 1, 2, 3, 4, 5
+
+_ASSET_HEAD = struct.Struct("<II")
+_ASSET_ITEM = struct.Struct("<BqH")
+_TRACK_HEAD = struct.Struct("<iIH")
+_TRACK_KIND = struct.Struct("<B")  # version 2 から
+_COMMIT_HEAD = struct.Struct("<QII")  # meta の位置, ASSETS の数, トラック数
+_COMMIT_TRACK = struct.Struct("<QiIq")  # 位置, index, clip 数, end_ms
+_TRAILER_BODY = struct.Struct("<Q")
+_TRAILER_SIZE = _RECORD_HEAD.size + _TRAILER_BODY.size + _CRC.size
+
+_MEDIA_TYPES = ("video", "audio", "image")  # MediaType.* の並び (番号で保存)
+_COMPRESS_LEVEL = 1  # 速さ優先
+# 追記で溜まった古いレコードがこれ以上の割合になったら保存時に書き直す
+_COMPACT_RATIO = 0.5
+_COMPACT_MIN_BYTES = 1 << 20
+
+
+class ProjectFileError(Exception):
+    """プロジェクトファイルとして読めない"""
+
+
+def _asset_key(asset: MediaAsset) -> tuple[str, str, int]:
+    return str(asset.path), asset.media_type, asset.duration_ms
+
+
+@dataclass(slots=True)
+class _TrackEntry:
+    """ファイル中の TRACK レコード 1 つ"""
+
+    track: Track
+    version: int  # 書いた時点の ClipIndex.version
+    offset: int
+    size: int  # レコード全体のバイト数
+    count: int
+    end_ms: int
+    name: str
+    kind: str
+    columns: bytes | memoryview | None = (
+        None  # 未読み込みのトラックを書き直すときに使う
+    )
+
+
+@dataclass
+class ProjectFile:
+    """
+    Project とファイルの対応 (どのトラックがファイルのどこにあるか)。
+    Project.save() / Project.load() から使う。
+    前回の保存から変わっていなければ追記だけで済ませる
+    """
+
+    path: Path
+    _assets: list[MediaAsset] = field(default_factory=list)
+    _asset_ids: dict[tuple[str, str, int], int] = field(default_factory=dict)
+    # (位置, サイズ)
+    _asset_records: list[tuple[int, int]] = field(default_factory=list)
+    _written_assets: int = 0
+    _meta: tuple[int, int, bytes] = (0, 0, b"")  # (位置, サイズ, payload)
+    _tracks: dict[int, _TrackEntry] = field(default_factory=dict)  # id(track) -> entry
+    _commit_size: int = 0
+    _stat: tuple[int, int] | None = None  # 最後に書いたときの (size, mtime_ns)
+    _version: int = _VERSION  # ファイルの形式 (古ければ次の保存で書き直す)
+
+    # --- 読み込み ---
+    @classmethod
+    def load(cls, path: str | os.PathLike[str]) -> Project:
+        """path を開く。トラックの clip は触れたときに展開する"""
+        from .project import MediaAsset, Project, Timeline, Track
+
+        path = Path(path)
+        data = path.read_bytes()
+        commit_at = cls._find_commit(data)
+        pf = cls(path)
+        pf._version = _HEADER.unpack_from(data)[1]
+
+        meta_at, n_asset_records, n_tracks = _COMMIT_HEAD.unpack_from(
+            data, commit_at + _RECORD_HEAD.size
+        )
+        pos = commit_at + _RECORD_HEAD.size + _COMMIT_HEAD.size
+        asset_offsets = struct.unpack_from(f"<{n_asset_records}Q", data, pos)
+        pos += 8 * n_asset_records
+        track_rows = [
+            _COMMIT_TRACK.unpack_from(data, pos + i * _COMMIT_TRACK.size)
+            for i in range(n_tracks)
+        ]
+        pf._commit_size = _record_size(data, commit_at)
+
+        meta_payload = bytes(_payload(data, meta_at, _META))
+        meta = json.loads(meta_payload)
+        pf._meta = (meta_at, _record_size(data, meta_at), meta_payload)
+
+        for at in asset_offsets:
+            body = bytes(_payload(data, at, _ASSETS))
+            first, count = _ASSET_HEAD.unpack_from(body)
+            if first != len(pf._assets):
+                raise ProjectFileError("asset table is out of order")
+            p = _ASSET_HEAD.size
+            for _ in range(count):
+                kind, duration, n = _ASSET_ITEM.unpack_from(body, p)
+                p += _ASSET_ITEM.size
+                asset = MediaAsset(
+                    Path(body[p : p + n].decode()), _MEDIA_TYPES[kind], duration
+                )
+                p += n
+                pf._asset_ids[_asset_key(asset)] = len(pf._assets)
+                pf._assets.append(asset)
+            pf._asset_records.append((at, _record_size(data, at)))
+        pf._written_assets = len(pf._assets)
+
+        tracks = []
+        for at, index, count, end_ms in track_rows:
+            body = bytes(_payload(data, at, _TRACK))
+            _, _, n = _TRACK_HEAD.unpack_from(body)
+            p = _TRACK_HEAD.size + n
+            name = body[_TRACK_HEAD.size : p].decode()
+            kind = "video"
+            if pf._version >= 2:
+                kind = _MEDIA_TYPES[_TRACK_KIND.unpack_from(body, p)[0]]
+                p += _TRACK_KIND.size
+            columns = memoryview(body)[p:]
+            clips = ClipIndex.lazy(
+                pf._clip_loader(columns, count, pf._version), count, end_ms
+            )
+            track = Track(index, name, clips, kind)
+            pf._tracks[id(track)] = _TrackEntry(
+                track,
+                clips.version,
+                at,
+                _record_size(data, at),
+                count,
+                end_ms,
+                name,
+                kind,
+                columns,
+            )
+            tracks.append(track)
+
+        project = Project(
+            name=meta["name"],
+            fps=meta["fps"],
+            width=meta["width"],
+            height=meta["height"],
+            timeline=Timeline(tracks),
+        )
+        project._file = pf
+        pf._stat = _stat_of(path)
+        return project
+
+    def _clip_loader(
+        self, columns: bytes | memoryview, count: int, version: int
+    ) -> Callable[[], list[Clip]]:
+        def load() -> list[Clip]:
+            from .project import Clip
+
+            raw = zlib.decompress(columns)
+            rows = 3 if version < 2 else 5
+            asset = np.frombuffer(raw, np.uint32, count).tolist()
+            rest = np.frombuffer(raw, np.int64, rows * count, offset=4 * count).reshape(
+                rows, count
+            )
+            in_points = rest[0].tolist()
+            durations = rest[1].tolist()
+            starts = np.cumsum(rest[2]).tolist()
+            assets = self._assets
+            if version < 2:
+                return [
+                    Clip(assets[a], i, d, s)
+                    for a, i, d, s in zip(asset, in_points, durations, starts)
+                ]
+            gains = np.frombuffer(
+                raw, np.float32, count, offset=(4 + 8 * rows) * count
+            ).tolist()
+            return [
+                Clip(assets[a], i, d, s, g, fi, fo)
+                for a, i, d, s, g, fi, fo in zip(
+                    asset,
+                    in_points,
+                    durations,
+                    starts,
+                    gains,
+                    rest[3].tolist(),
+                    rest[4].tolist(),
+                )
+            ]
+
+        return load
+
+    @staticmethod
+    def _find_commit(data: bytes) -> int:
+        """有効な COMMIT レコードの位置"""
+        if len(data) < _HEADER.size:
+            raise ProjectFileError("not a LarkEdit project file")
+        magic, version, _ = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ProjectFileError("not a LarkEdit project file")
+        if version > _VERSION:
+            raise ProjectFileError(f"unsupported project file version {version}")
+        # 普通は末尾の TRAILER から辿れる
+        tail = len(data) - _TRAILER_SIZE
+        if tail >= _HEADER.size and _check(data, tail) == _TRAILER:
+            (at,) = _TRAILER_BODY.unpack_from(data, tail + _RECORD_HEAD.size)
+            if at < tail and _check(data, at) == _COMMIT:
+                return at
+        # 途中で切れている: 先頭から読めるところまで辿る
+        last = -1
+        pos = _HEADER.size
+        while (tag := _check(data, pos)) is not None:
+            if tag == _COMMIT:
+                last = pos
+            pos += _record_size(data, pos)
+        if last < 0:
+            raise ProjectFileError("project file has no complete save")
+        return last
+
+    # --- 書き込み ---
+    def save(
+        self, project: Project, path: str | os.PathLike[str] | None = None
+    ) -> None:
+        """
+        project を書き出す。同じファイルが前回の保存のままなら変わったトラックだけ追記し、
+        そうでなければ (別名保存・外で書き換えられた・古いレコードが溜まった) 全体を書き直す
+        """
+        path = self.path if path is None else Path(path)
+        meta = json.dumps(
+            {
+                "name": project.name,
+                "fps": project.fps,
+                "width": project.width,
+                "height": project.height,
+            },
+            ensure_ascii=False,
+        ).encode()
+        append = (
+            path == self.path
+            and self._version == _VERSION
+            and self._stat is not None
+            and _stat_of(path) == self._stat
+        )
+        if append:
+            size = self._stat[0]  # type: ignore[index]
+            if size - self._live_size() > max(
+                _COMPACT_MIN_BYTES, size * _COMPACT_RATIO
+            ):
+                append = False
+        if append:
+            with open(path, "r+b") as f:
+                f.seek(0, os.SEEK_END)
+                self._write_records(f, f.tell(), project, meta, rewrite=False)
+                f.flush()
+                os.fsync(f.fileno())
+        else:
+            tmp = path.with_name(path.name + ".tmp")
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(_HEADER.pack(_MAGIC, _VERSION, 0))
+                    self._write_records(f, _HEADER.size, project, meta, rewrite=True)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, path)
+            except BaseException:
+                tmp.unlink(missing_ok=True)
+                raise
+        self.path = path
+        self._version = _VERSION
+        self._stat = _stat_of(path)
+
+    def _write_records(
+        self, f: BinaryIO, pos: int, project: Project, meta: bytes, *, rewrite: bool
+    ) -> None:
+        """pos から META / ASSETS / TRACK / COMMIT / TRAILER のうち必要なものを書く"""
+        # 変わったトラックを先に符号化する (新しい asset はここで表に載る)
+        kept: dict[int, _TrackEntry] = {}
+        encoded: list[tuple[Track, bytes, bytes | memoryview | None]] = []
+        for t in project.timeline.tracks:
+            old = self._tracks.get(id(t))
+            if old is not None and old.track is t and old.version == t.clips.version:
+                if (old.name, old.kind) == (t.name, t.kind) and not rewrite:
+                    kept[id(t)] = old
+                    continue
+                if (
+                    old.columns is not None
+                    and not t.clips.loaded
+                    and self._version == _VERSION
+                ):
+                    # 読み込んでいないトラックは列をそのまま写す
+                    payload = self._track_payload(t, old.columns)
+                    encoded.append((t, payload, old.columns))
+                    continue
+            encoded.append((t, self._track_payload(t), None))
+
+        out: list[bytes] = []
+
+        def put(tag: int, payload: bytes) -> tuple[int, int]:
+            nonlocal pos
+            rec = _record(tag, payload)
+            out.append(rec)
+            at, pos = pos, pos + len(rec)
+            return at, len(rec)
+
+        if rewrite or meta != self._meta[2]:
+            self._meta = (*put(_META, meta), meta)
+        if rewrite:
+            self._asset_records = []
+            self._written_assets = 0
+        if self._written_assets < len(self._assets):
+            self._asset_records.append(
+                put(_ASSETS, self._asset_table(self._written_assets))
+            )
+            self._written_assets = len(self._assets)
+        for t, payload, columns in encoded:
+            at, size = put(_TRACK, payload)
+            kept[id(t)] = _TrackEntry(
+                t,
+                t.clips.version,
+                at,
+                size,
+                len(t.clips),
+                t.clips.end_ms,
+                t.name,
+                t.kind,
+                columns,
+            )
+        entries = [kept[id(t)] for t in project.timeline.tracks]
+        self._tracks = {id(e.track): e for e in entries}
+
+        commit = [
+            _COMMIT_HEAD.pack(self._meta[0], len(self._asset_records), len(entries))
+        ]
+        commit.append(
+            struct.pack(
+                f"<{len(self._asset_records)}Q", *(a for a, _ in self._asset_records)
+            )
+        )
+        commit += [
+            _COMMIT_TRACK.pack(e.offset, e.track.index, e.count, e.end_ms)
+            for e in entries
+        ]
+        commit_at, self._commit_size = put(_COMMIT, b"".join(commit))
+        put(_TRAILER, _TRAILER_BODY.pack(commit_at))
+        f.write(b"".join(out))
+
+    def _live_size(self) -> int:
+        """今のファイルのうち最新の COMMIT から参照されているバイト数"""
+        live = _HEADER.size + self._meta[1] + self._commit_size + _TRAILER_SIZE
+        live += sum(size for _, size in self._asset_records)
+        live += sum(e.size for e in self._tracks.values())
+        return live
+
+    def _asset_id(self, asset: MediaAsset) -> int:
+        key = _asset_key(asset)
+        i = self._asset_ids.get(key)
+        if i is None:
+            i = self._asset_ids[key] = len(self._assets)
+            self._assets.append(asset)
+        return i
+
+    def _asset_table(self, first: int) -> bytes:
+        parts = [_ASSET_HEAD.pack(first, len(self._assets) - first)]
+        for a in self._assets[first:]:
+            path = str(a.path).encode()
+            parts.append(
+                _ASSET_ITEM.pack(
+                    _MEDIA_TYPES.index(a.media_type), a.duration_ms, len(path)
+                )
+            )
+            parts.append(path)
+        return b"".join(parts)
+
+    def _track_payload(
+        self, track: Track, columns: bytes | memoryview | None = None
+    ) -> bytes:
+        name = track.name.encode()
+        head = _TRACK_HEAD.pack(track.index, len(track.clips), len(name)) + name
+        head += _TRACK_KIND.pack(_MEDIA_TYPES.index(track.kind))
+        if columns is None:
+            clips = list(track.clips)
+            n = len(clips)
+            asset = np.fromiter((self._asset_id(c.asset) for c in clips), np.uint32, n)
+            rest = np.empty((5, n), np.int64)
+            rest[0] = np.fromiter((c.in_point_ms for c in clips), np.int64, n)
+            rest[1] = np.fromiter((c.duration_ms for c in clips), np.int64, n)
+            starts = np.fromiter((c.start_ms for c in clips), np.int64, n)
+            # 開始時刻順なので差分は小さく、よく縮む
+            rest[2] = np.diff(starts, prepend=0)
+            rest[3] = np.fromiter((c.fade_in_ms for c in clips), np.int64, n)
+            rest[4] = np.fromiter((c.fade_out_ms for c in clips), np.int64, n)
+            gain = np.fromiter((c.gain for c in clips), np.float32, n)
+            columns = zlib.compress(
+                asset.tobytes() + rest.tobytes() + gain.tobytes(), _COMPRESS_LEVEL
+            )
+        return head + columns
+
+
+# --- レコード ---
+
+
+def _record(tag: int, payload: bytes) -> bytes:
+    head = _RECORD_HEAD.pack(tag, len(payload))
+    return head + payload + _CRC.pack(zlib.crc32(payload, zlib.crc32(head[:1])))
+
+
+def _record_size(data: bytes, at: int) -> int:
+    _, n = _RECORD_HEAD.unpack_from(data, at)
+    return _RECORD_HEAD.size + n + _CRC.size
+
+
+def _check(data: bytes, at: int) -> int | None:
+    """at に完全なレコードがあればその tag"""
+    if at + _RECORD_HEAD.size > len(data):
+        return None
+    tag, n = _RECORD_HEAD.unpack_from(data, at)
+    end = at + _RECORD_HEAD.size + n
+    if end + _CRC.size > len(data):
+        return None
+    (crc,) = _CRC.unpack_from(data, end)
+    view = memoryview(data)
+    if crc != zlib.crc32(
+        view[at + _RECORD_HEAD.size : end], zlib.crc32(view[at : at + 1])
+    ):
+        return None
+    return tag
+
+
+def _payload(data: bytes, at: int, tag: int) -> memoryview:
+    if _check(data, at) != tag:
+        raise ProjectFileError(f"broken record at offset {at}")
+    _, n = _RECORD_HEAD.unpack_from(data, at)
+    return memoryview(data)[at + _RECORD_HEAD.size : at + _RECORD_HEAD.size + n]
+
+
+def _stat_of(path: Path) -> tuple[int, int] | None:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
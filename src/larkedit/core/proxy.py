@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from ..encoding.ffmpeg_binding import encoder as ffm  # type: ignore
+from ..encoding.ffmpeg_binding import probe as _probe  # type: ignore
+from ..utils.media import probe
+from ..utils.paths import cache_dir
+from .project import MediaAsset, MediaType, Project
+
+__all__ = ["ProxyCancelled", "ProxyManager"]
+
+_PROXY_SUFFIX = ".mp4"
+
+
+class ProxyCancelled(Exception):
+    """ProxyManager.shutdown() / cancel_pending() で中断された"""
+
+
+class ProxyManager:
+    """
+    取り込んだ映像から低解像度のプロキシを作り、MediaAsset.proxy_path に設定する。
+    プロキシは全フレームをキーフレームにする (gop_size=1) のでどこへ seek しても速い。
+    プレビュー (PlaybackEngine) は proxy_path があればそちらを読み、書き出しは常に元ファイルを使う。
+    ファイルはキャッシュディレクトリに元ファイルのパス・サイズ・更新時刻をキーに置くので、
+    プロジェクトを開き直したときは attach_all() で見つかったものをつなぎ直す。
+    エディタを重くしないよう、同時に作る数 (max_workers) と各ジョブのスレッド数を絞ってある。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        *,
+        height: int = 540,
+        threads: int = 2,
+        video_codec: str = "libx264",
+        gop_size: int = 1,
+        directory: str | Path | None = None,
+    ) -> None:
+        self._pool = ThreadPoolExecutor(max(1, max_workers), thread_name_prefix="proxy")
+        self._height = height
+        self._threads = threads
+        self._codec = video_codec
+        self._gop_size = gop_size
+        self._dir = Path(directory) if directory else cache_dir("proxies")
+        self._lock = threading.Lock()
+        self._jobs: dict[str, Future[Path | None]] = {}
+        self._stop = threading.Event()
+
+    # --- 公開 API ---
+    def proxy_for(self, asset: MediaAsset) -> Path | None:
+        """作成済みのプロキシ (無ければ None)"""
+        path = self._target(asset.path)
+        return path if path is not None and path.exists() else None
+
+    def attach(self, asset: MediaAsset) -> bool:
+        """作成済みのプロキシがあれば asset.proxy_path に設定する"""
+        path = self.proxy_for(asset)
+        if path is not None:
+            asset.proxy_path = path
+        return path is not None
+
+    def attach_all(self, project: Project) -> None:
+        """project の全 asset について attach() する (同じファイルは 1 回だけ調べる)"""
+        found: dict[Path, Path | None] = {}
+        for track in project.timeline.tracks:
+            for clip in track.clips:
+                asset = clip.asset
+                if asset.media_type != MediaType.VIDEO or asset.proxy_path is not None:
+                    continue
+                if asset.path not in found:
+                    found[asset.path] = self.proxy_for(asset)
+                asset.proxy_path = found[asset.path]
+
+    def submit(
+        self, asset: MediaAsset, callback: Callable[[MediaAsset], None] | None = None
+    ) -> Future[Path | None]:
+        """
+        asset のプロキシ作成を予約する。作成済みならすぐ完了する。
+        映像以外は作らない (結果は None)。callback は成功時にワーカースレッドから呼ばれる
+        """
+        fut: Future[Path | None]
+        target = (
+            self._target(asset.path) if asset.media_type == MediaType.VIDEO else None
+        )
+        if target is None or target.exists():
+            if target is not None:
+                asset.proxy_path = target
+            fut = Future()
+            fut.set_result(target)
+        else:
+            with self._lock:
+                fut = self._jobs.get(target.name)  # type: ignore[assignment]
+                if fut is None:
+                    fut = self._pool.submit(self._run, asset.path, target)
+                    self._jobs[target.name] = fut
+                    fut.add_done_callback(lambda f, key=target.name: self._discard(key))
+
+        def done(f: Future[Path | None]) -> None:
+            if f.cancelled() or f.exception() is not None or f.result() is None:
+                return
+            asset.proxy_path = f.result()
+            if callback is not None:
+                callback(asset)
+
+        fut.add_done_callback(done)
+        return fut
+
+    def cancel_pending(self) -> None:
+        """まだ始まっていないジョブを取り消す"""
+        with self._lock:
+            futures = list(self._jobs.values())
+        for fut in futures:
+            fut.cancel()
+
+    def shutdown(self, wait: bool = False) -> None:
+        """実行中のジョブも中断する (書きかけのファイルは消す)"""
+        self._stop.set()
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    # --- 内部 ---
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    def _target(self, source: Path) -> Path | None:
+        """source のプロキシの置き場所 (source を stat できなければ None)"""
+        source = Path(source).resolve()
+        try:
+            st = source.stat()
+        except OSError:
+            return None
+        h = hashlib.blake2b(digest_size=16)
+        key = (
+            f"{source}\0{st.st_size}\0{st.st_mtime_ns}"
+            f"\0{self._height}\0{self._codec}\0{self._gop_size}"
+        )
+        h.update(key.encode())
+        return self._dir / f"{h.hexdigest()}{_PROXY_SUFFIX}"
+
+    def _size(self, source: Path) -> tuple[int, int, int]:
+        """プロキシの (幅, 高さ, fps)。高さを self._height に揃え、元より大きくはしない"""
+        video = probe(source).get("video", {})
+        src_w, src_h = video.get("width", 0), video.get("height", 0)
+        fps = max(1, round(video.get("fps", 0) or 30))
+        if not src_w or not src_h:
+            raise ValueError(f"no video stream: {source}")
+        h = min(self._height, src_h)
+        w = round(src_w * h / src_h)
+        return w + (w & 1), h + (h & 1), fps  # yuv420p は偶数サイズ
+
+    def _run(self, source: Path, target: Path) -> Path:
+        if self._stop.is_set():
+            raise ProxyCancelled
+        width, height, fps = self._size(source)
+        part = target.with_name(f"{target.stem}.part{target.suffix}")
+        dec = _probe.MediaDecoder(str(source), width, height, True, self._threads)
+        enc = ffm.MediaEncoder(
+            str(part),
+            width,
+            height,
+            fps,
+            video_codec=self._codec,
+            audio_codec="",
+            threads=self._threads,
+            convert_threads=self._threads,
+            gop_size=self._gop_size,
+        )
+        try:
+            enc.start()
+            try:
+                while not self._stop.is_set():
+                    frame = enc.acquire_frame(0)
+                    got = dec.read_frame(frame.rgba)  # エンコーダの枠へ直接デコードする
+                    if got is None:
+                        break
+                    frame.pts = got[0]
+                    enc.submit_video(frame)
+            finally:
+                enc.finish()
+            if self._stop.is_set():
+                raise ProxyCancelled
+            os.replace(part, target)
+        except BaseException:
+            part.unlink(missing_ok=True)
+            raise
+        return target
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Sequence
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .project import Clip, Timeline, Track
+
+__all__ = ["RenderPlan", "frame_of"]
+
+
+def frame_of(ms: int, fps: int) -> int:
+    """ms 以降で最初のフレーム番号 (フレーム k の時刻は k * 1000 // fps)"""
+    return -(-ms * fps // 1000)
+
+
+def _readonly(a: np.ndarray) -> np.ndarray:
+    a.setflags(write=False)
+    return a
+
+
+@dataclass(frozen=True, slots=True)
+class _TrackPlan:
+    """1 トラックぶんの区間 (ClipIndex.version が変わらなければ使い回す)"""
+
+    track: Track
+    version: int
+    clips: tuple[Clip, ...]
+    clip: np.ndarray  # int32: clips の添字
+    start: np.ndarray  # int64: 開始フレーム
+    end: np.ndarray  # int64: 終了フレーム (含まない)
+    offset: np.ndarray  # int64: ソース時刻 = タイムライン時刻 + offset [ms]
+
+    @staticmethod
+    def build(track: Track, fps: int) -> _TrackPlan:
+        clips = tuple(track.clips)
+        if not clips:
+            empty = _readonly(np.zeros(0, np.int64))
+            return _TrackPlan(
+                track,
+                track.clips.version,
+                clips,
+                _readonly(np.zeros(0, np.int32)),
+                empty,
+                empty,
+                empty,
+            )
+        starts = np.fromiter(
+            (frame_of(c.start_ms, fps) for c in clips), np.int64, len(clips)
+        )
+        ends = np.fromiter(
+            (frame_of(c.end_ms, fps) for c in clips), np.int64, len(clips)
+        )
+        # フレームごとに見える clip を決める。find_clip_at と同じく先に始まるものが優先なので
+        # 後ろから塗って、先の clip で上書きする
+        owner = np.full(int(ends.max()), -1, np.int32)
+        for i in range(len(clips) - 1, -1, -1):
+            owner[starts[i] : ends[i]] = i
+        # 連続する同じ値をまとめて区間にする
+        change = np.flatnonzero(np.diff(owner)) + 1
+        seg_start = np.concatenate(([0], change)).astype(np.int64)
+        seg_end = np.concatenate((change, [len(owner)])).astype(np.int64)
+        seg_clip = owner[seg_start]
+        keep = seg_clip >= 0
+        seg_start, seg_end, seg_clip = seg_start[keep], seg_end[keep], seg_clip[keep]
+        offsets = np.fromiter(
+            (clips[i].in_point_ms - clips[i].start_ms for i in seg_clip),
+            np.int64,
+            len(seg_clip),
+        )
+        return _TrackPlan(
+            track,
+            track.clips.version,
+            clips,
+            _readonly(seg_clip),
+            _readonly(seg_start),
+            _readonly(seg_end),
+            _readonly(offsets),
+        )
+
+
+class RenderPlan:
+    """
+    Timeline (映像トラック) をフレーム単位の区間表に落としたもの (不変)。
+    各区間は (トラック, clip, [start, end) フレーム, ソース時刻オフセット)。
+    Timeline.render_plan() が前回の結果からトラック単位で作り直す。
+    """
+
+    __slots__ = ("fps", "frame_count", "_tracks")
+
+    def __init__(self, fps: int, tracks: Sequence[_TrackPlan]) -> None:
+        self.fps = fps
+        self._tracks = tuple(tracks)
+        self.frame_count = max(
+            (int(t.end[-1]) for t in self._tracks if len(t.end)), default=0
+        )
+
+    @classmethod
+    def build(
+        cls, timeline: Timeline, fps: int, previous: RenderPlan | None = None
+    ) -> RenderPlan:
+        """timeline から作る。previous があれば変わっていないトラックはそのまま使う"""
+        reuse: dict[int, _TrackPlan] = {}
+        if previous is not None and previous.fps == fps:
+            reuse = {id(t.track): t for t in previous._tracks}
+        tracks = []
+        for track in timeline.tracks:
+            if track.is_audio:
+                continue  # 音声は AudioMixer が混ぜる
+            old = reuse.get(id(track))
+            if (
+                old is not None
+                and old.track is track
+                and old.version == track.clips.version
+            ):
+                tracks.append(old)
+            else:
+                tracks.append(_TrackPlan.build(track, fps))
+        return cls(fps, tracks)
+
+    # --- 問い合わせ ---
+    @property
+    def track_indices(self) -> tuple[int, ...]:
+        """下のレイヤーから順のトラック番号"""
+        return tuple(t.track.index for t in self._tracks)
+
+    @property
+    def segment_count(self) -> int:
+        return sum(len(t.clip) for t in self._tracks)
+
+    def frame_time(self, frame: int) -> int:
+        return frame * 1000 // self.fps
+
+    def segments(self, track_index: int) -> list[tuple[Clip, int, int, int]]:
+        """トラックの区間 (clip, start_frame, end_frame, offset_ms)"""
+        t = self._track(track_index)
+        return [
+            (t.clips[c], int(a), int(b), int(o))
+            for c, a, b, o in zip(t.clip, t.start, t.end, t.offset)
+        ]
+
+    def layers_at(self, frame: int) -> list[tuple[int, Clip, int]]:
+        """frame で見える (トラック番号, clip, ソース時刻 ms) を下のレイヤーから"""
+        out = []
+        t_ms = self.frame_time(frame)
+        for t in self._tracks:
+            s = int(np.searchsorted(t.start, frame, "right")) - 1
+            if s >= 0 and frame < t.end[s]:
+                out.append((t.track.index, t.clips[t.clip[s]], t_ms + int(t.offset[s])))
+        return out
+
+    def track_frames(
+        self, track_index: int, first: int, last: int
+    ) -> tuple[tuple[Clip, ...], np.ndarray, np.ndarray]:
+        """
+        [first, last) の各フレームについて (clips, clip 添字 (-1 は無し), ソース時刻 ms)。
+        フレームを順に回す側は Python で探索しなくて済む
+        """
+        t = self._track(track_index)
+        n = max(0, last - first)
+        idx = np.full(n, -1, np.int32)
+        src = np.zeros(n, np.int64)
+        lo = int(np.searchsorted(t.end, first, "right"))
+        hi = int(np.searchsorted(t.start, last, "left"))
+        for s in range(lo, hi):
+            a = max(int(t.start[s]), first)
+            b = min(int(t.end[s]), last)
+            idx[a - first : b - first] = t.clip[s]
+            src[a - first : b - first] = (
+                np.arange(a, b, dtype=np.int64) * 1000 // self.fps + t.offset[s]
+            )
+        return t.clips, idx, src
+
+    def changed_frames(self, old: RenderPlan) -> list[tuple[int, int]]:
+        """old から見た目が変わりうるフレーム範囲 [start, end) の列 (キャッシュ無効化用)"""
+        n = max(self.frame_count, old.frame_count)
+        same_tracks = len(old._tracks) == len(self._tracks) and all(
+            a.track is b.track for a, b in zip(old._tracks, self._tracks)
+        )
+        if self.fps != old.fps or not same_tracks:
+            return [(0, n)] if n else []  # トラックの増減・並べ替えは全体に効く
+        dirty = np.zeros(n, np.int8)
+        for old_t, new_t in zip(old._tracks, self._tracks):
+            if old_t is new_t:
+                continue
+            diff = (self._frame_keys(old_t, n) != self._frame_keys(new_t, n)).any(
+                axis=0
+            )
+            dirty |= diff.astype(np.int8)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], dirty, [0]))))
+        return [(int(a), int(b)) for a, b in zip(edges[::2], edges[1::2])]
+
+    # --- 内部 ---
+    def _track(self, track_index: int) -> _TrackPlan:
+        for t in self._tracks:
+            if t.track.index == track_index:
+                return t
+        raise KeyError(track_index)
+
+    @staticmethod
+    def _frame_keys(t: _TrackPlan, n: int) -> np.ndarray:
+        """フレームごとの (clip の id, オフセット)"""
+        ids = np.zeros(n, np.int64)
+        off = np.zeros(n, np.int64)
+        clip_ids = np.fromiter((id(c) for c in t.clips), np.int64, len(t.clips))
+        for c, a, b, o in zip(t.clip, t.start, t.end, t.offset):
+            ids[a:b] = clip_ids[c]
+            off[a:b] = o
+        return np.stack((ids, off))
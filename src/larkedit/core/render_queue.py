@@ -0,0 +1,465 @@
+from __future__ import annotations
+
+import dataclasses
+import functools
+import heapq
+import itertools
+import json
+import multiprocessing as mp
+import os
+import pickle
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+from ..utils.paths import cache_dir
+from .compositor import RenderCancelled, RenderEngine, RenderSettings
+from .project import Project
+
+__all__ = ["JobState", "RenderJob", "RenderQueue"]
+
+_STATE_VERSION = 1
+_PROGRESS_INTERVAL = 0.25  # ワーカーが進捗を書き込む間隔 (秒)
+_MAX_CRASHES = 2  # 実行中にワーカープロセスが落ちた回数がこれに達したジョブは失敗にする
+
+
+class JobState:
+    QUEUED = "queued"
+    RUNNING = "running"
+    PAUSED = "paused"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = (DONE, FAILED, CANCELLED)
+
+
+@dataclass(slots=True)
+class RenderJob:
+    """キュー内の 1 書き出しジョブ (progress 以下はスケジューラが更新する)"""
+
+    id: str
+    name: str
+    settings: RenderSettings
+    priority: int = 0  # 大きいほど先に実行
+    state: str = JobState.QUEUED
+    seq: int = 0  # 同じ優先度では投入順
+    frames_done: int = 0
+    frames_total: int = 0
+    fps: float = 0.0  # 直近の書き出し速度
+    threads: int = 0  # 割り当てたコア数
+    crashes: int = 0  # 実行中にワーカープロセスが落ちた回数
+    error: str | None = None
+    stats: dict[str, Any] | None = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    @property
+    def progress(self) -> float:
+        return self.frames_done / self.frames_total if self.frames_total else 0.0
+
+    def to_json(self) -> dict[str, Any]:
+        d = {f.name: getattr(self, f.name) for f in dataclasses.fields(self)}
+        d["settings"] = dataclasses.asdict(self.settings)
+        d["settings"]["output"] = str(self.settings.output)
+        return d
+
+    @classmethod
+    def from_json(cls, d: dict[str, Any]) -> RenderJob:
+        d = dict(d)
+        d["settings"] = RenderSettings(**d["settings"])
+        return cls(**d)
+
+
+# --- ワーカープロセス側 ---
+
+
+def _run_job(
+    job_id: str,
+    project_file: str,
+    settings: RenderSettings,
+    progress: Any,  # Manager().dict(): job_id -> (done, total, fps)
+    control: Any,  # Manager().dict(): job_id -> JobState.PAUSED / CANCELLED
+) -> dict[str, Any]:
+    with open(project_file, "rb") as f:
+        project: Project = pickle.load(f)
+
+    t0 = time.perf_counter()
+    last = 0.0
+
+    def on_progress(done: int, total: int) -> None:
+        nonlocal last
+        now = time.perf_counter()
+        if now - last < _PROGRESS_INTERVAL and done != total:
+            return
+        last = now
+        progress[job_id] = (done, total, done / (now - t0))
+        # 一時停止中はここで止める (デコード先読みとエンコーダもキューが詰まって止まる)
+        while (flag := control.get(job_id)) == JobState.PAUSED:
+            time.sleep(0.2)
+        if flag == JobState.CANCELLED:
+            engine.cancel()
+
+    engine = RenderEngine(project, settings, on_progress)
+    stats = engine.run()
+    return dataclasses.asdict(stats) | {"fps": stats.fps, "realtime": stats.realtime}
+
+
+# --- スケジューラ ---
+
+
+class RenderQueue:
+    """
+    Project の書き出しジョブを優先度順にワーカープロセスで実行する。
+
+    - 同時実行数は max_workers、コア数は cpu_budget を各ジョブに分配し、
+      書き出し中のスレッド数の合計が cpu_budget を超えないようにする
+    - 状態は state_dir の queue.json (とジョブごとの Project スナップショット) に保存し、
+      次回起動時に未完了のジョブを再開する
+    - ワーカープロセスが落ちるとプールごと使えなくなるので作り直し、そのとき実行中だった
+      ジョブは積み直す (_MAX_CRASHES 回目で失敗にする)
+    - on_update はスケジューラスレッドから呼ばれる
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        *,
+        cpu_budget: int | None = None,
+        state_dir: str | Path | None = None,
+        on_update: Callable[[RenderJob], None] | None = None,
+        autostart: bool = True,
+    ) -> None:
+        self._cpu_budget = max(1, cpu_budget or os.cpu_count() or 1)
+        self._max_workers = max(1, min(max_workers or 2, self._cpu_budget))
+        self._dir = Path(state_dir) if state_dir else cache_dir("render_queue")
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._on_update = on_update
+
+        self._lock = threading.Condition()
+        self._jobs: dict[str, RenderJob] = {}
+        self._heap: list[tuple[int, int, str]] = []  # (-priority, seq, id)
+        self._running: dict[str, Future[dict[str, Any]]] = {}
+        self._seq = itertools.count()
+        self._closed = False
+        self._pending_emit: list[RenderJob] = []  # 次のループで on_update に渡す
+
+        ctx = mp.get_context("spawn")  # Qt / スレッドを抱えた親から fork しない
+        self._manager = ctx.Manager()
+        self._progress = self._manager.dict()
+        self._control = self._manager.dict()
+        self._ctx = ctx
+        self._pool = ProcessPoolExecutor(self._max_workers, mp_context=ctx)
+        self._broken = False  # _pool のワーカーが落ちた (次のループで作り直す)
+
+        self._load()
+        self._thread = threading.Thread(
+            target=self._loop, name="render-queue", daemon=True
+        )
+        if autostart:
+            self._thread.start()
+
+    # --- 公開 API ---
+    def start(self) -> None:
+        if not self._thread.is_alive():
+            self._thread.start()
+
+    def submit(
+        self, project: Project, settings: RenderSettings, priority: int = 0
+    ) -> RenderJob:
+        """project のスナップショットを取ってジョブを積む"""
+        job = RenderJob(
+            id=uuid.uuid4().hex,
+            name=project.name,
+            settings=dataclasses.replace(settings, output=str(settings.output)),
+            priority=priority,
+        )
+        self._project_file(job.id).write_bytes(pickle.dumps(project))
+        with self._lock:
+            job.seq = next(self._seq)
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (-priority, job.seq, job.id))
+            self._save_locked()
+            self._lock.notify_all()
+        return job
+
+    def jobs(self) -> list[RenderJob]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: (-j.priority, j.seq))
+
+    def job(self, job_id: str) -> RenderJob:
+        with self._lock:
+            return self._jobs[job_id]
+
+    def cancel(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            if job.state in JobState.FINISHED:
+                return
+            if job_id in self._running:
+                # ワーカーが次の進捗で中断する
+                self._control[job_id] = JobState.CANCELLED
+            else:
+                self._finish_locked(job, JobState.CANCELLED)
+            self._lock.notify_all()
+
+    def pause(self, job_id: str) -> None:
+        """実行中ならその場で止め、待機中ならスケジュール対象から外す"""
+        with self._lock:
+            job = self._jobs[job_id]
+            if job.state not in (JobState.QUEUED, JobState.RUNNING):
+                return
+            if job_id in self._running:
+                self._control[job_id] = JobState.PAUSED
+            job.state = JobState.PAUSED
+            self._save_locked()
+        self._emit(job)
+
+    def resume(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            if job.state != JobState.PAUSED:
+                return
+            if job_id in self._running:
+                self._control.pop(job_id, None)
+                job.state = JobState.RUNNING
+            else:
+                job.state = JobState.QUEUED
+                heapq.heappush(self._heap, (-job.priority, job.seq, job.id))
+            self._save_locked()
+            self._lock.notify_all()
+        self._emit(job)
+
+    def set_priority(self, job_id: str, priority: int) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.priority = priority
+            if job.state == JobState.QUEUED:
+                # 古い項目は取り出し時に捨てる
+                heapq.heappush(self._heap, (-priority, job.seq, job.id))
+            self._save_locked()
+            self._lock.notify_all()
+
+    def remove_finished(self) -> None:
+        """終了したジョブを一覧と状態ファイルから消す"""
+        with self._lock:
+            for job in [j for j in self._jobs.values() if j.state in JobState.FINISHED]:
+                del self._jobs[job.id]
+                self._project_file(job.id).unlink(missing_ok=True)
+            self._save_locked()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """すべてのジョブが終わるまで待つ (一時停止中のものがあれば終わらない)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while any(j.state not in JobState.FINISHED for j in self._jobs.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._lock.wait(remaining)
+        return True
+
+    def shutdown(self, cancel_running: bool = False) -> None:
+        """
+        スケジューラを止める。cancel_running=False なら実行中のジョブの完了を待つ。
+        待機中・一時停止中のジョブは状態ファイルに残り、次回起動時に再開される
+        """
+        with self._lock:
+            self._closed = True
+            for job_id in self._running:
+                # 一時停止中のものは中断して次回に回す
+                if cancel_running or self._jobs[job_id].state == JobState.PAUSED:
+                    self._control[job_id] = JobState.CANCELLED
+            self._lock.notify_all()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            self._save_locked()
+        self._manager.shutdown()
+
+    # --- スケジューラ ---
+    def _loop(self) -> None:
+        while True:
+            with self._lock:
+                if self._closed and not self._running:
+                    return
+                changed = self._poll_progress_locked()
+                if self._broken and not self._closed:
+                    self._restart_pool_locked()
+                if not self._closed and not self._broken:
+                    self._dispatch_locked()
+                self._lock.wait(_PROGRESS_INTERVAL)
+            for job in changed:
+                self._emit(job)
+
+    def _dispatch_locked(self) -> None:
+        while self._heap and len(self._running) < self._max_workers:
+            free = self._cpu_budget - sum(self._jobs[i].threads for i in self._running)
+            if free <= 0:
+                return
+            prio, _, job_id = self._heap[0]
+            job = self._jobs.get(job_id)
+            if job is None or job.state != JobState.QUEUED or -prio != job.priority:
+                heapq.heappop(self._heap)  # 取り消し・一時停止・優先度変更済み
+                continue
+            heapq.heappop(self._heap)
+
+            # 各ジョブは cpu_budget / max_workers コアまで (明示指定があればそれを上限とする)
+            threads = min(free, max(1, self._cpu_budget // self._max_workers))
+            if job.settings.threads:
+                threads = min(threads, job.settings.threads)
+
+            self._control.pop(job_id, None)
+            try:
+                fut = self._pool.submit(
+                    _run_job,
+                    job_id,
+                    str(self._project_file(job_id)),
+                    dataclasses.replace(
+                        job.settings,
+                        threads=threads,
+                        codec_threads=min(job.settings.codec_threads, threads),
+                    ),
+                    self._progress,
+                    self._control,
+                )
+            except BrokenProcessPool:
+                # 実行中のジョブの完了通知より先に気づいた。戻して次のループで作り直す
+                heapq.heappush(self._heap, (-job.priority, job.seq, job.id))
+                self._broken = True
+                return
+            job.state = JobState.RUNNING
+            job.threads = threads
+            job.started_at = time.time()
+            job.error = None
+            self._running[job_id] = fut
+            fut.add_done_callback(functools.partial(self._on_done, job_id, self._pool))
+            self._save_locked()
+            self._emit_later(job)
+
+    def _poll_progress_locked(self) -> list[RenderJob]:
+        changed = []
+        for job_id in self._running:
+            p = self._progress.get(job_id)
+            job = self._jobs[job_id]
+            if p is not None and p[0] != job.frames_done:
+                job.frames_done, job.frames_total, job.fps = p
+                changed.append(job)
+        changed.extend(self._pending_emit)
+        self._pending_emit.clear()
+        return changed
+
+    def _restart_pool_locked(self) -> None:
+        # 落ちたプールの残りのジョブは _on_done が BrokenProcessPool で受け取って積み直す
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = ProcessPoolExecutor(self._max_workers, mp_context=self._ctx)
+        self._broken = False
+
+    def _on_done(
+        self, job_id: str, pool: ProcessPoolExecutor, fut: Future[dict[str, Any]]
+    ) -> None:
+        with self._lock:
+            self._running.pop(job_id, None)
+            job = self._jobs[job_id]
+            flag = self._control.pop(job_id, None)
+            self._progress.pop(job_id, None)
+            try:
+                job.stats = fut.result()
+            except BaseException as e:  # noqa: BLE001
+                if self._closed and job.state == JobState.PAUSED:
+                    job.frames_done = 0  # 一時停止のまま残す (再開時は最初から)
+                    self._save_locked()
+                elif isinstance(e, RenderCancelled):
+                    self._finish_locked(job, JobState.CANCELLED)
+                elif self._closed and flag != JobState.CANCELLED:
+                    job.state = JobState.QUEUED  # プール停止で落ちたものは次回やり直す
+                    self._save_locked()
+                elif isinstance(e, BrokenProcessPool):
+                    # どのジョブがワーカーを落としたかは分からないので、実行中だったものはすべて扱いが同じ
+                    if pool is self._pool:
+                        self._broken = True
+                    if flag == JobState.CANCELLED:
+                        self._finish_locked(job, JobState.CANCELLED)
+                    else:
+                        self._crashed_locked(job, e)
+                else:
+                    job.error = f"{type(e).__name__}: {e}"
+                    self._finish_locked(job, JobState.FAILED)
+            else:
+                job.frames_done = job.frames_total = job.stats["frames"]
+                job.fps = job.stats["fps"]
+                self._finish_locked(job, JobState.DONE)
+            self._lock.notify_all()
+
+    def _crashed_locked(self, job: RenderJob, e: BaseException) -> None:
+        job.crashes += 1
+        if job.crashes >= _MAX_CRASHES:
+            job.error = f"{type(e).__name__}: {e}"
+            self._finish_locked(job, JobState.FAILED)
+            return
+        job.frames_done = 0
+        if job.state != JobState.PAUSED:  # 一時停止中ならそのまま (再開時に積む)
+            job.state = JobState.QUEUED
+            heapq.heappush(self._heap, (-job.priority, job.seq, job.id))
+        self._save_locked()
+        self._emit_later(job)
+
+    def _finish_locked(self, job: RenderJob, state: str) -> None:
+        job.state = state
+        job.finished_at = time.time()
+        self._save_locked()
+        self._emit_later(job)
+
+    def _emit_later(self, job: RenderJob) -> None:
+        """ロック外 (次のループ) で on_update を呼ぶ"""
+        self._pending_emit.append(job)
+
+    def _emit(self, job: RenderJob) -> None:
+        if self._on_update is not None:
+            self._on_update(job)
+
+    # --- 永続化 ---
+    def _project_file(self, job_id: str) -> Path:
+        return self._dir / f"{job_id}.project"
+
+    def _save_locked(self) -> None:
+        data = {
+            "version": _STATE_VERSION,
+            "jobs": [j.to_json() for j in self._jobs.values()],
+        }
+        tmp = self._dir / "queue.json.tmp"
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self._dir / "queue.json")
+
+    def _load(self) -> None:
+        path = self._dir / "queue.json"
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") != _STATE_VERSION:
+            return
+        for d in data["jobs"]:
+            job = RenderJob.from_json(d)
+            if (
+                job.state not in JobState.FINISHED
+                and not self._project_file(job.id).exists()
+            ):
+                job.state, job.error = JobState.FAILED, "project snapshot missing"
+            elif job.state == JobState.RUNNING:
+                # 前回の実行中にクラッシュした: 最初からやり直す
+                job.state = JobState.QUEUED
+                job.frames_done = 0
+            self._jobs[job.id] = job
+            if job.state == JobState.QUEUED:
+                heapq.heappush(self._heap, (-job.priority, job.seq, job.id))
+        self._seq = itertools.count(
+            max((j.seq for j in self._jobs.values()), default=-1) + 1
+        )
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import dataclasses
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable
+
+from ..encoding.ffmpeg_binding import encoder as ffm  # type: ignore
+from .audio import AudioMixer
+from .compositor import RenderCancelled, RenderEngine, RenderSettings, RenderStats
+from .project import Project
+
+__all__ = ["SegmentedExporter", "plan_segments"]
+
+_PROGRESS_INTERVAL = 0.25  # 秒
+
+
+def plan_segments(
+    start_ms: int, end_ms: int, fps: int, gop_size: int, count: int
+) -> list[tuple[int, int]]:
+    """
+    [start_ms, end_ms) をおよそ count 等分した (start_ms, end_ms) の列。
+    境界は gop_size フレームの倍数に揃える (区間の先頭が必ず GOP の先頭になる)
+    """
+    first = -(-start_ms * fps // 1000)
+    last = -(-end_ms * fps // 1000)
+    frames = max(0, last - first)
+    per = -(-frames // max(1, count))
+    per = max(gop_size, -(-per // gop_size) * gop_size)
+    bounds = list(range(first, last, per)) + [last]
+    # フレーム番号 → その格子に乗る ms (RenderEngine.frame_times と同じ丸め)
+    return [(a * 1000 // fps, b * 1000 // fps) for a, b in zip(bounds, bounds[1:])]
+
+
+def _render_segment(
+    index: int,
+    project: Project,
+    settings: RenderSettings,
+    progress: Any,  # Manager().dict(): index -> (done, total)
+    control: Any,  # Manager().dict(): "cancel" が立ったら中断
+) -> dict[str, Any]:
+    last = 0.0
+
+    def on_progress(done: int, total: int) -> None:
+        nonlocal last
+        now = time.perf_counter()
+        if now - last < _PROGRESS_INTERVAL and done != total:
+            return
+        last = now
+        progress[index] = (done, total)
+        if control.get("cancel"):
+            engine.cancel()
+
+    engine = RenderEngine(project, settings, on_progress)
+    return dataclasses.asdict(engine.run())
+
+
+def _render_audio(project: Project, settings: RenderSettings, control: Any) -> float:
+    """
+    書き出し範囲の音声を一度で settings.output へ書く (音声だけのファイル)。
+    区間ごとにエンコードするとプライミング / 末尾の詰め物が境界ごとに入ってずれていくため。
+    ミックスにかかった秒数を返す
+    """
+    fps = settings.fps or project.fps
+    first, last = RenderEngine(project, settings).frame_range()
+    mixer = AudioMixer(
+        project.timeline, sample_rate=settings.sample_rate, channels=settings.channels
+    )
+    enc = ffm.MediaEncoder(
+        str(settings.output),
+        0,
+        0,
+        fps,
+        sample_rate=settings.sample_rate,
+        channels=settings.channels,
+        video_codec="",
+        audio_codec=settings.audio_codec,
+    )
+    enc.start()
+    stop = threading.Event()
+    mix_s = 0.0
+    checked = time.perf_counter()
+    blocks = mixer.blocks(first * 1000 // fps, last * 1000 // fps, stop=stop)
+    while True:
+        t0 = time.perf_counter()
+        item = next(blocks, None)
+        mix_s += time.perf_counter() - t0
+        if item is None:
+            break
+        enc.submit_audio(item[1], item[0])
+        if t0 - checked >= _PROGRESS_INTERVAL:
+            checked = t0
+            if control.get("cancel"):
+                stop.set()
+    if stop.is_set():
+        raise RenderCancelled
+    enc.finish()
+    return mix_s
+
+
+class SegmentedExporter:
+    """
+    タイムラインを GOP 境界で区間に分け、区間ごとに別プロセスで書き出してから
+    concat_segments で再エンコードせずに 1 ファイルへつなぐ。
+    区間は映像だけにして、音声は範囲全体を別のプロセスで一度に書き出し、連結のときに足す。
+    1 本の長い書き出しを全コアに広げるためのもの (エンコーダ 1 本はスレッドを増やしても頭打ちになる)
+    """
+
+    def __init__(
+        self,
+        project: Project,
+        settings: RenderSettings,
+        progress: Callable[[int, int], None] | None = None,
+        *,
+        workers: int | None = None,
+        segments: int | None = None,
+    ) -> None:
+        self._project = project
+        self._settings = settings
+        self._progress = progress
+        self._workers = max(1, workers or os.cpu_count() or 1)
+        self._segments = max(1, segments or self._workers)
+        self._stop = threading.Event()
+
+    def cancel(self) -> None:
+        self._stop.set()
+
+    def plan(self) -> list[tuple[int, int]]:
+        s = self._settings
+        fps = s.fps or self._project.fps
+        end = self._project.timeline.duration_ms if s.end_ms is None else s.end_ms
+        return plan_segments(
+            s.start_ms, end, fps, s.gop_size or 2 * fps, self._segments
+        )
+
+    def run(self) -> RenderStats:
+        s = self._settings
+        fps = s.fps or self._project.fps
+        gop = s.gop_size or 2 * fps
+        plan = self.plan()
+        if len(plan) <= 1:  # 分ける意味が無い
+            return RenderEngine(self._project, s, self._progress).run()
+        output = Path(s.output)
+        # 各プロセスのスレッド数の合計がコア数を超えないように割る
+        threads = s.threads or max(
+            1, (os.cpu_count() or 1) // min(self._workers, len(plan))
+        )
+
+        wall0 = time.perf_counter()
+        stats = RenderStats()
+        ctx = mp.get_context("spawn")
+        with (
+            tempfile.TemporaryDirectory(prefix=".segments-", dir=output.parent) as tmp,
+            ctx.Manager() as manager,
+            ProcessPoolExecutor(min(self._workers, len(plan)), mp_context=ctx) as pool,
+        ):
+            progress = manager.dict()
+            control = manager.dict()
+            paths = [
+                str(Path(tmp) / f"{i:04d}{output.suffix}") for i in range(len(plan))
+            ]
+            mixer = AudioMixer(self._project.timeline)
+            audio_path = str(Path(tmp) / f"audio{output.suffix}")
+            # 先に投げて、映像の区間と並べて走らせる
+            audio: Future[float] | None = (
+                pool.submit(
+                    _render_audio,
+                    self._project,
+                    dataclasses.replace(s, output=audio_path),
+                    control,
+                )
+                if s.audio_codec and mixer.has_clips
+                else None
+            )
+            futures: list[Future[dict[str, Any]]] = [
+                pool.submit(
+                    _render_segment,
+                    i,
+                    self._project,
+                    dataclasses.replace(
+                        s,
+                        output=path,
+                        start_ms=a,
+                        end_ms=b,
+                        threads=threads,
+                        codec_threads=min(s.codec_threads, threads),
+                        gop_size=gop,
+                        audio_codec="",
+                    ),
+                    progress,
+                    control,
+                )
+                for i, ((a, b), path) in enumerate(zip(plan, paths))
+            ]
+            total = len(RenderEngine(self._project, s).frame_times())
+            try:
+                pending: set[Future[Any]] = set(futures)
+                if audio is not None:
+                    pending.add(audio)
+                while pending:
+                    done, pending = wait(pending, _PROGRESS_INTERVAL, FIRST_EXCEPTION)
+                    for f in done:
+                        f.result()  # 失敗した区間があればここで送出
+                    if self._stop.is_set():
+                        raise RenderCancelled
+                    if self._progress is not None:
+                        self._progress(sum(d for d, _ in progress.values()), total)
+            except BaseException:
+                control["cancel"] = True
+                for f in futures:
+                    f.cancel()
+                if audio is not None:
+                    audio.cancel()
+                raise
+
+            for f in futures:
+                seg = f.result()
+                stats.frames += seg["frames"]
+                stats.duration_ms += seg["duration_ms"]
+                for name in (
+                    "decode_s",
+                    "wait_s",
+                    "composite_s",
+                    "submit_s",
+                    "finish_s",
+                ):
+                    setattr(stats, name, getattr(stats, name) + seg[name])
+            if audio is not None:
+                stats.audio_s = audio.result()
+
+            t0 = time.perf_counter()
+            ffm.concat_segments(
+                paths, str(output), audio_path if audio is not None else ""
+            )
+            concat_s = time.perf_counter() - t0
+
+        stats.encoder = {
+            "segments": len(plan),
+            "workers": min(self._workers, len(plan)),
+            "threads_per_segment": threads,
+            "gop_size": gop,
+            "concat_s": concat_s,
+            "segment_stats": [f.result()["encoder"] for f in futures],
+        }
+        stats.wall_s = time.perf_counter() - wall0
+        return stats
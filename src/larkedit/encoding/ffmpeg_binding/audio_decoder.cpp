@@ -0,0 +1,245 @@
+#include "audio_decoder.hpp"
+
+#include <algorithm>
+#include <cstring>
+
+extern "C" {
+    #include <libavutil/opt.h>
+    #include <libavutil/version.h>
+}
+
+#define FFMPEG_VERSION_GTE_5 (LIBAVUTIL_VERSION_MAJOR >= 57)
+
+namespace {
+
+inline void throw_if_error(int err, const char* msg) {
+    if (err < 0) {
+        throw std::runtime_error(std::string(msg) + ": " + ff_err2str(err));
+    }
+}
+
+constexpr AVRational kMs{1, 1000};
+
+}  // namespace
+
+// AudioDecoder 本体
+AudioDecoder::AudioDecoder(const std::string& filename, int sample_rate, int channels) {
+    static FFMpegInit _once;
+
+    try {
+        /* --- 入力コンテキスト --- */
+        throw_if_error(avformat_open_input(&_fmt, filename.c_str(), nullptr, nullptr),
+                       "avformat_open_input");
+        throw_if_error(avformat_find_stream_info(_fmt, nullptr), "avformat_find_stream_info");
+
+        _aidx = av_find_best_stream(_fmt, AVMEDIA_TYPE_AUDIO, -1, -1, nullptr, 0);
+        if (_aidx < 0) throw std::runtime_error("audio stream not found");
+        _ast = _fmt->streams[_aidx];
+        // 音声以外のパケットは demux しない
+        for (unsigned i = 0; i < _fmt->nb_streams; ++i) {
+            if (static_cast<int>(i) != _aidx) _fmt->streams[i]->discard = AVDISCARD_ALL;
+        }
+
+        /* --- デコーダ --- */
+        const AVCodec* codec = avcodec_find_decoder(_ast->codecpar->codec_id);
+        if (!codec) throw std::runtime_error("decoder not found");
+        _actx = avcodec_alloc_context3(codec);
+        if (!_actx) throw std::runtime_error("avcodec_alloc_context3 failed");
+        throw_if_error(avcodec_parameters_to_context(_actx, _ast->codecpar),
+                       "avcodec_parameters_to_context");
+        _actx->pkt_timebase = _ast->time_base;
+        throw_if_error(avcodec_open2(_actx, codec, nullptr), "avcodec_open2");
+
+        _start_ts = _ast->start_time != AV_NOPTS_VALUE ? _ast->start_time : 0;
+        _out_rate = sample_rate > 0 ? sample_rate : _actx->sample_rate;
+        _out_ch   = channels > 0 ? channels : source_channels();
+
+        _frame = av_frame_alloc();
+        _pkt   = av_packet_alloc();
+        if (!_frame || !_pkt) throw std::runtime_error("av_frame_alloc / av_packet_alloc failed");
+
+        _init_resampler();
+    } catch (...) {
+        if (_swr) swr_free(&_swr);
+        av_frame_free(&_frame);
+        av_packet_free(&_pkt);
+        if (_actx) avcodec_free_context(&_actx);
+        if (_fmt)  avformat_close_input(&_fmt);
+        throw;
+    }
+}
+
+AudioDecoder::~AudioDecoder() {
+    if (_swr) swr_free(&_swr);
+    av_frame_free(&_frame);
+    av_packet_free(&_pkt);
+    if (_actx) avcodec_free_context(&_actx);
+    if (_fmt)  avformat_close_input(&_fmt);
+}
+
+void AudioDecoder::_init_resampler() {
+    /* Resampler: codec fmt -> FLT (interleaved, 出力レート / チャンネル) */
+#if FFMPEG_VERSION_GTE_5
+    AVChannelLayout in_layout{}, out_layout{};
+    if (_actx->ch_layout.order == AV_CHANNEL_ORDER_UNSPEC) {
+        av_channel_layout_default(&in_layout, _actx->ch_layout.nb_channels);  // WAV などで配置が無い
+    } else {
+        throw_if_error(av_channel_layout_copy(&in_layout, &_actx->ch_layout), "av_channel_layout_copy");
+    }
+    av_channel_layout_default(&out_layout, _out_ch);
+
+    _swr = swr_alloc();
+    if (!_swr) throw std::runtime_error("swr_alloc failed");
+
+    av_opt_set_chlayout(_swr, "in_chlayout", &in_layout, 0);
+    av_opt_set_int(_swr, "in_sample_rate", _actx->sample_rate, 0);
+    av_opt_set_sample_fmt(_swr, "in_sample_fmt", _actx->sample_fmt, 0);
+
+    av_opt_set_chlayout(_swr, "out_chlayout", &out_layout, 0);
+    av_opt_set_int(_swr, "out_sample_rate", _out_rate, 0);
+    av_opt_set_sample_fmt(_swr, "out_sample_fmt", AV_SAMPLE_FMT_FLT, 0);
+    av_channel_layout_uninit(&in_layout);
+    av_channel_layout_uninit(&out_layout);
+#else
+    const int64_t in_layout = _actx->channel_layout
+                                  ? _actx->channel_layout
+                                  : av_get_default_channel_layout(_actx->channels);
+    _swr = swr_alloc_set_opts(
+        nullptr,
+        av_get_default_channel_layout(_out_ch),
+        AV_SAMPLE_FMT_FLT,
+        _out_rate,
+        in_layout,
+        _actx->sample_fmt,
+        _actx->sample_rate,
+        0,
+        nullptr);
+#endif
+    if (!_swr || swr_init(_swr) < 0) {
+        throw std::runtime_error("swr_init failed");
+    }
+}
+
+/* --- */
+
+int AudioDecoder::source_channels() const {
+#if FFMPEG_VERSION_GTE_5
+    return _actx->ch_layout.nb_channels;
+#else
+    return _actx->channels;
+#endif
+}
+
+int64_t AudioDecoder::duration_ms() const {
+    if (_ast->duration != AV_NOPTS_VALUE) return av_rescale_q(_ast->duration, _ast->time_base, kMs);
+    if (_fmt->duration != AV_NOPTS_VALUE) return _fmt->duration / (AV_TIME_BASE / 1000);
+    return -1;
+}
+
+/* --- */
+/* 読み出し */
+/* --- */
+
+int AudioDecoder::read(float* dst, int max_samples) {
+    const size_t ch = static_cast<size_t>(_out_ch);
+    int done = 0;
+    while (done < max_samples) {
+        const size_t avail = (_buf.size() - _head) / ch;
+        if (avail == 0) {
+            _buf.clear();
+            _head = 0;
+            if (!_fill()) break;
+            continue;
+        }
+        const size_t n = std::min(avail, static_cast<size_t>(max_samples - done));
+        std::memcpy(dst + done * ch, _buf.data() + _head, n * ch * sizeof(float));
+        _head += n * ch;
+        done += static_cast<int>(n);
+    }
+    return done;
+}
+
+void AudioDecoder::seek(int64_t ms) {
+    const int64_t target = av_rescale_q(std::max<int64_t>(ms, 0), kMs, _ast->time_base) + _start_ts;
+    throw_if_error(av_seek_frame(_fmt, _aidx, target, AVSEEK_FLAG_BACKWARD), "av_seek_frame");
+    avcodec_flush_buffers(_actx);
+    // 前の位置の遅延サンプルが混ざらないよう作り直す
+    swr_free(&_swr);
+    _init_resampler();
+    _draining = false;
+    _flushed  = false;
+    _buf.clear();
+    _head    = 0;
+    _skip    = 0;
+    _seek_ts = target;
+}
+
+bool AudioDecoder::_fill() {
+    if (_decode_next()) {
+        if (_seek_ts != AV_NOPTS_VALUE) {
+            // seek は直前のパケットに着くので、target までのサンプルを捨てる
+            // (target より後から始まっていたら足りない分を無音で埋める)
+            const int64_t pts = _frame->best_effort_timestamp;
+            if (pts != AV_NOPTS_VALUE) {
+                const int64_t lead = av_rescale_q(_seek_ts - pts, _ast->time_base, AVRational{1, _out_rate});
+                if (lead > 0) {
+                    _skip = lead;
+                } else {
+                    _buf.assign(static_cast<size_t>(-lead) * _out_ch, 0.0f);
+                }
+            }
+            _seek_ts = AV_NOPTS_VALUE;
+        }
+        _append(const_cast<const uint8_t**>(_frame->extended_data), _frame->nb_samples);
+        av_frame_unref(_frame);
+        return true;
+    }
+    if (_flushed) return false;
+    // 終端: swr に残っている分を吐き出す
+    _flushed = true;
+    _append(nullptr, 0);
+    return _buf.size() > _head;
+}
+
+void AudioDecoder::_append(const uint8_t** in, int in_samples) {
+    const int cap = swr_get_out_samples(_swr, in_samples);
+    if (cap <= 0) return;
+    const size_t old = _buf.size();
+    _buf.resize(old + static_cast<size_t>(cap) * _out_ch);
+    uint8_t* out[] = {reinterpret_cast<uint8_t*>(_buf.data() + old)};
+    const int n = swr_convert(_swr, out, cap, in, in_samples);
+    throw_if_error(n, "swr_convert");
+    _buf.resize(old + static_cast<size_t>(n) * _out_ch);
+
+    if (_skip > 0) {
+        const int64_t drop = std::min<int64_t>(_skip, n);
+        _buf.erase(_buf.begin() + old, _buf.begin() + old + drop * _out_ch);
+        _skip -= drop;
+    }
+}
+
+bool AudioDecoder::_decode_next() {
+    while (true) {
+        int ret = avcodec_receive_frame(_actx, _frame);
+        if (ret == 0) return true;
+        if (ret == AVERROR_EOF) return false;
+        if (ret != AVERROR(EAGAIN)) throw_if_error(ret, "avcodec_receive_frame");
+        if (_draining) return false;
+
+        /* --- 次のパケットを送る --- */
+        ret = av_read_frame(_fmt, _pkt);
+        if (ret == AVERROR_EOF) {
+            throw_if_error(avcodec_send_packet(_actx, nullptr), "avcodec_send_packet(flush)");
+            _draining = true;
+            continue;
+        }
+        throw_if_error(ret, "av_read_frame");
+        if (_pkt->stream_index != _aidx) {
+            av_packet_unref(_pkt);
+            continue;
+        }
+        ret = avcodec_send_packet(_actx, _pkt);
+        av_packet_unref(_pkt);
+        if (ret != AVERROR_INVALIDDATA) throw_if_error(ret, "avcodec_send_packet");  // 壊れたパケットは読み飛ばす
+    }
+}
@@ -0,0 +1,57 @@
+#pragma once
+#include <cstdint>
+#include <string>
+#include <vector>
+#include "common.hpp"
+
+extern "C" {
+    #include <libavcodec/avcodec.h>
+    #include <libavformat/avformat.h>
+    #include <libswresample/swresample.h>
+}
+
+// 開いたままにして連続読み出し・シークする音声デコーダ。
+// 出力は常に sample_rate / channels の float32 interleaved (リサンプル・ダウンミックスは swr に任せる)
+class AudioDecoder {
+public:
+    // sample_rate / channels: 出力 (0 = 元のまま)
+    AudioDecoder(const std::string& filename, int sample_rate = 48000, int channels = 2);
+    ~AudioDecoder();
+    AudioDecoder(const AudioDecoder&) = delete;
+    AudioDecoder& operator=(const AudioDecoder&) = delete;
+
+    // 最大 max_samples (チャンネルあたり) を dst (max_samples x channels) に書き、書いた数を返す。
+    // 終端に達すると max_samples より少なくなり、以降は 0
+    int read(float* dst, int max_samples);
+    // 次の read が ms の位置から始まるようにシークする (サンプル単位で合わせる)
+    void seek(int64_t ms);
+
+    int sample_rate() const { return _out_rate; }
+    int channels() const { return _out_ch; }
+    int source_sample_rate() const { return _actx->sample_rate; }
+    int source_channels() const;
+    int64_t duration_ms() const;
+
+private:
+    bool _decode_next();                    // _frame に次のフレームを読む。終端なら false
+    bool _fill();                           // _buf に変換済みサンプルを足す。何も無ければ false
+    void _append(const uint8_t** in, int in_samples);
+    void _init_resampler();
+
+    AVFormatContext* _fmt{nullptr};
+    AVCodecContext* _actx{nullptr};
+    AVStream* _ast{nullptr};
+    SwrContext* _swr{nullptr};
+    AVFrame* _frame{nullptr};
+    AVPacket* _pkt{nullptr};
+    int _aidx{-1};
+    int _out_rate{0}, _out_ch{0};
+    int64_t _start_ts{0};                   // ストリーム先頭の時刻 (time_base)
+    bool _draining{false};                  // EOF を送ってデコーダを吐き出し中
+    bool _flushed{false};                   // swr の残りも吐き出した
+
+    std::vector<float> _buf;                // 変換済みで未読のサンプル (interleaved)
+    size_t _head{0};                        // _buf の読み出し位置 (float 単位)
+    int64_t _seek_ts{AV_NOPTS_VALUE};       // seek 直後: 最初のフレームをここに揃える
+    int64_t _skip{0};                       // 変換結果の先頭から捨てるサンプル数
+};
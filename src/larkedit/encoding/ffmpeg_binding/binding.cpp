@@ -1,31 +1,144 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include <pybind11/numpy.h>
+#include <mutex>
 #include "encoder.hpp"
 #include "compositor.hpp"
+#include "concat.hpp"
 
 namespace py = pybind11;
 
+namespace {
+
+/* --- Python バッファの保持 --- */
+// エンコードスレッドなど GIL を持たないスレッドで最後の参照が落ちた場合は
+// Py_AddPendingCall でメインスレッドに解放を任せる (ワーカーが GIL 待ちで止まらないように)
+std::mutex g_release_mtx;
+std::vector<py::buffer_info*> g_release_list;
+
+int drain_releases(void*) {
+    std::vector<py::buffer_info*> pending;
+    {
+        std::scoped_lock lk(g_release_mtx);
+        pending.swap(g_release_list);
+    }
+    for (auto* bi : pending) delete bi;
+    return 0;
+}
+
+void release_buffer(py::buffer_info* bi) {
+    if (!Py_IsInitialized()) return;  // 終了処理中はリークさせる
+    if (PyGILState_Check()) {
+        delete bi;
+        return;
+    }
+    bool schedule;
+    {
+        std::scoped_lock lk(g_release_mtx);
+        schedule = g_release_list.empty();
+        g_release_list.push_back(bi);
+    }
+    if (schedule && Py_AddPendingCall(&drain_releases, nullptr) != 0) {
+        py::gil_scoped_acquire gil;
+        drain_releases(nullptr);
+    }
+}
+
+bool is_c_contiguous(const py::buffer_info& info) {
+    py::ssize_t expected = info.itemsize;
+    for (py::ssize_t d = info.ndim - 1; d >= 0; --d) {
+        if (info.shape[d] != 1 && info.strides[d] != expected) return false;
+        expected *= info.shape[d];
+    }
+    return true;
+}
+
+// 任意のバッファ (ndarray / bytes / memoryview) を VideoFrame として参照する。
+// C 連続な uint8 列ならコピーせずに保持し、そうでなければ 1 回だけコピーする
+VideoFrame frame_from_buffer(const py::buffer& buf, int width, int height, int64_t pts) {
+    auto info = std::make_unique<py::buffer_info>(buf.request());
+    VideoFrame vf;
+    vf.width  = width;
+    vf.height = height;
+    vf.pts    = pts;
+    if (width <= 0 || height <= 0 || info->itemsize != 1 ||
+        static_cast<size_t>(info->size) != vf.size())
+        throw std::runtime_error("Expected HxWx4 RGBA");
+
+    if (!is_c_contiguous(*info)) {
+        auto contiguous = py::array_t<uint8_t, py::array::c_style | py::array::forcecast>::ensure(buf);
+        if (!contiguous) throw py::error_already_set();
+        return frame_from_buffer(contiguous, width, height, pts);
+    }
+    vf.data     = static_cast<uint8_t*>(info->ptr);
+    vf.readonly = info->readonly;
+    vf.owner    = std::shared_ptr<void>(info.release(), [](void* p) {
+        release_buffer(static_cast<py::buffer_info*>(p));
+    });
+    return vf;
+}
+
+VideoFrame frame_from_array(const py::buffer& arr, int64_t pts) {
+    py::buffer_info shape = arr.request();
+    if (shape.ndim != 3 || shape.shape[2] != 4) throw std::runtime_error("Expected HxWx4 RGBA");
+    return frame_from_buffer(arr, static_cast<int>(shape.shape[1]),
+                             static_cast<int>(shape.shape[0]), pts);
+}
+
+// VideoFrame / ndarray が混在したレイヤ列を参照する (ndarray は一時 VideoFrame でラップ)
+struct LayerRefs {
+    std::vector<VideoFrame> wrapped;
+    std::vector<const VideoFrame*> ptrs;
+
+    explicit LayerRefs(const py::sequence& layers) {
+        wrapped.reserve(layers.size());  // ポインタを安定させる
+        for (py::handle h : layers) {
+            if (py::isinstance<VideoFrame>(h)) {
+                ptrs.push_back(h.cast<const VideoFrame*>());
+            } else {
+                wrapped.push_back(frame_from_array(py::reinterpret_borrow<py::buffer>(h), 0));
+                ptrs.push_back(&wrapped.back());
+            }
+        }
+    }
+};
+
+// MediaEncoder の破棄 (finish を含む) は GIL を手放して行う
+struct ReleaseGilDeleter {
+    void operator()(MediaEncoder* p) const {
+        py::gil_scoped_release no_gil;
+        delete p;
+    }
+};
+
+}  // namespace
+
 PYBIND11_MODULE(encoder, m) {
     m.doc() = "FFmpeg encoder binding for LarkEdit";
 
     /* --- Structs --- */
-    py::class_<VideoFrame>(m, "VideoFrame")
-        .def(py::init([](int width, int height, int64_t pts, py::bytes rgba) {
-            // py::bytesからstd::vector<uint8_t>に変換
-            py::buffer_info info(py::buffer(rgba).request());
-            auto* ptr = static_cast<uint8_t*>(info.ptr);
-            return VideoFrame{
-                width,
-                height,
-                pts,
-                std::vector<uint8_t>(ptr, ptr + info.size)
-            };
-        }))
-        .def_readwrite("width",  &VideoFrame::width)
-        .def_readwrite("height", &VideoFrame::height)
-        .def_readwrite("pts",    &VideoFrame::pts)
-        .def_readwrite("rgba",   &VideoFrame::rgba);
+    // 画素はバッファプロトコルで HxWx4 uint8 として公開する (np.asarray(frame) はコピーしない)
+    py::class_<VideoFrame>(m, "VideoFrame", py::buffer_protocol())
+        .def(py::init([](int width, int height, int64_t pts, const py::buffer& rgba) {
+                return frame_from_buffer(rgba, width, height, pts);
+            }), py::arg("width"), py::arg("height"), py::arg("pts"), py::arg("rgba"))
+        .def(py::init(&frame_from_array), py::arg("rgba"), py::arg("pts")=0)
+        .def_buffer([](VideoFrame& f) -> py::buffer_info {
+            return py::buffer_info(
+                f.data, 1, py::format_descriptor<uint8_t>::format(), 3,
+                {f.height, f.width, 4},
+                {static_cast<py::ssize_t>(f.width) * 4, py::ssize_t{4}, py::ssize_t{1}},
+                f.readonly);
+        })
+        .def_readonly("width",  &VideoFrame::width)
+        .def_readonly("height", &VideoFrame::height)
+        .def_readwrite("pts",   &VideoFrame::pts)
+        .def_readwrite("premultiplied", &VideoFrame::premultiplied)
+        .def_readonly("readonly", &VideoFrame::readonly)
+        .def_property_readonly("rgba", [](py::object self) {
+            // self を base にした ndarray ビュー
+            return py::array::ensure(self);
+        });
 
     py::class_<AudioSamples>(m, "AudioSamples")
         .def(py::init<int64_t, std::vector<float>>())
@@ -33,35 +146,99 @@ PYBIND11_MODULE(encoder, m) {
         .def_readwrite("pcm",  &AudioSamples::pcm);
 
     /* --- Compositor --- */
+    // レイヤは VideoFrame でも HxWx4 の ndarray でもよく、どちらもコピーしない
     py::class_<Compositor>(m, "Compositor")
-        .def(py::init<int,int>())
-        .def("compose", &Compositor::compose);
+        .def(py::init<int,int,int>(),
+             py::arg("canvas_width"), py::arg("canvas_height"), py::arg("threads")=0)
+        .def("compose", [](Compositor& self, const py::sequence& layers) {
+                LayerRefs refs(layers);
+                py::gil_scoped_release no_gil;
+                return self.compose(refs.ptrs);
+            }, py::arg("layers"))
+        .def("compose_into", [](Compositor& self, const py::sequence& layers, py::object out) {
+                LayerRefs refs(layers);
+                if (py::isinstance<VideoFrame>(out)) {
+                    VideoFrame& dst = out.cast<VideoFrame&>();
+                    py::gil_scoped_release no_gil;
+                    self.compose_into(refs.ptrs, dst);
+                } else {
+                    VideoFrame dst = frame_from_array(py::reinterpret_borrow<py::buffer>(out), 0);
+                    py::gil_scoped_release no_gil;
+                    self.compose_into(refs.ptrs, dst);
+                }
+            }, py::arg("layers"), py::arg("out"))
+        .def("compose_reference", [](Compositor& self, const py::sequence& layers) {
+                LayerRefs refs(layers);
+                py::gil_scoped_release no_gil;
+                return self.compose_reference(refs.ptrs);
+            }, py::arg("layers"))
+        .def_property_readonly("threads", &Compositor::threads);
 
     /* --- MediaEncoder --- */
-    py::class_<MediaEncoder>(m, "MediaEncoder")
+    py::class_<MediaEncoder, std::unique_ptr<MediaEncoder, ReleaseGilDeleter>>(m, "MediaEncoder")
         .def(py::init<const std::string&,int,int,int,int,int,
-                      const std::string&,const std::string&, size_t>(),
+                      const std::string&,const std::string&, size_t,
+                      int,const std::string&,int, size_t, int,
+                      const std::string&, int64_t, const std::map<std::string, std::string>&>(),
              py::arg("filename"), py::arg("width"), py::arg("height"), py::arg("fps"),
              py::arg("sample_rate")=48000, py::arg("channels")=2,
              py::arg("video_codec")="libx264", py::arg("audio_codec")="aac",
-             py::arg("queue_cap")=32)
+             py::arg("queue_cap")=32,
+             py::arg("threads")=0, py::arg("thread_type")="frame+slice",
+             py::arg("convert_threads")=0, py::arg("audio_queue_cap")=64,
+             py::arg("gop_size")=0, py::arg("pix_fmt")="yuv420p",
+             py::arg("bit_rate")=4'000'000,
+             py::arg("codec_options")=std::map<std::string, std::string>{})
         .def("start", &MediaEncoder::start)
-        .def("submit_video", [](MediaEncoder& self, py::array_t<uint8_t, py::array::c_style> arr, int64_t pts){
+        // 積んだ画素はエンコード完了まで参照され続ける (呼び出し側は書き換えないこと)
+        .def("submit_video", [](MediaEncoder& self, const VideoFrame& frame){
+                VideoFrame vf = frame;
                 py::gil_scoped_release no_gil;
-                if (arr.ndim()!=3 || arr.shape(2)!=4)
-                    throw std::runtime_error("Expected HxWx4 RGBA");
-                VideoFrame vf{
-                    static_cast<int>(arr.shape(1)),
-                    static_cast<int>(arr.shape(0)),
-                    pts,
-                    std::vector<uint8_t>(arr.data(), arr.data()+arr.size())
-                };
-                self.submit_video(vf);
-            })
+                self.submit_video(std::move(vf));
+            }, py::arg("frame"))
+        .def("submit_video", [](MediaEncoder& self, const py::buffer& rgba, int64_t pts){
+                VideoFrame vf = frame_from_array(rgba, pts);
+                py::gil_scoped_release no_gil;
+                self.submit_video(std::move(vf));
+            }, py::arg("rgba"), py::arg("pts"))
         .def("submit_audio", [](MediaEncoder& self, py::array_t<float, py::array::c_style> arr, int64_t pts){
                 py::gil_scoped_release no_gil;
                 AudioSamples as{pts, std::vector<float>(arr.data(), arr.data()+arr.size())};
-                self.submit_audio(as);
-            })
-        .def("finish", &MediaEncoder::finish);
+                self.submit_audio(std::move(as));
+            }, py::arg("pcm"), py::arg("pts"))
+        .def("finish", &MediaEncoder::finish, py::call_guard<py::gil_scoped_release>())
+        // 書き込み用フレームをプールから借りる (Compositor.compose_into の out に使う)
+        .def("acquire_frame", &MediaEncoder::acquire_frame, py::arg("pts")=0)
+        .def("stats", [](const MediaEncoder& self) {
+                const EncoderStats s = self.stats();
+                py::dict pool;
+                pool["hits"]      = s.frame_pool.hits;
+                pool["misses"]    = s.frame_pool.misses;
+                pool["overflows"] = s.frame_pool.overflows;
+                pool["slots"]     = s.frame_pool.slots;
+                pool["in_use"]    = s.frame_pool.in_use;
+                const uint64_t total = s.frame_pool.hits + s.frame_pool.misses + s.frame_pool.overflows;
+                pool["hit_rate"]  = total ? static_cast<double>(s.frame_pool.hits) / total : 0.0;
+                py::dict d;
+                d["frame_pool"]     = pool;
+                d["video_frames"]   = s.video_frames;
+                d["audio_frames"]   = s.audio_frames;
+                d["packets"]        = s.packets;
+                d["yuv_reallocs"]   = s.yuv_reallocs;
+                d["audio_reallocs"] = s.audio_reallocs;
+                d["convert_ms"]      = s.convert_ms;
+                d["encode_ms"]       = s.encode_ms;
+                d["audio_encode_ms"] = s.audio_encode_ms;
+                d["video_queue"]     = s.video_queue;
+                d["audio_queue"]     = s.audio_queue;
+                d["convert_threads"] = s.convert_threads;
+                d["codec_threads"]   = s.codec_threads;
+                return d;
+            });
+
+    /* --- 区間書き出しの連結 --- */
+    m.def("concat_segments", &concat_segments,
+          py::arg("inputs"), py::arg("output"), py::arg("audio")="",
+          py::call_guard<py::gil_scoped_release>(),
+          "Join segments encoded with identical settings without re-encoding");
 }
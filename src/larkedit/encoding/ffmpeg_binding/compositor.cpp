@@ -1,17 +1,149 @@
 #include "compositor.hpp"
 #include <algorithm>
+#include <cstring>
+#include <stdexcept>
 
-Compositor::Compositor(int w, int h) : _w(w), _h(h) {}
-VideoFrame Compositor::compose(const std::vector<VideoFrame>& layers) {
-    VideoFrame result{_w, _h, layers.empty() ? 0 : layers[0].pts, std::vector<uint8_t>(_w*_h*4, 0)};
-    // αブレンド (premultiplied αは省略/最適化余地大)
-    for (const auto& l : layers) {
-        for (size_t i = 0; i < result.rgba.size(); i += 4) {
-            float a = l.rgba[i+3] / 255.f;
-            result.rgba[i+0] = static_cast<uint8_t>(l.rgba[i+0]*a + result.rgba[i+0]*(1-a));
-            result.rgba[i+1] = static_cast<uint8_t>(l.rgba[i+1]*a + result.rgba[i+1]*(1-a));
-            result.rgba[i+2] = static_cast<uint8_t>(l.rgba[i+2]*a + result.rgba[i+2]*(1-a));
-            result.rgba[i+3] = 255;
+#if defined(__SSE2__) || defined(_M_X64) || (defined(_M_IX86_FP) && _M_IX86_FP >= 2)
+    #include <emmintrin.h>
+    #define LARK_HAVE_SSE2 1
+#else
+    #define LARK_HAVE_SSE2 0
+#endif
+
+namespace {
+
+constexpr int kBandMinRows = 16;          // これより細い帯は作らない
+constexpr size_t kParallelMinPixels = 1u << 16;  // 小さいキャンバスは単スレッド
+
+// x / 255 を丸め込みで厳密に求める (x <= 255*255)
+inline uint32_t div255(uint32_t x) {
+    x += 128;
+    return (x + (x >> 8)) >> 8;
+}
+
+/* --- スカラー版 (端数ピクセル・非 x86 用) --- */
+inline void over_pixel(uint8_t* d, const uint8_t* s, bool straight) {
+    const uint32_t a = s[3];
+    if (a == 0) return;
+    if (a == 255) { std::memcpy(d, s, 4); return; }
+    const uint32_t ia = 255 - a;
+    for (int c = 0; c < 3; ++c) {
+        const uint32_t sc = straight ? div255(s[c] * a) : s[c];
+        d[c] = static_cast<uint8_t>(sc + div255(d[c] * ia));
+    }
+    d[3] = static_cast<uint8_t>(a + div255(d[3] * ia));
+}
+
+#if LARK_HAVE_SSE2
+inline __m128i div255_epi16(__m128i x) {
+    x = _mm_add_epi16(x, _mm_set1_epi16(128));
+    return _mm_srli_epi16(_mm_add_epi16(x, _mm_srli_epi16(x, 8)), 8);
+}
+
+// 2 ピクセル分 (16bit x 8 レーン) の over 演算
+inline __m128i over_epi16(__m128i s, __m128i d, bool straight) {
+    const __m128i c255 = _mm_set1_epi16(255);
+    const __m128i a = _mm_shufflehi_epi16(_mm_shufflelo_epi16(s, 0xFF), 0xFF);
+    if (straight) {
+        // α レーンには 255 を掛けて値を保つ
+        const __m128i amask = _mm_set_epi16(-1, 0, 0, 0, -1, 0, 0, 0);
+        const __m128i m = _mm_or_si128(_mm_andnot_si128(amask, a), _mm_and_si128(amask, c255));
+        s = div255_epi16(_mm_mullo_epi16(s, m));
+    }
+    return _mm_add_epi16(s, div255_epi16(_mm_mullo_epi16(d, _mm_sub_epi16(c255, a))));
+}
+#endif
+
+// n ピクセルの src を dst (乗算済み) に重ねる
+void blend_span(uint8_t* dst, const uint8_t* src, size_t n, bool straight) {
+    size_t i = 0;
+#if LARK_HAVE_SSE2
+    const __m128i zero = _mm_setzero_si128();
+    const __m128i amask = _mm_set1_epi32(static_cast<int>(0xFF000000u));
+    for (; i + 4 <= n; i += 4) {
+        const __m128i s = _mm_loadu_si128(reinterpret_cast<const __m128i*>(src + i * 4));
+        const __m128i sa = _mm_and_si128(s, amask);
+        if (_mm_movemask_epi8(_mm_cmpeq_epi32(sa, zero)) == 0xFFFF) continue;  // 完全透明
+        if (_mm_movemask_epi8(_mm_cmpeq_epi32(sa, amask)) == 0xFFFF) {          // 完全不透明
+            _mm_storeu_si128(reinterpret_cast<__m128i*>(dst + i * 4), s);
+            continue;
+        }
+        const __m128i d = _mm_loadu_si128(reinterpret_cast<const __m128i*>(dst + i * 4));
+        const __m128i lo = over_epi16(_mm_unpacklo_epi8(s, zero), _mm_unpacklo_epi8(d, zero), straight);
+        const __m128i hi = over_epi16(_mm_unpackhi_epi8(s, zero), _mm_unpackhi_epi8(d, zero), straight);
+        _mm_storeu_si128(reinterpret_cast<__m128i*>(dst + i * 4), _mm_packus_epi16(lo, hi));
+    }
+#endif
+    for (; i < n; ++i) over_pixel(dst + i * 4, src + i * 4, straight);
+}
+
+}  // namespace
+
+Compositor::Compositor(int w, int h, int threads)
+    : _w(w), _h(h), _pool(std::make_unique<ThreadPool>(static_cast<unsigned>(std::max(threads, 0)))) {
+    if (w <= 0 || h <= 0) throw std::runtime_error("Compositor: invalid canvas size");
+}
+
+VideoFrame Compositor::compose(const std::vector<const VideoFrame*>& layers) {
+    VideoFrame result = VideoFrame::allocate(_w, _h);
+    compose_into(layers, result);
+    return result;
+}
+
+void Compositor::compose_into(const std::vector<const VideoFrame*>& layers, VideoFrame& dst) {
+    const size_t pixels = static_cast<size_t>(_w) * _h;
+    for (const VideoFrame* l : layers) {
+        if (!l || !l->data || l->width != _w || l->height != _h)
+            throw std::runtime_error("Layer size must match canvas (HxWx4 RGBA)");
+        if (l->data == dst.data) throw std::runtime_error("Destination frame must not be a layer");
+    }
+    if (!dst.data) {
+        dst = VideoFrame::allocate(_w, _h);
+    } else if (dst.width != _w || dst.height != _h) {
+        throw std::runtime_error("Destination size must match canvas (HxWx4 RGBA)");
+    } else if (dst.readonly) {
+        throw std::runtime_error("Destination frame is read-only");
+    }
+    dst.pts = layers.empty() ? 0 : layers[0]->pts;
+    dst.premultiplied = true;
+
+    // キャンバスを行帯に分け、帯ごとに全レイヤを重ねる (帯がキャッシュに乗ったまま処理できる)
+    const size_t workers = pixels < kParallelMinPixels ? 1 : _pool->size();
+    const int bands = std::max(1, std::min<int>(static_cast<int>(workers) * 2, _h / kBandMinRows));
+    const int rows_per_band = (_h + bands - 1) / bands;
+
+    auto run_band = [&](size_t b) {
+        const int y0 = static_cast<int>(b) * rows_per_band;
+        const int y1 = std::min(_h, y0 + rows_per_band);
+        if (y0 >= y1) return;
+        const size_t off = static_cast<size_t>(y0) * _w * 4;
+        const size_t n   = static_cast<size_t>(y1 - y0) * _w;
+        uint8_t* out = dst.data + off;
+        std::memset(out, 0, n * 4);
+        for (const VideoFrame* l : layers)
+            blend_span(out, l->data + off, n, !l->premultiplied);
+    };
+    if (workers == 1) {
+        for (int b = 0; b < bands; ++b) run_band(static_cast<size_t>(b));
+    } else {
+        _pool->parallel_for(static_cast<size_t>(bands), run_band);
+    }
+}
+
+VideoFrame Compositor::compose_reference(const std::vector<const VideoFrame*>& layers) const {
+    VideoFrame result = VideoFrame::allocate(_w, _h, layers.empty() ? 0 : layers[0]->pts);
+    uint8_t* out = result.data;
+    std::memset(out, 0, result.size());
+    for (const VideoFrame* l : layers) {
+        if (!l || !l->data || l->width != _w || l->height != _h)
+            throw std::runtime_error("Layer size must match canvas (HxWx4 RGBA)");
+        const uint8_t* in = l->data;
+        for (size_t i = 0; i < result.size(); i += 4) {
+            float a = in[i+3] / 255.f;
+            out[i+0] = static_cast<uint8_t>(in[i+0]*a + out[i+0]*(1-a));
+            out[i+1] = static_cast<uint8_t>(in[i+1]*a + out[i+1]*(1-a));
+            out[i+2] = static_cast<uint8_t>(in[i+2]*a + out[i+2]*(1-a));
+            out[i+3] = 255;
         }
     }
     return result;
@@ -1,16 +1,48 @@
 #pragma once
 #include <vector>
 #include <cstdint>
+#include <memory>
+#include "thread_pool.hpp"
+
+// RGBA フレームへの参照。画素は owner が保持し、コピーしても共有される
 struct VideoFrame {
-    int width, height;
-    int64_t pts;                 // ミリ秒
-    std::vector<uint8_t> rgba;   // RGBA 実フレーム
+    int width{0}, height{0};
+    int64_t pts{0};                 // ミリ秒
+    uint8_t* data{nullptr};         // RGBA 実フレーム (height x width x 4, 連続)
+    std::shared_ptr<void> owner;    // data の所有者 (自前確保 / numpy 配列など)
+    bool premultiplied{false};      // data が乗算済み α か (Compositor の出力は true)
+    bool readonly{false};           // bytes などを参照している場合
+
+    size_t size() const { return static_cast<size_t>(width) * height * 4; }
+
+    // 未初期化の画素バッファを確保する
+    static VideoFrame allocate(int w, int h, int64_t pts = 0) {
+        VideoFrame f;
+        f.width  = w;
+        f.height = h;
+        f.pts    = pts;
+        std::shared_ptr<uint8_t[]> buf(new uint8_t[f.size()]);
+        f.data  = buf.get();
+        f.owner = std::move(buf);
+        return f;
+    }
 };
 
 class Compositor {
 public:
-    Compositor(int canvas_w, int canvas_h);
-    VideoFrame compose(const std::vector<VideoFrame>& layers); // 上から順にブレンド
+    // threads: 帯分割に使うスレッド数 (0 = ハードウェア並列数)
+    Compositor(int canvas_w, int canvas_h, int threads = 0);
+
+    // 先頭が最背面。結果は乗算済み α の RGBA
+    VideoFrame compose(const std::vector<const VideoFrame*>& layers);
+    // dst のバッファを再利用して合成する (容量が足りれば再確保しない)
+    void compose_into(const std::vector<const VideoFrame*>& layers, VideoFrame& dst);
+    // 旧来のスカラー float 実装 (ベンチマーク・比較用)
+    VideoFrame compose_reference(const std::vector<const VideoFrame*>& layers) const;
+
+    int threads() const { return static_cast<int>(_pool->size()); }
+
 private:
     int _w, _h;
+    std::unique_ptr<ThreadPool> _pool;
 };
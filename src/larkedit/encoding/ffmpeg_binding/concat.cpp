@@ -0,0 +1,188 @@
+#include "concat.hpp"
+
+#include <algorithm>
+#include <memory>
+#include "common.hpp"
+
+extern "C" {
+    #include <libavcodec/avcodec.h>
+    #include <libavformat/avformat.h>
+    #include <libavutil/mathematics.h>
+}
+
+namespace {
+
+inline void throw_if_error(int err, const char* msg) {
+    if (err < 0) {
+        throw std::runtime_error(std::string(msg) + ": " + ff_err2str(err));
+    }
+}
+
+struct InputCloser {
+    void operator()(AVFormatContext* ic) const { avformat_close_input(&ic); }
+};
+
+struct OutputCloser {
+    void operator()(AVFormatContext* oc) const {
+        if (!(oc->oformat->flags & AVFMT_NOFILE) && oc->pb) avio_closep(&oc->pb);
+        avformat_free_context(oc);
+    }
+};
+
+struct PacketFreer {
+    void operator()(AVPacket* p) const { av_packet_free(&p); }
+};
+
+using InputPtr  = std::unique_ptr<AVFormatContext, InputCloser>;
+using OutputPtr = std::unique_ptr<AVFormatContext, OutputCloser>;
+
+InputPtr open_input(const std::string& filename) {
+    AVFormatContext* ic = nullptr;
+    throw_if_error(avformat_open_input(&ic, filename.c_str(), nullptr, nullptr),
+                   "avformat_open_input");
+    InputPtr guard(ic);
+    throw_if_error(avformat_find_stream_info(ic, nullptr), "avformat_find_stream_info");
+    return guard;
+}
+
+AVStream* copy_stream(AVFormatContext* oc, const AVStream* ist) {
+    AVStream* ost = avformat_new_stream(oc, nullptr);
+    if (!ost) throw std::runtime_error("avformat_new_stream failed");
+    throw_if_error(avcodec_parameters_copy(ost->codecpar, ist->codecpar),
+                   "avcodec_parameters_copy");
+    ost->codecpar->codec_tag = 0;  // コンテナが違っても通るように
+    ost->time_base = ist->time_base;
+    ost->avg_frame_rate = ist->avg_frame_rate;
+    return ost;
+}
+
+// 連結できるか (再エンコードしないのでパラメータが同じでなければならない)
+void check_compatible(const AVCodecParameters* a, const AVCodecParameters* b,
+                      const std::string& filename) {
+    const bool same = a->codec_type == b->codec_type && a->codec_id == b->codec_id &&
+                      a->width == b->width && a->height == b->height &&
+                      a->format == b->format && a->sample_rate == b->sample_rate;
+    if (!same) {
+        throw std::runtime_error("concat_segments: stream parameters differ in '" + filename + "'");
+    }
+}
+
+}  // namespace
+
+void concat_segments(const std::vector<std::string>& inputs, const std::string& output,
+                     const std::string& audio) {
+    if (inputs.empty()) throw std::runtime_error("concat_segments: no inputs");
+    static FFMpegInit _once;
+
+    AVFormatContext* raw = nullptr;
+    throw_if_error(avformat_alloc_output_context2(&raw, nullptr, nullptr, output.c_str()),
+                   "avformat_alloc_output_context2");
+    OutputPtr oc(raw);
+    std::unique_ptr<AVPacket, PacketFreer> pkt(av_packet_alloc());
+    std::unique_ptr<AVPacket, PacketFreer> apkt(av_packet_alloc());
+    if (!pkt || !apkt) throw std::runtime_error("av_packet_alloc failed");
+
+    // 区間のストリームごとの終端 (pts + duration, AV_TIME_BASE)。次の入力はこの最大値から始める
+    std::vector<int64_t> stream_end;
+    int64_t offset = 0;
+
+    // audio の音声ストリームは区間のストリームの後ろに足す
+    InputPtr ac = audio.empty() ? nullptr : open_input(audio);
+    std::vector<int> audio_map;  // ac のストリーム → 出力ストリーム (音声以外は -1)
+    bool audio_held = false;     // apkt に読んだがまだ書いていない
+
+    // audio のパケットを limit (AV_TIME_BASE) までの分だけ書く (区間のパケットと交互に並べる)
+    auto write_audio = [&](int64_t limit) {
+        while (ac) {
+            if (!audio_held) {
+                const int ret = av_read_frame(ac.get(), apkt.get());
+                if (ret == AVERROR_EOF) {
+                    ac.reset();
+                    break;
+                }
+                throw_if_error(ret, "av_read_frame(audio)");
+                if (audio_map[apkt->stream_index] < 0) {
+                    av_packet_unref(apkt.get());
+                    continue;
+                }
+                audio_held = true;
+            }
+            const AVStream* ist = ac->streams[apkt->stream_index];
+            const int64_t ts = apkt->dts != AV_NOPTS_VALUE ? apkt->dts : apkt->pts;
+            if (ts != AV_NOPTS_VALUE &&
+                av_rescale_q(ts, ist->time_base, av_get_time_base_q()) > limit) {
+                break;
+            }
+            const AVStream* ost = oc->streams[audio_map[apkt->stream_index]];
+            av_packet_rescale_ts(apkt.get(), ist->time_base, ost->time_base);
+            apkt->stream_index = ost->index;
+            apkt->pos = -1;
+            audio_held = false;
+            throw_if_error(av_interleaved_write_frame(oc.get(), apkt.get()),
+                           "av_interleaved_write_frame(audio)");
+        }
+    };
+
+    for (size_t i = 0; i < inputs.size(); ++i) {
+        InputPtr ic = open_input(inputs[i]);
+
+        /* --- 出力ストリームは最初の入力 (と audio の音声) からコピー --- */
+        if (i == 0) {
+            for (unsigned s = 0; s < ic->nb_streams; ++s) copy_stream(oc.get(), ic->streams[s]);
+            stream_end.assign(ic->nb_streams, 0);
+            if (ac) {
+                for (unsigned s = 0; s < ac->nb_streams; ++s) {
+                    const AVStream* ist = ac->streams[s];
+                    audio_map.push_back(ist->codecpar->codec_type == AVMEDIA_TYPE_AUDIO
+                                            ? copy_stream(oc.get(), ist)->index
+                                            : -1);
+                }
+            }
+            if (!(oc->oformat->flags & AVFMT_NOFILE)) {
+                throw_if_error(avio_open(&oc->pb, output.c_str(), AVIO_FLAG_WRITE), "avio_open");
+            }
+            throw_if_error(avformat_write_header(oc.get(), nullptr), "avformat_write_header");
+        } else {
+            if (ic->nb_streams != stream_end.size()) {
+                throw std::runtime_error("concat_segments: stream count differs in '" + inputs[i] + "'");
+            }
+            for (unsigned s = 0; s < ic->nb_streams; ++s) {
+                check_compatible(oc->streams[s]->codecpar, ic->streams[s]->codecpar, inputs[i]);
+            }
+            offset = *std::max_element(stream_end.begin(), stream_end.end());
+        }
+
+        /* --- パケットを時刻だけずらして書き出す --- */
+        while (true) {
+            int ret = av_read_frame(ic.get(), pkt.get());
+            if (ret == AVERROR_EOF) break;
+            throw_if_error(ret, "av_read_frame");
+
+            const int s = pkt->stream_index;
+            AVStream* ist = ic->streams[s];
+            AVStream* ost = oc->streams[s];
+            // 入力ごとの開始時刻を 0 に揃えてから offset を足す
+            const int64_t start = ist->start_time != AV_NOPTS_VALUE ? ist->start_time : 0;
+            const int64_t shift = av_rescale_q(offset, av_get_time_base_q(), ist->time_base) - start;
+            if (pkt->pts != AV_NOPTS_VALUE) pkt->pts += shift;
+            if (pkt->dts != AV_NOPTS_VALUE) pkt->dts += shift;
+
+            const int64_t ts = pkt->pts != AV_NOPTS_VALUE ? pkt->pts : pkt->dts;
+            if (ts != AV_NOPTS_VALUE) {
+                const int64_t end = av_rescale_q(ts + pkt->duration, ist->time_base, av_get_time_base_q());
+                stream_end[s] = std::max(stream_end[s], end);
+            }
+            if (pkt->dts != AV_NOPTS_VALUE) {
+                write_audio(av_rescale_q(pkt->dts, ist->time_base, av_get_time_base_q()));
+            }
+
+            av_packet_rescale_ts(pkt.get(), ist->time_base, ost->time_base);
+            pkt->pos = -1;
+            throw_if_error(av_interleaved_write_frame(oc.get(), pkt.get()),
+                           "av_interleaved_write_frame");  // pkt は unref される
+        }
+    }
+
+    write_audio(INT64_MAX);  // 映像より長い分
+    throw_if_error(av_write_trailer(oc.get()), "av_write_trailer");
+}
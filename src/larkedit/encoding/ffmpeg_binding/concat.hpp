@@ -0,0 +1,11 @@
+#pragma once
+#include <string>
+#include <vector>
+
+// 同じ設定でエンコードしたファイルを再エンコードせずに連結する (stream copy)。
+// 各入力は先頭がキーフレームで、ストリーム構成とコーデックパラメータが一致していること。
+// 各入力の時刻は前の入力の終端から続くようにずらす。
+// audio を渡すとその音声ストリームを時刻を変えずに加える (区間とは別に一度で書き出した音声。
+// 区間ごとに AAC などをエンコードすると境界ごとにプライミングが入ってずれていくため)。
+void concat_segments(const std::vector<std::string>& inputs, const std::string& output,
+                     const std::string& audio = "");
@@ -0,0 +1,245 @@
+#include "decoder.hpp"
+
+#include <algorithm>
+#include <cstring>
+
+namespace {
+
+inline void throw_if_error(int err, const char* msg) {
+    if (err < 0) {
+        throw std::runtime_error(std::string(msg) + ": " + ff_err2str(err));
+    }
+}
+
+constexpr AVRational kMs{1, 1000};
+
+}  // namespace
+
+// MediaDecoder 本体
+MediaDecoder::MediaDecoder(const std::string& filename, int width, int height, bool fit, int threads,
+                           bool use_index)
+    : _filename(filename), _use_index(use_index) {
+    static FFMpegInit _once;
+
+    try {
+        /* --- 入力コンテキスト --- */
+        throw_if_error(avformat_open_input(&_fmt, filename.c_str(), nullptr, nullptr),
+                       "avformat_open_input");
+        throw_if_error(avformat_find_stream_info(_fmt, nullptr), "avformat_find_stream_info");
+
+        _vidx = av_find_best_stream(_fmt, AVMEDIA_TYPE_VIDEO, -1, -1, nullptr, 0);
+        if (_vidx < 0) throw std::runtime_error("video stream not found");
+        _vst = _fmt->streams[_vidx];
+        // 映像以外のパケットは demux しない
+        for (unsigned i = 0; i < _fmt->nb_streams; ++i) {
+            if (static_cast<int>(i) != _vidx) _fmt->streams[i]->discard = AVDISCARD_ALL;
+        }
+
+        /* --- デコーダ --- */
+        const AVCodec* codec = avcodec_find_decoder(_vst->codecpar->codec_id);
+        if (!codec) throw std::runtime_error("decoder not found");
+        _vctx = avcodec_alloc_context3(codec);
+        if (!_vctx) throw std::runtime_error("avcodec_alloc_context3 failed");
+        throw_if_error(avcodec_parameters_to_context(_vctx, _vst->codecpar),
+                       "avcodec_parameters_to_context");
+        _vctx->pkt_timebase = _vst->time_base;
+        _vctx->thread_count = threads;  // 0 = コア数
+        _vctx->thread_type  = FF_THREAD_FRAME | FF_THREAD_SLICE;
+        throw_if_error(avcodec_open2(_vctx, codec, nullptr), "avcodec_open2");
+
+        _start_ts = _vst->start_time != AV_NOPTS_VALUE ? _vst->start_time : 0;
+        const AVRational fr = _vst->avg_frame_rate.num ? _vst->avg_frame_rate : _vst->r_frame_rate;
+        if (fr.num > 0 && fr.den > 0) _frame_dur = av_rescale_q(1, av_inv_q(fr), _vst->time_base);
+
+        _frame = av_frame_alloc();
+        _pkt   = av_packet_alloc();
+        if (!_frame || !_pkt) throw std::runtime_error("av_frame_alloc / av_packet_alloc failed");
+    } catch (...) {
+        av_frame_free(&_frame);
+        av_packet_free(&_pkt);
+        if (_vctx) avcodec_free_context(&_vctx);
+        if (_fmt)  avformat_close_input(&_fmt);
+        throw;
+    }
+
+    set_output_size(width, height, fit);
+}
+
+MediaDecoder::~MediaDecoder() {
+    if (_sws) sws_freeContext(_sws);
+    av_frame_free(&_frame);
+    av_packet_free(&_pkt);
+    if (_vctx) avcodec_free_context(&_vctx);
+    if (_fmt)  avformat_close_input(&_fmt);
+}
+
+/* --- */
+
+void MediaDecoder::set_output_size(int width, int height, bool fit) {
+    if (width < 0 || height < 0) throw std::runtime_error("Output size must be >= 0");
+    _out_w = width  > 0 ? width  : _vctx->width;
+    _out_h = height > 0 ? height : _vctx->height;
+    _fit   = fit;
+}
+
+double MediaDecoder::fps() const {
+    const AVRational fr = _vst->avg_frame_rate.num ? _vst->avg_frame_rate : _vst->r_frame_rate;
+    return fr.num && fr.den ? av_q2d(fr) : 0.0;
+}
+
+int64_t MediaDecoder::duration_ms() const {
+    if (_vst->duration != AV_NOPTS_VALUE) return av_rescale_q(_vst->duration, _vst->time_base, kMs);
+    if (_fmt->duration != AV_NOPTS_VALUE) return _fmt->duration / (AV_TIME_BASE / 1000);
+    return -1;
+}
+
+int64_t MediaDecoder::_to_ms(int64_t ts) const {
+    return av_rescale_q(ts - _start_ts, _vst->time_base, kMs);
+}
+
+int64_t MediaDecoder::_to_ts(int64_t ms) const {
+    return av_rescale_q(ms, kMs, _vst->time_base) + _start_ts;
+}
+
+/* --- */
+/* 読み出し */
+/* --- */
+
+bool MediaDecoder::read_frame(uint8_t* dst, int64_t& pts_ms) {
+    if (_pending) {
+        _pending = false;
+    } else if (!_decode_next()) {
+        return false;
+    }
+    pts_ms = _to_ms(_frame->best_effort_timestamp);
+    _convert(dst);
+    return true;
+}
+
+void MediaDecoder::seek(int64_t ms, bool exact) {
+    const int64_t target = _to_ts(std::max<int64_t>(ms, 0));
+    // target を表示しているフレームか (シーク直後は target より後の最初のフレームも採る)
+    auto covers = [&](int64_t pts) {
+        return !exact || pts == AV_NOPTS_VALUE || pts >= target || pts + _frame_dur > target;
+    };
+
+    /* --- 前進で届くか: 現フレームより先で、間にキーフレームが無い --- */
+    // キーフレームでよいならコンテナの索引でシークするだけで済む (ファイル全体を読む索引は作らない)
+    const KeyframeIndex* index = exact ? _keyframes() : nullptr;
+    const bool forward = exact && index && _pos_ts != AV_NOPTS_VALUE &&
+                         _pos_ts + std::max<int64_t>(_frame_dur, 1) <= target &&
+                         !index->has_keyframe_between(_pos_ts, target);
+
+    if (forward) {
+        if (_pending && covers(_pos_ts)) return;
+        _pending = false;
+    } else {
+        /* --- 直前のキーフレームへ --- */
+        const KeyframeIndex::Entry* kf = index ? index->at_or_before(target) : nullptr;
+        throw_if_error(av_seek_frame(_fmt, _vidx, kf ? kf->dts : target, AVSEEK_FLAG_BACKWARD),
+                       "av_seek_frame");
+        avcodec_flush_buffers(_vctx);
+        _draining = false;
+        _pending  = false;
+        _pos_ts   = AV_NOPTS_VALUE;
+    }
+
+    /* --- target を含むフレームまで前進 (変換はしない) --- */
+    while (_decode_next()) {
+        if (covers(_pos_ts)) {
+            _pending = true;
+            return;
+        }
+    }
+    // 終端を越えた: 次の read_frame は false を返す
+}
+
+int64_t MediaDecoder::keyframe_before(int64_t ms) {
+    const KeyframeIndex* index = _keyframes();
+    if (!index) return -1;
+    const KeyframeIndex::Entry* kf = index->at_or_before(_to_ts(std::max<int64_t>(ms, 0)));
+    return kf ? _to_ms(kf->pts) : 0;
+}
+
+const KeyframeIndex* MediaDecoder::_keyframes() {
+    if (!_index && !_index_tried) {
+        _index_tried = true;
+        auto idx = KeyframeIndex::get(_filename, _use_index);
+        if (idx && idx->stream_index == _vidx) _index = std::move(idx);
+    }
+    return _index.get();
+}
+
+bool MediaDecoder::_decode_next() {
+    while (true) {
+        int ret = avcodec_receive_frame(_vctx, _frame);
+        if (ret == 0) {
+            _pos_ts = _frame->best_effort_timestamp;
+            return true;
+        }
+        if (ret == AVERROR_EOF) return false;
+        if (ret != AVERROR(EAGAIN)) throw_if_error(ret, "avcodec_receive_frame");
+        if (_draining) return false;
+
+        /* --- 次のパケットを送る --- */
+        ret = av_read_frame(_fmt, _pkt);
+        if (ret == AVERROR_EOF) {
+            throw_if_error(avcodec_send_packet(_vctx, nullptr), "avcodec_send_packet(flush)");
+            _draining = true;
+            continue;
+        }
+        throw_if_error(ret, "av_read_frame");
+        if (_pkt->stream_index != _vidx) {
+            av_packet_unref(_pkt);
+            continue;
+        }
+        ret = avcodec_send_packet(_vctx, _pkt);
+        av_packet_unref(_pkt);
+        if (ret != AVERROR_INVALIDDATA) throw_if_error(ret, "avcodec_send_packet");  // 壊れたパケットは読み飛ばす
+    }
+}
+
+/* --- */
+/* 色変換 */
+/* --- */
+
+void MediaDecoder::_convert(uint8_t* dst) {
+    const int src_w = _frame->width;
+    const int src_h = _frame->height;
+
+    /* --- 配置: fit なら縦横比を保って中央、そうでなければ全面に引き伸ばす --- */
+    int rw = _out_w, rh = _out_h;
+    if (_fit && src_w > 0 && src_h > 0) {
+        const double scale = std::min(static_cast<double>(_out_w) / src_w,
+                                      static_cast<double>(_out_h) / src_h);
+        rw = std::clamp(static_cast<int>(src_w * scale + 0.5), 1, _out_w);
+        rh = std::clamp(static_cast<int>(src_h * scale + 0.5), 1, _out_h);
+    }
+    const int rx = (_out_w - rw) / 2;
+    const int ry = (_out_h - rh) / 2;
+
+    /* --- スケーラは入出力が変わった時だけ作り直す --- */
+    _sws = sws_getCachedContext(_sws,
+                                src_w, src_h, static_cast<AVPixelFormat>(_frame->format),
+                                rw, rh, AV_PIX_FMT_RGBA,
+                                SWS_BILINEAR, nullptr, nullptr, nullptr);
+    if (!_sws) throw std::runtime_error("sws_getCachedContext failed");
+
+    /* --- 余白は透明 (α = 0) --- */
+    const size_t stride = static_cast<size_t>(_out_w) * 4;
+    if (rw != _out_w || rh != _out_h) {
+        std::memset(dst, 0, stride * ry);
+        std::memset(dst + stride * (ry + rh), 0, stride * (_out_h - ry - rh));
+        const size_t left  = static_cast<size_t>(rx) * 4;
+        const size_t right = static_cast<size_t>(_out_w - rx - rw) * 4;
+        for (int y = ry; y < ry + rh; ++y) {
+            uint8_t* row = dst + stride * y;
+            std::memset(row, 0, left);
+            std::memset(row + stride - right, 0, right);
+        }
+    }
+
+    uint8_t* dst_data[1]      = {dst + stride * ry + static_cast<size_t>(rx) * 4};
+    const int dst_linesize[1] = {static_cast<int>(stride)};
+    sws_scale(_sws, _frame->data, _frame->linesize, 0, src_h, dst_data, dst_linesize);
+}
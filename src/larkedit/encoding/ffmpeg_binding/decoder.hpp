@@ -0,0 +1,76 @@
+#pragma once
+#include <cstdint>
+#include <memory>
+#include <string>
+#include "common.hpp"
+#include "keyframe_index.hpp"
+
+extern "C" {
+    #include <libavcodec/avcodec.h>
+    #include <libavformat/avformat.h>
+    #include <libswscale/swscale.h>
+}
+
+// 開いたままにして連続読み出し・シークする映像デコーダ。
+// 出力は常に out_w x out_h の RGBA (straight α) で、呼び出し側のバッファへ直接書く
+class MediaDecoder {
+public:
+    // width / height: 出力サイズ (0 = 元サイズ)
+    // fit: true ならアスペクト比を保って中央に配置し、余白は透明にする
+    // threads: デコーダのスレッド数 (0 = 自動)
+    // use_index: 初回シーク時にキーフレーム索引を作る (false でもキャッシュ済みなら使う)
+    MediaDecoder(const std::string& filename,
+                 int width = 0, int height = 0,
+                 bool fit = true,
+                 int threads = 0,
+                 bool use_index = true);
+    ~MediaDecoder();
+    MediaDecoder(const MediaDecoder&) = delete;
+    MediaDecoder& operator=(const MediaDecoder&) = delete;
+
+    // 次のフレームを dst (height x width x 4, 連続) に書く。終端なら false
+    bool read_frame(uint8_t* dst, int64_t& pts_ms);
+    // ms を含むフレームへ正確にシークする (次の read_frame がそのフレームを返す)。
+    // 索引があれば直前のキーフレームへ飛び、同じ GOP 内の前方ならシークせずに読み進める。
+    // exact = false なら直前のキーフレームそのものを返す (サムネイル用, デコードは 1 枚)
+    void seek(int64_t ms, bool exact = true);
+    // ms 以前で最後のキーフレームの時刻 [ms] (索引が無ければ -1)
+    int64_t keyframe_before(int64_t ms);
+    // 出力サイズを変える (スケーラは次の変換で作り直される)
+    void set_output_size(int width, int height, bool fit);
+
+    int width() const { return _out_w; }
+    int height() const { return _out_h; }
+    bool fit() const { return _fit; }
+    int source_width() const { return _vctx->width; }
+    int source_height() const { return _vctx->height; }
+    double fps() const;
+    int64_t duration_ms() const;
+
+private:
+    bool _decode_next();                    // _frame に次のフレームを読む。終端なら false
+    const KeyframeIndex* _keyframes();      // 索引 (無ければ nullptr)
+    void _convert(uint8_t* dst);
+    int64_t _to_ms(int64_t ts) const;
+    int64_t _to_ts(int64_t ms) const;
+
+    AVFormatContext* _fmt{nullptr};
+    AVCodecContext* _vctx{nullptr};
+    AVStream* _vst{nullptr};
+    SwsContext* _sws{nullptr};
+    AVFrame* _frame{nullptr};
+    AVPacket* _pkt{nullptr};
+    int _vidx{-1};
+    std::string _filename;
+    bool _use_index{true};
+    bool _index_tried{false};
+    std::shared_ptr<const KeyframeIndex> _index;
+    int64_t _pos_ts{AV_NOPTS_VALUE};        // _frame に入っているフレームの pts
+    int64_t _start_ts{0};                   // ストリーム先頭の時刻 (time_base)
+    int64_t _frame_dur{0};                  // 1 フレームの長さ (time_base, 不明なら 0)
+    bool _draining{false};                  // EOF を送ってデコーダを吐き出し中
+    bool _pending{false};                   // seek で読んだフレームを次の read_frame で返す
+
+    int _out_w{0}, _out_h{0};
+    bool _fit{true};
+};
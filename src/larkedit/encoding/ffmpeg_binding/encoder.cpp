@@ -1,11 +1,13 @@
 #include "encoder.hpp"
 
-#include <cstring>          // std::memcpy
+#include <algorithm>
+#include <chrono>
+#include <deque>
 #include <utility>          // std::move
-#include <variant>
 
 extern "C" {
     #include <libavutil/opt.h>
+    #include <libavutil/pixdesc.h>
     #include <libavutil/version.h>
 }
 
@@ -19,17 +21,6 @@ inline void throw_if_error(int err, const char* msg) {
     }
 }
 
-/* --- RAII ヘルパ --- */
-struct FrameDeleter {
-    void operator()(AVFrame* f) const noexcept { if (f) av_frame_free(&f); }
-};
-using FramePtr = std::unique_ptr<AVFrame, FrameDeleter>;
-
-struct PacketDeleter {
-    void operator()(AVPacket* p) const noexcept { if (p) av_packet_free(&p); }
-};
-using PacketPtr = std::unique_ptr<AVPacket, PacketDeleter>;
-
 // 非推奨APIを回避する
 inline AVSampleFormat get_default_sample_fmt(const AVCodec* codec) {
 #if FFMPEG_VERSION_GTE_5
@@ -40,6 +31,45 @@ inline AVSampleFormat get_default_sample_fmt(const AVCodec* codec) {
 #endif
 }
 
+// 変換中・待機中・エンコード中の 3 枚あれば変換とエンコードが重なる
+constexpr size_t kYuvRing = 3;
+
+// 片方のストリームが止まっている間に mux が抱える最大パケット数。
+// 超えたら相手を待たずに書き出す (並べ替えは av_interleaved_write_frame に任せる)
+constexpr size_t kMuxHoldback = 64;
+
+// 並べ替えに使う時刻 (DTS が無ければ PTS)
+inline int64_t packet_ts(const AVPacket* pkt) {
+    return pkt->dts != AV_NOPTS_VALUE ? pkt->dts : pkt->pts;
+}
+
+AVPixelFormat parse_pix_fmt(const std::string& name) {
+    const AVPixelFormat fmt = av_get_pix_fmt(name.c_str());
+    if (fmt == AV_PIX_FMT_NONE) throw std::runtime_error("Unknown pix_fmt '" + name + "'");
+    return fmt;
+}
+
+int parse_thread_type(const std::string& name) {
+    if (name == "frame")       return FF_THREAD_FRAME;
+    if (name == "slice")       return FF_THREAD_SLICE;
+    if (name == "frame+slice") return FF_THREAD_FRAME | FF_THREAD_SLICE;
+    throw std::runtime_error("Unknown thread_type '" + name + "' (frame / slice / frame+slice)");
+}
+
+// スコープの経過時間を counter [us] に足す
+class ScopedTimer {
+public:
+    explicit ScopedTimer(std::atomic<uint64_t>& counter)
+        : _counter(counter), _t0(std::chrono::steady_clock::now()) {}
+    ~ScopedTimer() {
+        _counter += std::chrono::duration_cast<std::chrono::microseconds>(
+            std::chrono::steady_clock::now() - _t0).count();
+    }
+private:
+    std::atomic<uint64_t>& _counter;
+    std::chrono::steady_clock::time_point _t0;
+};
+
 }  // namespace
 
 // MediaEncoder 本体
@@ -51,47 +81,105 @@ MediaEncoder::MediaEncoder(const std::string& filename,
                            int ch,
                            const std::string& vcodec,
                            const std::string& acodec,
-                           size_t queue_cap)
-    : _queue(queue_cap),
-      _filename(filename),
+                           size_t queue_cap,
+                           int threads,
+                           const std::string& thread_type,
+                           int convert_threads,
+                           size_t audio_queue_cap,
+                           int gop_size,
+                           const std::string& pix_fmt,
+                           int64_t bit_rate,
+                           const std::map<std::string, std::string>& codec_options)
+    : _filename(filename),
       _w(width),
       _h(height),
       _fps(fps),
       _sr(sr),
       _ch(ch),
-      _last_video_dts(AV_NOPTS_VALUE) {
+      _video_queue(queue_cap),
+      _audio_queue(audio_queue_cap),
+      _encode_queue(kYuvRing),
+      _yuv_free(kYuvRing),
+      _mux_queue(2 * kMuxHoldback),
+      _frame_pool(width, height, queue_cap + 4),  // キュー + 生産側・エンコード中の分
+      _packet_pool(2 * kMuxHoldback) {
     static FFMpegInit _once;
 
+    if (vcodec.empty() && acodec.empty()) {
+        throw std::runtime_error("Either a video or an audio codec is required");
+    }
+
     /* ---出力コンテキスト --- */
     throw_if_error(
         avformat_alloc_output_context2(&_oc, nullptr, nullptr, filename.c_str()),
         "avformat_alloc_output_context2");
 
-    /* --- 動画ストリーム ---- */
-    const AVCodec* vcod = avcodec_find_encoder_by_name(vcodec.c_str());
-    if (!vcod) {
-        throw std::runtime_error("Video codec '" + vcodec + "' not found");
-    }
-    _vst = avformat_new_stream(_oc, vcod);
-    if (!_vst) throw std::runtime_error("avformat_new_stream(v) failed");
-
-    _vctx = avcodec_alloc_context3(vcod);
-    if (!_vctx) throw std::runtime_error("avcodec_alloc_context3(v) failed");
-
-    _vctx->codec_id  = vcod->id;
-    _vctx->pix_fmt   = AV_PIX_FMT_YUV420P;
-    _vctx->width     = width;
-    _vctx->height    = height;
-    _vctx->time_base = AVRational{1, fps};
-    _vctx->framerate = AVRational{fps, 1};
-    _vctx->bit_rate  = 4'000'000;
-    if (vcod->id == AV_CODEC_ID_H264) {
-        av_opt_set(_vctx->priv_data, "preset", "veryfast", 0);
-        av_opt_set(_vctx->priv_data, "crf", "23", 0);
+    /* --- 動画ストリーム (任意。音声だけ書き出すときは作らない) ---- */
+    if (!vcodec.empty()) {
+        const AVCodec* vcod = avcodec_find_encoder_by_name(vcodec.c_str());
+        if (!vcod) {
+            throw std::runtime_error("Video codec '" + vcodec + "' not found");
+        }
+        _vst = avformat_new_stream(_oc, vcod);
+        if (!_vst) throw std::runtime_error("avformat_new_stream(v) failed");
+
+        _vctx = avcodec_alloc_context3(vcod);
+        if (!_vctx) throw std::runtime_error("avcodec_alloc_context3(v) failed");
+
+        _vctx->codec_id  = vcod->id;
+        _vctx->pix_fmt   = parse_pix_fmt(pix_fmt);
+        _vctx->width     = width;
+        _vctx->height    = height;
+        _vctx->time_base = AVRational{1, fps};
+        _vctx->framerate = AVRational{fps, 1};
+        _vctx->bit_rate  = bit_rate;
+        _vctx->thread_count = threads;  // 0 = コーデック任せ (コア数)
+        _vctx->thread_type  = parse_thread_type(thread_type);
+        const bool own_scenecut = vcod->id == AV_CODEC_ID_H264 || vcod->id == AV_CODEC_ID_HEVC;
+        if (gop_size > 0) {
+            // 固定間隔の closed GOP にして、区間ごとに書き出したファイルを GOP 境界でつなげるようにする
+            _vctx->gop_size   = gop_size;
+            _vctx->keyint_min = gop_size;
+            _vctx->flags     |= AV_CODEC_FLAG_CLOSED_GOP;
+            if (!own_scenecut && !codec_options.count("sc_threshold")) {
+                // mpeg4 などはシーン検出と closed GOP を併用できない (avcodec_open2 が失敗する)。
+                // シーン検出を止めて間隔どおりにだけキーフレームを置く。このオプションが無いコーデックでは何もしない
+                av_opt_set(_vctx, "sc_threshold", "1000000000", AV_OPT_SEARCH_CHILDREN);
+            }
+        }
+        if (vcod->id == AV_CODEC_ID_H264) {
+            // 既定値。codec_options に同じ名前があればそちらが勝つ
+            av_opt_set(_vctx->priv_data, "preset", "veryfast", 0);
+            av_opt_set(_vctx->priv_data, "crf", "23", 0);
+        }
+        AVDictionary* opts = nullptr;
+        for (const auto& [key, value] : codec_options) {
+            av_dict_set(&opts, key.c_str(), value.c_str(), 0);
+        }
+        const int open_err = avcodec_open2(_vctx, vcod, &opts);
+        // 使われなかったもの (綴り違い・このコーデックに無いもの) は黙って捨てずにエラーにする
+        std::string unknown;
+        const AVDictionaryEntry* e = nullptr;
+        while ((e = av_dict_get(opts, "", e, AV_DICT_IGNORE_SUFFIX))) {
+            unknown += unknown.empty() ? e->key : std::string(", ") + e->key;
+        }
+        av_dict_free(&opts);
+        if (open_err < 0 && gop_size > 0) {
+            throw std::runtime_error("avcodec_open2(v): " + ff_err2str(open_err) + " ('" + vcodec +
+                                     "' may not support a fixed closed GOP; gop_size=" +
+                                     std::to_string(gop_size) + ")");
+        }
+        throw_if_error(open_err, "avcodec_open2(v)");
+        if (!unknown.empty()) {
+            throw std::runtime_error("Unknown codec options for '" + vcodec + "': " + unknown);
+        }
+        // スレッドを自前で管理するコーデック (libx264 など) は 0 を自動のまま残すので、そのときはコア数とみなす
+        _codec_threads = _vctx->thread_count > 0
+                             ? _vctx->thread_count
+                             : static_cast<int>(std::max(1u, std::thread::hardware_concurrency()));
+        throw_if_error(avcodec_parameters_from_context(_vst->codecpar, _vctx),
+                       "avcodec_parameters_from_context(v)");
     }
-    throw_if_error(avcodec_open2(_vctx, vcod, nullptr), "avcodec_open2(v)");
-    throw_if_error(avcodec_parameters_from_context(_vst->codecpar, _vctx),
-                   "avcodec_parameters_from_context(v)");
 
     /* --- オーディオストリーム (任意) --- */
     if (!acodec.empty()) {
@@ -155,18 +243,45 @@ MediaEncoder::MediaEncoder(const std::string& filename,
     }
     throw_if_error(avformat_write_header(_oc, nullptr), "avformat_write_header");
 
-    /* --- 色変換コンテキスト --- */
-    _sws = sws_getContext(width,
-                          height,
-                          AV_PIX_FMT_RGBA,
-                          width,
-                          height,
-                          _vctx->pix_fmt,
-                          SWS_BILINEAR,
-                          nullptr,
-                          nullptr,
-                          nullptr);
-    if (!_sws) throw std::runtime_error("sws_getContext failed");
+    if (_vctx) {
+        /* --- 色変換 --- */
+        _init_converter(convert_threads);
+
+        /* --- 使い回すフレーム・パケット --- */
+        for (size_t i = 0; i < kYuvRing; ++i) {
+            AVFrame* yuv = av_frame_alloc();
+            if (!yuv) throw std::runtime_error("av_frame_alloc(yuv) failed");
+            _yuv_ring.push_back(yuv);
+            yuv->format = _vctx->pix_fmt;
+            yuv->width  = width;
+            yuv->height = height;
+            throw_if_error(av_frame_get_buffer(yuv, 0), "av_frame_get_buffer(yuv)");
+            _yuv_free.push(yuv);
+        }
+    }
+
+    if (_actx) {
+        _aframe = av_frame_alloc();
+        if (!_aframe) throw std::runtime_error("av_frame_alloc(a) failed");
+        _aframe_size = _actx->frame_size > 0 ? _actx->frame_size : 1024;
+        _aframe->nb_samples = _aframe_size;
+#if FFMPEG_VERSION_GTE_5
+        throw_if_error(av_channel_layout_copy(&_aframe->ch_layout, &_actx->ch_layout),
+                       "av_channel_layout_copy");
+#else
+        _aframe->channel_layout = _actx->channel_layout;
+#endif
+        _aframe->format      = _actx->sample_fmt;
+        _aframe->sample_rate = sr;
+        throw_if_error(av_frame_get_buffer(_aframe, 0), "av_frame_get_buffer(a)");
+        _afifo = av_audio_fifo_alloc(AV_SAMPLE_FMT_FLT, ch, 2 * _aframe_size);
+        if (!_afifo) throw std::runtime_error("av_audio_fifo_alloc failed");
+        _apcm.resize(static_cast<size_t>(_aframe_size) * ch);
+    }
+
+    _vpkt = av_packet_alloc();
+    _apkt = av_packet_alloc();
+    if (!_vpkt || !_apkt) throw std::runtime_error("av_packet_alloc failed");
 }
 
 /* --- */
@@ -174,8 +289,14 @@ MediaEncoder::MediaEncoder(const std::string& filename,
 MediaEncoder::~MediaEncoder() {
     try {
         if (_running) finish();
-        if (_sws)  sws_freeContext(_sws);
+        _convert_pool.reset();
+        for (auto& band : _sws_bands) sws_freeContext(band.ctx);
         if (_swr)  swr_free(&_swr);
+        for (auto*& yuv : _yuv_ring) av_frame_free(&yuv);
+        av_frame_free(&_aframe);
+        if (_afifo) av_audio_fifo_free(_afifo);
+        av_packet_free(&_vpkt);
+        av_packet_free(&_apkt);
         if (_vctx) avcodec_free_context(&_vctx);
         if (_actx) avcodec_free_context(&_actx);
         if (_oc) {
@@ -193,89 +314,270 @@ MediaEncoder::~MediaEncoder() {
 
 void MediaEncoder::start() {
     if (_running) return;
-    _running = true;
-    _worker  = std::thread(&MediaEncoder::_encode_loop, this);
+    _running      = true;
+    _muxer        = std::thread(&MediaEncoder::_mux_loop, this);
+    if (_vctx) {
+        _converter    = std::thread(&MediaEncoder::_convert_loop, this);
+        _video_worker = std::thread(&MediaEncoder::_video_loop, this);
+    }
+    if (_actx) _audio_worker = std::thread(&MediaEncoder::_audio_loop, this);
 }
 
-void MediaEncoder::submit_video(const VideoFrame& v) {
-    if (!_running) throw std::runtime_error("Encoder not started");
-    _queue.push(v);
+void MediaEncoder::submit_video(VideoFrame v) {
+    _check_open();
+    if (!_vctx) return;  // Video 無効
+    if (!v.data || v.width != _w || v.height != _h)
+        throw std::runtime_error("Frame size must match encoder (HxWx4 RGBA)");
+    // 画素は参照のまま積む (コピーしない)
+    if (!_video_queue.push(std::move(v))) _throw_closed();
+}
+
+void MediaEncoder::submit_audio(AudioSamples a) {
+    _check_open();
+    if (!_actx) return;  // Audio 無効
+    if (!_audio_queue.push(std::move(a))) _throw_closed();
 }
 
-void MediaEncoder::submit_audio(const AudioSamples& a) {
+void MediaEncoder::_check_open() {
+    if (_finished) throw std::runtime_error("Encoder already finished");
     if (!_running) throw std::runtime_error("Encoder not started");
-    if (!_actx)    return;  // Audio 無効
-    _queue.push(a);
+    _rethrow_if_failed();
+}
+
+// キューが閉じられていて積めなかった (黙って捨てると出力が欠ける)
+void MediaEncoder::_throw_closed() {
+    _rethrow_if_failed();  // エンコードが失敗して閉じられた
+    throw std::runtime_error("Encoder already finished (submitted data was not encoded)");
+}
+
+VideoFrame MediaEncoder::acquire_frame(int64_t pts) {
+    return _frame_pool.acquire(pts);
+}
+
+EncoderStats MediaEncoder::stats() const {
+    EncoderStats s;
+    s.frame_pool     = _frame_pool.stats();
+    s.video_frames   = _n_video;
+    s.audio_frames   = _n_audio;
+    s.packets        = _n_packets;
+    s.yuv_reallocs   = _n_yuv_reallocs;
+    s.audio_reallocs = _n_audio_reallocs;
+    s.convert_ms      = _convert_us / 1000.0;
+    s.encode_ms       = _encode_us / 1000.0;
+    s.audio_encode_ms = _audio_encode_us / 1000.0;
+    s.video_queue     = _video_queue.size();
+    s.audio_queue     = _audio_queue.size();
+    s.convert_threads = static_cast<int>(_sws_bands.size());
+    s.codec_threads   = _codec_threads;
+    return s;
 }
 
 void MediaEncoder::finish() {
     if (!_running) return;
-    _queue.close();
-    if (_worker.joinable()) _worker.join();
-    _flush();
-    throw_if_error(av_write_trailer(_oc), "av_write_trailer");
+    _finished = true;
+    _video_queue.close();
+    _audio_queue.close();
+    // 各エンコードスレッドが flush して終端を送り、mux が書き切るまで待つ
+    for (auto* t : {&_converter, &_video_worker, &_audio_worker, &_muxer}) {
+        if (t->joinable()) t->join();
+    }
     _running = false;
+    _rethrow_if_failed();
+    throw_if_error(av_write_trailer(_oc), "av_write_trailer");
+}
+
+void MediaEncoder::_fail() {
+    {
+        std::scoped_lock lk(_error_mtx);
+        if (!_error) _error = std::current_exception();
+    }
+    _failed = true;
+    _video_queue.close();
+    _audio_queue.close();
+    _encode_queue.close();
+    _yuv_free.close();
+    _mux_queue.close();
+}
+
+void MediaEncoder::_rethrow_if_failed() {
+    if (!_failed) return;
+    std::scoped_lock lk(_error_mtx);
+    std::rethrow_exception(_error);
 }
 
 /* --- */
 /* 内部スレッド */
 /* --- */
 
-void MediaEncoder::_encode_loop() {
-    while (auto v = _queue.pop()) {
-        std::visit(
-            [&](auto&& msg) {
-                using T = std::decay_t<decltype(msg)>;
-                if constexpr (std::is_same_v<T, VideoFrame>)
-                    _encode_video(msg);
-                else if constexpr (std::is_same_v<T, AudioSamples>)
-                    _encode_audio(msg);
-            },
-            *v);
+void MediaEncoder::_convert_loop() {
+    try {
+        while (auto vf = _video_queue.pop()) {
+            auto yuv = _yuv_free.pop();  // エンコード側が返すまで待つ
+            if (!yuv) break;
+            _convert_video(*vf, *yuv);
+            _encode_queue.push(*yuv);
+        }
+    } catch (...) {
+        _fail();
+    }
+    _encode_queue.close();
+}
+
+void MediaEncoder::_video_loop() {
+    try {
+        while (auto yuv = _encode_queue.pop()) _encode_video(*yuv);
+        if (!_failed) _flush_video();
+        _mux_queue.push({0, nullptr});
+    } catch (...) {
+        _fail();
+    }
+}
+
+void MediaEncoder::_audio_loop() {
+    try {
+        while (auto a = _audio_queue.pop()) _encode_audio(*a);
+        if (!_failed) _flush_audio();
+        _mux_queue.push({1, nullptr});
+    } catch (...) {
+        _fail();
+    }
+}
+
+// 両ストリームの先頭を DTS で比べて小さい方から書き出す。
+// 片方が終端済み、または相手待ちで kMuxHoldback を超えたら待たずに書く
+void MediaEncoder::_mux_loop() {
+    std::deque<AVPacket*> pending[2];
+    bool ended[2] = {_vctx == nullptr, _actx == nullptr};
+    const AVRational tb[2] = {_vst ? _vst->time_base : AVRational{1, 1},
+                              _ast ? _ast->time_base : AVRational{1, 1}};
+
+    try {
+        while (true) {
+            while (true) {
+                const bool has_v = !pending[0].empty();
+                const bool has_a = !pending[1].empty();
+                int s;
+                if (has_v && has_a) {
+                    s = av_compare_ts(packet_ts(pending[0].front()), tb[0],
+                                      packet_ts(pending[1].front()), tb[1]) <= 0 ? 0 : 1;
+                } else if (has_v && (ended[1] || pending[0].size() > kMuxHoldback)) {
+                    s = 0;
+                } else if (has_a && (ended[0] || pending[1].size() > kMuxHoldback)) {
+                    s = 1;
+                } else {
+                    break;
+                }
+                AVPacket* pkt = pending[s].front();
+                pending[s].pop_front();
+                _write_packet(pkt);
+            }
+            if (ended[0] && ended[1]) break;
+
+            auto item = _mux_queue.pop();
+            if (!item) break;  // 失敗で閉じられた
+            if (item->pkt) pending[item->stream].push_back(item->pkt);
+            else           ended[item->stream] = true;
+        }
+    } catch (...) {
+        _fail();
+    }
+    for (auto& q : pending) {
+        for (auto* pkt : q) _packet_pool.release(pkt);
+    }
+    // 失敗時にキューへ残ったパケットも回収する (閉じられていない正常終了時は何も残っていない)
+    if (_failed) {
+        while (auto item = _mux_queue.pop()) _packet_pool.release(item->pkt);
+    }
+}
+
+void MediaEncoder::_write_packet(AVPacket* pkt) {
+    const int ret = av_interleaved_write_frame(_oc, pkt);
+    _packet_pool.release(pkt);
+    throw_if_error(ret, "av_interleaved_write_frame");
+    ++_n_packets;
+}
+
+/* --- */
+/* 色変換 */
+/* --- */
+
+void MediaEncoder::_init_converter(int convert_threads) {
+    // 帯の境界は色差の縦サブサンプリング単位 (4:2:0 なら 2 行) に揃える
+    const AVPixFmtDescriptor* desc = av_pix_fmt_desc_get(_vctx->pix_fmt);
+    const int align = 1 << (desc ? desc->log2_chroma_h : 0);
+    const int units = _h / align;
+
+    int bands = convert_threads > 0
+                    ? convert_threads
+                    : static_cast<int>(std::min(8u, std::max(1u, std::thread::hardware_concurrency())));
+    bands = std::clamp(bands, 1, std::max(1, units / 16));  // 1 帯あたり最低 16 単位
+
+    for (int i = 0; i < bands; ++i) {
+        SwsBand band;
+        band.y = units * i / bands * align;
+        band.h = (i == bands - 1 ? _h : units * (i + 1) / bands * align) - band.y;
+        // 縦方向は等倍なので帯ごとに独立に変換できる
+        band.ctx = sws_getContext(_w, band.h, AV_PIX_FMT_RGBA,
+                                  _w, band.h, _vctx->pix_fmt,
+                                  SWS_BILINEAR, nullptr, nullptr, nullptr);
+        if (!band.ctx) {
+            for (auto& b : _sws_bands) sws_freeContext(b.ctx);
+            _sws_bands.clear();
+            throw std::runtime_error("sws_getContext failed");
+        }
+        _sws_bands.push_back(band);
     }
+    _convert_pool = std::make_unique<ThreadPool>(static_cast<unsigned>(bands));
+}
+
+void MediaEncoder::_convert_video(const VideoFrame& vf, AVFrame* yuv) {
+    ScopedTimer timer(_convert_us);
+
+    /* --- YUV (dst): 使い回し。エンコーダが参照中なら作り直される --- */
+    if (!av_frame_is_writable(yuv)) ++_n_yuv_reallocs;
+    throw_if_error(av_frame_make_writable(yuv), "av_frame_make_writable(yuv)");
+
+    const AVPixFmtDescriptor* desc = av_pix_fmt_desc_get(_vctx->pix_fmt);
+    const int chroma_shift = desc ? desc->log2_chroma_h : 0;
+
+    /* --- RGBA (src): VideoFrame の画素を直接読み、帯ごとに並列変換 --- */
+    _convert_pool->parallel_for(_sws_bands.size(), [&](size_t i) {
+        const SwsBand& band = _sws_bands[i];
+        const uint8_t* src_data[1] = {vf.data + static_cast<size_t>(band.y) * _w * 4};
+        const int src_linesize[1]  = {_w * 4};
+        uint8_t* dst_data[AV_NUM_DATA_POINTERS] = {};
+        for (int p = 0; p < AV_NUM_DATA_POINTERS && yuv->data[p]; ++p) {
+            const int row = (p == 1 || p == 2) ? band.y >> chroma_shift : band.y;
+            dst_data[p] = yuv->data[p] + static_cast<ptrdiff_t>(row) * yuv->linesize[p];
+        }
+        sws_scale(band.ctx, src_data, src_linesize, 0, band.h, dst_data, yuv->linesize);
+    });
+    yuv->pts = (vf.pts * _fps + 500) / 1000;  // ms -> time_base (切り捨てだと 33ms が 0 になる)
 }
 
 /* --- */
 /* 映像ペイロード */
 /* --- */
 
-void MediaEncoder::_encode_video(const VideoFrame& vf) {
-    /* --- RGBA Frame (src) --- */
-    FramePtr rgb(av_frame_alloc());
-    rgb->format = AV_PIX_FMT_RGBA;
-    rgb->width  = _w;
-    rgb->height = _h;
-    throw_if_error(av_frame_get_buffer(rgb.get(), 0), "av_frame_get_buffer(rgba)");
-
-    std::memcpy(rgb->data[0], vf.rgba.data(), vf.rgba.size());
-    rgb->pts = vf.pts * _fps / 1000;  // ms -> time_base
-
-    /* --- YUV420 (dst) --- */
-    FramePtr yuv(av_frame_alloc());
-    yuv->format = _vctx->pix_fmt;
-    yuv->width  = _w;
-    yuv->height = _h;
-    throw_if_error(av_frame_get_buffer(yuv.get(), 0), "av_frame_get_buffer(yuv)");
-
-    sws_scale(_sws,
-              rgb->data,
-              rgb->linesize,
-              0,
-              _h,
-              yuv->data,
-              yuv->linesize);
-    yuv->pts = rgb->pts;
-
-    /* --- エンコーダへ送信 --- */
-    throw_if_error(avcodec_send_frame(_vctx, yuv.get()), "avcodec_send_frame(v)");
-    PacketPtr pkt(av_packet_alloc());
+void MediaEncoder::_encode_video(AVFrame* yuv) {
+    {
+        ScopedTimer timer(_encode_us);
+        throw_if_error(avcodec_send_frame(_vctx, yuv), "avcodec_send_frame(v)");
+        ++_n_video;
+        _drain_video_packets();
+    }
+    _yuv_free.push(yuv);  // 変換ステージに返す
+}
+
+void MediaEncoder::_drain_video_packets() {
+    AVPacket* pkt = _vpkt;
     while (true) {
-        int ret = avcodec_receive_packet(_vctx, pkt.get());
+        int ret = avcodec_receive_packet(_vctx, pkt);
         if (ret == AVERROR(EAGAIN) || ret == AVERROR_EOF) break;
         throw_if_error(ret, "avcodec_receive_packet(v)");
         
         // codec → stream へ時刻変換
-        av_packet_rescale_ts(pkt.get(), _vctx->time_base, _vst->time_base);
+        av_packet_rescale_ts(pkt, _vctx->time_base, _vst->time_base);
         pkt->stream_index = _vst->index;
         
         // 同じDTS値が連続しないように調整（単調増加を保証）
@@ -290,10 +592,10 @@ void MediaEncoder::_encode_video(const VideoFrame& vf) {
         if (pkt->dts != AV_NOPTS_VALUE) {
             _last_video_dts = pkt->dts;
         }
-        
-        throw_if_error(av_interleaved_write_frame(_oc, pkt.get()),
-                       "av_interleaved_write_frame(v)");
-        av_packet_unref(pkt.get());
+
+        AVPacket* out = _packet_pool.acquire();
+        av_packet_move_ref(out, pkt);
+        if (!_mux_queue.push({0, out})) _packet_pool.release(out);  // 失敗で閉じられた
     }
 }
 
@@ -303,70 +605,76 @@ void MediaEncoder::_encode_video(const VideoFrame& vf) {
 
 void MediaEncoder::_encode_audio(const AudioSamples& a) {
     if (!_actx) return;
+    ScopedTimer timer(_audio_encode_us);
+
+    const int frame_size = _aframe_size;
+    const int64_t total = static_cast<int64_t>(a.pcm.size() / _ch);
+    const float* in = a.pcm.data();
+    int64_t skip = 0;
+
+    // 出力のサンプル時刻は最初の塊から連続させる。
+    // 塊の間が空いていたら無音で埋め、重なっていたら重なった分を捨てる
+    if (_afifo_pts == AV_NOPTS_VALUE) _afifo_pts = a.pts;
+    const int64_t expected = _afifo_pts + av_audio_fifo_size(_afifo);
+    if (a.pts > expected) {
+        std::vector<float> zeros(_apcm.size(), 0.0f);
+        for (int64_t gap = a.pts - expected; gap > 0; gap -= frame_size) {
+            void* silence[] = {zeros.data()};
+            const int n = static_cast<int>(std::min<int64_t>(gap, frame_size));
+            throw_if_error(av_audio_fifo_write(_afifo, silence, n), "av_audio_fifo_write");
+            while (av_audio_fifo_size(_afifo) >= frame_size) _send_audio_frame(frame_size);
+        }
+    } else {
+        skip = std::min(expected - a.pts, total);
+    }
 
-    // フレームサイズを取得
-    int frame_size = _actx->frame_size > 0 ? _actx->frame_size : 1024;
-    
-    const int total_samples = static_cast<int>(a.pcm.size() / _ch);
-    const uint8_t* in_data = reinterpret_cast<const uint8_t*>(a.pcm.data());
-    
-    // フレームサイズ単位で処理
-    for (int offset = 0; offset < total_samples; offset += frame_size) {
-        int current_samples = std::min(frame_size, total_samples - offset);
-        if (current_samples <= 0) break;
-        
-        const uint8_t* in_buf[] = {
-            in_data + offset * _ch * sizeof(float),
-        };
-
-        /* --- 入力フレーム (FLT / host order) --- */
-        FramePtr in(av_frame_alloc());
-        in->nb_samples = current_samples;
-#if FFMPEG_VERSION_GTE_5
-        in->ch_layout = _actx->ch_layout;
-#else
-        in->channel_layout = _actx->channel_layout;
-#endif
-        in->format = AV_SAMPLE_FMT_FLT;
-        in->sample_rate = _sr;
-        throw_if_error(av_frame_get_buffer(in.get(), 0), "av_frame_get_buffer(a-in)");
-        std::memcpy(in->data[0], in_buf[0], current_samples * _ch * sizeof(float));
-        in->pts = (a.pts + (offset * 1000 / _sr)) * _sr / 1000;  // ms → samples
-
-        /* --- 出力フレーム (codec fmt) --- */
-        FramePtr out(av_frame_alloc());
-        out->nb_samples = current_samples;
-#if FFMPEG_VERSION_GTE_5
-        out->ch_layout = _actx->ch_layout;
-#else
-        out->channel_layout = _actx->channel_layout;
-#endif
-        out->format = _actx->sample_fmt;
-        out->sample_rate = _sr;
-        throw_if_error(av_frame_get_buffer(out.get(), 0), "av_frame_get_buffer(a-out)");
+    if (total > skip) {
+        void* data[] = {const_cast<float*>(in + skip * _ch)};
+        throw_if_error(av_audio_fifo_write(_afifo, data, static_cast<int>(total - skip)),
+                       "av_audio_fifo_write");
+    }
+    // 途中のフレームは満サイズで送る (AAC などは最後のフレームしか短くできない)
+    while (av_audio_fifo_size(_afifo) >= frame_size) _send_audio_frame(frame_size);
+}
 
-        throw_if_error(
-            swr_convert(_swr, out->data, current_samples, in_buf, current_samples),
-            "swr_convert");
+void MediaEncoder::_send_audio_frame(int nb_samples) {
+    void* pcm[] = {_apcm.data()};
+    throw_if_error(av_audio_fifo_read(_afifo, pcm, nb_samples), "av_audio_fifo_read");
+    // 入力 (FLT / interleaved)
+    const uint8_t* in_buf[] = {reinterpret_cast<const uint8_t*>(_apcm.data())};
+
+    /* --- 出力フレーム (codec fmt): 使い回し --- */
+    AVFrame* out = _aframe;
+    out->nb_samples = _aframe_size;  // 作り直しが起きても満サイズで確保させる
+    if (!av_frame_is_writable(out)) ++_n_audio_reallocs;
+    throw_if_error(av_frame_make_writable(out), "av_frame_make_writable(a)");
+    out->nb_samples = nb_samples;
+
+    throw_if_error(swr_convert(_swr, out->data, nb_samples, in_buf, nb_samples),
+                   "swr_convert");
+    out->pts = _afifo_pts;
+    _afifo_pts += nb_samples;
+
+    /* --- エンコーダに送信 --- */
+    throw_if_error(avcodec_send_frame(_actx, out), "avcodec_send_frame(a)");
+    ++_n_audio;
+    _drain_audio_packets();
+}
 
-        out->pts = in->pts;
+void MediaEncoder::_drain_audio_packets() {
+    AVPacket* pkt = _apkt;
+    while (true) {
+        int ret = avcodec_receive_packet(_actx, pkt);
+        if (ret == AVERROR(EAGAIN) || ret == AVERROR_EOF) break;
+        throw_if_error(ret, "avcodec_receive_packet(a)");
+        
+        // codec → stream へ時刻変換
+        av_packet_rescale_ts(pkt, _actx->time_base, _ast->time_base);
+        pkt->stream_index = _ast->index;
 
-        /* --- エンコーダに送信 --- */
-        throw_if_error(avcodec_send_frame(_actx, out.get()), "avcodec_send_frame(a)");
-        PacketPtr pkt(av_packet_alloc());
-        while (true) {
-            int ret = avcodec_receive_packet(_actx, pkt.get());
-            if (ret == AVERROR(EAGAIN) || ret == AVERROR_EOF) break;
-            throw_if_error(ret, "avcodec_receive_packet(a)");
-            
-            // codec → stream へ時刻変換
-            av_packet_rescale_ts(pkt.get(), _actx->time_base, _ast->time_base);
-            pkt->stream_index = _ast->index;
-            
-            throw_if_error(av_interleaved_write_frame(_oc, pkt.get()),
-                        "av_interleaved_write_frame(a)");
-            av_packet_unref(pkt.get());
-        }
+        AVPacket* out = _packet_pool.acquire();
+        av_packet_move_ref(out, pkt);
+        if (!_mux_queue.push({1, out})) _packet_pool.release(out);  // 失敗で閉じられた
     }
 }
 
@@ -374,44 +682,14 @@ void MediaEncoder::_encode_audio(const AudioSamples& a) {
 /* フラッシュ */
 /* --- */
 
-void MediaEncoder::_flush() {
-    /* --- Video flush --- */
+void MediaEncoder::_flush_video() {
     throw_if_error(avcodec_send_frame(_vctx, nullptr), "flush video send");
-    PacketPtr pkt(av_packet_alloc());
-    while (avcodec_receive_packet(_vctx, pkt.get()) == 0) {
-        // codec → stream へ時刻変換
-        av_packet_rescale_ts(pkt.get(), _vctx->time_base, _vst->time_base);
-        pkt->stream_index = _vst->index;
-        
-        // フラッシュ時も同様にDTS値の単調増加を保証
-        if (pkt->dts != AV_NOPTS_VALUE && _last_video_dts != AV_NOPTS_VALUE && pkt->dts <= _last_video_dts) {
-            pkt->dts = _last_video_dts + 1;
-            // PTSもDTSより後ろになるよう調整
-            if (pkt->pts != AV_NOPTS_VALUE && pkt->pts < pkt->dts) {
-                pkt->pts = pkt->dts;
-            }
-        }
-        
-        if (pkt->dts != AV_NOPTS_VALUE) {
-            _last_video_dts = pkt->dts;
-        }
-        
-        throw_if_error(av_interleaved_write_frame(_oc, pkt.get()),
-                       "av_interleaved_write_frame(v)");
-        av_packet_unref(pkt.get());
-    }
+    _drain_video_packets();
+}
 
-    /* --- Audio flush --- */
-    if (_actx) {
-        throw_if_error(avcodec_send_frame(_actx, nullptr), "flush audio send");
-        while (avcodec_receive_packet(_actx, pkt.get()) == 0) {
-            // codec → stream へ時刻変換
-            av_packet_rescale_ts(pkt.get(), _actx->time_base, _ast->time_base);
-            pkt->stream_index = _ast->index;
-            
-            throw_if_error(av_interleaved_write_frame(_oc, pkt.get()),
-                          "av_interleaved_write_frame(a)");
-            av_packet_unref(pkt.get());
-        }
-    }
+void MediaEncoder::_flush_audio() {
+    // 持ち越した端数を最後の (短い) フレームとして送る
+    if (const int rest = av_audio_fifo_size(_afifo); rest > 0) _send_audio_frame(rest);
+    throw_if_error(avcodec_send_frame(_actx, nullptr), "flush audio send");
+    _drain_audio_packets();
 }
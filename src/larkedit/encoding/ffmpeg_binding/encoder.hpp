@@ -1,9 +1,15 @@
 #pragma once
+#include <map>
 #include <memory>
 #include <thread>
 #include <atomic>
+#include <exception>
+#include <mutex>
 #include "thread_queue.hpp"
+#include "thread_pool.hpp"
 #include "compositor.hpp"
+#include "frame_pool.hpp"
+#include "packet_pool.hpp"
 #include "common.hpp"
 
 extern "C" {
@@ -11,35 +17,83 @@ extern "C" {
     #include <libavformat/avformat.h>
     #include <libswscale/swscale.h>
     #include <libswresample/swresample.h>
+    #include <libavutil/audio_fifo.h>
 }
 
 struct AudioSamples {
-    int64_t pts;            // ミリ秒
+    int64_t pts;            // サンプル数 (time_base 1/sample_rate)
     std::vector<float> pcm; // interleaved float32
 };
 
+// エンコードループの計測値 (プールのヒット率確認用)
+struct EncoderStats {
+    FramePool::Stats frame_pool;     // submit 用 RGBA バッファ
+    uint64_t video_frames{0};
+    uint64_t audio_frames{0};
+    uint64_t packets{0};
+    uint64_t yuv_reallocs{0};        // エンコーダがバッファを保持していて YUV を作り直した回数
+    uint64_t audio_reallocs{0};
+    double convert_ms{0};            // 色変換ステージの累計時間
+    double encode_ms{0};             // 映像エンコードの累計時間
+    double audio_encode_ms{0};       // 音声エンコードの累計時間
+    size_t video_queue{0};           // 現在のキュー長
+    size_t audio_queue{0};
+    int convert_threads{0};          // 色変換の帯数
+    int codec_threads{0};            // コーデックが実際に使うスレッド数
+};
+
 class MediaEncoder {
 public:
     MediaEncoder(const std::string& filename,
                  int width, int height, int fps,
                  int sr = 48000, int ch = 2,
-                 const std::string& vcodec = "libx264",
-                 const std::string& acodec = "aac",
-                 size_t queue_cap = 32);
+                 const std::string& vcodec = "libx264",         // 空なら音声だけ書き出す
+                 const std::string& acodec = "aac",             // 空なら映像だけ書き出す
+                 size_t queue_cap = 32,
+                 int threads = 0,                               // コーデックのスレッド数 (0 = 自動)
+                 const std::string& thread_type = "frame+slice", // "frame" / "slice" / "frame+slice"
+                 int convert_threads = 0,                       // 色変換の帯分割数 (0 = 自動)
+                 size_t audio_queue_cap = 64,                   // 音声キューの上限 (映像とは独立)
+                 int gop_size = 0,                              // キーフレーム間隔 (0 = コーデック任せ)
+                 const std::string& pix_fmt = "yuv420p",        // エンコーダに渡す画素形式
+                 int64_t bit_rate = 4'000'000,                  // 0 = コーデック任せ (crf などで決める)
+                 const std::map<std::string, std::string>& codec_options = {});  // avcodec_open2 に渡す
 
     void start();                           // スレッド開始
-    void submit_video(const VideoFrame& v); // キューに積む
-    void submit_audio(const AudioSamples& a);
-    void finish();                          // flush & join
+    void submit_video(VideoFrame v);        // 映像キューに積む (画素は共有)
+    void submit_audio(AudioSamples a);      // 音声キューに積む (映像とは互いに待たない)
+    void finish();                          // flush & join (ワーカーの例外はここで再送出)
+    VideoFrame acquire_frame(int64_t pts);  // プールから書き込み用フレームを借りる
+    EncoderStats stats() const;             // プール・エンコード計測値
     ~MediaEncoder();
 
 private:
-    void _encode_loop();
+    // エンコードスレッド → mux スレッドへ渡すもの (pkt == nullptr はストリーム終端)
+    struct MuxItem {
+        int stream;                         // 0: 映像, 1: 音声
+        AVPacket* pkt;
+    };
+
+    void _convert_loop();
+    void _video_loop();
+    void _audio_loop();
+    void _mux_loop();
     void _init_video_stream();
     void _init_audio_stream();
-    void _encode_video(const VideoFrame& v);
+    void _init_converter(int convert_threads);
+    void _convert_video(const VideoFrame& v, AVFrame* yuv);
+    void _encode_video(AVFrame* yuv);
     void _encode_audio(const AudioSamples& a);
-    void _flush();
+    void _send_audio_frame(int nb_samples);
+    void _drain_video_packets();
+    void _drain_audio_packets();
+    void _flush_video();
+    void _flush_audio();
+    void _write_packet(AVPacket* pkt);
+    void _fail();                           // 最初の例外を保存して全キューを閉じる
+    void _rethrow_if_failed();
+    void _check_open();
+    [[noreturn]] void _throw_closed();
 
     // FFmpeg
     AVFormatContext* _oc{nullptr};
@@ -47,16 +101,54 @@ private:
     AVStream* _ast{nullptr};
     AVCodecContext* _vctx{nullptr};
     AVCodecContext* _actx{nullptr};
-    SwsContext* _sws{nullptr};
     SwrContext* _swr{nullptr};
+    // 色変換は縦の帯ごとに SwsContext を持ち、_convert_pool で並列に回す
+    struct SwsBand {
+        SwsContext* ctx{nullptr};
+        int y{0}, h{0};
+    };
+    std::vector<SwsBand> _sws_bands;
+    std::unique_ptr<ThreadPool> _convert_pool;
+    // エンコーダ寿命の間使い回すフレーム・パケット
+    std::vector<AVFrame*> _yuv_ring;        // 変換中・待機中・エンコード中で回す
+    AVFrame*  _aframe{nullptr};
+    // 受け取った塊を frame_size ずつに切り直す (端数は次の塊まで持ち越す)
+    AVAudioFifo* _afifo{nullptr};
+    int64_t _afifo_pts{AV_NOPTS_VALUE};     // _afifo 先頭のサンプル時刻
+    int _aframe_size{0};                    // 1 フレームのサンプル数 (frame_size)
+    std::vector<float> _apcm;               // _afifo から 1 フレームぶん取り出す先
+    AVPacket* _vpkt{nullptr};
+    AVPacket* _apkt{nullptr};
     int64_t _last_video_dts{AV_NOPTS_VALUE};  // DTS単調増加を保証するための前回値
 
     // cfg
     std::string _filename;
     int _w, _h, _fps, _sr, _ch;
+    int _codec_threads{0};  // avcodec_open2 後に決まった映像エンコーダのスレッド数
 
-    // threading
-    ThreadQueue<std::variant<VideoFrame, AudioSamples>> _queue;
-    std::thread _worker;
+    // threading:
+    //   映像: submit_video → _video_queue → 色変換 → _encode_queue → 映像エンコード → _mux_queue
+    //   音声: submit_audio → _audio_queue → 音声エンコード → _mux_queue
+    //   mux : _mux_queue → DTS 順に並べて書き出し
+    ThreadQueue<VideoFrame> _video_queue;
+    ThreadQueue<AudioSamples> _audio_queue;
+    ThreadQueue<AVFrame*> _encode_queue;
+    ThreadQueue<AVFrame*> _yuv_free;        // 空いている _yuv_ring
+    ThreadQueue<MuxItem> _mux_queue;
+    std::thread _converter;
+    std::thread _video_worker;
+    std::thread _audio_worker;
+    std::thread _muxer;
     std::atomic<bool> _running{false};
+    std::atomic<bool> _failed{false};
+    std::atomic<bool> _finished{false};  // finish() を呼んだ (以降の submit は例外)
+    std::mutex _error_mtx;
+    std::exception_ptr _error;
+
+    // pooling
+    FramePool _frame_pool;
+    PacketPool _packet_pool;
+    std::atomic<uint64_t> _n_video{0}, _n_audio{0}, _n_packets{0};
+    std::atomic<uint64_t> _n_yuv_reallocs{0}, _n_audio_reallocs{0};
+    std::atomic<uint64_t> _convert_us{0}, _encode_us{0}, _audio_encode_us{0};
 };
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Sequence
+from collections.abc import Buffer
+from typing import Literal, Mapping, Sequence, TypedDict, overload
 
 import numpy as _np
 from numpy.typing import NDArray
@@ -9,24 +10,60 @@ class VideoFrame:
     width: int
     height: int
     pts: int
-    rgba: bytes
+    premultiplied: bool  # True なら rgba は乗算済み α (Compositor の出力)
+    readonly: bool  # bytes など書き込めないバッファを参照している場合
 
-    def __init__(self, width: int, height: int, pts: int, rgba: bytes) -> None: ...
-    def __repr__(self) -> str: ...
-    def __eq__(self, other: object) -> bool: ...
+    @overload
+    def __init__(self, width: int, height: int, pts: int, rgba: Buffer) -> None: ...
+    @overload
+    def __init__(self, rgba: NDArray[_np.uint8], pts: int = 0) -> None: ...
+    def __buffer__(self, flags: int) -> memoryview: ...
+    @property
+    def rgba(self) -> NDArray[_np.uint8]: ...  # コピーしないビュー
 
 class AudioSamples:
-    pts: int  # milliseconds
+    pts: int  # samples (time_base 1/sample_rate)
     pcm: list[float]  # exposed as Python list for zero‑copy
 
     def __init__(self, pts: int, pcm: list[float]) -> None: ...
     def __repr__(self) -> str: ...
     def __eq__(self, other: object) -> bool: ...
 
+_Layer = VideoFrame | NDArray[_np.uint8]
+
 class Compositor:
-    def __init__(self, canvas_width: int, canvas_height: int) -> None: ...
-    def compose(self, layers: Sequence[VideoFrame]) -> VideoFrame: ...
-    def __call__(self, layers: Sequence[VideoFrame]) -> VideoFrame: ...
+    threads: int
+
+    def __init__(
+        self, canvas_width: int, canvas_height: int, threads: int = 0
+    ) -> None: ...
+    def compose(self, layers: Sequence[_Layer]) -> VideoFrame: ...
+    def compose_into(self, layers: Sequence[_Layer], out: _Layer) -> None: ...
+    def compose_reference(self, layers: Sequence[_Layer]) -> VideoFrame: ...
+    def __call__(self, layers: Sequence[_Layer]) -> VideoFrame: ...
+
+class FramePoolStats(TypedDict):
+    hits: int
+    misses: int
+    overflows: int
+    slots: int
+    in_use: int
+    hit_rate: float
+
+class EncoderStats(TypedDict):
+    frame_pool: FramePoolStats
+    video_frames: int
+    audio_frames: int
+    packets: int
+    yuv_reallocs: int
+    audio_reallocs: int
+    convert_ms: float
+    encode_ms: float
+    audio_encode_ms: float
+    video_queue: int
+    audio_queue: int
+    convert_threads: int
+    codec_threads: int
 
 class MediaEncoder:
     def __init__(
@@ -37,14 +74,30 @@ class MediaEncoder:
         fps: int,
         sample_rate: int = 48_000,
         channels: int = 2,
-        video_codec: str = "libx264",
-        audio_codec: str = "aac",
+        video_codec: str = "libx264",  # "" なら音声だけ書き出す
+        audio_codec: str = "aac",  # "" なら映像だけ書き出す
         queue_cap: int = 32,
+        threads: int = 0,
+        thread_type: Literal["frame", "slice", "frame+slice"] = "frame+slice",
+        convert_threads: int = 0,
+        audio_queue_cap: int = 64,
+        gop_size: int = 0,  # 0 = コーデック任せ。指定すると固定間隔の closed GOP
+        pix_fmt: str = "yuv420p",
+        bit_rate: int = 4_000_000,  # 0 = コーデック任せ (crf などで決める)
+        codec_options: Mapping[
+            str, str
+        ] = {},  # avcodec_open2 に渡す (使われなかったものはエラー)
     ) -> None: ...
     def start(self) -> None: ...
+    # 積んだ画素はエンコード完了まで参照される (コピーしない)
+    @overload
+    def submit_video(self, frame: VideoFrame) -> None: ...
+    @overload
     def submit_video(self, rgba: NDArray[_np.uint8], pts: int) -> None: ...
     def submit_audio(self, pcm: NDArray[_np.float32], pts: int) -> None: ...
     def finish(self) -> None: ...
+    def acquire_frame(self, pts: int = 0) -> VideoFrame: ...
+    def stats(self) -> EncoderStats: ...
     def __enter__(self) -> "MediaEncoder": ...
     def __exit__(
         self,
@@ -53,3 +106,5 @@ class MediaEncoder:
         exc_tb: object | None,
     ) -> bool: ...
     def __del__(self) -> None: ...
+
+def concat_segments(inputs: Sequence[str], output: str, audio: str = "") -> None: ...
@@ -0,0 +1,65 @@
+#pragma once
+#include <atomic>
+#include <cstdint>
+#include <memory>
+#include <mutex>
+#include <vector>
+#include "compositor.hpp"
+
+// 同一サイズの RGBA バッファを使い回す有界プール。
+// スロットの参照がプール自身だけ (use_count == 1) になったら空きとみなすので、
+// 返却処理も control block の確保も要らない
+class FramePool {
+public:
+    struct Stats {
+        uint64_t hits{0};      // 空きスロットを再利用
+        uint64_t misses{0};    // スロットを新規確保 (プールが育つ間だけ)
+        uint64_t overflows{0}; // 上限まで使用中でプール外に確保
+        size_t slots{0};       // 現在のスロット数
+        size_t in_use{0};      // 貸出中のスロット数
+    };
+
+    FramePool(int w, int h, size_t cap) : _w(w), _h(h), _cap(cap) { _slots.reserve(cap); }
+
+    VideoFrame acquire(int64_t pts) {
+        VideoFrame f;
+        f.width  = _w;
+        f.height = _h;
+        f.pts    = pts;
+        std::scoped_lock lk(_mtx);
+        for (auto& slot : _slots) {
+            if (slot.use_count() == 1) {
+                std::atomic_thread_fence(std::memory_order_acquire);  // 前の利用者の読み出し完了を待つ
+                ++_stats.hits;
+                f.data  = slot.get();
+                f.owner = slot;
+                return f;
+            }
+        }
+        std::shared_ptr<uint8_t[]> buf(new uint8_t[f.size()]);
+        if (_slots.size() < _cap) {
+            ++_stats.misses;
+            _slots.push_back(buf);
+        } else {
+            ++_stats.overflows;
+        }
+        f.data  = buf.get();
+        f.owner = std::move(buf);
+        return f;
+    }
+
+    Stats stats() const {
+        std::scoped_lock lk(_mtx);
+        Stats s = _stats;
+        s.slots = _slots.size();
+        for (const auto& slot : _slots) s.in_use += slot.use_count() > 1;
+        return s;
+    }
+
+private:
+    int _w, _h;
+    size_t _cap;
+    mutable std::mutex _mtx;
+    std::vector<std::shared_ptr<uint8_t[]>> _slots;
+    Stats _stats;
+};
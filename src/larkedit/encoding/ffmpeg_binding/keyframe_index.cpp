@@ -0,0 +1,252 @@
+#include "keyframe_index.hpp"
+
+#include <algorithm>
+#include <cstdio>
+#include <filesystem>
+#include <fstream>
+#include <functional>
+#include <mutex>
+#include <unordered_map>
+#include "common.hpp"
+
+namespace fs = std::filesystem;
+
+namespace {
+
+/* --- サイドカー形式 (ネイティブエンディアン) ---
+ * "LKIX" | version u32 | size i64 | mtime i64 | path_len u32 | path
+ * | stream i32 | tb.num i32 | tb.den i32 | start_pts i64 | frame_count i64 | n u64 | (pts i64, dts i64) x n
+ */
+constexpr char kMagic[4]    = {'L', 'K', 'I', 'X'};
+constexpr uint32_t kVersion = 1;
+
+struct FileStamp {
+    int64_t size{-1};
+    int64_t mtime{0};
+    bool operator==(const FileStamp& o) const { return size == o.size && mtime == o.mtime; }
+};
+
+FileStamp stamp_of(const fs::path& path) {
+    std::error_code ec;
+    FileStamp st;
+    const auto size = fs::file_size(path, ec);
+    if (ec) return st;
+    const auto mtime = fs::last_write_time(path, ec);
+    if (ec) return st;
+    st.size  = static_cast<int64_t>(size);
+    st.mtime = static_cast<int64_t>(mtime.time_since_epoch().count());
+    return st;
+}
+
+struct CacheEntry {
+    FileStamp stamp;
+    std::shared_ptr<const KeyframeIndex> index;
+};
+
+std::mutex g_mtx;
+std::unordered_map<std::string, CacheEntry> g_cache;
+std::string g_cache_dir;
+
+fs::path sidecar_path(const std::string& dir, const std::string& key) {
+    char name[32];
+    std::snprintf(name, sizeof(name), "%016llx.lkix",
+                  static_cast<unsigned long long>(std::hash<std::string>{}(key)));
+    return fs::path(dir) / name;
+}
+
+template <typename T>
+void put(std::ostream& os, const T& v) {
+    os.write(reinterpret_cast<const char*>(&v), sizeof(T));
+}
+
+template <typename T>
+bool take(std::istream& is, T& v) {
+    return static_cast<bool>(is.read(reinterpret_cast<char*>(&v), sizeof(T)));
+}
+
+// 読めない・古い・別ファイルのものは nullptr
+std::shared_ptr<KeyframeIndex> load_sidecar(const fs::path& path, const std::string& key,
+                                            const FileStamp& st) {
+    std::ifstream is(path, std::ios::binary);
+    if (!is) return nullptr;
+
+    char magic[4];
+    uint32_t version = 0, path_len = 0;
+    FileStamp saved;
+    if (!is.read(magic, 4) || !std::equal(magic, magic + 4, kMagic)) return nullptr;
+    if (!take(is, version) || version != kVersion) return nullptr;
+    if (!take(is, saved.size) || !take(is, saved.mtime) || !(saved == st)) return nullptr;
+    if (!take(is, path_len) || path_len != key.size()) return nullptr;
+    std::string saved_key(path_len, '\0');
+    if (!is.read(saved_key.data(), path_len) || saved_key != key) return nullptr;  // ハッシュ衝突
+
+    auto idx = std::make_shared<KeyframeIndex>();
+    uint64_t n = 0;
+    if (!take(is, idx->stream_index) || !take(is, idx->time_base.num) ||
+        !take(is, idx->time_base.den) || !take(is, idx->start_pts) ||
+        !take(is, idx->frame_count) || !take(is, n))
+        return nullptr;
+    if (idx->time_base.num <= 0 || idx->time_base.den <= 0) return nullptr;
+    // n は壊れていることがある: 残りのバイト数とちょうど合わなければ古いものとして作り直す
+    const std::streamoff body = is.tellg();
+    is.seekg(0, std::ios::end);
+    const std::streamoff end = is.tellg();
+    if (body < 0 || end < body) return nullptr;
+    const uint64_t remaining = static_cast<uint64_t>(end - body);
+    constexpr uint64_t kEntryBytes = 2 * sizeof(int64_t);  // (pts, dts)
+    if (n > remaining / kEntryBytes || n * kEntryBytes != remaining) return nullptr;
+    is.seekg(body);
+    idx->keyframes.resize(n);
+    for (auto& e : idx->keyframes) {
+        if (!take(is, e.pts) || !take(is, e.dts)) return nullptr;
+    }
+    return idx;
+}
+
+// キャッシュなので失敗しても無視する
+void save_sidecar(const fs::path& path, const std::string& key, const FileStamp& st,
+                  const KeyframeIndex& idx) {
+    std::error_code ec;
+    fs::create_directories(path.parent_path(), ec);
+    fs::path tmp = path;
+    tmp += ".tmp";
+    {
+        std::ofstream os(tmp, std::ios::binary | std::ios::trunc);
+        if (!os) return;
+        os.write(kMagic, 4);
+        put(os, kVersion);
+        put(os, st.size);
+        put(os, st.mtime);
+        put(os, static_cast<uint32_t>(key.size()));
+        os.write(key.data(), static_cast<std::streamsize>(key.size()));
+        put(os, idx.stream_index);
+        put(os, idx.time_base.num);
+        put(os, idx.time_base.den);
+        put(os, idx.start_pts);
+        put(os, idx.frame_count);
+        put(os, static_cast<uint64_t>(idx.keyframes.size()));
+        for (const auto& e : idx.keyframes) {
+            put(os, e.pts);
+            put(os, e.dts);
+        }
+        if (!os) {
+            os.close();
+            fs::remove(tmp, ec);
+            return;
+        }
+    }
+    fs::rename(tmp, path, ec);  // 書き途中のファイルを読ませない
+    if (ec) fs::remove(tmp, ec);
+}
+
+inline void throw_if_error(int err, const char* msg) {
+    if (err < 0) {
+        throw std::runtime_error(std::string(msg) + ": " + ff_err2str(err));
+    }
+}
+
+}  // namespace
+
+/* --- */
+
+const KeyframeIndex::Entry* KeyframeIndex::at_or_before(int64_t pts) const {
+    auto it = std::upper_bound(keyframes.begin(), keyframes.end(), pts,
+                               [](int64_t v, const Entry& e) { return v < e.pts; });
+    return it == keyframes.begin() ? nullptr : &*(it - 1);
+}
+
+bool KeyframeIndex::has_keyframe_between(int64_t from, int64_t to) const {
+    auto it = std::upper_bound(keyframes.begin(), keyframes.end(), from,
+                               [](int64_t v, const Entry& e) { return v < e.pts; });
+    return it != keyframes.end() && it->pts <= to;
+}
+
+void KeyframeIndex::set_cache_dir(const std::string& dir) {
+    std::scoped_lock lk(g_mtx);
+    g_cache_dir = dir;
+}
+
+std::string KeyframeIndex::cache_dir() {
+    std::scoped_lock lk(g_mtx);
+    return g_cache_dir;
+}
+
+std::shared_ptr<const KeyframeIndex> KeyframeIndex::get(const std::string& filename, bool build) {
+    std::error_code ec;
+    fs::path abs = fs::absolute(filename, ec);
+    const std::string key = ec ? filename : abs.lexically_normal().string();
+    const FileStamp st = stamp_of(key);
+    if (st.size < 0) return nullptr;  // 通常ファイルでない (URL など)
+
+    std::string dir;
+    {
+        std::scoped_lock lk(g_mtx);
+        auto it = g_cache.find(key);
+        if (it != g_cache.end() && it->second.stamp == st) return it->second.index;
+        dir = g_cache_dir;
+    }
+
+    std::shared_ptr<KeyframeIndex> idx;
+    if (!dir.empty()) idx = load_sidecar(sidecar_path(dir, key), key, st);
+    if (!idx) {
+        if (!build) return nullptr;
+        try {
+            idx = _scan(filename);
+        } catch (const std::exception&) {
+            return nullptr;
+        }
+        if (!dir.empty()) save_sidecar(sidecar_path(dir, key), key, st, *idx);
+    }
+
+    std::scoped_lock lk(g_mtx);
+    g_cache[key] = CacheEntry{st, idx};
+    return idx;
+}
+
+// パケットを読むだけ (デコードしない) でキーフレームを拾う
+std::shared_ptr<KeyframeIndex> KeyframeIndex::_scan(const std::string& filename) {
+    static FFMpegInit _once;
+
+    struct Guard {
+        AVFormatContext* fmt{nullptr};
+        AVPacket* pkt{nullptr};
+        ~Guard() {
+            av_packet_free(&pkt);
+            if (fmt) avformat_close_input(&fmt);
+        }
+    } g;
+
+    throw_if_error(avformat_open_input(&g.fmt, filename.c_str(), nullptr, nullptr),
+                   "avformat_open_input");
+    throw_if_error(avformat_find_stream_info(g.fmt, nullptr), "avformat_find_stream_info");
+    const int vidx = av_find_best_stream(g.fmt, AVMEDIA_TYPE_VIDEO, -1, -1, nullptr, 0);
+    if (vidx < 0) throw std::runtime_error("video stream not found");
+    for (unsigned i = 0; i < g.fmt->nb_streams; ++i) {
+        if (static_cast<int>(i) != vidx) g.fmt->streams[i]->discard = AVDISCARD_ALL;
+    }
+
+    auto idx = std::make_shared<KeyframeIndex>();
+    idx->stream_index = vidx;
+    idx->time_base    = g.fmt->streams[vidx]->time_base;
+    idx->start_pts    = g.fmt->streams[vidx]->start_time != AV_NOPTS_VALUE
+                            ? g.fmt->streams[vidx]->start_time
+                            : 0;
+
+    g.pkt = av_packet_alloc();
+    if (!g.pkt) throw std::runtime_error("av_packet_alloc failed");
+    while (av_read_frame(g.fmt, g.pkt) >= 0) {
+        if (g.pkt->stream_index == vidx) {
+            ++idx->frame_count;
+            if ((g.pkt->flags & AV_PKT_FLAG_KEY) &&
+                (g.pkt->pts != AV_NOPTS_VALUE || g.pkt->dts != AV_NOPTS_VALUE)) {
+                const int64_t pts = g.pkt->pts != AV_NOPTS_VALUE ? g.pkt->pts : g.pkt->dts;
+                const int64_t dts = g.pkt->dts != AV_NOPTS_VALUE ? g.pkt->dts : g.pkt->pts;
+                idx->keyframes.push_back({pts, dts});
+            }
+        }
+        av_packet_unref(g.pkt);
+    }
+    std::sort(idx->keyframes.begin(), idx->keyframes.end(),
+              [](const Entry& a, const Entry& b) { return a.pts < b.pts; });
+    return idx;
+}
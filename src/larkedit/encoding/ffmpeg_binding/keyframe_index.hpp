@@ -0,0 +1,40 @@
+#pragma once
+#include <cstdint>
+#include <memory>
+#include <string>
+#include <vector>
+
+extern "C" {
+    #include <libavutil/avutil.h>
+}
+
+// 映像ストリームのキーフレーム一覧 (demux だけで作る)。
+// プロセス内でキャッシュし、set_cache_dir で指定があればサイドカーファイルにも保存する
+class KeyframeIndex {
+public:
+    struct Entry {
+        int64_t pts;                        // 表示時刻 (time_base)
+        int64_t dts;                        // シークに使う時刻 (time_base)
+    };
+
+    int stream_index{-1};
+    AVRational time_base{0, 1};
+    int64_t start_pts{0};                   // ストリーム先頭 (MediaDecoder の 0 ms)
+    int64_t frame_count{0};                 // 映像パケット数
+    std::vector<Entry> keyframes;           // pts 昇順
+
+    // pts 以前で最後のキーフレーム (無ければ nullptr)
+    const Entry* at_or_before(int64_t pts) const;
+    // (from, to] にキーフレームがあるか
+    bool has_keyframe_between(int64_t from, int64_t to) const;
+
+    // キャッシュ / サイドカーから取得し、無ければ build = true の時だけ作る。
+    // ファイルのサイズ・更新時刻が変わっていたら作り直す。作れなければ nullptr
+    static std::shared_ptr<const KeyframeIndex> get(const std::string& filename, bool build = true);
+    // サイドカーの保存先 (空文字列で保存しない)
+    static void set_cache_dir(const std::string& dir);
+    static std::string cache_dir();
+
+private:
+    static std::shared_ptr<KeyframeIndex> _scan(const std::string& filename);
+};
@@ -0,0 +1,52 @@
+#pragma once
+#include <mutex>
+#include <stdexcept>
+#include <vector>
+
+extern "C" {
+    #include <libavcodec/avcodec.h>
+}
+
+// エンコードスレッド → mux スレッドで受け渡す AVPacket の使い回し。
+// 空なら新規確保し、返却時は cap を超えた分だけ解放する (待たせない)
+class PacketPool {
+public:
+    explicit PacketPool(size_t cap) : _cap(cap) { _free.reserve(cap); }
+    ~PacketPool() {
+        for (auto*& p : _free) av_packet_free(&p);
+    }
+    PacketPool(const PacketPool&) = delete;
+    PacketPool& operator=(const PacketPool&) = delete;
+
+    AVPacket* acquire() {
+        {
+            std::scoped_lock lk(_mtx);
+            if (!_free.empty()) {
+                AVPacket* p = _free.back();
+                _free.pop_back();
+                return p;
+            }
+        }
+        AVPacket* p = av_packet_alloc();
+        if (!p) throw std::runtime_error("av_packet_alloc failed");
+        return p;
+    }
+
+    void release(AVPacket* p) {
+        if (!p) return;
+        av_packet_unref(p);
+        {
+            std::scoped_lock lk(_mtx);
+            if (_free.size() < _cap) {
+                _free.push_back(p);
+                return;
+            }
+        }
+        av_packet_free(&p);
+    }
+
+private:
+    size_t _cap;
+    std::mutex _mtx;
+    std::vector<AVPacket*> _free;
+};
@@ -2,7 +2,13 @@
 #include <pybind11/stl.h>
 #include <pybind11/numpy.h>
 
+#include <algorithm>
+#include <cstring>
+#include <memory>
+
 #include "common.hpp" // ff_err2str / FFMpegInit
+#include "decoder.hpp"
+#include "audio_decoder.hpp"
 extern "C"
 {
 #include <libavformat/avformat.h>
@@ -26,16 +32,6 @@ struct ScopedFmtCtx
     }
 };
 
-struct ScopedCodecCtx
-{
-    AVCodecContext *ctx{nullptr};
-    ~ScopedCodecCtx()
-    {
-        if (ctx)
-            avcodec_free_context(&ctx);
-    }
-};
-
 inline void throw_if(int err, const char *msg)
 {
     if (err < 0)
@@ -43,7 +39,18 @@ inline void throw_if(int err, const char *msg)
 }
 
 // --- MediaInfo ---
-py::dict probe(const std::string &file)
+// FFmpeg 側は GIL を手放して調べ、dict の組み立てだけ GIL を持って行う
+struct MediaInfoData
+{
+    int64_t duration_ms{-1};
+    bool has_video{false};
+    int width{0}, height{0};
+    double fps{0.0};
+    bool has_audio{false};
+    int sample_rate{0}, channels{0};
+};
+
+MediaInfoData probe_info(const std::string &file)
 {
     static FFMpegInit _once;
 
@@ -53,133 +60,228 @@ py::dict probe(const std::string &file)
     throw_if(avformat_find_stream_info(fmt.ctx, nullptr),
              "avformat_find_stream_info");
 
-    py::dict info;
-    info["duration_ms"] = fmt.ctx->duration != AV_NOPTS_VALUE
-                              ? static_cast<int64_t>(fmt.ctx->duration / (AV_TIME_BASE / 1000))
-                              : -1;
+    MediaInfoData info;
+    if (fmt.ctx->duration != AV_NOPTS_VALUE)
+        info.duration_ms = static_cast<int64_t>(fmt.ctx->duration / (AV_TIME_BASE / 1000));
 
     // --- streams ---
     for (unsigned i = 0; i < fmt.ctx->nb_streams; ++i)
     {
         AVStream *st = fmt.ctx->streams[i];
-        if (st->codecpar->codec_type == AVMEDIA_TYPE_VIDEO && !info.contains("video"))
+        if (st->codecpar->codec_type == AVMEDIA_TYPE_VIDEO && !info.has_video)
         {
             AVRational fr = st->avg_frame_rate.num ? st->avg_frame_rate : st->r_frame_rate;
-            double fps = fr.num && fr.den ? static_cast<double>(fr.num) / fr.den : 0.0;
-            py::dict v;
-            v["width"] = st->codecpar->width;
-            v["height"] = st->codecpar->height;
-            v["fps"] = fps;
-            info["video"] = v;
+            info.has_video = true;
+            info.width = st->codecpar->width;
+            info.height = st->codecpar->height;
+            info.fps = fr.num && fr.den ? static_cast<double>(fr.num) / fr.den : 0.0;
         }
-        else if (st->codecpar->codec_type == AVMEDIA_TYPE_AUDIO && !info.contains("audio"))
+        else if (st->codecpar->codec_type == AVMEDIA_TYPE_AUDIO && !info.has_audio)
         {
-            py::dict a;
-            a["sample_rate"] = st->codecpar->sample_rate;
+            info.has_audio = true;
+            info.sample_rate = st->codecpar->sample_rate;
 #if FFMPEG_VERSION_GTE_5
-            a["channels"] = st->codecpar->ch_layout.nb_channels;
+            info.channels = st->codecpar->ch_layout.nb_channels;
 #else
-            a["channels"] = st->codecpar->channels;
+            info.channels = st->codecpar->channels;
 #endif
-            info["audio"] = a;
         }
     }
     return info;
 }
 
+py::dict probe(const std::string &file)
+{
+    MediaInfoData data;
+    {
+        py::gil_scoped_release no_gil;
+        data = probe_info(file);
+    }
+
+    py::dict info;
+    info["duration_ms"] = data.duration_ms;
+    if (data.has_video)
+    {
+        py::dict v;
+        v["width"] = data.width;
+        v["height"] = data.height;
+        v["fps"] = data.fps;
+        info["video"] = v;
+    }
+    if (data.has_audio)
+    {
+        py::dict a;
+        a["sample_rate"] = data.sample_rate;
+        a["channels"] = data.channels;
+        info["audio"] = a;
+    }
+    return info;
+}
+
 // --- extract frame (RGBA) ---
+// 出力を max_w x max_h に収まるよう縮小する (拡大はしない)
+void fit_thumbnail(MediaDecoder &dec, int max_w, int max_h)
+{
+    int w = dec.source_width(), h = dec.source_height();
+    if (max_w > 0 && max_h > 0)
+    {
+        double scale = std::min(1.0, std::min(static_cast<double>(max_w) / w,
+                                              static_cast<double>(max_h) / h));
+        w = std::max(1, static_cast<int>(w * scale));
+        h = std::max(1, static_cast<int>(h * scale));
+    }
+    dec.set_output_size(w, h, false);
+}
+
 py::tuple extract_rgba_frame(const std::string &file,
                              int64_t ms,
                              int max_w,
                              int max_h)
 {
-    static FFMpegInit _once;
+    std::vector<uint8_t> rgba;
+    int dst_w = 0, dst_h = 0;
+    {
+        py::gil_scoped_release no_gil;
+        MediaDecoder dec(file, 0, 0, true, 0, false);  // 1 回きりなので索引は作らない (あれば使う)
+        fit_thumbnail(dec, max_w, max_h);
+        dst_w = dec.width();
+        dst_h = dec.height();
 
-    // --- open / find video stream ---
-    ScopedFmtCtx fmt;
-    throw_if(avformat_open_input(&fmt.ctx, file.c_str(), nullptr, nullptr),
-             "avformat_open_input");
-    throw_if(avformat_find_stream_info(fmt.ctx, nullptr),
-             "avformat_find_stream_info");
+        dec.seek(ms);
+        rgba.resize(static_cast<size_t>(dst_w) * dst_h * 4);
+        int64_t pts = 0;
+        if (!dec.read_frame(rgba.data(), pts))
+            throw std::runtime_error("decode failed");
+    }
 
-    int v_idx = av_find_best_stream(fmt.ctx, AVMEDIA_TYPE_VIDEO, -1, -1, nullptr, 0);
-    if (v_idx < 0)
-        throw std::runtime_error("video stream not found");
-
-    AVStream *v_st = fmt.ctx->streams[v_idx];
-    const AVCodec *codec = avcodec_find_decoder(v_st->codecpar->codec_id);
-    if (!codec)
-        throw std::runtime_error("decoder not found");
-
-    ScopedCodecCtx vctx;
-    vctx.ctx = avcodec_alloc_context3(codec);
-    avcodec_parameters_to_context(vctx.ctx, v_st->codecpar);
-    throw_if(avcodec_open2(vctx.ctx, codec, nullptr), "avcodec_open2");
-
-    // --- seek ---
-    int64_t ts = ms * v_st->time_base.den / (1000LL * v_st->time_base.num);
-    av_seek_frame(fmt.ctx, v_idx, ts, AVSEEK_FLAG_BACKWARD);
-    avcodec_flush_buffers(vctx.ctx);
-
-    // --- decode first frame ---
-    AVPacket *pkt = av_packet_alloc();
-    AVFrame *frm = av_frame_alloc();
-    bool got = false;
-    while (av_read_frame(fmt.ctx, pkt) >= 0)
+    return py::make_tuple(dst_w, dst_h,
+                          py::bytes(reinterpret_cast<char *>(rgba.data()),
+                                    rgba.size()));
+}
+
+// --- extract frames (RGBA, batch) ---
+// 時刻を昇順に並べて 1 つのデコーダで前から順に読み、(N, H, W, 4) を元の順序で返す。
+// exact = false なら時刻ごとにシークして最初にデコードできたフレーム (直前のキーフレーム) を使う。
+// キーフレーム索引 (初回はファイル全体を読む) は exact = true のときだけ作る
+py::array_t<uint8_t> extract_rgba_frames(const std::string &file,
+                                         const std::vector<int64_t> &ms_list,
+                                         int max_w,
+                                         int max_h,
+                                         bool exact)
+{
+    std::unique_ptr<MediaDecoder> dec;
     {
-        if (pkt->stream_index != v_idx)
-        {
-            av_packet_unref(pkt);
-            continue;
-        }
-        throw_if(avcodec_send_packet(vctx.ctx, pkt), "send_packet");
-        av_packet_unref(pkt);
-        while (avcodec_receive_frame(vctx.ctx, frm) == 0)
-        {
-            got = true;
-            break;
-        }
-        if (got)
-            break;
+        py::gil_scoped_release no_gil;
+        dec = std::make_unique<MediaDecoder>(file, 0, 0, true, 0, exact);
+        fit_thumbnail(*dec, max_w, max_h);
     }
-    av_packet_free(&pkt);
-    if (!got)
+
+    const py::ssize_t n = static_cast<py::ssize_t>(ms_list.size());
+    py::array_t<uint8_t> out({n, static_cast<py::ssize_t>(dec->height()),
+                              static_cast<py::ssize_t>(dec->width()), py::ssize_t{4}});
+    uint8_t *base = out.mutable_data();
+    const size_t frame_bytes = static_cast<size_t>(dec->width()) * dec->height() * 4;
+
     {
-        av_frame_free(&frm);
-        throw std::runtime_error("decode failed");
+        py::gil_scoped_release no_gil;
+        std::vector<size_t> order(ms_list.size());
+        for (size_t i = 0; i < order.size(); ++i)
+            order[i] = i;
+        std::stable_sort(order.begin(), order.end(),
+                         [&](size_t a, size_t b) { return ms_list[a] < ms_list[b]; });
+
+        const uint8_t *prev = nullptr;
+        for (size_t k : order)
+        {
+            uint8_t *dst = base + frame_bytes * k;
+            int64_t pts = 0;
+            dec->seek(ms_list[k], exact);
+            if (!dec->read_frame(dst, pts))
+            {
+                // 終端より後: 直前のフレーム (無ければ透明) で埋める
+                if (prev)
+                    std::memcpy(dst, prev, frame_bytes);
+                else
+                    std::memset(dst, 0, frame_bytes);
+            }
+            prev = dst;
+        }
     }
+    return out;
+}
 
-    // --- scale & RGBA ---
-    int dst_w = frm->width, dst_h = frm->height;
-    if (max_w > 0 && max_h > 0)
+// --- keyframe index ---
+std::vector<int64_t> keyframe_times(const std::string &file)
+{
+    std::shared_ptr<const KeyframeIndex> idx;
     {
-        double scale = std::min(1.0, std::min(static_cast<double>(max_w) / frm->width,
-                                              static_cast<double>(max_h) / frm->height));
-        dst_w = static_cast<int>(frm->width * scale);
-        dst_h = static_cast<int>(frm->height * scale);
+        py::gil_scoped_release no_gil;
+        idx = KeyframeIndex::get(file);
     }
+    if (!idx)
+        throw std::runtime_error("failed to build keyframe index");
+
+    // MediaDecoder の pts と同じ基準 (ストリーム先頭 = 0 ms)
+    std::vector<int64_t> out;
+    out.reserve(idx->keyframes.size());
+    for (const auto &e : idx->keyframes)
+        out.push_back(av_rescale_q(e.pts - idx->start_pts, idx->time_base, AVRational{1, 1000}));
+    return out;
+}
+
+// --- MediaDecoder ---
+using RgbaArray = py::array_t<uint8_t, py::array::c_style>;
 
-    SwsContext *sws = sws_getContext(frm->width, frm->height,
-                                     static_cast<AVPixelFormat>(frm->format),
-                                     dst_w, dst_h, AV_PIX_FMT_RGBA,
-                                     SWS_BILINEAR, nullptr, nullptr, nullptr);
-    if (!sws)
+// out が指定されていれば検査してそのまま使い、無ければ新しく確保する
+RgbaArray output_array(const MediaDecoder &dec, const py::object &out)
+{
+    if (out.is_none())
+        return RgbaArray({dec.height(), dec.width(), 4});
+
+    if (!py::isinstance<RgbaArray>(out))
+        throw std::runtime_error("out must be a C-contiguous uint8 ndarray");
+    RgbaArray arr = out.cast<RgbaArray>();
+    if (arr.ndim() != 3 || arr.shape(0) != dec.height() || arr.shape(1) != dec.width() ||
+        arr.shape(2) != 4)
+        throw std::runtime_error("Expected HxWx4 RGBA matching decoder output size");
+    if (!arr.writeable())
+        throw std::runtime_error("out must be writable");
+    return arr;
+}
+
+// (pts_ms, ndarray) / 終端なら None
+py::object read_into(MediaDecoder &dec, const py::object &out)
+{
+    RgbaArray arr = output_array(dec, out);
+    uint8_t *dst = arr.mutable_data();
+    int64_t pts = 0;
+    bool ok;
     {
-        av_frame_free(&frm);
-        throw std::runtime_error("sws_getContext");
+        py::gil_scoped_release no_gil;
+        ok = dec.read_frame(dst, pts);
     }
+    if (!ok)
+        return py::none();
+    return py::make_tuple(pts, arr);
+}
 
-    std::vector<uint8_t> rgba(dst_w * dst_h * 4);
-    uint8_t *dst_data[1] = {rgba.data()};
-    int dst_linesize[1] = {dst_w * 4};
-
-    sws_scale(sws, frm->data, frm->linesize, 0, frm->height, dst_data, dst_linesize);
-    sws_freeContext(sws);
-    av_frame_free(&frm);
+// --- AudioDecoder ---
+using PcmArray = py::array_t<float, py::array::c_style>;
 
-    return py::make_tuple(dst_w, dst_h,
-                          py::bytes(reinterpret_cast<char *>(rgba.data()),
-                                    rgba.size()));
+// out (N x channels) の先頭から読めるだけ書き、書いたサンプル数を返す
+int audio_read_into(AudioDecoder &dec, const py::object &out)
+{
+    if (!py::isinstance<PcmArray>(out))
+        throw std::runtime_error("out must be a C-contiguous float32 ndarray");
+    PcmArray arr = out.cast<PcmArray>();
+    if (arr.ndim() != 2 || arr.shape(1) != dec.channels())
+        throw std::runtime_error("Expected N x channels float32 array");
+    if (!arr.writeable())
+        throw std::runtime_error("out must be writable");
+    float *dst = arr.mutable_data();
+    const int n = static_cast<int>(arr.shape(0));
+    py::gil_scoped_release no_gil;
+    return dec.read(dst, n);
 }
 
 // --- module ---
@@ -199,4 +301,81 @@ PYBIND11_MODULE(probe, m)
               Extract one frame at given milliseconds.
               Returns (width, height, raw_rgba_bytes).
           )pbdoc");
+
+    m.def("extract_rgba_frames", &extract_rgba_frames,
+          py::arg("file"),
+          py::arg("ms_list"),
+          py::arg("max_w") = 256,
+          py::arg("max_h") = 256,
+          py::arg("exact") = true,
+          R"pbdoc(
+              Extract frames at many timestamps in one sequential decode pass.
+              Returns an (N, H, W, 4) uint8 array in the order of ms_list.
+              exact=False takes the keyframe at or before each timestamp
+              without building the keyframe index.
+          )pbdoc");
+    m.def("set_index_dir", &KeyframeIndex::set_cache_dir, py::arg("path"),
+          "Directory for keyframe index sidecar files (empty string disables persistence).");
+    m.def("keyframe_times", &keyframe_times, py::arg("file"),
+          "Build (or load) the keyframe index and return keyframe times in ms.");
+
+    // 開いたままにして read_frame / seek を繰り返す (スケーラ・デコーダは使い回す)
+    py::class_<MediaDecoder>(m, "MediaDecoder")
+        .def(py::init<const std::string &, int, int, bool, int, bool>(),
+             py::arg("file"), py::arg("width") = 0, py::arg("height") = 0,
+             py::arg("fit") = true, py::arg("threads") = 0, py::arg("use_index") = true,
+             py::call_guard<py::gil_scoped_release>())
+        .def("read_frame", &read_into, py::arg("out") = py::none(),
+             "Decode the next frame into out (or a new array). Returns (pts_ms, rgba) or None at EOF.")
+        .def("seek", &MediaDecoder::seek, py::arg("ms"), py::arg("exact") = true,
+             py::call_guard<py::gil_scoped_release>(),
+             "Seek so that the next read_frame returns the frame shown at ms "
+             "(exact=False: the keyframe at or before ms).")
+        .def("keyframe_before", &MediaDecoder::keyframe_before, py::arg("ms"),
+             py::call_guard<py::gil_scoped_release>())
+        .def("frame_at", [](MediaDecoder &self, int64_t ms, const py::object &out) {
+                {
+                    py::gil_scoped_release no_gil;
+                    self.seek(ms);
+                }
+                return read_into(self, out);
+            }, py::arg("ms"), py::arg("out") = py::none())
+        .def("set_output_size", &MediaDecoder::set_output_size,
+             py::arg("width"), py::arg("height"), py::arg("fit") = true)
+        .def("__iter__", [](py::object self) { return self; })
+        .def("__next__", [](MediaDecoder &self) {
+                py::object r = read_into(self, py::none());
+                if (r.is_none())
+                    throw py::stop_iteration();
+                return r;
+            })
+        .def_property_readonly("width", &MediaDecoder::width)
+        .def_property_readonly("height", &MediaDecoder::height)
+        .def_property_readonly("fit", &MediaDecoder::fit)
+        .def_property_readonly("source_width", &MediaDecoder::source_width)
+        .def_property_readonly("source_height", &MediaDecoder::source_height)
+        .def_property_readonly("fps", &MediaDecoder::fps)
+        .def_property_readonly("duration_ms", &MediaDecoder::duration_ms);
+
+    // 出力は float32 interleaved (N x channels)。大きめの塊で読むと呼び出しの手間が薄まる
+    py::class_<AudioDecoder>(m, "AudioDecoder")
+        .def(py::init<const std::string &, int, int>(),
+             py::arg("file"), py::arg("sample_rate") = 48000, py::arg("channels") = 2,
+             py::call_guard<py::gil_scoped_release>())
+        .def("read", [](AudioDecoder &self, int max_samples) {
+                PcmArray arr({std::max(max_samples, 0), self.channels()});
+                const int n = audio_read_into(self, arr);
+                return n == arr.shape(0) ? arr : PcmArray(arr[py::slice(0, n, 1)]);
+            }, py::arg("max_samples"),
+             "Decode up to max_samples samples. Returns an N x channels float32 array (N = 0 at EOF).")
+        .def("read_into", &audio_read_into, py::arg("out"),
+             "Decode into out (N x channels float32). Returns the number of samples written.")
+        .def("seek", &AudioDecoder::seek, py::arg("ms"),
+             py::call_guard<py::gil_scoped_release>(),
+             "Seek so that the next read starts at ms (sample accurate).")
+        .def_property_readonly("sample_rate", &AudioDecoder::sample_rate)
+        .def_property_readonly("channels", &AudioDecoder::channels)
+        .def_property_readonly("source_sample_rate", &AudioDecoder::source_sample_rate)
+        .def_property_readonly("source_channels", &AudioDecoder::source_channels)
+        .def_property_readonly("duration_ms", &AudioDecoder::duration_ms);
 }
@@ -1,4 +1,7 @@
-from typing import Dict, Literal, Tuple, Union
+from typing import Dict, Literal, Sequence, Tuple, Union
+
+import numpy as _np
+from numpy.typing import NDArray
 
 def probe(file: str) -> Union[
     Dict[Literal["duration_ms"], int],
@@ -8,3 +11,72 @@ def probe(file: str) -> Union[
 def extract_rgba_frame(
     file: str, ms: int = 0, max_w: int = 256, max_h: int = 256
 ) -> Tuple[int, int, bytes]: ...
+def extract_rgba_frames(
+    file: str,
+    ms_list: Sequence[int],
+    max_w: int = 256,
+    max_h: int = 256,
+    exact: bool = True,
+) -> NDArray[_np.uint8]: ...
+def set_index_dir(path: str) -> None: ...
+def keyframe_times(file: str) -> list[int]: ...
+
+class MediaDecoder:
+    """開いたまま連続読み出し・シークする映像デコーダ (出力は HxWx4 RGBA)"""
+
+    def __init__(
+        self,
+        file: str,
+        width: int = 0,
+        height: int = 0,
+        fit: bool = True,
+        threads: int = 0,
+        use_index: bool = True,
+    ) -> None: ...
+    @property
+    def width(self) -> int: ...
+    @property
+    def height(self) -> int: ...
+    @property
+    def fit(self) -> bool: ...
+    @property
+    def source_width(self) -> int: ...
+    @property
+    def source_height(self) -> int: ...
+    @property
+    def fps(self) -> float: ...
+    @property
+    def duration_ms(self) -> int: ...
+    # out を渡すとその配列に書き込んで返す (height x width x 4, C 連続, 書き込み可)
+    def read_frame(
+        self, out: NDArray[_np.uint8] | None = None
+    ) -> tuple[int, NDArray[_np.uint8]] | None: ...
+    def seek(self, ms: int, exact: bool = True) -> None: ...
+    def keyframe_before(self, ms: int) -> int: ...
+    def frame_at(
+        self, ms: int, out: NDArray[_np.uint8] | None = None
+    ) -> tuple[int, NDArray[_np.uint8]] | None: ...
+    def set_output_size(self, width: int, height: int, fit: bool = True) -> None: ...
+    def __iter__(self) -> "MediaDecoder": ...
+    def __next__(self) -> tuple[int, NDArray[_np.uint8]]: ...
+
+class AudioDecoder:
+    """開いたまま連続読み出し・シークする音声デコーダ (出力は N x channels の float32)"""
+
+    def __init__(
+        self, file: str, sample_rate: int = 48000, channels: int = 2
+    ) -> None: ...
+    @property
+    def sample_rate(self) -> int: ...
+    @property
+    def channels(self) -> int: ...
+    @property
+    def source_sample_rate(self) -> int: ...
+    @property
+    def source_channels(self) -> int: ...
+    @property
+    def duration_ms(self) -> int: ...
+    def read(self, max_samples: int) -> NDArray[_np.float32]: ...
+    # out (N x channels, C 連続, 書き込み可) の先頭から書き、書いたサンプル数を返す
+    def read_into(self, out: NDArray[_np.float32]) -> int: ...
+    def seek(self, ms: int) -> None: ...
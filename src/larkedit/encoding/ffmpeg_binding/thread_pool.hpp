@@ -0,0 +1,92 @@
+#pragma once
+#include <algorithm>
+#include <atomic>
+#include <condition_variable>
+#include <cstdint>
+#include <exception>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+// 常駐ワーカーで parallel_for を回すだけの小さなプール
+// (呼び出しスレッドも 1 ワーカーとして参加する)
+class ThreadPool {
+public:
+    explicit ThreadPool(unsigned n = 0) {
+        if (n == 0) n = std::max(1u, std::thread::hardware_concurrency());
+        for (unsigned i = 1; i < n; ++i) _workers.emplace_back([this]{ _loop(); });
+    }
+    ~ThreadPool() {
+        { std::scoped_lock lk(_mtx); _stop = true; }
+        _cv.notify_all();
+        for (auto& t : _workers) t.join();
+    }
+    ThreadPool(const ThreadPool&) = delete;
+    ThreadPool& operator=(const ThreadPool&) = delete;
+
+    unsigned size() const { return static_cast<unsigned>(_workers.size()) + 1; }
+
+    // fn(i) を i ∈ [0, n) で実行し、全て終わるまで待つ
+    void parallel_for(size_t n, const std::function<void(size_t)>& fn) {
+        if (n == 0) return;
+        if (_workers.empty() || n == 1) {
+            for (size_t i = 0; i < n; ++i) fn(i);
+            return;
+        }
+        std::scoped_lock run(_run_mtx);  // 同時に投入されたジョブは直列化
+        {
+            std::scoped_lock lk(_mtx);
+            _fn = &fn;
+            _n = n;
+            _next = 0;
+            _busy = _workers.size();
+            _error = nullptr;
+            ++_gen;
+        }
+        _cv.notify_all();
+        _drain();
+        std::unique_lock lk(_mtx);
+        _cv_done.wait(lk, [&]{ return _busy == 0; });
+        _fn = nullptr;
+        if (_error) std::rethrow_exception(_error);
+    }
+
+private:
+    void _drain() {
+        for (size_t i; (i = _next.fetch_add(1)) < _n;) {
+            try {
+                (*_fn)(i);
+            } catch (...) {
+                std::scoped_lock lk(_mtx);
+                if (!_error) _error = std::current_exception();
+            }
+        }
+    }
+
+    void _loop() {
+        uint64_t seen = 0;
+        while (true) {
+            {
+                std::unique_lock lk(_mtx);
+                _cv.wait(lk, [&]{ return _stop || _gen != seen; });
+                if (_stop) return;
+                seen = _gen;
+            }
+            _drain();
+            std::scoped_lock lk(_mtx);
+            if (--_busy == 0) _cv_done.notify_one();
+        }
+    }
+
+    std::vector<std::thread> _workers;
+    std::mutex _mtx, _run_mtx;
+    std::condition_variable _cv, _cv_done;
+    const std::function<void(size_t)>* _fn{nullptr};
+    size_t _n{0};
+    std::atomic<size_t> _next{0};
+    size_t _busy{0};
+    uint64_t _gen{0};
+    std::exception_ptr _error;
+    bool _stop{false};
+};
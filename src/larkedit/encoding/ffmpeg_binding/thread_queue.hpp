@@ -1,25 +1,32 @@
 #pragma once
 #include <condition_variable>
 #include <mutex>
-#include <queue>
+#include <vector>
 #include <optional>
 
+// 固定長リングバッファの有界キュー (push/pop でヒープ確保しない)
 template <typename T>
 class ThreadQueue {
 public:
-    explicit ThreadQueue(size_t cap = 16) : _cap(cap) {}
-    void push(T v) {
+    explicit ThreadQueue(size_t cap = 16) : _buf(cap ? cap : 1) {}
+    // close 済みなら積まずに false
+    bool push(T v) {
         std::unique_lock lk(_mtx);
-        _cv_full.wait(lk, [&]{ return _q.size() < _cap || _closed; });
-        if (_closed) return;
-        _q.push(std::move(v));
+        _cv_full.wait(lk, [&]{ return _size < _buf.size() || _closed; });
+        if (_closed) return false;
+        _buf[(_head + _size) % _buf.size()].emplace(std::move(v));
+        ++_size;
         _cv_empty.notify_one();
+        return true;
     }
     std::optional<T> pop() {
         std::unique_lock lk(_mtx);
-        _cv_empty.wait(lk, [&]{ return !_q.empty() || _closed; });
-        if (_q.empty()) return std::nullopt;
-        T v = std::move(_q.front()); _q.pop();
+        _cv_empty.wait(lk, [&]{ return _size > 0 || _closed; });
+        if (_size == 0) return std::nullopt;
+        std::optional<T> v = std::move(_buf[_head]);
+        _buf[_head].reset();
+        _head = (_head + 1) % _buf.size();
+        --_size;
         _cv_full.notify_one();
         return v;
     }
@@ -27,10 +34,11 @@ public:
         { std::scoped_lock lk(_mtx); _closed = true; }
         _cv_empty.notify_all(); _cv_full.notify_all();
     }
+    size_t size() const { std::scoped_lock lk(_mtx); return _size; }
 private:
-    std::mutex _mtx;
+    mutable std::mutex _mtx;
     std::condition_variable _cv_empty, _cv_full;
-    std::queue<T> _q;
-    size_t _cap;
+    std::vector<std::optional<T>> _buf;
+    size_t _head{0}, _size{0};
     bool _closed{false};
 };
@@ -0,0 +1,440 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Sequence
+
+import numpy as np
+
+from ..utils.paths import cache_dir
+from .ffmpeg_binding import encoder as ffm  # type: ignore
+
+if TYPE_CHECKING:
+    from ..core.compositor import RenderSettings, ThreadType
+    from ..core.project import Project
+
+__all__ = [
+    "PRESETS",
+    "EncodingPreset",
+    "TuneMeasurement",
+    "TuneResult",
+    "auto_tune",
+    "get_preset",
+    "speed_ladder",
+]
+
+
+@dataclass(frozen=True, slots=True)
+class EncodingPreset:
+    """
+    名前付きの書き出し設定 (配信先ごと)。
+    options はそのまま avcodec_open2 に渡る (libx264 なら preset / crf / profile、
+    コーデック共通の maxrate / bufsize / g など)。使われなかった名前はエンコーダがエラーにする。
+    quality は同じ系統のプリセットどうしの画質の順位 (大きいほど良い。auto_tune で比べる)
+    """
+
+    name: str
+    label: str
+    video_codec: str = "libx264"
+    audio_codec: str = "aac"
+    pix_fmt: str = "yuv420p"
+    bit_rate: int = 0  # 0 = crf などで決める
+    options: dict[str, str] = field(default_factory=dict)
+    threads: int = 0  # エンコーダのスレッド数 (0 = 自動)
+    thread_type: ThreadType = "frame+slice"
+    quality: int = 0
+
+    def with_options(self, **options: str) -> EncodingPreset:
+        """options を上書きしたもの"""
+        return dataclasses.replace(self, options={**self.options, **options})
+
+    def encoder_kwargs(self) -> dict[str, Any]:
+        """MediaEncoder のキーワード引数"""
+        return {
+            "video_codec": self.video_codec,
+            "audio_codec": self.audio_codec,
+            "pix_fmt": self.pix_fmt,
+            "bit_rate": self.bit_rate,
+            "codec_options": dict(self.options),
+            "threads": self.threads,
+            "thread_type": self.thread_type,
+        }
+
+    def apply(self, settings: RenderSettings) -> RenderSettings:
+        """settings のエンコーダ設定をこのプリセットにしたもの (出力先や範囲はそのまま)"""
+        return dataclasses.replace(
+            settings,
+            video_codec=self.video_codec,
+            audio_codec=self.audio_codec,
+            pix_fmt=self.pix_fmt,
+            bit_rate=self.bit_rate,
+            codec_options=dict(self.options),
+            codec_threads=self.threads,
+            thread_type=self.thread_type,
+        )
+
+
+# --- 配信先ごとのプリセット ---
+
+PRESETS: dict[str, EncodingPreset] = {
+    p.name: p
+    for p in (
+        EncodingPreset(
+            "draft",
+            "下書き確認 (速さ優先)",
+            options={"preset": "ultrafast", "crf": "28"},
+            quality=10,
+        ),
+        EncodingPreset(
+            "web",
+            "Web 配信 (H.264)",
+            options={"preset": "veryfast", "crf": "23", "profile": "high"},
+            quality=40,
+        ),
+        EncodingPreset(
+            "social",
+            "SNS (H.264、ビットレート上限付き)",
+            options={
+                "preset": "fast",
+                "crf": "21",
+                "profile": "high",
+                "maxrate": "8M",
+                "bufsize": "16M",
+            },
+            quality=50,
+        ),
+        EncodingPreset(
+            "hevc",
+            "H.265 (同じ画質でより小さく)",
+            video_codec="libx265",
+            options={"preset": "medium", "crf": "24"},
+            quality=60,
+        ),
+        EncodingPreset(
+            "upload",
+            "動画サイトへのアップロード (H.264 高画質)",
+            options={"preset": "slow", "crf": "18", "profile": "high"},
+            quality=70,
+        ),
+        EncodingPreset(
+            "archive",
+            "保存用 (H.264 4:4:4、ほぼ劣化なし)",
+            pix_fmt="yuv444p",
+            options={"preset": "slow", "crf": "14"},
+            quality=90,
+        ),
+    )
+}
+
+
+def get_preset(name: str) -> EncodingPreset:
+    try:
+        return PRESETS[name]
+    except KeyError:
+        raise KeyError(
+            f"unknown encoding preset {name!r} (one of {', '.join(PRESETS)})"
+        ) from None
+
+
+# x264 / x265 の preset (遅いほど同じ crf で小さく・きれいになる)
+_SPEED_PRESETS = (
+    "veryslow",
+    "slower",
+    "slow",
+    "medium",
+    "fast",
+    "faster",
+    "veryfast",
+    "superfast",
+    "ultrafast",
+)
+_SPEED_CODECS = ("libx264", "libx265")
+
+
+def speed_ladder(base: EncodingPreset, slowest: str = "slow") -> list[EncodingPreset]:
+    """
+    base の preset だけを slowest から ultrafast まで振ったもの (画質の良い順)。
+    preset の無いコーデックなら [base]
+    """
+    if base.video_codec not in _SPEED_CODECS:
+        return [base]
+    speeds = _SPEED_PRESETS[_SPEED_PRESETS.index(slowest) :]
+    return [
+        dataclasses.replace(
+            base.with_options(preset=p),
+            name=f"{base.name}@{p}",
+            quality=base.quality + len(speeds) - i,
+        )
+        for i, p in enumerate(speeds)
+    ]
+
+
+# --- 自動調整 ---
+# 候補のプリセット × スレッド設定で、プロジェクトから切り出した数秒を実際にエンコードして速さを測り、
+# 要求した実時間倍率を満たすうちで最も画質の良いものを選ぶ。結果はホストごとにキャッシュする。
+
+_SAMPLE_FRAMES = 16  # 合成して手元に持つフレーム数 (往復させて sample_s 秒ぶんにする)
+_CACHE_VERSION = 1
+_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True, slots=True)
+class TuneMeasurement:
+    preset: str
+    threads: int
+    thread_type: ThreadType
+    realtime: float  # 実時間の何倍速でエンコードできたか
+    error: str | None = None  # エンコーダを開けなかった (このホストでは使えない候補)
+
+
+@dataclass(slots=True)
+class TuneResult:
+    preset: EncodingPreset  # threads / thread_type も決めたもの
+    realtime: float
+    met_target: bool  # False なら目標に届かず、最も速かったものを返した
+    measurements: list[TuneMeasurement] = field(default_factory=list)
+    cached: bool = False
+
+
+def auto_tune(
+    project: Project,
+    base: EncodingPreset | str = "web",
+    *,
+    target_realtime: float = 1.0,
+    candidates: Sequence[EncodingPreset] | None = None,
+    thread_options: Sequence[tuple[int, ThreadType]] | None = None,
+    sample_s: float = 2.0,
+    width: int = 0,
+    height: int = 0,
+    fps: int = 0,
+    use_cache: bool = True,
+) -> TuneResult:
+    """
+    このマシンで target_realtime 倍速以上でエンコードできる、最も画質の良い設定を選ぶ。
+    candidates を省略すると base の speed_ladder()。画質の良い順に試し、
+    各候補では thread_options (スレッド数, thread_type) のうち最も速いものを使う。
+    計るのはエンコードだけ (デコード・合成はあらかじめ済ませたフレームを流す)。
+    同じホスト・解像度・候補の結果はキャッシュから返す (use_cache=False で測り直す)。
+    このビルドに無いコーデックなど、エンコードできなかった候補は飛ばして measurements に
+    error 付きで残す。どの候補も使えなければ RuntimeError
+    """
+    if isinstance(base, str):
+        base = get_preset(base)
+    width = width or project.width
+    height = height or project.height
+    fps = fps or project.fps
+    ranked = sorted(candidates or speed_ladder(base), key=lambda p: -p.quality)
+    if not ranked:
+        raise ValueError("no candidate presets")
+    options = list(thread_options or _default_thread_options())
+
+    key = _cache_key(ranked, options, width, height, fps, target_realtime)
+    if use_cache and (hit := _cache_get(key, ranked)) is not None:
+        return hit
+
+    frames = _sample_frames(project, width, height, fps)
+    n = max(1, round(sample_s * fps))
+    measurements: list[TuneMeasurement] = []
+    chosen: tuple[EncodingPreset, float] | None = None
+    fastest: tuple[EncodingPreset, float] | None = None
+    for cand in ranked:
+        best: tuple[EncodingPreset, float] | None = None
+        for threads, thread_type in options:
+            p = dataclasses.replace(cand, threads=threads, thread_type=thread_type)
+            try:
+                rt = _bench(p, frames, n, width, height, fps)
+            except RuntimeError as e:
+                measurements.append(
+                    TuneMeasurement(cand.name, threads, thread_type, 0.0, str(e))
+                )
+                break  # コーデックやオプションの問題なのでスレッド設定を変えても同じ
+            measurements.append(TuneMeasurement(cand.name, threads, thread_type, rt))
+            if best is None or rt > best[1]:
+                best = (p, rt)
+        if best is None:
+            continue
+        if fastest is None or best[1] > fastest[1]:
+            fastest = best
+        if best[1] >= target_realtime:
+            chosen = best
+            break
+    if fastest is None:
+        errors = "; ".join(f"{m.preset}: {m.error}" for m in measurements)
+        raise RuntimeError(
+            f"no candidate preset can be encoded on this host ({errors})"
+        )
+    preset, rt = chosen or fastest
+    result = TuneResult(preset, rt, chosen is not None, measurements)
+    _cache_put(key, result)
+    return result
+
+
+def _default_thread_options() -> list[tuple[int, ThreadType]]:
+    half = max(1, (os.cpu_count() or 1) // 2)
+    return [(0, "frame+slice"), (0, "frame"), (half, "frame+slice")]
+
+
+def _bench(
+    preset: EncodingPreset,
+    frames: list[np.ndarray],
+    n: int,
+    width: int,
+    height: int,
+    fps: int,
+) -> float:
+    """frames を往復させて n フレームエンコードし、実時間の何倍速だったかを返す"""
+    cycle = list(range(len(frames))) + list(range(len(frames) - 2, 0, -1)) or [0]
+    kwargs = preset.encoder_kwargs()
+    kwargs["audio_codec"] = ""
+    with tempfile.TemporaryDirectory(prefix="larkedit-tune-") as tmp:
+        # 捨てるファイルなのでどのコーデックでも書ける Matroska にする (mp4 は ffv1 などを通さない)
+        enc = ffm.MediaEncoder(
+            str(Path(tmp) / "bench.mkv"), width, height, fps, **kwargs
+        )
+        enc.start()
+        t0 = time.perf_counter()
+        for i in range(n):
+            enc.submit_video(frames[cycle[i % len(cycle)]], i * 1000 // fps)
+        enc.finish()
+        elapsed = time.perf_counter() - t0
+        del enc
+    return n / fps / elapsed if elapsed > 0 else float("inf")
+
+
+def _sample_frames(
+    project: Project, width: int, height: int, fps: int
+) -> list[np.ndarray]:
+    """タイムライン中央の連続したフレームを合成する (映像が無ければ作り物)"""
+    from ..core.compositor import _next_layers, _open_readers
+
+    plan = project.timeline.render_plan(fps)
+    if plan.frame_count == 0:
+        return _synthetic_frames(width, height)
+    first = max(0, plan.frame_count // 2 - _SAMPLE_FRAMES // 2)
+    last = min(plan.frame_count, first + _SAMPLE_FRAMES)
+    stop = threading.Event()
+    readers = _open_readers(
+        plan, first, last, width, height, lookahead=4, threads=0, stop=stop
+    )
+    comp = ffm.Compositor(width, height, 0)
+    frames = []
+    for r in readers:
+        r.start()
+    try:
+        for _ in range(first, last):
+            held = _next_layers(readers)
+            try:
+                image = np.empty((height, width, 4), np.uint8)
+                comp.compose_into([r.slots.frames[slot] for r, slot in held], image)
+                frames.append(image)
+            finally:
+                for r, slot in held:
+                    r.slots.release(slot)
+    finally:
+        stop.set()
+        for r in readers:
+            r.join()
+    return frames
+
+
+def _synthetic_frames(width: int, height: int) -> list[np.ndarray]:
+    """動くグラデーションとノイズ (真っ黒だとエンコードが速すぎて参考にならない)"""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.int32)
+    noise = rng.integers(0, 32, (height, width), np.int32)
+    frames = []
+    for i in range(_SAMPLE_FRAMES):
+        image = np.empty((height, width, 4), np.uint8)
+        image[..., 0] = (x + 8 * i) & 0xFF
+        image[..., 1] = (y + 4 * i) & 0xFF
+        image[..., 2] = ((x + y) // 2 + noise) & 0xFF
+        image[..., 3] = 255
+        frames.append(image)
+    return frames
+
+
+# --- キャッシュ (ホストごと) ---
+
+
+def _cache_path() -> Path:
+    return cache_dir("presets") / "autotune.json"
+
+
+def _cache_key(
+    ranked: Sequence[EncodingPreset],
+    options: Sequence[tuple[int, ThreadType]],
+    width: int,
+    height: int,
+    fps: int,
+    target: float,
+) -> str:
+    host = [platform.node(), platform.machine(), platform.processor(), os.cpu_count()]
+    cands = [[p.name, p.encoder_kwargs()] for p in ranked]
+    raw = json.dumps(
+        [
+            _CACHE_VERSION,
+            host,
+            cands,
+            [list(o) for o in options],
+            width,
+            height,
+            fps,
+            target,
+        ]
+    )
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _cache_load() -> dict[str, Any]:
+    try:
+        data = json.loads(_cache_path().read_text())
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _cache_get(key: str, ranked: Sequence[EncodingPreset]) -> TuneResult | None:
+    with _cache_lock:
+        entry = _cache_load().get(key)
+    by_name = {p.name: p for p in ranked}
+    if not isinstance(entry, dict) or entry.get("preset") not in by_name:
+        return None
+    preset = dataclasses.replace(
+        by_name[entry["preset"]],
+        threads=entry["threads"],
+        thread_type=entry["thread_type"],
+    )
+    measurements = [TuneMeasurement(*m) for m in entry.get("measurements", [])]
+    return TuneResult(
+        preset, entry["realtime"], entry["met_target"], measurements, cached=True
+    )
+
+
+def _cache_put(key: str, result: TuneResult) -> None:
+    entry = {
+        "preset": result.preset.name,
+        "threads": result.preset.threads,
+        "thread_type": result.preset.thread_type,
+        "realtime": result.realtime,
+        "met_target": result.met_target,
+        "measurements": [dataclasses.astuple(m) for m in result.measurements],
+        "measured_at": time.time(),
+    }
+    path = _cache_path()
+    with _cache_lock:
+        data = _cache_load()
+        data[key] = entry
+        tmp = path.with_name(path.name + ".tmp")
+        try:
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)  # キャッシュに書けなくても結果は返す
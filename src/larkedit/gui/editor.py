@@ -34,10 +34,13 @@ class EditorPage(QWidget):
         import_act = QAction("メディアを読み込む…", self)
         undo_act = QAction("Undo", self)
         redo_act = QAction("Redo", self)
+        play_act = QAction("再生 / 停止", self)
         toolbar.addAction(import_act)
         toolbar.addSeparator()
         toolbar.addAction(undo_act)
         toolbar.addAction(redo_act)
+        toolbar.addSeparator()
+        toolbar.addAction(play_act)
 
         # --- レイアウト ---
         vbox = QVBoxLayout(self)
@@ -49,6 +52,8 @@ class EditorPage(QWidget):
         self._preview = PreviewWidget(project, self)
         self._prop_editor = PropertyEditorWidget(project, self)
 
+        play_act.triggered.connect(self._preview.toggle_playback)
+
         top_split.addWidget(self._media_pool)
         top_split.addWidget(self._preview)
         top_split.addWidget(self._prop_editor)
@@ -71,5 +76,9 @@ class EditorPage(QWidget):
 
         # 最低 1 トラック
         if not self._project.timeline.tracks:
-            self._project.timeline.add_track(Track(index=0, name="V1"))
+            self._project.add_track(Track(index=0, name="V1"))
         self._timeline.set_project(self._project)
+
+    def shutdown(self) -> None:
+        """ウィンドウを閉じる前に呼ぶ (プレビューの先読みスレッドを止める)"""
+        self._preview.shutdown()
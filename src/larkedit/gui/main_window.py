@@ -3,11 +3,20 @@ from __future__ import annotations
 import sys
 from pathlib import Path
 
-from PySide6.QtWidgets import QMainWindow, QStackedWidget
+from PySide6.QtCore import QTimer
+from PySide6.QtGui import QAction, QCloseEvent, QKeySequence
+from PySide6.QtWidgets import QFileDialog, QMainWindow, QMessageBox, QStackedWidget
 
-from ..core.project import Project  # 編集モデル
+from ..core.command import UndoStack
+from ..core.project import Project, ProjectChange  # 編集モデル
+from ..core.project_file import PROJECT_SUFFIX, ProjectFileError
+from ..utils.media import init_index_dir
 from .editor import EditorPage
-from .welcome import WelcomePage
+from .welcome import WelcomePage, add_recent
+
+AUTOSAVE_INTERVAL_MS = 60_000
+# 保存で起こりうるもの (書けない・読み込み途中の元ファイルが壊れている など)
+_SAVE_ERRORS = (OSError, ValueError, ProjectFileError)
 
 
 class MainWindow(QMainWindow):
@@ -31,11 +40,35 @@ class MainWindow(QMainWindow):
 
         # EditorPage は遅延生成
         self._editor: EditorPage | None = None
+        self._project: Project | None = None
+        self._dirty = False
+
+        # --- メニュー ---
+        file_menu = self.menuBar().addMenu("ファイル")
+        self._save_act = QAction("保存", self)
+        self._save_act.setShortcut(QKeySequence.StandardKey.Save)
+        self._save_act.triggered.connect(self._save)
+        self._save_as_act = QAction("名前を付けて保存…", self)
+        self._save_as_act.setShortcut(QKeySequence.StandardKey.SaveAs)
+        self._save_as_act.triggered.connect(self._save_as)
+        file_menu.addAction(self._save_act)
+        file_menu.addAction(self._save_as_act)
+        self._save_act.setEnabled(False)
+        self._save_as_act.setEnabled(False)
+
+        # 変更があれば一定間隔で保存 (追記だけなので軽い)
+        self._autosave = QTimer(self)
+        self._autosave.setInterval(AUTOSAVE_INTERVAL_MS)
+        self._autosave.timeout.connect(self._on_autosave)
+        self._autosave.start()
 
         # --- シグナル接続 ---
         self._welcome.new_project_requested.connect(self._create_new_project)
         self._welcome.open_project_requested.connect(self._open_project_from_path)
 
+        # 前回落ちたセッションがあればウィンドウが出てから復旧を聞く
+        QTimer.singleShot(0, self._offer_recovery)
+
     # ---
     # WelcomePage -> EditorPage 遷移ハンドラ
     # ---
@@ -44,17 +77,157 @@ class MainWindow(QMainWindow):
         self._open_editor(project)
 
     def _open_project_from_path(self, path: Path) -> None:
-        # TODO: Project.load(path)
-        project = Project(name=path.stem)
+        try:
+            project = Project.load(path)
+        except (OSError, ProjectFileError) as e:
+            QMessageBox.warning(
+                self, "LarkEdit", f"プロジェクトを開けませんでした:\n{path}\n{e}"
+            )
+            return
+        add_recent(path)
         self._open_editor(project)
 
-    def _open_editor(self, project: Project) -> None:
+    def _open_editor(self, project: Project) -> bool:
+        if self._project is not None:
+            if not self._confirm_discard():
+                return False
+            self._project.detach_observer(self)
+            self._close_history()
+        self._project = project
+        self._dirty = False
+        project.attach_observer(self)
+        self._save_act.setEnabled(True)
+        self._save_as_act.setEnabled(True)
         if self._editor is None:
             self._editor = EditorPage(project, self)
             self._stack.addWidget(self._editor)
         else:
             self._editor.set_project(project)
         self._stack.setCurrentWidget(self._editor)
+        return True
+
+    # ---
+    # クラッシュ復旧
+    # ---
+    def _offer_recovery(self) -> None:
+        """落ちたセッションのジャーナルのうち一番新しいものを復旧するか聞く (他は消す)"""
+        found: tuple[Path, Path | None] | None = None
+        for journal in UndoStack.orphaned_journals():
+            if found is None:
+                try:
+                    project_path = UndoStack.journal_project(journal)
+                    if UndoStack.journal_has_edits(journal) and (
+                        project_path is None or project_path.exists()
+                    ):
+                        found = journal, project_path
+                        continue
+                except (OSError, ValueError):
+                    pass
+            journal.unlink(missing_ok=True)
+        if found is None:
+            return
+        journal, project_path = found
+        name = project_path.name if project_path is not None else "未保存のプロジェクト"
+        answer = QMessageBox.question(
+            self,
+            "LarkEdit",
+            f"前回のセッションは正常に終了しませんでした。\n{name} の編集を復旧しますか?",
+        )
+        if answer != QMessageBox.StandardButton.Yes:
+            journal.unlink(missing_ok=True)
+            return
+        try:
+            project = Project.load(project_path) if project_path else Project()
+            project.undo_stack = UndoStack.recover(project, journal)
+        except (OSError, ValueError, ProjectFileError) as e:
+            QMessageBox.warning(self, "LarkEdit", f"復旧できませんでした:\n{e}")
+            return
+        if project_path is not None:
+            add_recent(project_path)
+        if self._open_editor(project):
+            self._dirty = True  # 復旧した編集はまだ保存していない
+
+    # ---
+    # 保存
+    # ---
+    def project_changed(self, *, description: str, change: ProjectChange) -> None:
+        self._dirty = True
+
+    def _save(self) -> bool:
+        if self._project is None:
+            return False
+        if self._project.file_path is None:
+            return self._save_as()
+        return self._write(self._project.file_path)
+
+    def _save_as(self) -> bool:
+        if self._project is None:
+            return False
+        filename, _ = QFileDialog.getSaveFileName(
+            self,
+            "名前を付けて保存",
+            str(Path.home() / f"{self._project.name}{PROJECT_SUFFIX}"),
+            f"LarkEdit プロジェクト (*{PROJECT_SUFFIX})",
+        )
+        if not filename:
+            return False
+        path = Path(filename)
+        if path.suffix != PROJECT_SUFFIX:
+            path = path.with_name(path.name + PROJECT_SUFFIX)
+        if not self._write(path):
+            return False
+        add_recent(path)
+        return True
+
+    def _write(self, path: Path) -> bool:
+        assert self._project is not None
+        try:
+            self._project.save(path)
+        except _SAVE_ERRORS as e:
+            QMessageBox.warning(self, "LarkEdit", f"保存できませんでした:\n{path}\n{e}")
+            return False
+        self._dirty = False
+        return True
+
+    def _on_autosave(self) -> None:
+        # 一度も保存していないプロジェクトは場所が決まらないので対象外
+        if self._project is None or not self._dirty or self._project.file_path is None:
+            return
+        try:
+            self._project.save()
+        except _SAVE_ERRORS:
+            return  # 次の周期で再試行
+        self._dirty = False
+
+    def _confirm_discard(self) -> bool:
+        """未保存の変更があれば保存するか聞く (False なら操作をやめる)"""
+        if self._project is None or not self._dirty:
+            return True
+        Button = QMessageBox.StandardButton
+        answer = QMessageBox.question(
+            self,
+            "LarkEdit",
+            f"{self._project.name} に保存していない変更があります。保存しますか?",
+            Button.Save | Button.Discard | Button.Cancel,
+            Button.Save,
+        )
+        if answer == Button.Save:
+            return self._save()
+        return answer == Button.Discard
+
+    def closeEvent(self, e: QCloseEvent) -> None:
+        if not self._confirm_discard():
+            e.ignore()
+            return
+        if self._editor is not None:
+            self._editor.shutdown()
+        self._close_history()
+        super().closeEvent(e)
+
+    def _close_history(self) -> None:
+        # 保存するか破棄すると決めた後だけ呼ぶ (ジャーナルは未保存の編集の唯一の控え)
+        if self._project is not None and self._project.undo_stack is not None:
+            self._project.undo_stack.close()
 
     # --- アプリ終了用ラッパ (CLI から呼び出し) ---
     @staticmethod
@@ -62,6 +235,7 @@ class MainWindow(QMainWindow):
         from PySide6.QtWidgets import QApplication
 
         app = QApplication(sys.argv)
+        init_index_dir()  # プレビューのシークでも前回の索引を使う
         win = MainWindow()
         win.show()
         sys.exit(app.exec())
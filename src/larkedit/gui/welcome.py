@@ -16,6 +16,15 @@ from PySide6.QtWidgets import (
 )
 
 RECENT_FILE = Path.home() / ".larkedit_recent"  # 単純なテキスト保存
+RECENT_LIMIT = 20
+
+
+def add_recent(path: Path) -> None:
+    """path を最近使ったプロジェクトの先頭に入れる"""
+    path = path.resolve()
+    lines = RECENT_FILE.read_text().splitlines() if RECENT_FILE.exists() else []
+    lines = [str(path)] + [line for line in lines if line != str(path)]
+    RECENT_FILE.write_text("\n".join(lines[:RECENT_LIMIT]) + "\n")
 
 
 class WelcomePage(QWidget):
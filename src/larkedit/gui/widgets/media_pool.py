@@ -3,7 +3,8 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Optional
 
-from PySide6.QtCore import QByteArray, QMimeData, Qt
+import numpy as np
+from PySide6.QtCore import QByteArray, QMimeData, QObject, Qt, Signal
 from PySide6.QtGui import QDrag, QMouseEvent, QPixmap
 from PySide6.QtWidgets import (
     QFileDialog,
@@ -15,42 +16,35 @@ from PySide6.QtWidgets import (
     QWidget,
 )
 
+from ...core.media_manager import ImportResult, MediaImportService, detect_media_type
 from ...core.project import MediaAsset, MediaType, Project
-from ...utils.media import probe, thumbnail_qpixmap
+from ...core.proxy import ProxyManager
+from ...utils.media import rgba_to_qpixmap
 
 # 独自 MIME: クリップ追加時に asset.path を渡す
 MIME_ASSET_PATH = "application/x-larkedit-asset"
 
 
 class MediaItemWidget(QWidget):
-    """サムネイル + ファイル名"""
+    """サムネイル + ファイル名 (取り込み完了まではプレースホルダ)"""
 
     def __init__(
         self, asset: MediaAsset, thumb_size: int = 96, parent: Optional[QWidget] = None
     ) -> None:
         super().__init__(parent)
         self.asset = asset
+        self.ready = False  # probe 完了までは長さが未確定なのでドラッグさせない
+        self._thumb_size = thumb_size
         self.setFixedSize(thumb_size + 10, thumb_size + 40)  # 余白込み
         v = QVBoxLayout(self)
         v.setContentsMargins(4, 4, 4, 4)
         v.setSpacing(4)
 
-        # --- サムネイル
-        thumb = QLabel(alignment=Qt.AlignmentFlag.AlignCenter)
-        thumb.setFixedSize(thumb_size, thumb_size)
-        if asset.media_type == MediaType.IMAGE:
-            pm = QPixmap(str(asset.path)).scaled(
-                thumb_size,
-                thumb_size,
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation,
-            )
-            thumb.setPixmap(pm)
-        else:
-            # サムネイルを生成
-            pm = thumbnail_qpixmap(asset.path, 0, thumb_size)
-            thumb.setPixmap(pm)
-        v.addWidget(thumb)
+        # --- サムネイル (生成はワーカースレッドで行い set_thumbnail で差し替える)
+        self._thumb = QLabel(alignment=Qt.AlignmentFlag.AlignCenter)
+        self._thumb.setFixedSize(thumb_size, thumb_size)
+        self._thumb.setPixmap(self._placeholder())
+        v.addWidget(self._thumb)
 
         # --- ファイル名
         name = QLabel(asset.path.name, alignment=Qt.AlignmentFlag.AlignCenter)
@@ -58,15 +52,37 @@ class MediaItemWidget(QWidget):
         name.setWordWrap(True)
         v.addWidget(name)
 
-        # --- D&D 有効化
-        self.setCursor(Qt.CursorShape.OpenHandCursor)
+        # --- D&D は取り込み完了後に有効化
+        self.setCursor(Qt.CursorShape.BusyCursor)
         self.setAttribute(
             Qt.WidgetAttribute.WA_DeleteOnClose, False
         )  # 破棄はプール側が管理
 
+    def set_proxy_ready(self) -> None:
+        self.setToolTip(f"{self.asset.path}\nプロキシ: {self.asset.proxy_path}")
+
+    def set_thumbnail(self, rgba: np.ndarray | None) -> None:
+        """取り込み結果を反映する (GUI スレッドから呼ぶ)"""
+        pm = rgba_to_qpixmap(rgba) if rgba is not None else self._placeholder()
+        self._thumb.setPixmap(pm)
+        self.ready = True
+        self.setCursor(Qt.CursorShape.OpenHandCursor)
+
+    def set_failed(self, error: str) -> None:
+        """読めなかった (長さが分からないのでドラッグさせない)"""
+        self._thumb.setPixmap(self._placeholder(Qt.GlobalColor.darkRed))
+        self.setToolTip(f"{self.asset.path}\n取り込みに失敗: {error}")
+        self.ready = False
+        self.setCursor(Qt.CursorShape.ForbiddenCursor)
+
+    def _placeholder(self, color: Qt.GlobalColor = Qt.GlobalColor.gray) -> QPixmap:
+        pm = QPixmap(self._thumb_size, self._thumb_size)
+        pm.fill(color)
+        return pm
+
     # --- Drag ---
     def mousePressEvent(self, e: QMouseEvent) -> None:
-        if e.button() != Qt.MouseButton.LeftButton:
+        if e.button() != Qt.MouseButton.LeftButton or not self.ready:
             return
         drag = QDrag(self)
         mime = QMimeData()
@@ -77,6 +93,13 @@ class MediaItemWidget(QWidget):
         drag.exec(Qt.DropAction.CopyAction)
 
 
+class _ImportBridge(QObject):
+    """ワーカースレッドの取り込み結果を GUI スレッドへ渡す"""
+
+    finished = Signal(object)  # (ticket, ImportResult)
+    proxy_ready = Signal(object)  # MediaAsset
+
+
 class MediaPoolWidget(QWidget):
     """
     +--------- QScrollArea -------------------------------------------+
@@ -109,10 +132,27 @@ class MediaPoolWidget(QWidget):
 
         self._assets: list[MediaAsset] = []
 
+        # 取り込みはバックグラウンドで行い、結果をシグナル経由で受け取る
+        self._import_service = MediaImportService(thumb_size=self._thumb_size)
+        self._bridge = _ImportBridge(self)
+        self._bridge.finished.connect(self._on_import_finished)
+        self._pending: dict[int, MediaItemWidget] = {}
+        self._next_ticket = 0
+        service = self._import_service
+        self.destroyed.connect(lambda *_: service.shutdown())
+
+        # プレビュー用のプロキシも裏で作る (同時に 1 本だけ)
+        self._proxies = ProxyManager()
+        self._bridge.proxy_ready.connect(self._on_proxy_ready)
+        self._proxies.attach_all(project)
+        proxies = self._proxies
+        self.destroyed.connect(lambda *_: proxies.shutdown())
+
     # ---
     def set_project(self, project: Project) -> None:
         self._project = project
         self._clear_assets()
+        self._proxies.attach_all(project)
 
     # --- Media import ---
     def _choose_file(self) -> None:
@@ -123,33 +163,55 @@ class MediaPoolWidget(QWidget):
             self._import_media(Path(p))
 
     def _import_media(self, path: Path) -> None:
-        # メディアタイプの判定
-        mtype = (
-            MediaType.IMAGE
-            if path.suffix.lower() in {".png", ".jpg", ".jpeg", ".bmp", ".gif"}
-            else MediaType.VIDEO
-        )
-
-        # メディア情報を取得
-        try:
-            media_info = probe(path)
-            duration_ms = media_info.get("duration_ms", 0)
-        except Exception:
-            duration_ms = 10_000  # probe 失敗時はデフォルト10秒
-
-        asset = MediaAsset(path, mtype, duration_ms=duration_ms)
+        # 先にプレースホルダを並べ、probe とサムネイルは後から埋める
+        asset = MediaAsset(path, detect_media_type(path), duration_ms=0)
         self._assets.append(asset)
-        self._add_widget(asset)
+        widget = self._add_widget(asset)
         # Project 側でリスト管理したい場合はここで登録する
 
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        self._pending[ticket] = widget
+        bridge = self._bridge
+        self._import_service.submit(
+            path, lambda result: bridge.finished.emit((ticket, result))
+        )
+
+    def _on_import_finished(self, payload: tuple[int, ImportResult]) -> None:
+        ticket, result = payload
+        widget = self._pending.pop(ticket, None)
+        if widget is None:  # クリア済み
+            return
+        if result.info is None:
+            widget.set_failed(result.error or "unknown error")
+            return
+        widget.asset.duration_ms = result.duration_ms
+        widget.set_thumbnail(result.thumbnail)
+        if result.error is not None:  # サムネイルだけ作れなかった
+            widget.setToolTip(f"{widget.asset.path}\n{result.error}")
+        if result.error is None and widget.asset.media_type == MediaType.VIDEO:
+            bridge = self._bridge
+            self._proxies.submit(widget.asset, bridge.proxy_ready.emit)
+
+    def _on_proxy_ready(self, asset: MediaAsset) -> None:
+        for i in range(self._grid.count()):
+            item = self._grid.itemAt(i)
+            w = item.widget() if item is not None else None
+            if isinstance(w, MediaItemWidget) and w.asset is asset:
+                w.set_proxy_ready()
+
     # --- Grid helpers ---
-    def _add_widget(self, asset: MediaAsset) -> None:
+    def _add_widget(self, asset: MediaAsset) -> MediaItemWidget:
         idx = len(self._assets) - 1
         row, col = divmod(idx, self._col_count)
         w = MediaItemWidget(asset, self._thumb_size)
         self._grid.addWidget(w, row, col)
+        return w
 
     def _clear_assets(self) -> None:
+        self._import_service.cancel_pending()
+        self._proxies.cancel_pending()
+        self._pending.clear()
         while self._grid.count():
             self._grid.takeAt(0).widget().deleteLater()
         self._assets.clear()
@@ -2,32 +2,157 @@ from __future__ import annotations
 
 from typing import Optional
 
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QColor, QPixmap
-from PySide6.QtWidgets import QLabel, QWidget
+import numpy as np
+from PySide6.QtCore import QRectF, Qt, QTimer
+from PySide6.QtGui import (
+    QAction,
+    QActionGroup,
+    QColor,
+    QImage,
+    QKeyEvent,
+    QPainter,
+    QPaintEvent,
+)
+from PySide6.QtWidgets import QWidget
 
-from ...core.project import Project
+from ...core.playback import PlaybackEngine, PreviewQuality
+from ...core.project import Project, ProjectChange
 
 
-class PreviewWidget(QLabel):
+class PreviewWidget(QWidget):
     """
     タイムラインの現在フレームを表示。
-    今はプレースホルダとして真っ黒の QPixmap。
+    PlaybackEngine が合成したフレームをタイマーで拾い、配列をコピーせずに QImage で包んで描く。
+    Space で再生 / 一時停止。右クリックメニューでプレビュー画質 (等倍 / 1/2 / 1/4) を選ぶ。
     """
 
+    QUALITY_LABELS = {
+        PreviewQuality.FULL: "フル",
+        PreviewQuality.HALF: "1/2",
+        PreviewQuality.QUARTER: "1/4",
+    }
+
     def __init__(self, project: Project, parent: Optional[QWidget] = None) -> None:
         super().__init__(parent)
         self.setObjectName("PreviewWidget")
-        self.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.setMinimumSize(320, 240)
+        self.setFocusPolicy(Qt.FocusPolicy.ClickFocus)
+
+        self._engine: PlaybackEngine | None = None
+        self._project: Project | None = None
+        self._array: np.ndarray | None = (
+            None  # _image が参照している配列 (生かしておく)
+        )
+        self._image: QImage | None = None
+        self._quality = PreviewQuality.FULL
+
+        # --- 画質メニュー ---
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.ActionsContextMenu)
+        group = QActionGroup(self)
+        for quality in PreviewQuality.ALL:
+            act = QAction(
+                f"プレビュー画質: {self.QUALITY_LABELS[quality]}", self, checkable=True
+            )
+            act.setChecked(quality == self._quality)
+            act.triggered.connect(lambda _=False, q=quality: self.set_quality(q))
+            group.addAction(act)
+            self.addAction(act)
+
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.timeout.connect(self._on_tick)
+
         self.set_project(project)
 
     # ---
     def set_project(self, project: Project) -> None:
+        if self._project is not None:
+            self._project.detach_observer(self)
+        if self._engine is not None:
+            self._engine.close()
         self._project = project
-        self._update_placeholder()
+        self._engine = PlaybackEngine(project, quality=self._quality)
+        project.attach_observer(self)
+        self._array = self._image = None
+        # フレーム間隔の半分で見に行く (表示の遅れを半フレーム以内に抑える)
+        self._timer.start(max(1, 500 // project.fps))
+        self.update()
+
+    def set_quality(self, quality: int) -> None:
+        """PreviewQuality.* (大きいほどデコード・合成する画素が減る)"""
+        self._quality = quality
+        if self._engine is not None:
+            self._engine.set_quality(quality)
+
+    @property
+    def engine(self) -> PlaybackEngine | None:
+        return self._engine
+
+    def toggle_playback(self) -> None:
+        if self._engine is None:
+            return
+        if self._engine.playing:
+            self._engine.pause()
+        else:
+            self._engine.play()
+
+    def seek_ms(self, ms: int) -> None:
+        if self._engine is not None:
+            self._engine.seek_ms(ms)
+
+    # --- ProjectObserver ---
+    def project_changed(self, *, description: str, change: ProjectChange) -> None:
+        if self._engine is not None:
+            self._engine.invalidate(change)
+        if change.structural and self._project is not None:
+            self._timer.setInterval(max(1, 500 // self._project.fps))  # fps が変わった
+
+    # --- Qt ---
+    def keyPressEvent(self, event: QKeyEvent) -> None:
+        if event.key() == Qt.Key.Key_Space:
+            self.toggle_playback()
+        else:
+            super().keyPressEvent(event)
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("black"))
+        if self._image is not None:
+            # アスペクト比を保って中央に
+            iw, ih = self._image.width(), self._image.height()
+            scale = min(self.width() / iw, self.height() / ih)
+            w, h = iw * scale, ih * scale
+            target = QRectF((self.width() - w) / 2, (self.height() - h) / 2, w, h)
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+            painter.drawImage(target, self._image)
+        painter.end()
+
+    def shutdown(self) -> None:
+        """先読みスレッドを止める (親ウィンドウを閉じるときにも呼ぶこと)"""
+        self._timer.stop()
+        if self._engine is not None:
+            self._engine.close()
+            self._engine = None
+
+    def closeEvent(self, event) -> None:  # type: ignore[no-untyped-def]
+        self.shutdown()
+        super().closeEvent(event)
 
-    def _update_placeholder(self) -> None:
-        pm = QPixmap(640, 360)
-        pm.fill(QColor("black"))
-        self.setPixmap(pm)
+    # --- 内部 ---
+    def _on_tick(self) -> None:
+        if self._engine is None:
+            return
+        _, array = self._engine.current_frame()
+        if array is None or array is self._array:
+            return
+        h, w = array.shape[:2]
+        # Compositor の出力は乗算済み α の RGBA
+        self._image = QImage(
+            array.data,
+            w,
+            h,
+            array.strides[0],
+            QImage.Format.Format_RGBA8888_Premultiplied,
+        )
+        self._array = array
+        self.update()
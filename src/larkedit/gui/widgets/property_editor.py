@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+from PySide6.QtCore import QSignalBlocker
 from PySide6.QtWidgets import QDoubleSpinBox, QFormLayout, QLabel, QWidget
 
-from ...core.project import Clip, Project
+from ...core.command import UndoStack
+from ...core.project import Clip, Project, UpdateClipCommand
 
 
 class PropertyEditorWidget(QWidget):
@@ -35,8 +37,10 @@ class PropertyEditorWidget(QWidget):
 
     def show_clip(self, clip: Clip) -> None:
         self._clip = clip
-        self._in_spin.setValue(clip.in_point_ms)
-        self._dur_spin.setValue(clip.duration_ms)
+        # 表示を合わせるだけなので編集として扱わない
+        with QSignalBlocker(self._in_spin), QSignalBlocker(self._dur_spin):
+            self._in_spin.setValue(clip.in_point_ms)
+            self._dur_spin.setValue(clip.duration_ms)
         self.setEnabled(True)
 
     def clear_selection(self) -> None:
@@ -46,5 +50,20 @@ class PropertyEditorWidget(QWidget):
     def _apply_changes(self) -> None:
         if not self._clip:
             return
-        self._clip.in_point_ms = int(self._in_spin.value())
-        self._clip.duration_ms = int(self._dur_spin.value())
+        values = {
+            "in_point_ms": int(self._in_spin.value()),
+            "duration_ms": int(self._dur_spin.value()),
+        }
+        changes = {k: v for k, v in values.items() if getattr(self._clip, k) != v}
+        if not changes:
+            return
+        if not self._project.undo_stack:
+            self._project.undo_stack = UndoStack()
+        # 同じ clip への連続入力は 1 段にまとめる
+        cmd = UpdateClipCommand(
+            self._project,
+            self._clip,
+            merge_id=f"clip-props:{id(self._clip)}",
+            **changes,
+        )
+        self._project.undo_stack.push(cmd)
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QWheelEvent
 from PySide6.QtWidgets import QScrollArea, QVBoxLayout, QWidget
 
-from ...core.project import Project
+from ...core.project import Project, ProjectChange
 from .track import TrackWidget
 
 
@@ -14,14 +16,21 @@ class TimelineWidget(QScrollArea):
                 ├─ TrackWidget 0
                 ├─ TrackWidget 1
                 └─ ...
+
+    Ctrl + ホイールでズーム。Project の変更は ProjectChange の tracks / ranges を見て
+    変わったトラックの TrackWidget にだけ流し、変わった範囲だけを描き直させる。
     """
 
+    MIN_ZOOM = -16
+    MAX_ZOOM = 12
+
     def __init__(self, project: Project, parent: QWidget | None = None) -> None:
         super().__init__(parent)
         self.setObjectName("TimelineWidget")
         self.setWidgetResizable(True)
 
         self._project = project
+        self._zoom = 0
         self._content = QWidget()
         self._vbox = QVBoxLayout(self._content)
         self._vbox.setContentsMargins(0, 0, 0, 0)
@@ -30,33 +39,70 @@ class TimelineWidget(QScrollArea):
         self.setWidget(self._content)
         self._track_widgets: list[TrackWidget] = []
 
+        project.attach_observer(self)
         self._populate()
 
     # --- utils ---
     def _populate(self) -> None:
-        # 既存ウィジェット除去
+        # 既存ウィジェット除去 (末尾のスペーサーも)
         for tw in self._track_widgets:
-            self._vbox.removeWidget(tw)
             tw.deleteLater()
+        while self._vbox.count():
+            self._vbox.takeAt(0)
         self._track_widgets.clear()
 
         # Project の Track をウィジェット化
         for t in sorted(self._project.timeline.tracks, key=lambda x: x.index):
             tw = TrackWidget(self._project, t, self._content)
-            tw.clip_added.connect(self._on_clip_added)
+            tw.set_zoom(self._zoom)
             self._vbox.addWidget(tw)
             self._track_widgets.append(tw)
 
         # スペーサー
         self._vbox.addStretch()
 
-    # --- slots ---
-    def _on_clip_added(self) -> None:
-        # Clip 追加時に全トラック再描画
+    def _tracks_match(self) -> bool:
+        tracks = self._project.timeline.tracks
+        return len(tracks) == len(self._track_widgets) and all(
+            tw.track is t for tw, t in zip(self._track_widgets, tracks)
+        )
+
+    # --- ProjectObserver ---
+    def project_changed(self, *, description: str, change: ProjectChange) -> None:
+        if change.structural or not self._tracks_match():
+            self._populate()  # トラックの増減
+            return
         for tw in self._track_widgets:
-            tw.update()
+            if change.affects(tw.track.index):
+                tw.apply_change(change.ranges)
+
+    # --- Qt ---
+    def wheelEvent(self, e: QWheelEvent) -> None:
+        if not e.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            super().wheelEvent(e)
+            return
+        steps = e.angleDelta().y() // 120
+        if steps:
+            self.set_zoom(self._zoom + steps)
+        e.accept()
 
     # --- API ---
+    def set_zoom(self, zoom: int) -> None:
+        """ズーム段 (TrackWidget.set_zoom を参照)。表示中央の時刻がずれないようにスクロールも直す"""
+        zoom = max(self.MIN_ZOOM, min(self.MAX_ZOOM, zoom))
+        if zoom == self._zoom:
+            return
+        bar = self.horizontalScrollBar()
+        center = bar.value() + self.viewport().width() / 2
+        scale = TrackWidget.ZOOM_STEP ** (zoom - self._zoom)
+        self._zoom = zoom
+        for tw in self._track_widgets:
+            tw.set_zoom(zoom)
+        self._content.adjustSize()
+        bar.setValue(int(center * scale - self.viewport().width() / 2))
+
     def set_project(self, project: Project) -> None:
+        self._project.detach_observer(self)
         self._project = project
+        project.attach_observer(self)
         self._populate()
@@ -1,10 +1,18 @@
 from __future__ import annotations
 
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
 
 from PySide6.QtCore import QMimeData, QRect, Signal
-from PySide6.QtGui import QColor, QDragEnterEvent, QDropEvent, QPainter
+from PySide6.QtGui import (
+    QColor,
+    QDragEnterEvent,
+    QDropEvent,
+    QPainter,
+    QPaintEvent,
+    QPixmap,
+)
 from PySide6.QtWidgets import QWidget
 
 from ...core.command import UndoStack
@@ -19,12 +27,24 @@ class TrackWidget(QWidget):
     1 トラックを表す行ウィジェット。
     * 背景・ヘッダ・クリップ矩形を自前でペイント
     * MediaPool からの D&D を受け取り AddClipCommand を発行
+
+    描画は TILE_WIDTH px ごとのタイルに分け、ズーム段ごとに QPixmap でキャッシュする。
+    paintEvent では見えているタイルだけを貼り、タイルを作るときも
+    clips_in_range でそのタイルにかかる clip だけを描く。
+    トラックが変わったら apply_change() に変わった時間範囲を渡すとそこのタイルだけ捨てる
+    (範囲が分からなければ sync() が前回との差分を探す)。
     """
 
-    clip_added = Signal()  # タイムライン全体の再描画要求用
+    # D&D で clip を置いた (再描画は ProjectChange で TimelineWidget から来る)
+    clip_added = Signal()
 
     TRACK_HEIGHT = 40
-    PIXELS_PER_MS = 0.02
+    PIXELS_PER_MS = 0.02  # ズーム段 0 の倍率
+    ZOOM_STEP = 2**0.5  # ズーム 1 段あたりの倍率
+    TILE_WIDTH = 256
+    MAX_TILES = 128  # トラックごとに持つタイル数 (古いものから捨てる)
+    BACKGROUND = QColor("#222")
+    CLIP_COLOR = QColor("#6699cc")
 
     def __init__(
         self, project: Project, track: Track, parent: Optional[QWidget] = None
@@ -32,9 +52,24 @@ class TrackWidget(QWidget):
         super().__init__(parent)
         self._project = project
         self._track = track
+        self._zoom = 0
+        # (ズーム段, タイル番号)
+        self._tiles: OrderedDict[tuple[int, int], QPixmap] = OrderedDict()
+        self._version = -1  # 最後に sync したときの clips.version
+        # (id(clip), start_ms, end_ms)。None は不明
+        self._spans: set[tuple[int, int, int]] | None = set()
         self.setObjectName("TrackWidget")
         self.setFixedHeight(self.TRACK_HEIGHT)
         self.setAcceptDrops(True)
+        self.sync()
+
+    @property
+    def track(self) -> Track:
+        return self._track
+
+    @property
+    def pixels_per_ms(self) -> float:
+        return self.PIXELS_PER_MS * self.ZOOM_STEP**self._zoom
 
     # --- D&D ---
     def dragEnterEvent(self, e: QDragEnterEvent) -> None:
@@ -63,7 +98,7 @@ class TrackWidget(QWidget):
         if asset is None:  # asset 未登録ならスキップ
             return
 
-        start_ms = int(e.position().x() / self.PIXELS_PER_MS)
+        start_ms = int(e.position().x() / self.pixels_per_ms)
         if not self._project.undo_stack:
             self._project.undo_stack = UndoStack()
 
@@ -78,18 +113,103 @@ class TrackWidget(QWidget):
         e.acceptProposedAction()
 
     # --- paint ---
-    def paintEvent(self, _):
+    def paintEvent(self, e: QPaintEvent) -> None:
         p = QPainter(self)
-        # 背景
-        p.fillRect(self.rect(), QColor("#222"))
-        # クリップ
-        for clip in self._track.clips:
-            x = int(clip.start_ms * self.PIXELS_PER_MS)
-            w = int(clip.duration_ms * self.PIXELS_PER_MS)
-            p.fillRect(QRect(x, 4, w, self.height() - 8), QColor("#6699cc"))
+        exposed = e.rect()
+        tw = self.TILE_WIDTH
+        for i in range(max(0, exposed.left() // tw), exposed.right() // tw + 1):
+            p.drawPixmap(i * tw, 0, self._tile(i))
+        p.end()
+
+    def _tile(self, i: int) -> QPixmap:
+        key = (self._zoom, i)
+        pm = self._tiles.get(key)
+        if pm is not None:
+            self._tiles.move_to_end(key)
+            return pm
+        tw, h = self.TILE_WIDTH, self.height()
+        dpr = self.devicePixelRatioF()
+        pm = QPixmap(int(tw * dpr), int(h * dpr))
+        pm.setDevicePixelRatio(dpr)
+        pm.fill(self.BACKGROUND)
+        p = QPainter(pm)
+        ppm = self.pixels_per_ms
+        x0 = i * tw
+        for clip in self._track.clips_in_range(int(x0 / ppm), int((x0 + tw) / ppm) + 1):
+            x = int(clip.start_ms * ppm) - x0
+            w = max(1, int(clip.duration_ms * ppm))
+            p.fillRect(QRect(x, 4, w, h - 8), self.CLIP_COLOR)
         p.end()
+        self._tiles[key] = pm
+        if len(self._tiles) > self.MAX_TILES:
+            self._tiles.popitem(last=False)
+        return pm
+
+    # --- 変更の反映 ---
+    def sync(self) -> None:
+        """
+        トラックの変更を反映する。clips.version が変わっていなければ何もしない。
+        変わっていれば前回との差分 (増えた・消えた・動いた clip) の時間範囲だけ描き直す
+        """
+        clips = self._track.clips
+        if clips.version == self._version:
+            return
+        self._version = clips.version
+        spans = {(id(c), c.start_ms, c.end_ms) for c in clips}
+        old, self._spans = self._spans, spans
+        self._update_width()
+        if old is None:
+            # apply_change() で追いかけていた間の様子は分からないので全部描き直す
+            self._tiles.clear()
+            self.update()
+            return
+        for _, start, end in spans ^ old:
+            self.invalidate_range(start, end)
+
+    def apply_change(self, ranges: Iterable[tuple[int, int]]) -> None:
+        """
+        ProjectChange.ranges を反映する。sync() と違い clip を総なめしないので、
+        長いトラックでも変わった範囲の大きさぶんの手間で済む
+        """
+        clips = self._track.clips
+        if clips.version == self._version:
+            return
+        self._version = clips.version
+        self._spans = None  # 次に sync() するときは作り直す
+        self._update_width()
+        for start, end in ranges:
+            self.invalidate_range(start, end)
+
+    def invalidate_range(self, start_ms: int, end_ms: int) -> None:
+        """[start_ms, end_ms) にかかるタイルを全ズーム段で捨てて再描画する"""
+        tw = self.TILE_WIDTH
+        for zoom, i in list(self._tiles):
+            ppm = self.PIXELS_PER_MS * self.ZOOM_STEP**zoom
+            if int(start_ms * ppm) < (i + 1) * tw and i * tw <= int(end_ms * ppm):
+                del self._tiles[(zoom, i)]
+        ppm = self.pixels_per_ms
+        x0 = int(start_ms * ppm)
+        self.update(QRect(x0, 0, int(end_ms * ppm) - x0 + 1, self.height()))
+
+    def set_zoom(self, zoom: int) -> None:
+        """ズーム段 (0 で PIXELS_PER_MS、1 段ごとに ZOOM_STEP 倍)。他の段のタイルは残しておく"""
+        if zoom == self._zoom:
+            return
+        self._zoom = zoom
+        self._update_width()
+        self.update()
+
+    def _update_width(self) -> None:
+        # 末尾の後ろにも少し置けるように余白を足す
+        self.setMinimumWidth(
+            int(self._track.clips.end_ms * self.pixels_per_ms) + self.TILE_WIDTH
+        )
 
     # --- utils ---
     def set_track(self, track: Track) -> None:
         self._track = track
+        self._tiles.clear()
+        self._spans = set()
+        self._version = -1
+        self.sync()
         self.update()
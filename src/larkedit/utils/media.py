@@ -8,6 +8,24 @@ from PySide6.QtCore import Qt
 from PySide6.QtGui import QImage, QPixmap
 
 from ..encoding.ffmpeg_binding import probe as _probe_mod  # type: ignore
+from .paths import cache_dir
+
+_index_dir_ready = False
+
+
+def init_index_dir() -> None:
+    """
+    キーフレーム索引をサイドカーとしてキャッシュに残し、次回起動時のシークでも使う。
+    起動時か最初の probe / 抽出で 1 回だけ呼ばれる (import しただけではディレクトリを作らない)
+    """
+    global _index_dir_ready
+    if _index_dir_ready:
+        return
+    _index_dir_ready = True
+    try:
+        _probe_mod.set_index_dir(str(cache_dir("keyframes")))
+    except OSError:  # キャッシュを作れなければプロセス内だけで持つ
+        pass
 
 
 class VideoInfo(TypedDict, total=False):
@@ -29,28 +47,79 @@ class MediaInfo(TypedDict, total=False):
 
 def probe(path: str | Path) -> MediaInfo:
     """FFmpeg でメディア情報を取得。辞書で返す。"""
+    init_index_dir()
     return _probe_mod.probe(str(path))  # type: ignore[return-value]
 
 
+IMAGE_SUFFIXES = frozenset({".png", ".jpg", ".jpeg", ".bmp", ".gif"})
+
+
+def thumbnail_rgba(path: str | Path, ms: int = 0, size: int = 96) -> np.ndarray:
+    """
+    size x size に収まる (H, W, 4) RGBA サムネイルを返す。
+    GUI スレッド以外からも呼べる (FFmpeg 呼び出し中は GIL を手放す)。
+    """
+    path = Path(path)
+    if path.suffix.lower() in IMAGE_SUFFIXES:
+        img = QImage(str(path))  # QImage はワーカースレッドで使ってよい
+        if img.isNull():
+            raise ValueError(f"cannot load image: {path}")
+        img = img.scaled(
+            size,
+            size,
+            Qt.AspectRatioMode.KeepAspectRatio,
+            Qt.TransformationMode.SmoothTransformation,
+        ).convertToFormat(QImage.Format.Format_RGBA8888)
+        w, h = img.width(), img.height()
+        arr = np.frombuffer(img.constBits(), dtype=np.uint8, count=img.sizeInBytes())
+        return (
+            arr.reshape((h, img.bytesPerLine()))[:, : w * 4].reshape((h, w, 4)).copy()
+        )
+    init_index_dir()
+    w, h, rgba_bytes = _probe_mod.extract_rgba_frame(str(path), ms, size, size)
+    return np.frombuffer(rgba_bytes, dtype=np.uint8).reshape((h, w, 4))
+
+
+def rgba_to_qpixmap(rgba: np.ndarray) -> QPixmap:
+    """(H, W, 4) RGBA を QPixmap に (GUI スレッドで呼ぶこと)"""
+    h, w = rgba.shape[:2]
+    rgba = np.ascontiguousarray(rgba)
+    img = QImage(rgba.data, w, h, w * 4, QImage.Format.Format_RGBA8888)
+    return QPixmap.fromImage(img)  # fromImage がコピーするので rgba は解放してよい
+
+
 def thumbnail_qpixmap(path: str | Path, ms: int = 0, size: int = 96) -> QPixmap:
     """
     指定時刻 ms のフレームを取得し、正方サムネイルにして QPixmap 返却。
     失敗時は単色プレースホルダ。
     """
     try:
-        w, h, rgba_bytes = _probe_mod.extract_rgba_frame(str(path), ms, size, size)
-        arr = np.frombuffer(rgba_bytes, dtype=np.uint8).reshape((h, w, 4))
-        img = QImage(arr.data, w, h, QImage.Format.Format_RGBA8888)
-        pm = QPixmap.fromImage(img)
-        if max(w, h) > size:  # 念のため
-            pm = pm.scaled(
-                size,
-                size,
-                Qt.AspectRatioMode.IgnoreAspectRatio,
-                Qt.TransformationMode.SmoothTransformation,
-            )
-        return pm
+        return rgba_to_qpixmap(thumbnail_rgba(path, ms, size))
     except Exception:  # noqa: BLE001
         pm = QPixmap(size, size)
         pm.fill(Qt.GlobalColor.gray)
         return pm
+
+
+def thumbnail_strip(
+    path: str | Path,
+    count: int,
+    height: int = 64,
+    *,
+    duration_ms: int | None = None,
+    exact: bool = False,
+) -> np.ndarray:
+    """
+    全体から等間隔に count 枚を 1 パスで取り出し (N, H, W, 4) で返す。
+    exact=False ならキーフレームだけをデコードする (フィルムストリップ用)。
+    """
+    if count <= 0:
+        return np.empty((0, height, 0, 4), dtype=np.uint8)
+    if duration_ms is None:
+        duration_ms = max(probe(path).get("duration_ms", 0), 0)
+    step = duration_ms / count
+    ms_list = [int(step * (i + 0.5)) for i in range(count)]
+    init_index_dir()
+    return _probe_mod.extract_rgba_frames(  # type: ignore[no-any-return]
+        str(path), ms_list, 1 << 14, height, exact
+    )
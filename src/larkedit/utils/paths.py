@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+__all__ = ["cache_dir"]
+
+_APP_NAME = "LarkEdit"
+
+
+def _cache_root() -> Path:
+    """OS ごとのユーザーキャッシュディレクトリ (LARKEDIT_CACHE_DIR で上書き可)"""
+    if env := os.environ.get("LARKEDIT_CACHE_DIR"):
+        return Path(env)
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+        return Path(base) / _APP_NAME / "cache"
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / _APP_NAME
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / _APP_NAME.lower()
+
+
+def cache_dir(*parts: str) -> Path:
+    """キャッシュディレクトリ (配下の parts) を作成して返す"""
+    path = _cache_root().joinpath(*parts)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,65 @@
+"""テスト用の小さなメディアを作る (ネイティブ拡張でエンコードする)"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# ユーザーのキャッシュ (キーフレーム索引・サムネイル・自動調整の結果) を汚さない。
+# larkedit を import する前に決める (ワーカープロセスにも引き継がれる)
+_CACHE = tempfile.TemporaryDirectory(prefix="larkedit-test-cache-")
+os.environ["LARKEDIT_CACHE_DIR"] = _CACHE.name
+
+from larkedit.encoding.ffmpeg_binding import encoder as ffm  # type: ignore
+
+# どの FFmpeg ビルドにも入っているコーデック (libx264 は無いことがある)
+VIDEO_CODEC = "mpeg4"
+AUDIO_CODEC = "aac"
+
+
+def make_media(
+    path: Path,
+    seconds: float,
+    *,
+    width: int = 160,
+    height: int = 120,
+    fps: int = 30,
+    video: bool = True,
+    audio: bool = True,
+    sample_rate: int = 48000,
+    gop_size: int = 0,
+) -> Path:
+    """
+    フレームごとに色の変わる映像と 440 Hz の正弦波を書く。
+    映像の (0, 0) の画素の R はフレーム番号 * 8 (mod 256)
+    """
+    enc = ffm.MediaEncoder(
+        str(path),
+        width,
+        height,
+        fps,
+        sample_rate=sample_rate,
+        channels=2,
+        video_codec=VIDEO_CODEC if video else "",
+        audio_codec=AUDIO_CODEC if audio else "",
+        gop_size=gop_size,
+    )
+    enc.start()
+    if video:
+        for i in range(round(seconds * fps)):
+            frame = np.zeros((height, width, 4), np.uint8)
+            frame[..., 0] = (i * 8) % 256
+            frame[..., 3] = 255
+            enc.submit_video(frame, i * 1000 // fps)
+    if audio:
+        total = round(seconds * sample_rate)
+        t = np.arange(total, dtype=np.float32) / sample_rate
+        tone = (0.25 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+        pcm = np.repeat(tone[:, None], 2, axis=1)
+        for pos in range(0, total, 4096):
+            enc.submit_audio(np.ascontiguousarray(pcm[pos : pos + 4096]), pos)
+    enc.finish()
+    return path
@@ -0,0 +1,96 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from support import VIDEO_CODEC, make_media
+
+from larkedit.core.audio import AudioMixer
+from larkedit.core.compositor import RenderEngine, RenderSettings
+from larkedit.core.project import Clip, MediaAsset, MediaType, Project
+from larkedit.utils.media import probe
+
+RATE = 48000
+
+
+class AudioMixerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._tmp = tempfile.TemporaryDirectory()
+        root = Path(cls._tmp.name)
+        cls.tone = make_media(root / "tone.mp4", 2.0)
+        cls.video_only = make_media(root / "video.mp4", 1.0, audio=False)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls._tmp.cleanup()
+
+    def _project(self, *clips: tuple[Path, int]) -> Project:
+        p = Project(width=160, height=120)
+        for path, start in clips:
+            asset = MediaAsset(path, MediaType.AUDIO, probe(str(path))["duration_ms"])
+            p.add_clip(1, asset, start)
+        return p
+
+    def test_empty_timeline_has_no_clips(self) -> None:
+        mixer = AudioMixer(Project().timeline)
+        self.assertFalse(mixer.has_clips)
+        self.assertEqual(mixer.mix(0, 1000).shape, (RATE, 2))
+        self.assertFalse(mixer.mix(0, 1000).any())
+
+    def test_blocks_are_contiguous_in_samples(self) -> None:
+        mixer = AudioMixer(self._project((self.tone, 0)).timeline, sample_rate=44100)
+        pos = 0
+        for pts, block in mixer.blocks(0, 1500):
+            self.assertEqual(pts, pos)
+            pos += len(block)
+        self.assertEqual(pos, 1500 * 44100 // 1000)
+
+    def test_clip_is_placed_at_its_start(self) -> None:
+        mixer = AudioMixer(self._project((self.tone, 500)).timeline)
+        out = mixer.mix(0, 1500)
+        self.assertFalse(out[: RATE // 2 - 64].any())
+        self.assertGreater(np.abs(out[RATE // 2 + 2048 :]).max(), 0.2)
+
+    def test_gain_and_fades(self) -> None:
+        p = self._project((self.tone, 0))
+        clip = p.timeline.track(1).clips[0]
+        p.update_clip(clip, gain=0.5)
+        half = np.abs(AudioMixer(p.timeline).mix(500, 1000)).max()
+        self.assertAlmostEqual(half, 0.125, delta=0.01)
+
+        p.update_clip(clip, gain=1.0, fade_in_ms=1000)
+        out = AudioMixer(p.timeline).mix(0, 1000)
+        self.assertLess(np.abs(out[: RATE // 10]).max(), 0.03)
+        self.assertGreater(np.abs(out[-RATE // 10 :]).max(), 0.2)
+
+    def test_overlapping_clips_are_summed_and_clipped(self) -> None:
+        p = self._project(*[(self.tone, 0)] * 6)
+        out = AudioMixer(p.timeline).mix(500, 1000)
+        self.assertEqual(np.abs(out).max(), 1.0)
+
+    def test_source_without_audio_is_silence(self) -> None:
+        p = self._project((self.video_only, 0), (self.tone, 1000))
+        out = AudioMixer(p.timeline).mix(0, 2000)
+        self.assertFalse(out[: RATE - 64].any())
+        self.assertGreater(np.abs(out[RATE + 2048 :]).max(), 0.2)
+
+    def test_missing_source_still_fails(self) -> None:
+        p = Project()
+        p.timeline.track(1).add_clip(
+            Clip(MediaAsset(Path("/no/such.wav"), MediaType.AUDIO, 1000), 0, 1000, 0)
+        )
+        with self.assertRaises(RuntimeError):
+            AudioMixer(p.timeline).mix(0, 1000)
+
+    def test_render_with_video_only_clip_on_audio_track(self) -> None:
+        p = self._project((self.video_only, 0))
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "out.mp4"
+            stats = RenderEngine(p, RenderSettings(out, video_codec=VIDEO_CODEC)).run()
+            self.assertEqual(stats.frames, 30)
+            self.assertIsNotNone(probe(str(out))["audio"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import pickle
+import random
+import unittest
+from pathlib import Path
+
+from larkedit.core.clip_index import ClipIndex
+from larkedit.core.project import Clip, MediaAsset, MediaType
+
+ASSET = MediaAsset(Path("a.mp4"), MediaType.VIDEO, 10_000)
+
+
+def _clip(start_ms: int, duration_ms: int) -> Clip:
+    return Clip(ASSET, 0, duration_ms, start_ms)
+
+
+def _ids(clips) -> list[int]:
+    return [id(c) for c in clips]
+
+
+class ClipIndexTest(unittest.TestCase):
+    def test_queries_match_brute_force(self) -> None:
+        rng = random.Random(1)
+        clips = [
+            _clip(rng.randrange(0, 5000), rng.randrange(1, 800)) for _ in range(300)
+        ]
+        index = ClipIndex(clips)
+        ordered = sorted(clips, key=lambda c: c.start_ms)
+        for _ in range(500):
+            st = rng.randrange(-100, 6000)
+            en = st + rng.randrange(1, 500)
+            expect = [c for c in ordered if c.start_ms < en and st < c.end_ms]
+            self.assertEqual(_ids(index.overlapping(st, en)), _ids(expect))
+        pos = ordered[10].start_ms
+        self.assertIs(index.first_at(pos), index.at(pos)[0])
+        self.assertIsNone(index.first_at(99_999))
+
+    def test_empty(self) -> None:
+        index = ClipIndex()
+        self.assertEqual(index.overlapping(0, 1000), [])
+        self.assertEqual(index.end_ms, 0)
+        self.assertEqual(len(index), 0)
+
+    def test_add_many_keeps_existing_first_for_equal_starts(self) -> None:
+        a, b, c, d = _clip(0, 10), _clip(100, 10), _clip(100, 20), _clip(50, 10)
+        index = ClipIndex([a, b])
+        index.add_many([c, d])
+        self.assertEqual(_ids(index), _ids([a, d, b, c]))
+        e = _clip(100, 5)
+        index.add(e)
+        self.assertEqual(_ids(index[2:]), _ids([b, c, e]))
+        self.assertEqual(_ids(index.at(105)), _ids([b, c]))
+
+    def test_remove_many_is_all_or_nothing(self) -> None:
+        a, b = _clip(0, 10), _clip(20, 10)
+        index = ClipIndex([a, b])
+        version = index.version
+        with self.assertRaisesRegex(ValueError, "not in this index"):
+            index.remove_many([a, _clip(0, 10)])  # 等しいが別のオブジェクト
+        self.assertEqual(_ids(index), _ids([a, b]))
+        self.assertEqual(index.version, version)
+        index.remove_many([a])
+        self.assertEqual(_ids(index), _ids([b]))
+        with self.assertRaises(ValueError):
+            index.remove(a)
+
+    def test_update_reorders(self) -> None:
+        a, b = _clip(0, 10), _clip(20, 10)
+        index = ClipIndex([a, b])
+        index.update(a, start_ms=40)
+        self.assertEqual(_ids(index), _ids([b, a]))
+        self.assertEqual(_ids(index.at(45)), _ids([a]))
+        self.assertEqual(index.at(5), [])
+        self.assertEqual(index.end_ms, 50)
+
+    def test_update_with_bad_field_keeps_clip_indexed(self) -> None:
+        a = _clip(0, 10)
+        index = ClipIndex([a])
+        with self.assertRaises(AttributeError):
+            index.update(a, no_such_field=1)
+        self.assertIn(a, index)
+
+    def test_lazy_loads_on_first_query(self) -> None:
+        clips = [_clip(0, 10), _clip(20, 10)]
+        calls = []
+
+        def loader() -> list[Clip]:
+            calls.append(1)
+            return list(clips)
+
+        index = ClipIndex.lazy(loader, 2, 30)
+        self.assertEqual((len(index), index.end_ms, index.loaded), (2, 30, False))
+        self.assertEqual(calls, [])
+        self.assertEqual(_ids(index.at(25)), _ids(clips[1:]))
+        self.assertTrue(index.loaded)
+        list(index)
+        self.assertEqual(calls, [1])
+
+    def test_pickle_round_trip(self) -> None:
+        index = ClipIndex([_clip(20, 10), _clip(0, 10)])
+        copy = pickle.loads(pickle.dumps(index))
+        self.assertEqual([c.start_ms for c in copy], [0, 20])
+        self.assertEqual(len(copy.at(25)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
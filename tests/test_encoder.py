@@ -0,0 +1,67 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+from support import AUDIO_CODEC, VIDEO_CODEC
+
+from larkedit.encoding.ffmpeg_binding import encoder as ffm  # type: ignore
+from larkedit.encoding.ffmpeg_binding import probe as _probe  # type: ignore
+
+
+class SubmitAfterFinishTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "out.mkv"
+
+    def _encoder(self, **kwargs) -> "ffm.MediaEncoder":
+        kwargs.setdefault("video_codec", VIDEO_CODEC)
+        kwargs.setdefault("audio_codec", AUDIO_CODEC)
+        enc = ffm.MediaEncoder(str(self.path), 320, 240, 30, **kwargs)
+        enc.start()
+        return enc
+
+    def test_submit_after_finish_raises(self) -> None:
+        enc = self._encoder()
+        frame = np.zeros((240, 320, 4), np.uint8)
+        enc.submit_video(frame, 0)
+        enc.finish()
+        with self.assertRaisesRegex(RuntimeError, "already finished"):
+            enc.submit_video(frame, 33)
+        with self.assertRaisesRegex(RuntimeError, "already finished"):
+            enc.submit_audio(np.zeros((1024, 2), np.float32), 0)
+
+    def test_submit_racing_finish_is_not_dropped(self) -> None:
+        # キューが満杯で待っている submit を finish が閉じる
+        enc = self._encoder(audio_codec="", queue_cap=1, threads=1)
+        frames = [np.full((240, 320, 4), i * 8 % 256, np.uint8) for i in range(8)]
+        accepted = 0
+        errors: list[Exception] = []
+
+        def feed() -> None:
+            nonlocal accepted
+            i = 0
+            try:
+                while True:
+                    enc.submit_video(frames[i % len(frames)], i * 1000 // 30)
+                    accepted += 1
+                    i += 1
+            except RuntimeError as e:
+                errors.append(e)
+
+        t = threading.Thread(target=feed)
+        t.start()
+        time.sleep(0.3)
+        enc.finish()
+        t.join(10)
+        self.assertFalse(t.is_alive())
+        written = sum(1 for _ in _probe.MediaDecoder(str(self.path)))
+        self.assertEqual(written, accepted)  # 受け付けた分は全部書かれている
+        self.assertRegex(str(errors[0]), "already finished")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import json
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+from support import make_media
+
+# 別プロセスで索引を引く (プロセス内のキャッシュを通さずサイドカーを読ませる)
+_SCRIPT = """
+import json, sys
+from larkedit.encoding.ffmpeg_binding import probe
+from larkedit.utils.media import init_index_dir
+init_index_dir()
+print(json.dumps(probe.keyframe_times(sys.argv[1])))
+"""
+
+
+class SidecarTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.root = Path(cls._tmp.name)
+        cls.media = make_media(cls.root / "clip.mp4", 2.0, audio=False, gop_size=10)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls._tmp.cleanup()
+
+    def setUp(self) -> None:
+        self.cache = Path(tempfile.mkdtemp(dir=self.root))
+
+    def _keyframes(self) -> list[int]:
+        env = dict(os.environ, LARKEDIT_CACHE_DIR=str(self.cache))
+        out = subprocess.run(
+            [sys.executable, "-c", _SCRIPT, str(self.media)],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        return json.loads(out)
+
+    def _sidecar(self) -> Path:
+        (path,) = (self.cache / "keyframes").glob("*.lkix")
+        return path
+
+    def _count_offset(self, data: bytes) -> int:
+        """サイドカー中のキーフレーム数 n の位置"""
+        (path_len,) = struct.unpack_from("=I", data, 24)
+        return 28 + path_len + 4 + 4 + 4 + 8 + 8
+
+    def test_sidecar_is_reused(self) -> None:
+        keys = self._keyframes()
+        self.assertEqual(len(keys), 6)
+        before = self._sidecar().stat().st_mtime_ns
+        self.assertEqual(self._keyframes(), keys)
+        self.assertEqual(self._sidecar().stat().st_mtime_ns, before)
+
+    def test_corrupt_count_rebuilds_the_index(self) -> None:
+        keys = self._keyframes()
+        sidecar = self._sidecar()
+        good = sidecar.read_bytes()
+        at = self._count_offset(good)
+        self.assertEqual(struct.unpack_from("=Q", good, at)[0], len(keys))
+        for n in (1 << 60, 1 << 40, len(keys) + 1, len(keys) - 1):
+            bad = bytearray(good)
+            struct.pack_into("=Q", bad, at, n)
+            sidecar.write_bytes(bytes(bad))
+            self.assertEqual(self._keyframes(), keys, n)
+            self.assertEqual(sidecar.read_bytes(), good)  # 書き直された
+
+    def test_truncated_sidecar_rebuilds_the_index(self) -> None:
+        keys = self._keyframes()
+        sidecar = self._sidecar()
+        good = sidecar.read_bytes()
+        for cut in (len(good) - 1, self._count_offset(good) + 4, 10):
+            sidecar.write_bytes(good[:cut])
+            self.assertEqual(self._keyframes(), keys, cut)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import support  # noqa: F401  (LARKEDIT_CACHE_DIR を先に差し替える)
+
+from larkedit.core.command import UndoStack
+from larkedit.core.project import AddClipCommand, MediaAsset, MediaType, Project
+from larkedit.core.project_file import ProjectFileError
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication, QMessageBox  # noqa: E402
+
+from larkedit.gui import main_window  # noqa: E402
+from larkedit.gui.main_window import MainWindow  # noqa: E402
+
+Button = QMessageBox.StandardButton
+
+
+class CloseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.win = MainWindow()
+        self.addCleanup(self.win.deleteLater)
+        self.project = Project()
+        self.assertTrue(self.win._open_editor(self.project))
+        self.project.undo_stack = UndoStack(journal=self.dir / "undo.journal")
+        self.project.undo_stack.push(self._add_clip(0))
+        self.journal = self.project.undo_stack.journal_path
+        self.assertTrue(self.journal.exists())
+        self.assertTrue(self.win._dirty)
+
+    def _add_clip(self, start_ms: int) -> AddClipCommand:
+        asset = MediaAsset(self.dir / "a.mp4", MediaType.VIDEO, 1000)
+        return AddClipCommand(
+            self.project, track_index=0, asset=asset, start_ms=start_ms
+        )
+
+    def _close(self, answer: QMessageBox.StandardButton) -> tuple[bool, mock.Mock]:
+        with mock.patch.object(
+            main_window.QMessageBox, "question", return_value=answer
+        ) as question:
+            closed = self.win.close()
+        return closed, question
+
+    def test_cancel_keeps_window_and_journal(self) -> None:
+        closed, question = self._close(Button.Cancel)
+        self.assertFalse(closed)
+        question.assert_called_once()
+        self.assertTrue(self.journal.exists())
+        self.assertTrue(self.win._dirty)
+
+    def test_discard_removes_journal(self) -> None:
+        closed, _ = self._close(Button.Discard)
+        self.assertTrue(closed)
+        self.assertFalse(self.journal.exists())
+
+    def test_save_writes_project_before_closing(self) -> None:
+        path = self.dir / "p.lkproj"
+        self.project.save(path)
+        self.project.undo_stack.push(self._add_clip(1000))
+        closed, _ = self._close(Button.Save)
+        self.assertTrue(closed)
+        self.assertTrue(path.exists())
+        self.assertEqual(len(Project.load(path).timeline.track(0).clips), 2)
+        self.assertFalse(self.journal.exists())
+
+    def test_failed_save_keeps_window_open(self) -> None:
+        self.project.save(self.dir / "p.lkproj")
+        with (
+            mock.patch.object(Project, "save", side_effect=ProjectFileError("corrupt")),
+            mock.patch.object(main_window.QMessageBox, "warning") as warning,
+        ):
+            closed, _ = self._close(Button.Save)
+        self.assertFalse(closed)
+        warning.assert_called_once()
+        self.assertTrue(self.journal.exists())
+
+    def test_clean_project_closes_without_asking(self) -> None:
+        self.win._dirty = False
+        closed, question = self._close(Button.Cancel)
+        self.assertTrue(closed)
+        question.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
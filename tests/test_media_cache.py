@@ -0,0 +1,119 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from support import make_media
+
+from larkedit.core.media_cache import MediaCache
+
+INFO = {"duration_ms": 1000, "video": {"width": 16, "height": 16, "fps": 30.0}}
+
+
+class MediaCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.db = self.dir / "cache.sqlite3"
+        self.files = []
+        for name in "abc":
+            f = self.dir / f"{name}.mp4"
+            f.write_bytes(name.encode() * 100)
+            self.files.append(f)
+
+    def _cache(self, **kwargs) -> MediaCache:
+        cache = MediaCache(self.db, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def _last_used(self, path: Path) -> float:
+        with sqlite3.connect(self.db) as db:
+            return db.execute(
+                "SELECT last_used FROM media WHERE path = ?", (str(path.resolve()),)
+            ).fetchone()[0]
+
+    def test_round_trip(self) -> None:
+        cache = self._cache()
+        thumb = np.arange(8 * 6 * 4, dtype=np.uint8).reshape(6, 8, 4)
+        cache.put(self.files[0], INFO, thumb, 96)
+        hit = cache.get(self.files[0], 96)
+        self.assertEqual(hit.info, INFO)
+        np.testing.assert_array_equal(hit.thumbnail, thumb)
+        self.assertIsNone(cache.get(self.files[0], 48).thumbnail)  # 別サイズ
+        self.assertIsNone(cache.get(self.files[1]))
+        self.assertIsNone(cache.get(self.dir / "missing.mp4"))
+
+    def test_changed_file_misses_and_replaces_old_row(self) -> None:
+        cache = self._cache()
+        cache.put(self.files[0], INFO)
+        size = cache.total_bytes
+        self.files[0].write_bytes(b"changed" * 100)
+        self.assertIsNone(cache.get(self.files[0]))
+        cache.put(self.files[0], INFO)
+        self.assertEqual(cache.total_bytes, size)
+        cache.invalidate(self.files[0])
+        self.assertEqual(cache.total_bytes, 0)
+
+    def test_get_does_not_write_until_flushed(self) -> None:
+        cache = self._cache()
+        cache.put(self.files[0], INFO)
+        before = self._last_used(self.files[0])
+        self.assertIsNotNone(cache.get(self.files[0]))
+        self.assertEqual(self._last_used(self.files[0]), before)
+        cache.close()
+        self.assertGreater(self._last_used(self.files[0]), before)
+
+    def test_eviction_sees_pending_touches(self) -> None:
+        cache = self._cache()
+        cache.put(self.files[0], INFO)
+        one = cache.total_bytes
+        cache._max_bytes = 2 * one
+        cache.put(self.files[1], INFO)
+        cache.get(self.files[0])  # a の方が新しく使われた
+        cache.put(self.files[2], INFO)
+        self.assertIsNotNone(cache.get(self.files[0]))
+        self.assertIsNone(cache.get(self.files[1]))
+        self.assertEqual(cache.total_bytes, 2 * one)
+
+    def test_size_limit_is_shared_between_instances(self) -> None:
+        first = self._cache()
+        first.put(self.files[0], INFO)
+        one = first.total_bytes
+        second = self._cache(max_bytes=2 * one)
+        first.put(self.files[1], INFO)  # second の知らない行
+        second.put(self.files[2], INFO)
+        self.assertEqual(second.total_bytes, 2 * one)
+        self.assertIsNone(second.get(self.files[0]))
+
+    def test_default_is_shared(self) -> None:
+        self.assertIs(MediaCache.default(), MediaCache.default())
+
+
+class IndexDirTest(unittest.TestCase):
+    def test_import_does_not_create_cache_dirs(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            media = make_media(Path(tmp) / "clip.mp4", 0.5, audio=False)
+            cache = Path(tmp) / "cache"
+            env = dict(os.environ, LARKEDIT_CACHE_DIR=str(cache))
+            script = (
+                "import sys, pathlib\n"
+                "from larkedit.utils import media\n"
+                "cache = pathlib.Path(sys.argv[1])\n"
+                "assert not (cache / 'keyframes').exists(), 'created on import'\n"
+                "media.probe(sys.argv[2])\n"
+                "assert (cache / 'keyframes').is_dir(), 'not created on probe'\n"
+            )
+            subprocess.run(
+                [sys.executable, "-c", script, str(cache), str(media)],
+                env=env,
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
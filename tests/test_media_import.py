@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from support import make_media
+
+from larkedit.core.media_cache import MediaCache
+from larkedit.core.media_manager import ImportResult, MediaImportService
+
+
+class _BrokenCache:
+    """get / put が exc を送出するキャッシュ"""
+
+    def __init__(self, exc: Exception) -> None:
+        self.exc = exc
+
+    def get(self, *args, **kwargs):
+        raise self.exc
+
+    def put(self, *args, **kwargs):
+        raise self.exc
+
+
+class MediaImportTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.root = Path(cls._tmp.name)
+        cls.media = make_media(cls.root / "clip.mp4", 1.0)
+        cls.junk = cls.root / "junk.mp4"
+        cls.junk.write_bytes(b"not a video" * 100)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls._tmp.cleanup()
+
+    def _import(self, service: MediaImportService, path: Path) -> ImportResult:
+        self.addCleanup(service.shutdown, wait=True)
+        got: list[ImportResult] = []
+        done = threading.Event()
+
+        def callback(result: ImportResult) -> None:
+            got.append(result)
+            done.set()
+
+        future = service.submit(path, callback)
+        self.assertTrue(done.wait(30), "callback was not called")
+        self.assertIs(future.result(), got[0])
+        return got[0]
+
+    def test_import_and_cache_hit(self) -> None:
+        cache = MediaCache(self.root / "cache.sqlite3")
+        self.addCleanup(cache.close)
+        first = self._import(MediaImportService(1, cache=cache), self.media)
+        self.assertIsNone(first.error)
+        self.assertFalse(first.cached)
+        self.assertEqual(first.thumbnail.shape[2], 4)
+        self.assertAlmostEqual(first.duration_ms, 1000, delta=50)
+
+        second = self._import(MediaImportService(1, cache=cache), self.media)
+        self.assertTrue(second.cached)
+        self.assertEqual(second.info, first.info)
+
+    def test_unreadable_file_reports_error(self) -> None:
+        result = self._import(MediaImportService(1, use_cache=False), self.junk)
+        self.assertIsNone(result.info)
+        self.assertIn("probe", result.error)
+
+    def test_locked_cache_does_not_fail_import(self) -> None:
+        cache = _BrokenCache(sqlite3.OperationalError("database is locked"))
+        result = self._import(MediaImportService(1, cache=cache), self.media)
+        self.assertIsNone(result.error)
+        self.assertIsNotNone(result.info)
+
+    def test_unexpected_error_is_delivered(self) -> None:
+        cache = _BrokenCache(ValueError("boom"))
+        result = self._import(MediaImportService(1, cache=cache), self.media)
+        self.assertEqual(result.error, "ValueError: boom")
+
+
+class MediaPoolWidgetTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PySide6.QtWidgets import QApplication
+
+        cls.app = QApplication.instance() or QApplication([])
+
+    def test_failed_import_is_shown_and_not_draggable(self) -> None:
+        from larkedit.core.project import Project
+        from larkedit.gui.widgets.media_pool import MediaPoolWidget
+
+        pool = MediaPoolWidget(Project())
+        self.addCleanup(pool.deleteLater)
+        path = Path("/no/such/file.mp4")
+        pool._import_media(path)
+        ticket, widget = next(iter(pool._pending.items()))
+        pool._on_import_finished(
+            (ticket, ImportResult(path, "video", 0, error="probe: not found"))
+        )
+        self.assertFalse(widget.ready)
+        self.assertIn("probe: not found", widget.toolTip())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import dataclasses
+import unittest
+from pathlib import Path
+
+from support import VIDEO_CODEC
+
+from larkedit.core.compositor import RenderSettings
+from larkedit.core.project import Project
+from larkedit.encoding.presets import PRESETS, auto_tune, get_preset, speed_ladder
+
+# このビルドで必ず使える候補と、絶対に無いコーデックの候補
+USABLE = dataclasses.replace(
+    PRESETS["web"], name="usable", video_codec=VIDEO_CODEC, options={}
+)
+MISSING = dataclasses.replace(
+    PRESETS["hevc"], name="missing", video_codec="no-such-codec", quality=99
+)
+SINGLE_THREAD = [(1, "frame")]
+
+
+class PresetTest(unittest.TestCase):
+    def test_get_preset(self) -> None:
+        self.assertIs(get_preset("archive"), PRESETS["archive"])
+        with self.assertRaisesRegex(KeyError, "unknown encoding preset"):
+            get_preset("nope")
+
+    def test_speed_ladder(self) -> None:
+        ladder = speed_ladder(PRESETS["web"])
+        self.assertEqual(ladder[0].options["preset"], "slow")
+        self.assertEqual(ladder[-1].options["preset"], "ultrafast")
+        qualities = [p.quality for p in ladder]
+        self.assertEqual(qualities, sorted(qualities, reverse=True))
+        self.assertEqual(speed_ladder(USABLE), [USABLE])
+
+    def test_apply_keeps_output_and_range(self) -> None:
+        s = RenderSettings(Path("out.mp4"), start_ms=100, end_ms=900)
+        applied = PRESETS["archive"].apply(s)
+        self.assertEqual((applied.output, applied.start_ms), (s.output, 100))
+        self.assertEqual(applied.pix_fmt, "yuv444p")
+
+
+class AutoTuneTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.project = Project(width=160, height=120)
+
+    def _tune(self, candidates, **kwargs):
+        return auto_tune(
+            self.project,
+            candidates=candidates,
+            thread_options=SINGLE_THREAD,
+            sample_s=0.2,
+            **kwargs,
+        )
+
+    def test_picks_a_candidate(self) -> None:
+        result = self._tune([USABLE], use_cache=False)
+        self.assertEqual(result.preset.name, "usable")
+        self.assertGreater(result.realtime, 0)
+        self.assertFalse(result.cached)
+
+    def test_unusable_candidate_is_skipped_and_cached(self) -> None:
+        result = self._tune([MISSING, USABLE], target_realtime=0.01)
+        self.assertEqual(result.preset.name, "usable")
+        failed = [m for m in result.measurements if m.error is not None]
+        self.assertEqual([m.preset for m in failed], ["missing"])
+        self.assertIn("no-such-codec", failed[0].error)
+
+        again = self._tune([MISSING, USABLE], target_realtime=0.01)
+        self.assertTrue(again.cached)
+        self.assertEqual(again.preset.name, "usable")
+        self.assertEqual(again.measurements, result.measurements)
+
+    def test_no_usable_candidate(self) -> None:
+        with self.assertRaisesRegex(RuntimeError, "no-such-codec"):
+            self._tune([MISSING], use_cache=False)
+
+    def test_unreachable_target_returns_fastest(self) -> None:
+        result = self._tune([USABLE], target_realtime=1e9, use_cache=False)
+        self.assertFalse(result.met_target)
+        self.assertEqual(result.preset.name, "usable")
+
+
+if __name__ == "__main__":
+    unittest.main()
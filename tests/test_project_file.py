@@ -0,0 +1,150 @@
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+from larkedit.core import project_file
+from larkedit.core.project import MediaAsset, MediaType, Project, Track
+from larkedit.core.project_file import ProjectFileError
+
+VIDEO = MediaAsset(Path("/media/a.mp4"), MediaType.VIDEO, 60_000)
+AUDIO = MediaAsset(Path("/media/ナレーション.wav"), MediaType.AUDIO, 30_000)
+
+
+def _rows(project: Project) -> list[tuple]:
+    return [
+        (
+            t.index,
+            t.name,
+            t.kind,
+            [
+                (str(c.asset.path), c.asset.media_type, c.in_point_ms, c.duration_ms)
+                + (c.start_ms, c.gain, c.fade_in_ms, c.fade_out_ms)
+                for c in t.clips
+            ],
+        )
+        for t in project.timeline.tracks
+    ]
+
+
+class ProjectFileTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "p.lkproj"
+        p = Project(name="テスト", fps=25, width=640, height=360)
+        p.add_track(Track(index=2, name="overlay"))
+        for i in range(50):
+            p.add_clip(0, VIDEO, i * 1000, in_point_ms=i, duration_ms=900)
+        clip = p.add_clip(1, AUDIO, 500)
+        p.update_clip(clip, gain=0.5, fade_in_ms=200, fade_out_ms=300)
+        self.project = p
+
+    def test_round_trip(self) -> None:
+        self.project.save(self.path)
+        loaded = Project.load(self.path)
+        self.assertEqual(
+            (loaded.name, loaded.fps, loaded.width, loaded.height),
+            ("テスト", 25, 640, 360),
+        )
+        self.assertEqual(_rows(loaded), _rows(self.project))
+        self.assertEqual(loaded.file_path, self.path)
+
+    def test_tracks_load_lazily(self) -> None:
+        self.project.save(self.path)
+        loaded = Project.load(self.path)
+        clips = loaded.timeline.track(0).clips
+        self.assertFalse(clips.loaded)
+        self.assertEqual((len(clips), clips.end_ms), (50, 49_900))
+        self.assertEqual(loaded.timeline.duration_ms, 49_900)
+        self.assertEqual(len(clips.at(1000)), 1)
+        self.assertTrue(clips.loaded)
+        self.assertFalse(loaded.timeline.track(1).clips.loaded)
+
+    def test_second_save_appends_only_changed_tracks(self) -> None:
+        self.project.save(self.path)
+        first = self.path.read_bytes()
+        self.project.add_clip(2, VIDEO, 0)
+        self.project.save()
+        second = self.path.read_bytes()
+        self.assertEqual(second[: len(first)], first)  # 既存のバイトは変えない
+        # 変わったトラック (と新しい COMMIT) だけなので、全体を書くより小さい
+        self.assertLess(len(second) - len(first), len(first) // 2)
+        self.assertEqual(_rows(Project.load(self.path)), _rows(self.project))
+
+    def test_save_of_loaded_project_keeps_unloaded_tracks(self) -> None:
+        self.project.save(self.path)
+        loaded = Project.load(self.path)
+        loaded.update_settings(name="renamed")
+        other = self.path.with_name("other.lkproj")
+        loaded.save(other)  # 別名保存は全体を書き直す
+        self.assertFalse(loaded.timeline.track(0).clips.loaded)
+        again = Project.load(other)
+        self.assertEqual(again.name, "renamed")
+        self.assertEqual(_rows(again), _rows(self.project))
+
+    def test_truncated_save_recovers_previous_commit(self) -> None:
+        self.project.save(self.path)
+        before = _rows(self.project)
+        size = self.path.stat().st_size
+        self.project.add_clip(2, VIDEO, 0)
+        self.project.save()
+        data = self.path.read_bytes()
+        # 追記の途中で落ちた: 新しいレコードのどこで切れても前回の保存が読める
+        for cut in (size + 3, (size + len(data)) // 2):
+            self.path.write_bytes(data[:cut])
+            self.assertEqual(_rows(Project.load(self.path)), before, cut)
+        # TRAILER だけ欠けたなら COMMIT までは書けているので新しい方が読める
+        self.path.write_bytes(data[:-1])
+        self.assertEqual(_rows(Project.load(self.path)), _rows(self.project))
+
+    def test_corrupt_trailer_falls_back_to_scan(self) -> None:
+        self.project.save(self.path)
+        data = bytearray(self.path.read_bytes())
+        data[-1] ^= 0xFF
+        self.path.write_bytes(bytes(data))
+        self.assertEqual(_rows(Project.load(self.path)), _rows(self.project))
+
+    def test_unreadable_files(self) -> None:
+        self.path.write_bytes(b"")
+        with self.assertRaisesRegex(ProjectFileError, "not a LarkEdit"):
+            Project.load(self.path)
+        self.path.write_bytes(b"PK\x03\x04" + bytes(64))
+        with self.assertRaisesRegex(ProjectFileError, "not a LarkEdit"):
+            Project.load(self.path)
+        self.path.write_bytes(struct.pack("<4sHH8x", b"LKPJ", 99, 0))
+        with self.assertRaisesRegex(ProjectFileError, "version 99"):
+            Project.load(self.path)
+        self.project.save(self.path)
+        header = self.path.read_bytes()[:40]
+        self.path.write_bytes(header)  # 最初の保存すら終わっていない
+        with self.assertRaisesRegex(ProjectFileError, "no complete save"):
+            Project.load(self.path)
+
+    def test_external_change_rewrites_the_file(self) -> None:
+        self.project.save(self.path)
+        self.path.write_bytes(self.path.read_bytes() + b"\0")  # 外で書き換えられた
+        self.project.add_clip(2, VIDEO, 0)
+        self.project.save()
+        self.assertFalse(self.path.with_name("p.lkproj.tmp").exists())
+        self.assertEqual(_rows(Project.load(self.path)), _rows(self.project))
+
+    def test_stale_records_are_compacted(self) -> None:
+        self.project.save(self.path)
+        size = self.path.stat().st_size
+        old = project_file._COMPACT_MIN_BYTES
+        project_file._COMPACT_MIN_BYTES = 0
+        self.addCleanup(setattr, project_file, "_COMPACT_MIN_BYTES", old)
+        for i in range(10):
+            self.project.update_clip(self.project.timeline.track(0).clips[i], gain=0.25)
+            self.project.save()
+        self.assertLess(self.path.stat().st_size, 2 * size)
+        self.assertEqual(_rows(Project.load(self.path)), _rows(self.project))
+
+    def test_first_save_needs_a_path(self) -> None:
+        with self.assertRaisesRegex(ValueError, "path is required"):
+            self.project.save()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from pathlib import Path
+
+from larkedit.core.project import MediaAsset, MediaType, Project, Track
+from larkedit.core.render_plan import RenderPlan, frame_of
+
+ASSET = MediaAsset(Path("a.mp4"), MediaType.VIDEO, 60_000)
+FPS = 30
+
+
+def _brute_layers(project: Project, frame: int) -> list[tuple[int, int, int]]:
+    """find_clip_at で 1 フレームずつ求めた (トラック, clip の id, ソース時刻)"""
+    t_ms = frame * 1000 // FPS
+    out = []
+    for track in project.timeline.tracks:
+        if track.is_audio:
+            continue
+        clip = track.find_clip_at(t_ms)
+        if clip is not None:
+            out.append((track.index, id(clip), t_ms - clip.start_ms + clip.in_point_ms))
+    return out
+
+
+class RenderPlanTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.project = Project(fps=FPS)
+        self.project.add_track(Track(index=2, name="overlay"))
+        add = self.project.add_clip
+        self.a = add(0, ASSET, 0, duration_ms=1000)
+        self.b = add(0, ASSET, 500, in_point_ms=2000, duration_ms=1000)  # a と重なる
+        self.c = add(0, ASSET, 2010, duration_ms=333)  # フレーム境界にない
+        self.d = add(2, ASSET, 700, in_point_ms=100, duration_ms=400)
+        add(1, MediaAsset(Path("a.wav"), MediaType.AUDIO, 5000), 0)
+
+    def _plan(self) -> RenderPlan:
+        return self.project.timeline.render_plan(FPS)
+
+    def test_frame_of_rounds_up(self) -> None:
+        self.assertEqual(frame_of(0, FPS), 0)
+        self.assertEqual(frame_of(33, FPS), 1)
+        self.assertEqual(frame_of(34, FPS), 2)
+        self.assertEqual(frame_of(1000, FPS), 30)
+
+    def test_layers_match_find_clip_at(self) -> None:
+        plan = self._plan()
+        self.assertEqual(plan.track_indices, (0, 2))  # 音声トラックは入らない
+        self.assertEqual(plan.frame_count, frame_of(self.c.end_ms, FPS))
+        for frame in range(plan.frame_count + 5):
+            got = [(i, id(c), t) for i, c, t in plan.layers_at(frame)]
+            self.assertEqual(got, _brute_layers(self.project, frame), frame)
+
+    def test_earlier_clip_wins_overlap(self) -> None:
+        segs = self._plan().segments(0)
+        got = [(c, a, b) for c, a, b, _ in segs[:2]]
+        self.assertEqual(got, [(self.a, 0, 30), (self.b, 30, 45)])
+        self.assertEqual(segs[1][3], 2000 - 500)
+
+    def test_track_frames(self) -> None:
+        plan = self._plan()
+        clips, idx, src = plan.track_frames(2, 0, 40)
+        self.assertTrue((idx[:21] == -1).all())
+        self.assertIs(clips[idx[21]], self.d)
+        self.assertEqual(int(src[21]), 21 * 1000 // FPS - 700 + 100)
+        self.assertEqual(len(plan.track_frames(2, 50, 40)[1]), 0)
+        with self.assertRaises(KeyError):
+            plan.track_frames(7, 0, 10)
+
+    def test_unchanged_tracks_are_reused(self) -> None:
+        first = self._plan()
+        self.project.update_clip(self.d, start_ms=1000)
+        second = self._plan()
+        self.assertIs(first._tracks[0], second._tracks[0])
+        self.assertIsNot(first._tracks[1], second._tracks[1])
+        self.assertEqual(second.changed_frames(first), [(frame_of(700, FPS), 42)])
+        self.assertEqual(second.changed_frames(second), [])
+
+    def test_fps_change_rebuilds_everything(self) -> None:
+        first = self._plan()
+        second = self.project.timeline.render_plan(60)
+        self.assertIsNot(first._tracks[0], second._tracks[0])
+        self.assertEqual(
+            second.changed_frames(first),
+            [(0, max(first.frame_count, second.frame_count))],
+        )
+
+    def test_adding_a_track_invalidates_all_frames(self) -> None:
+        first = self._plan()
+        self.project.add_track(Track(index=3, name="top"))
+        second = self._plan()
+        self.assertEqual(second.changed_frames(first), [(0, first.frame_count)])
+
+    def test_plan_is_immutable(self) -> None:
+        plan = self._plan()
+        with self.assertRaises(ValueError):
+            plan._tracks[0].start[0] = 5
+
+    def test_empty_timeline(self) -> None:
+        plan = Project().timeline.render_plan(FPS)
+        self.assertEqual((plan.frame_count, plan.segment_count), (0, 0))
+        self.assertEqual(plan.layers_at(0), [])
+        self.assertEqual(plan.changed_frames(plan), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import signal
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from support import VIDEO_CODEC
+
+from larkedit.core.compositor import RenderSettings
+from larkedit.core.project import Project
+from larkedit.core.render_queue import JobState, RenderQueue
+
+
+def _settings(output: Path, seconds: int) -> RenderSettings:
+    # クリップが無くても end_ms まで黒を書き出す
+    return RenderSettings(
+        output, width=320, height=240, video_codec=VIDEO_CODEC, end_ms=seconds * 1000
+    )
+
+
+class RenderQueueTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.project = Project(width=320, height=240)
+
+    def _queue(self, **kwargs) -> RenderQueue:
+        q = RenderQueue(1, state_dir=self.dir / "state", **kwargs)
+        self.addCleanup(q.shutdown, cancel_running=True)
+        return q
+
+    def _kill_worker_when_running(self, q: RenderQueue, job_id: str) -> None:
+        deadline = time.monotonic() + 60
+        while q.job(job_id).frames_done == 0:
+            self.assertLess(time.monotonic(), deadline, "job never started")
+            time.sleep(0.05)
+        for pid in list(q._pool._processes):
+            os.kill(pid, signal.SIGKILL)
+
+    def test_jobs_run_in_priority_order(self) -> None:
+        q = self._queue(autostart=False)
+        low = q.submit(self.project, _settings(self.dir / "low.mp4", 1), priority=0)
+        high = q.submit(self.project, _settings(self.dir / "high.mp4", 1), priority=5)
+        q.start()
+        self.assertTrue(q.wait(60))
+        self.assertEqual(q.job(low.id).state, JobState.DONE)
+        self.assertEqual(q.job(high.id).state, JobState.DONE)
+        self.assertLess(q.job(high.id).started_at, q.job(low.id).started_at)
+        self.assertEqual(q.job(low.id).frames_done, 30)
+
+    def test_cancel_queued_job(self) -> None:
+        q = self._queue(autostart=False)
+        job = q.submit(self.project, _settings(self.dir / "out.mp4", 1))
+        q.cancel(job.id)
+        q.start()
+        self.assertTrue(q.wait(10))
+        self.assertEqual(q.job(job.id).state, JobState.CANCELLED)
+        self.assertFalse((self.dir / "out.mp4").exists())
+
+    def test_failed_job_does_not_stop_the_queue(self) -> None:
+        q = self._queue()
+        bad = q.submit(
+            self.project,
+            RenderSettings(self.dir / "bad.mp4", video_codec="no-such-codec"),
+        )
+        good = q.submit(self.project, _settings(self.dir / "good.mp4", 1))
+        self.assertTrue(q.wait(60))
+        self.assertEqual(q.job(bad.id).state, JobState.FAILED)
+        self.assertIn("no-such-codec", q.job(bad.id).error)
+        self.assertEqual(q.job(good.id).state, JobState.DONE)
+
+    def test_worker_crash_requeues_the_running_job(self) -> None:
+        q = self._queue()
+        job = q.submit(self.project, _settings(self.dir / "long.mp4", 30))
+        self._kill_worker_when_running(q, job.id)
+        after = q.submit(self.project, _settings(self.dir / "after.mp4", 1))
+        self.assertTrue(q.wait(120))
+        self.assertEqual(q.job(job.id).state, JobState.DONE)
+        self.assertEqual(q.job(job.id).crashes, 1)
+        self.assertEqual(q.job(after.id).state, JobState.DONE)
+
+    def test_job_fails_after_repeated_crashes(self) -> None:
+        q = self._queue()
+        job = q.submit(self.project, _settings(self.dir / "long.mp4", 30))
+        self._kill_worker_when_running(q, job.id)
+        deadline = time.monotonic() + 60
+        while q.job(job.id).crashes == 0:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+        self._kill_worker_when_running(q, job.id)
+        after = q.submit(self.project, _settings(self.dir / "after.mp4", 1))
+        self.assertTrue(q.wait(120))
+        self.assertEqual(q.job(job.id).state, JobState.FAILED)
+        self.assertIn("BrokenProcessPool", q.job(job.id).error)
+        self.assertEqual(q.job(after.id).state, JobState.DONE)
+
+    def test_unfinished_jobs_resume_after_restart(self) -> None:
+        q = self._queue(autostart=False)
+        job = q.submit(self.project, _settings(self.dir / "out.mp4", 1))
+        q.shutdown()
+        q = self._queue(autostart=False)
+        self.assertEqual(q.job(job.id).state, JobState.QUEUED)
+        q.start()
+        self.assertTrue(q.wait(60))
+        self.assertEqual(q.job(job.id).state, JobState.DONE)
+
+
+if __name__ == "__main__":
+    unittest.main()
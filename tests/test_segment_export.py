@@ -0,0 +1,125 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+import numpy as np
+from support import VIDEO_CODEC, make_media
+
+from larkedit.core.compositor import RenderCancelled, RenderEngine, RenderSettings
+from larkedit.core.project import MediaAsset, MediaType, Project
+from larkedit.core.proxy import ProxyManager
+from larkedit.core.segment_export import SegmentedExporter, plan_segments
+from larkedit.encoding.ffmpeg_binding import encoder as ffm  # type: ignore
+from larkedit.encoding.ffmpeg_binding import probe as _probe  # type: ignore
+from larkedit.utils.media import probe
+
+
+def _frames(path: Path) -> list[np.ndarray]:
+    return [rgba.copy() for _, rgba in _probe.MediaDecoder(str(path))]
+
+
+class PlanSegmentsTest(unittest.TestCase):
+    def test_bounds_are_on_gop_boundaries(self) -> None:
+        plan = plan_segments(0, 10_000, 30, 60, 4)
+        self.assertEqual(plan[0][0], 0)
+        self.assertEqual(plan[-1][1], 10_000)
+        for (_, b), (a, _) in zip(plan, plan[1:]):
+            self.assertEqual(a, b)
+            self.assertEqual(a * 30 // 1000 % 60, 0)
+
+    def test_short_range_is_one_segment(self) -> None:
+        self.assertEqual(plan_segments(0, 1000, 30, 60, 8), [(0, 1000)])
+        self.assertEqual(plan_segments(500, 500, 30, 60, 8), [])
+
+
+class SegmentedExportTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls.root = Path(cls._tmp.name)
+        src = make_media(cls.root / "src.mp4", 4.0, sample_rate=44100)
+        asset_ms = probe(str(src))["duration_ms"]
+        cls.project = Project(width=160, height=120, fps=30)
+        cls.project.add_clip(0, MediaAsset(src, MediaType.VIDEO, asset_ms), 0)
+        cls.project.add_clip(1, MediaAsset(src, MediaType.AUDIO, asset_ms), 0)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls._tmp.cleanup()
+
+    def _settings(self, name: str) -> RenderSettings:
+        # codec_options は空: mpeg4 でも固定 GOP で開けること
+        return RenderSettings(
+            self.root / name, video_codec=VIDEO_CODEC, sample_rate=44100, gop_size=30
+        )
+
+    def test_matches_single_pass_export(self) -> None:
+        single = self._settings("single.mp4")
+        RenderEngine(self.project, single).run()
+        seg = self._settings("segmented.mp4")
+        stats = SegmentedExporter(self.project, seg, segments=4, workers=2).run()
+        self.assertEqual(stats.encoder["segments"], 4)
+        self.assertEqual(stats.frames, 120)
+
+        a, b = _frames(single.output), _frames(seg.output)
+        self.assertEqual(len(a), len(b))
+        for x, y in zip(a, b):
+            np.testing.assert_array_equal(x, y)
+
+    def test_audio_is_continuous_across_segments(self) -> None:
+        out = self._settings("audio.mp4")
+        SegmentedExporter(self.project, out, segments=4, workers=2).run()
+        info = probe(str(out.output))
+        self.assertIn("audio", info)
+        dec = _probe.AudioDecoder(str(out.output), 44100, 2)
+        parts = []
+        while len(part := dec.read(44100)):
+            parts.append(part)
+        pcm = np.concatenate(parts)
+        # 4 秒の正弦波が境界で途切れたりずれたりしていない
+        self.assertAlmostEqual(len(pcm) / 44100, 4.0, delta=0.05)
+        body = pcm[4410:-4410, 0]
+        windows = body[: len(body) // 441 * 441].reshape(-1, 441)  # 10 ms ごと
+        self.assertGreater(np.sqrt((windows**2).mean(axis=1)).min(), 0.15)
+
+    def test_cancel(self) -> None:
+        out = self._settings("cancelled.mp4")
+        exporter = SegmentedExporter(self.project, out, segments=4, workers=2)
+        threading.Timer(0.05, exporter.cancel).start()
+        with self.assertRaises(RenderCancelled):
+            exporter.run()
+        self.assertFalse(out.output.exists())
+
+
+class FixedGopTest(unittest.TestCase):
+    def test_intra_only_mpeg4_opens(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            src = make_media(root / "src.mp4", 1.0, audio=False)
+            proxies = ProxyManager(video_codec=VIDEO_CODEC, height=60, directory=root)
+            asset = MediaAsset(src, MediaType.VIDEO, 1000)
+            path = proxies.submit(asset).result(60)
+            proxies.shutdown(wait=True)
+            self.assertEqual(asset.proxy_path, path)
+            self.assertEqual(len(_probe.keyframe_times(str(path))), 30)  # 全フレーム
+
+    def test_open_failure_names_the_gop(self) -> None:
+        with (
+            tempfile.TemporaryDirectory() as tmp,
+            self.assertRaisesRegex(RuntimeError, "gop_size=30"),
+        ):
+            ffm.MediaEncoder(
+                str(Path(tmp) / "x.mp4"),
+                160,
+                120,
+                30,
+                video_codec=VIDEO_CODEC,
+                audio_codec="",
+                gop_size=30,
+                codec_options={"sc_threshold": "10"},
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import bisect
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+from support import make_media
+
+from larkedit.encoding.ffmpeg_binding import probe as _probe  # type: ignore
+from larkedit.utils.media import probe, thumbnail_strip
+from larkedit.utils.paths import cache_dir
+
+
+def _sidecars() -> set[Path]:
+    return set(cache_dir("keyframes").glob("*.lkix"))
+
+
+class ThumbnailStripTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.media = make_media(
+            Path(tmp.name) / "clip.mp4", 3.0, audio=False, gop_size=15
+        )
+
+    def test_keyframe_mode_does_not_index_the_file(self) -> None:
+        before = _sidecars()
+        strip = thumbnail_strip(self.media, 12, 48)
+        self.assertEqual(strip.shape[:2], (12, 48))
+        self.assertEqual(_sidecars(), before)
+
+        # 各時刻の直前のキーフレームと同じ絵
+        keys = _probe.keyframe_times(str(self.media))
+        self.assertEqual(len(keys), 6)
+        step = probe(self.media)["duration_ms"] / 12
+        at = [
+            keys[bisect.bisect_right(keys, int(step * (i + 0.5))) - 1]
+            for i in range(12)
+        ]
+        exact = _probe.extract_rgba_frames(str(self.media), at, 1 << 14, 48, True)
+        np.testing.assert_array_equal(strip, exact)
+
+    def test_exact_mode(self) -> None:
+        strip = thumbnail_strip(self.media, 6, 48, duration_ms=3000, exact=True)
+        for i, frame in enumerate(strip):
+            number = int(500 * (i + 0.5)) * 30 // 1000  # ms を含むフレーム
+            self.assertAlmostEqual(int(frame[0, 0, 0]), number * 8 % 256, delta=6)
+
+    def test_past_the_end_repeats_the_last_frame(self) -> None:
+        for exact in (False, True):
+            frames = _probe.extract_rgba_frames(
+                str(self.media), [10_000, 2990], 1 << 14, 48, exact
+            )
+            np.testing.assert_array_equal(frames[0], frames[1])
+
+    def test_empty(self) -> None:
+        self.assertEqual(thumbnail_strip(self.media, 0).shape[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,234 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import support  # noqa: F401  (LARKEDIT_CACHE_DIR を先に差し替える)
+
+from larkedit.core.command import Command, DeltaCodec, DeltaCommand, UndoStack
+from larkedit.core.project import (
+    AddClipCommand,
+    Clip,
+    MediaAsset,
+    MediaType,
+    Project,
+    RemoveClipsCommand,
+    UpdateClipCommand,
+)
+
+ASSET = MediaAsset(Path("/media/a.mp4"), MediaType.VIDEO, 10_000)
+
+
+def _state(project: Project) -> list[list[tuple]]:
+    return [
+        [(c.start_ms, c.duration_ms, c.in_point_ms, c.gain) for c in t.clips]
+        for t in project.timeline.tracks
+    ]
+
+
+def _add(project: Project, start_ms: int) -> AddClipCommand:
+    return AddClipCommand(project, track_index=0, asset=ASSET, start_ms=start_ms)
+
+
+class _Opaque(Command):
+    """差分にできないコマンド"""
+
+    description = "Opaque"
+
+    def __init__(self, project: Project) -> None:
+        super().__init__()
+        self._project = project
+        self._clip: Clip | None = None
+
+    @property
+    def project(self) -> Project:
+        return self._project
+
+    def _execute(self) -> bool:
+        self._clip = self._project.add_clip(0, ASSET, 50_000)
+        return True
+
+    def _undo(self) -> None:
+        assert self._clip is not None
+        self._project.remove_clip(0, self._clip)
+
+
+class DeltaCodecTest(unittest.TestCase):
+    def test_round_trip_shares_assets(self) -> None:
+        project = Project()
+        codec = DeltaCodec(project)
+        cmd = _add(project, 100)
+        cmd.execute()
+        data = codec.encode(cmd)
+        self.assertEqual(data[0], "AddClipCommand")
+        copy = DeltaCodec(project).decode(data)
+        self.assertIsInstance(copy, AddClipCommand)
+        copy.undo()  # 値でタイムラインの clip を探して消す
+        self.assertEqual(_state(project), [[], []])
+        copy.redo()
+        self.assertEqual(_state(project), [[(100, 10_000, 0, 1.0)], []])
+        ref = codec.asset_ref(ASSET)
+        self.assertIs(codec.asset(ref), ASSET)
+        fresh = DeltaCodec()
+        self.assertEqual(fresh.asset(ref), ASSET)
+        self.assertIs(fresh.asset(ref), fresh.asset(list(ref)))
+
+    def test_opaque_and_unknown(self) -> None:
+        codec = DeltaCodec()
+        self.assertIsNone(codec.encode(_Opaque(Project())))
+        with self.assertRaisesRegex(ValueError, "unknown command type"):
+            codec.decode(["NoSuchCommand", {}])
+
+    def test_delta_command_must_implement_from_delta(self) -> None:
+        class Half(DeltaCommand):
+            def _execute(self) -> bool:
+                return True
+
+            def _undo(self) -> None:
+                pass
+
+            def to_delta(self, codec: DeltaCodec) -> object:
+                return {}
+
+        with self.assertRaises(TypeError):
+            Half()
+
+
+class UndoStackTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.project = Project()
+
+    def _stack(self, **kwargs) -> UndoStack:
+        stack = UndoStack(journal=self.dir / "undo.lkundo", **kwargs)
+        self.addCleanup(stack.close)
+        self.project.undo_stack = stack
+        return stack
+
+    def test_default_depth_is_kept(self) -> None:
+        stack = self._stack()
+        for i in range(1005):
+            stack.push(_add(self.project, i))
+        n = 0
+        while stack.can_undo:
+            stack.undo()
+            n += 1
+        self.assertEqual(n, 1000)
+        self.assertEqual(len(self.project.timeline.track(0).clips), 5)
+
+    def test_undo_redo_through_the_journal(self) -> None:
+        stack = self._stack(memory_budget=0)  # 先頭以外は全部ジャーナルから読み直す
+        for i in range(20):
+            stack.push(_add(self.project, i * 100))
+        clip = self.project.timeline.track(0).clips[3]
+        stack.push(UpdateClipCommand(self.project, clip, gain=0.5, merge_id="g"))
+        stack.push(UpdateClipCommand(self.project, clip, gain=0.25, merge_id="g"))
+        stack.push(RemoveClipsCommand(self.project, track_index=0, clips=[clip]))
+        done = _state(self.project)
+        self.assertLessEqual(stack.memory_bytes, 3 * 2048)
+
+        stack.undo()
+        self.assertEqual(clip.gain, 0.25)
+        stack.undo()  # 2 回の更新はマージされて 1 段
+        self.assertEqual(self.project.timeline.track(0).clips[3].gain, 1.0)
+        while stack.can_undo:
+            stack.undo()
+        self.assertEqual(_state(self.project), [[], []])
+        while stack.can_redo:
+            stack.redo()
+        self.assertEqual(_state(self.project), done)
+
+    def test_opaque_command_drops_older_history_over_budget(self) -> None:
+        stack = self._stack(memory_budget=0)
+        stack.push(_add(self.project, 0))
+        stack.push(_Opaque(self.project))
+        stack.push(_add(self.project, 100))
+        stack.push(_add(self.project, 200))
+        n = 0
+        while stack.can_undo:
+            stack.undo()
+            n += 1
+        self.assertLess(n, 4)
+
+
+class RecoveryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.path = self.dir / "p.lkproj"
+        self.journal = self.dir / "undo.lkundo"
+        self.project = Project()
+        self.stack = UndoStack(journal=self.journal)
+        self.project.undo_stack = self.stack
+
+    def _crash(self) -> None:
+        """close() せずに落ちた (ジャーナルだけ残る)"""
+        assert self.stack._journal is not None
+        self.stack._journal._f.close()
+
+    def _recover(self) -> tuple[Project, UndoStack]:
+        project = Project.load(UndoStack.journal_project(self.journal))
+        stack = UndoStack.recover(project, self.journal)
+        self.addCleanup(stack.close)
+        return project, stack
+
+    def test_replays_edits_after_the_last_save(self) -> None:
+        self.stack.push(_add(self.project, 0))
+        self.project.save(self.path)
+        self.assertFalse(UndoStack.journal_has_edits(self.journal))
+        self.stack.push(_add(self.project, 100))
+        self.stack.push(_add(self.project, 200))
+        self.stack.undo()
+        clip = self.project.timeline.track(0).clips[0]
+        self.stack.push(UpdateClipCommand(self.project, clip, gain=0.5))
+        expected = _state(self.project)
+        self._crash()
+
+        self.assertTrue(UndoStack.journal_has_edits(self.journal))
+        self.assertEqual(UndoStack.journal_project(self.journal), self.path)
+        project, stack = self._recover()
+        self.assertEqual(_state(project), expected)
+        # 履歴も引き継ぐ (保存前の段まで戻せる)
+        while stack.can_undo:
+            stack.undo()
+        self.assertEqual(_state(project), [[], []])
+
+    def test_truncated_record_is_ignored(self) -> None:
+        self.project.save(self.path)
+        self.stack.push(_add(self.project, 0))
+        expected = _state(self.project)
+        self.stack.push(_add(self.project, 100))
+        self._crash()
+        data = self.journal.read_bytes()
+        self.journal.write_bytes(data[:-3])  # 最後の PUSH を書いている途中で落ちた
+
+        project, stack = self._recover()
+        self.assertEqual(_state(project), expected)
+        stack.push(_add(project, 300))  # 壊れた分を捨ててから追記する
+        self.assertEqual(len(project.timeline.track(0).clips), 2)
+        stack.close()
+        self.assertFalse(self.journal.exists())
+
+    def test_replay_stops_at_opaque_command(self) -> None:
+        self.project.save(self.path)
+        self.stack.push(_add(self.project, 0))
+        expected = _state(self.project)
+        self.stack.push(_Opaque(self.project))
+        self.stack.push(_add(self.project, 100))
+        self._crash()
+
+        project, stack = self._recover()
+        self.assertEqual(_state(project), expected)
+        self.assertEqual(stack.undo_description, "Add Clip")
+        self.assertFalse(stack.can_redo)
+
+    def test_not_a_journal(self) -> None:
+        self.journal.write_bytes(b"junk")
+        with self.assertRaisesRegex(ValueError, "not an undo journal"):
+            UndoStack.journal_has_edits(self.journal)
+
+
+if __name__ == "__main__":
+    unittest.main()